@@ -13,6 +13,23 @@ BOT_VERSION = "1.0.0"
 # Konfiguracja Telegram
 TELEGRAM_TOKEN = os.getenv('TELEGRAM_TOKEN')
 
+# Tryb odbierania aktualizacji: "polling" (domyślnie) lub "webhook"
+BOT_UPDATE_MODE = os.getenv('BOT_UPDATE_MODE', 'polling')
+
+# Konfiguracja webhooka: publiczny adres bota, adres i port lokalnego serwera,
+# ścieżka oraz sekret weryfikujący zapytania od Telegrama
+WEBHOOK_URL = os.getenv('WEBHOOK_URL')
+WEBHOOK_LISTEN = os.getenv('WEBHOOK_LISTEN', '0.0.0.0')
+WEBHOOK_PORT = int(os.getenv('WEBHOOK_PORT', '8443'))
+WEBHOOK_PATH = os.getenv('WEBHOOK_PATH', 'telegram')
+WEBHOOK_SECRET_TOKEN = os.getenv('WEBHOOK_SECRET_TOKEN')
+
+# Port punktu kontroli stanu GET /health (0 - wyłączony)
+HEALTH_PORT = int(os.getenv('HEALTH_PORT', '0'))
+
+# Liczba aktualizacji obsługiwanych równocześnie (1 - kolejno, jak dotychczas)
+CONCURRENT_UPDATES = int(os.getenv('CONCURRENT_UPDATES', '1'))
+
 # Konfiguracja OpenAI
 OPENAI_API_KEY = os.getenv('OPENAI_API_KEY')
 DEFAULT_MODEL = "gpt-4o"  # Domyślny model OpenAI
@@ -28,6 +45,41 @@ AVAILABLE_MODELS = {
     "gpt-4o": "GPT-4o"
 }
 
+# Budżet tokenów kontekstu (prompt systemowy + historia + wiadomość) dla modeli
+MODEL_CONTEXT_BUDGETS = {
+    "gpt-3.5-turbo": 3000,
+    "gpt-4": 6000,
+    "gpt-4o": 12000,
+    "default": 3000
+}
+
+# Maksymalna liczba tokenów pojedynczej wiadomości z historii (dłuższe są skracane)
+MAX_HISTORY_MESSAGE_TOKENS = 1500
+
+# Limity zapytań do OpenAI dla modeli: równoczesne zapytania, zapytania i tokeny na minutę
+OPENAI_MODEL_LIMITS = {
+    "gpt-3.5-turbo": {"concurrency": 20, "rpm": 3500, "tpm": 160000},
+    "gpt-4": {"concurrency": 5, "rpm": 500, "tpm": 10000},
+    "gpt-4o": {"concurrency": 10, "rpm": 500, "tpm": 30000},
+    "dall-e-3": {"concurrency": 2, "rpm": 7},
+    "default": {"concurrency": 5, "rpm": 500, "tpm": 30000}
+}
+
+# Modele zastępcze używane, gdy wybrany model jest przeciążony lub niedostępny
+OPENAI_FALLBACK_MODELS = {
+    "gpt-4": ["gpt-4o", "gpt-3.5-turbo"],
+    "gpt-4o": ["gpt-3.5-turbo"]
+}
+
+# Maksymalna długość dłuższego boku zdjęcia wysyłanego do modelu wizyjnego (w pikselach)
+VISION_MAX_IMAGE_EDGE = 2048
+
+# Poziom szczegółowości analizy zdjęć ("low" lub "high") dla trybów analizy
+VISION_DETAIL_BY_MODE = {
+    "analyze": "low",
+    "translate": "high"
+}
+
 # System kredytów
 CREDIT_COSTS = {
     # Koszty wiadomości w zależności od modelu
@@ -45,9 +97,24 @@ CREDIT_COSTS = {
     },
     # Koszty analizy plików
     "document": 5,
-    "photo": 8
+    "photo": 8,
+    # Koszty tłumaczenia całego pliku PDF (za stronę, nie mniej niż minimum)
+    "pdf_translation_page": 1,
+    "pdf_translation_min": 8
 }
 
+# Kategorie operacji zapisywane w transakcjach kredytów (klucz -> etykieta w statystykach)
+CREDIT_CATEGORIES = {
+    "message": "Wiadomości",
+    "image": "Obrazy",
+    "document": "Analiza dokumentów",
+    "photo": "Analiza zdjęć",
+    "other": "Inne"
+}
+
+# Kategoria transakcji, dla której nie podano rodzaju operacji
+DEFAULT_CREDIT_CATEGORY = "other"
+
 # Pakiety kredytów
 CREDIT_PACKAGES = [
     {"id": 1, "name": "Starter", "credits": 100, "price": 4.99},
@@ -57,6 +124,11 @@ CREDIT_PACKAGES = [
     {"id": 5, "name": "Biznes", "credits": 5000, "price": 179.99}
 ]
 
+# Pamięć podręczna wykresów kredytów: limit pamięci procesu (w bajtach) i opcjonalny
+# katalog, do którego trafiają wykresy usunięte z pamięci (brak - bez zapisu na dysk)
+CHART_CACHE_MAX_BYTES = 32 * 1024 * 1024
+CHART_CACHE_DIR = os.getenv('CHART_CACHE_DIR')
+
 # Dostępne języki
 AVAILABLE_LANGUAGES = {
     "pl": "Polski 🇵🇱",
@@ -65,102 +137,119 @@ AVAILABLE_LANGUAGES = {
 }
 
 # Tryby czatu (odpowiednik szablonów promptów)
+# "cacheable" - czy odpowiedzi na powtarzalne pytania na początku rozmowy mogą być zapamiętywane
 CHAT_MODES = {
     "no_mode": {
         "name": "🔄 Brak trybu",
         "prompt": "Jesteś pomocnym asystentem AI.",
         "model": "gpt-3.5-turbo",
-        "credit_cost": 1
+        "credit_cost": 1,
+        "cacheable": False
     },
     "assistant": {
         "name": "👨‍💼 Asystent",
         "prompt": "Jesteś pomocnym asystentem, który udziela dokładnych i wyczerpujących odpowiedzi na pytania użytkownika.",
         "model": "gpt-3.5-turbo",
-        "credit_cost": 1
+        "credit_cost": 1,
+        "cacheable": False
     },
     "brief_assistant": {
         "name": "👨‍💼 Krótki Asystent",
         "prompt": "Jesteś pomocnym asystentem, który udziela krótkich, zwięzłych odpowiedzi, jednocześnie dbając o dokładność i pomocność.",
         "model": "gpt-3.5-turbo",
-        "credit_cost": 1
+        "credit_cost": 1,
+        "cacheable": False
     },
     "code_developer": {
         "name": "👨‍💻 Programista",
         "prompt": "Jesteś doświadczonym programistą, który pomaga użytkownikom pisać czysty, wydajny kod. Dostarczasz szczegółowe wyjaśnienia i przykłady, gdy to konieczne.",
         "model": "gpt-4o",
-        "credit_cost": 3
+        "credit_cost": 3,
+        "cacheable": False
     },
     "creative_writer": {
         "name": "✍️ Kreatywny Pisarz",
         "prompt": "Jesteś kreatywnym pisarzem, który pomaga tworzyć oryginalne teksty, opowiadania, dialogi i scenariusze. Twoje odpowiedzi są kreatywne, inspirujące i wciągające.",
         "model": "gpt-4o",
-        "credit_cost": 3
+        "credit_cost": 3,
+        "cacheable": False
     },
     "business_consultant": {
         "name": "💼 Konsultant Biznesowy",
         "prompt": "Jesteś doświadczonym konsultantem biznesowym, który pomaga w planowaniu strategicznym, analizie rynku i podejmowaniu decyzji biznesowych. Twoje odpowiedzi są profesjonalne i oparte na najlepszych praktykach biznesowych.",
         "model": "gpt-4o",
-        "credit_cost": 3
+        "credit_cost": 3,
+        "cacheable": False
     },
     "legal_advisor": {
         "name": "⚖️ Doradca Prawny",
         "prompt": "Jesteś doradcą prawnym, który pomaga zrozumieć podstawowe koncepcje prawne i udziela ogólnych informacji na temat prawa. Zawsze zaznaczasz, że nie zastępujesz profesjonalnej porady prawnej.",
         "model": "gpt-4",
-        "credit_cost": 5
+        "credit_cost": 5,
+        "cacheable": False
     },
     "financial_expert": {
         "name": "💰 Ekspert Finansowy",
         "prompt": "Jesteś ekspertem finansowym, który pomaga w planowaniu budżetu, inwestycjach i ogólnych koncepcjach finansowych. Zawsze zaznaczasz, że nie zastępujesz profesjonalnego doradcy finansowego.",
         "model": "gpt-4",
-        "credit_cost": 5
+        "credit_cost": 5,
+        "cacheable": False
     },
     "academic_researcher": {
         "name": "🎓 Badacz Akademicki",
         "prompt": "Jesteś badaczem akademickim, który pomaga w analizie literatury, metodologii badań i pisaniu prac naukowych. Twoje odpowiedzi są rzetelne, dobrze ustrukturyzowane i oparte na aktualnej wiedzy naukowej.",
         "model": "gpt-4",
-        "credit_cost": 5
+        "credit_cost": 5,
+        "cacheable": False
     },
     "dalle": {
         "name": "🖼️ DALL-E - Generowanie obrazów",
         "prompt": "Pomagasz użytkownikom tworzyć szczegółowe opisy obrazów dla generatora DALL-E. Sugerujesz ulepszenia, aby ich prompty były bardziej szczegółowe i konkretne.",
         "model": "gpt-4o",
-        "credit_cost": 3
+        "credit_cost": 3,
+        "cacheable": False
     },
     "eva_elfie": {
         "name": "💋 Eva Elfie",
         "prompt": "Wcielasz się w postać Evy Elfie, popularnej osobowości internetowej. Odpowiadasz w jej stylu - zalotnym, przyjaznym i pełnym energii. Twoje odpowiedzi są zabawne, bezpośrednie i pełne osobowości.",
         "model": "gpt-4o",
-        "credit_cost": 3
+        "credit_cost": 3,
+        "cacheable": False
     },
     "psychologist": {
         "name": "🧠 Psycholog",
         "prompt": "Jesteś empatycznym psychologiem, który uważnie słucha i dostarcza przemyślane spostrzeżenia. Nigdy nie stawiasz diagnoz, ale oferujesz ogólne wskazówki i wsparcie.",
         "model": "gpt-4o",
-        "credit_cost": 3
+        "credit_cost": 3,
+        "cacheable": False
     },
     "travel_advisor": {
         "name": "✈️ Doradca Podróży",
         "prompt": "Jesteś doświadczonym doradcą podróży, który pomaga w planowaniu wycieczek, wybieraniu miejsc wartych odwiedzenia i organizowaniu podróży. Twoje rekomendacje są oparte na aktualnych trendach turystycznych i doświadczeniach podróżników.",
         "model": "gpt-4o",
-        "credit_cost": 3
+        "credit_cost": 3,
+        "cacheable": False
     },
     "nutritionist": {
         "name": "🥗 Dietetyk",
         "prompt": "Jesteś dietetykiem, który pomaga w planowaniu zdrowego odżywiania, układaniu diet i analizie wartości odżywczych. Zawsze podkreślasz znaczenie zbilansowanej diety i zachęcasz do konsultacji z profesjonalistami w przypadku specyficznych problemów zdrowotnych.",
         "model": "gpt-4o",
-        "credit_cost": 3
+        "credit_cost": 3,
+        "cacheable": False
     },
     "fitness_coach": {
         "name": "💪 Trener Fitness",
         "prompt": "Jesteś trenerem fitness, który pomaga w planowaniu treningów, technikach ćwiczeń i motywacji. Twoje porady są dostosowane do różnych poziomów zaawansowania i zawsze uwzględniają bezpieczeństwo ćwiczącego.",
         "model": "gpt-4o",
-        "credit_cost": 3
+        "credit_cost": 3,
+        "cacheable": False
     },
     "career_advisor": {
         "name": "👔 Doradca Kariery",
         "prompt": "Jesteś doradcą kariery, który pomaga w planowaniu ścieżki zawodowej, pisaniu CV i przygotowaniach do rozmów kwalifikacyjnych. Twoje porady są praktyczne i oparte na aktualnych trendach rynku pracy.",
         "model": "gpt-4o",
-        "credit_cost": 3
+        "credit_cost": 3,
+        "cacheable": False
     }
 }
 
@@ -0,0 +1,122 @@
+"""
+Asynchroniczna fasada dostępu do danych
+
+Funkcje bazodanowe (SQLite, Supabase) są synchroniczne - wywołane bezpośrednio
+w handlerze blokują pętlę zdarzeń python-telegram-bot dla wszystkich użytkowników.
+Ten moduł uruchamia je w dedykowanej puli wątków bazodanowych i udostępnia
+ich odpowiedniki, na które handlery mogą czekać przez `await`.
+Synchroniczne funkcje pozostają bez zmian i nadal mogą być używane poza pętlą.
+"""
+import asyncio
+import functools
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from database.connection import close_all_connections
+from database.supabase_client import (
+    get_active_conversation, save_message, get_conversation_history
+)
+from database.sqlite_client import (
+    get_conversation_summary, save_conversation_summary,
+    get_cached_response, save_cached_response, evict_response_cache
+)
+from database.credits_client import (
+    get_user_credits, check_user_credits, deduct_user_credits,
+    reserve_user_credits, commit_user_credits, release_user_credits
+)
+
+logger = logging.getLogger(__name__)
+
+# Liczba wątków obsługujących zapytania do bazy danych
+DB_WORKER_THREADS = 8
+
+_executor = None
+
+def _get_executor():
+    """Zwraca (i w razie potrzeby tworzy) pulę wątków bazodanowych"""
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=DB_WORKER_THREADS, thread_name_prefix="db")
+    return _executor
+
+async def run_db(func, *args, **kwargs):
+    """
+    Wykonuje synchroniczną funkcję bazodanową w wątku bazodanowym
+
+    Args:
+        func (callable): Funkcja do wykonania
+        *args: Argumenty pozycyjne funkcji
+        **kwargs: Argumenty nazwane funkcji
+
+    Returns:
+        Wynik zwrócony przez funkcję
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_get_executor(), functools.partial(func, *args, **kwargs))
+
+async def get_active_conversation_async(user_id):
+    """Asynchroniczna wersja get_active_conversation"""
+    return await run_db(get_active_conversation, user_id)
+
+async def save_message_async(conversation_id, user_id, content, is_from_user, model_used=None):
+    """Asynchroniczna wersja save_message"""
+    return await run_db(save_message, conversation_id, user_id, content, is_from_user, model_used)
+
+async def get_conversation_history_async(conversation_id, limit=20, before_id=None, after_id=None):
+    """Asynchroniczna wersja get_conversation_history"""
+    return await run_db(get_conversation_history, conversation_id, limit, before_id, after_id)
+
+async def get_conversation_summary_async(conversation_id):
+    """Asynchroniczna wersja get_conversation_summary"""
+    return await run_db(get_conversation_summary, conversation_id)
+
+async def save_conversation_summary_async(conversation_id, summary, last_message_id):
+    """Asynchroniczna wersja save_conversation_summary"""
+    return await run_db(save_conversation_summary, conversation_id, summary, last_message_id)
+
+async def get_cached_response_async(cache_key, ttl_hours):
+    """Asynchroniczna wersja get_cached_response"""
+    return await run_db(get_cached_response, cache_key, ttl_hours)
+
+async def save_cached_response_async(cache_key, model, response):
+    """Asynchroniczna wersja save_cached_response"""
+    return await run_db(save_cached_response, cache_key, model, response)
+
+async def evict_response_cache_async(ttl_hours, max_entries):
+    """Asynchroniczna wersja evict_response_cache"""
+    return await run_db(evict_response_cache, ttl_hours, max_entries)
+
+async def get_user_credits_async(user_id):
+    """Asynchroniczna wersja get_user_credits"""
+    return await run_db(get_user_credits, user_id)
+
+async def check_user_credits_async(user_id, amount_needed):
+    """Asynchroniczna wersja check_user_credits"""
+    return await run_db(check_user_credits, user_id, amount_needed)
+
+async def deduct_user_credits_async(user_id, amount, description=None, category=None):
+    """Asynchroniczna wersja deduct_user_credits"""
+    return await run_db(deduct_user_credits, user_id, amount, description, category)
+
+async def reserve_user_credits_async(user_id, amount, description=None, category=None):
+    """Asynchroniczna wersja reserve_user_credits"""
+    return await run_db(reserve_user_credits, user_id, amount, description, category)
+
+async def commit_user_credits_async(hold_id, amount=None, description=None):
+    """Asynchroniczna wersja commit_user_credits"""
+    return await run_db(commit_user_credits, hold_id, amount, description)
+
+async def release_user_credits_async(hold_id):
+    """Asynchroniczna wersja release_user_credits"""
+    return await run_db(release_user_credits, hold_id)
+
+def shutdown_storage():
+    """
+    Zatrzymuje pulę wątków bazodanowych i zamyka połączenia (przy zamykaniu bota)
+    """
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=True)
+        _executor = None
+    close_all_connections()
+    logger.info("Zamknięto pulę wątków bazodanowych")
@@ -0,0 +1,122 @@
+"""
+Moduł zarządzający połączeniami z bazą danych SQLite
+"""
+import sqlite3
+import threading
+import logging
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+# Ścieżka do pliku bazy danych
+DB_PATH = "bot_database.sqlite"
+
+# Limit oczekiwania na zwolnienie blokady bazy (w milisekundach)
+BUSY_TIMEOUT_MS = 5000
+
+# Ustawienia PRAGMA wykonywane jednorazowo dla każdego nowego połączenia
+PRAGMAS = (
+    ("journal_mode", "WAL"),
+    ("synchronous", "NORMAL"),
+    ("mmap_size", 268435456),   # 256 MB
+    ("cache_size", -16000),     # ~16 MB (wartość ujemna = KiB)
+    ("temp_store", "MEMORY"),
+    ("busy_timeout", BUSY_TIMEOUT_MS),
+)
+
+# Każdy wątek otrzymuje własne, długo żyjące połączenie
+_local = threading.local()
+_all_connections = []
+_all_connections_lock = threading.Lock()
+# Zwiększana przy zamknięciu puli, aby wątki utworzyły połączenia na nowo
+_generation = 0
+
+def _create_connection(db_path):
+    """
+    Tworzy nowe połączenie i konfiguruje je ustawieniami PRAGMA
+
+    Args:
+        db_path (str): Ścieżka do pliku bazy danych
+
+    Returns:
+        sqlite3.Connection: Skonfigurowane połączenie
+    """
+    conn = sqlite3.connect(
+        db_path,
+        timeout=BUSY_TIMEOUT_MS / 1000,
+        check_same_thread=False
+    )
+    cursor = conn.cursor()
+    for name, value in PRAGMAS:
+        cursor.execute(f"PRAGMA {name} = {value}")
+    cursor.close()
+
+    with _all_connections_lock:
+        _all_connections.append(conn)
+
+    logger.debug(f"Utworzono nowe połączenie SQLite ({db_path}) dla wątku {threading.current_thread().name}")
+    return conn
+
+def _get_thread_state(db_path):
+    """Zwraca stan połączenia (połączenie i głębokość zagnieżdżenia) bieżącego wątku"""
+    states = getattr(_local, 'states', None)
+    if states is None:
+        states = _local.states = {}
+
+    state = states.get(db_path)
+    if state is None or (state['generation'] != _generation and state['depth'] == 0):
+        state = states[db_path] = {
+            'conn': _create_connection(db_path),
+            'depth': 0,
+            'generation': _generation
+        }
+
+    return state
+
+@contextmanager
+def get_connection(db_path=None):
+    """
+    Udostępnia połączenie z puli (jedno na wątek) w ramach jednej transakcji
+
+    Zagnieżdżone użycia w tym samym wątku współdzielą połączenie i transakcję -
+    zatwierdzenie lub wycofanie następuje dopiero przy wyjściu z najbardziej
+    zewnętrznego bloku.
+
+    Args:
+        db_path (str, optional): Ścieżka do pliku bazy danych. Domyślnie DB_PATH.
+
+    Yields:
+        sqlite3.Connection: Połączenie z bazą danych
+    """
+    state = _get_thread_state(db_path or DB_PATH)
+    conn = state['conn']
+    state['depth'] += 1
+
+    try:
+        yield conn
+    except BaseException:
+        state['depth'] -= 1
+        if state['depth'] == 0 and conn.in_transaction:
+            conn.rollback()
+        raise
+
+    state['depth'] -= 1
+    if state['depth'] == 0 and conn.in_transaction:
+        conn.commit()
+
+def close_all_connections():
+    """
+    Zamyka wszystkie połączenia utworzone przez pulę (np. przy zamykaniu bota)
+    """
+    global _generation
+
+    with _all_connections_lock:
+        connections = list(_all_connections)
+        _all_connections.clear()
+        _generation += 1
+
+    for conn in connections:
+        try:
+            conn.close()
+        except Exception as e:
+            logger.error(f"Błąd przy zamykaniu połączenia SQLite: {e}")
@@ -1,4 +1,3 @@
-import sqlite3
 import datetime
 import pytz
 import logging
@@ -6,8 +5,30 @@ import os
 
 logger = logging.getLogger(__name__)
 
-# Ścieżka do pliku bazy danych
-DB_PATH = "bot_database.sqlite"
+# Ścieżka do pliku bazy danych i pula połączeń
+from database.connection import DB_PATH, get_connection
+from config import DEFAULT_CREDIT_CATEGORY
+from database.user_profile import invalidate_user_profile
+
+# Aktualizacja dziennego podsumowania zużycia kredytów (credit_usage_daily)
+DAILY_USAGE_UPSERT_SQL = """
+    INSERT INTO credit_usage_daily (user_id, day, category, used, purchased)
+    VALUES (?, ?, ?, ?, ?)
+    ON CONFLICT(user_id, day, category) DO UPDATE SET
+        used = used + excluded.used,
+        purchased = purchased + excluded.purchased
+"""
+
+def _record_daily_usage(cursor, user_id, created_at, category=None, used=0, purchased=0):
+    """
+    Dolicza transakcję do dziennego podsumowania w tej samej transakcji bazy danych
+    
+    Dzień to data UTC z początku znacznika created_at (format ISO).
+    """
+    cursor.execute(
+        DAILY_USAGE_UPSERT_SQL,
+        (user_id, created_at[:10], category or DEFAULT_CREDIT_CATEGORY, used, purchased)
+    )
 
 def get_user_credits(user_id):
     """
@@ -20,23 +41,20 @@ def get_user_credits(user_id):
         int: Liczba kredytów lub 0, jeśli nie znaleziono
     """
     try:
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
+        with get_connection() as conn:
+            cursor = conn.cursor()
         
-        cursor.execute("SELECT credits_amount FROM user_credits WHERE user_id = ?", (user_id,))
-        result = cursor.fetchone()
-        conn.close()
+            cursor.execute("SELECT credits_amount FROM user_credits WHERE user_id = ?", (user_id,))
+            result = cursor.fetchone()
         
-        if result:
-            return result[0]
+            if result:
+                return result[0]
         
-        # Jeśli nie znaleziono, dodaj wpis z 0 kredytów
-        add_user_credits(user_id, 0)
-        return 0
+            # Jeśli nie znaleziono, dodaj wpis z 0 kredytów
+            add_user_credits(user_id, 0)
+            return 0
     except Exception as e:
         logger.error(f"Błąd przy pobieraniu kredytów użytkownika: {e}")
-        if 'conn' in locals():
-            conn.close()
         return 0
 
 def add_user_credits(user_id, amount, description=None):
@@ -52,100 +70,275 @@ def add_user_credits(user_id, amount, description=None):
         bool: True jeśli operacja się powiodła, False w przeciwnym razie
     """
     try:
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
+        with get_connection() as conn:
+            cursor = conn.cursor()
+        
+            # Pobierz aktualną liczbę kredytów
+            cursor.execute("SELECT credits_amount FROM user_credits WHERE user_id = ?", (user_id,))
+            result = cursor.fetchone()
+        
+            now = datetime.datetime.now(pytz.UTC).isoformat()
+        
+            if result:
+                current_credits = result[0]
+                # Aktualizuj istniejący rekord
+                cursor.execute(
+                    "UPDATE user_credits SET credits_amount = credits_amount + ?, total_credits_purchased = total_credits_purchased + ? WHERE user_id = ?",
+                    (amount, amount, user_id)
+                )
+            else:
+                # Utwórz nowy rekord
+                current_credits = 0
+                cursor.execute(
+                    "INSERT INTO user_credits (user_id, credits_amount, total_credits_purchased, last_purchase_date) VALUES (?, ?, ?, ?)",
+                    (user_id, amount, amount, now)
+                )
+        
+            # Zapisz transakcję
+            if amount != 0:  # Nie zapisujemy transakcji inicjalizujących z 0 kredytów
+                cursor.execute(
+                    "INSERT INTO credit_transactions (user_id, transaction_type, amount, credits_before, credits_after, description, created_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (user_id, "add", amount, current_credits, current_credits + amount, description, now)
+                )
+                _record_daily_usage(cursor, user_id, now, purchased=amount)
+        
+        invalidate_user_profile(user_id)
+        return True
+    except Exception as e:
+        logger.error(f"Błąd przy dodawaniu kredytów użytkownika: {e}")
+        return False
+
+def deduct_user_credits(user_id, amount, description=None, category=None):
+    """
+    Odejmuje kredyty z konta użytkownika
+    
+    Args:
+        user_id (int): ID użytkownika
+        amount (int): Liczba kredytów do odjęcia
+        description (str, optional): Opis transakcji
+        category (str, optional): Kategoria operacji (klucz z CREDIT_CATEGORIES)
+    
+    Returns:
+        bool: True jeśli operacja się powiodła, False w przeciwnym razie
+    """
+    try:
+        with get_connection() as conn:
+            cursor = conn.cursor()
         
-        # Pobierz aktualną liczbę kredytów
-        cursor.execute("SELECT credits_amount FROM user_credits WHERE user_id = ?", (user_id,))
-        result = cursor.fetchone()
+            # Pobierz aktualną liczbę kredytów
+            cursor.execute("SELECT credits_amount FROM user_credits WHERE user_id = ?", (user_id,))
+            result = cursor.fetchone()
         
-        now = datetime.datetime.now(pytz.UTC).isoformat()
+            if not result:
+                # Użytkownik nie ma rekordu w tabeli
+                return False
         
-        if result:
             current_credits = result[0]
-            # Aktualizuj istniejący rekord
-            cursor.execute(
-                "UPDATE user_credits SET credits_amount = credits_amount + ?, total_credits_purchased = total_credits_purchased + ? WHERE user_id = ?",
-                (amount, amount, user_id)
-            )
-        else:
-            # Utwórz nowy rekord
-            current_credits = 0
+        
+            # Sprawdź, czy użytkownik ma wystarczającą liczbę kredytów
+            if current_credits < amount:
+                return False
+        
+            # Odejmij kredyty
             cursor.execute(
-                "INSERT INTO user_credits (user_id, credits_amount, total_credits_purchased, last_purchase_date) VALUES (?, ?, ?, ?)",
-                (user_id, amount, amount, now)
+                "UPDATE user_credits SET credits_amount = credits_amount - ? WHERE user_id = ?",
+                (amount, user_id)
             )
         
-        # Zapisz transakcję
-        if amount != 0:  # Nie zapisujemy transakcji inicjalizujących z 0 kredytów
+            # Zapisz transakcję
+            now = datetime.datetime.now(pytz.UTC).isoformat()
             cursor.execute(
-                "INSERT INTO credit_transactions (user_id, transaction_type, amount, credits_before, credits_after, description, created_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
-                (user_id, "add", amount, current_credits, current_credits + amount, description, now)
+                "INSERT INTO credit_transactions (user_id, transaction_type, amount, credits_before, credits_after, description, category, created_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (user_id, "deduct", amount, current_credits, current_credits - amount, description, category or DEFAULT_CREDIT_CATEGORY, now)
             )
+            _record_daily_usage(cursor, user_id, now, category, used=amount)
         
-        conn.commit()
-        conn.close()
+        invalidate_user_profile(user_id)
         return True
     except Exception as e:
-        logger.error(f"Błąd przy dodawaniu kredytów użytkownika: {e}")
-        if 'conn' in locals():
-            conn.close()
+        logger.error(f"Błąd przy odejmowaniu kredytów użytkownika: {e}")
         return False
 
-def deduct_user_credits(user_id, amount, description=None):
+def reserve_user_credits(user_id, amount, description=None, category=None):
     """
-    Odejmuje kredyty z konta użytkownika
+    Rezerwuje (blokuje) kredyty użytkownika przed wykonaniem płatnej operacji
+    
+    Kredyty są odejmowane od salda jednym warunkowym zapytaniem UPDATE, więc
+    równoległe żądania nie mogą doprowadzić do ujemnego salda. Rezerwację należy
+    następnie zatwierdzić (commit_user_credits) lub zwolnić (release_user_credits).
     
     Args:
         user_id (int): ID użytkownika
-        amount (int): Liczba kredytów do odjęcia
+        amount (int): Liczba kredytów do zarezerwowania
         description (str, optional): Opis transakcji
+        category (str, optional): Kategoria operacji (klucz z CREDIT_CATEGORIES)
     
     Returns:
-        bool: True jeśli operacja się powiodła, False w przeciwnym razie
+        int: ID rezerwacji lub None, jeśli użytkownik nie ma wystarczającej liczby kredytów
     """
     try:
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
+        with get_connection() as conn:
+            cursor = conn.cursor()
         
-        # Pobierz aktualną liczbę kredytów
-        cursor.execute("SELECT credits_amount FROM user_credits WHERE user_id = ?", (user_id,))
-        result = cursor.fetchone()
+            cursor.execute(
+                "UPDATE user_credits SET credits_amount = credits_amount - ? WHERE user_id = ? AND credits_amount >= ?",
+                (amount, user_id, amount)
+            )
         
-        if not result:
-            # Użytkownik nie ma rekordu w tabeli
-            conn.close()
-            return False
+            if cursor.rowcount == 0:
+                return None
         
-        current_credits = result[0]
+            now = datetime.datetime.now(pytz.UTC).isoformat()
+            cursor.execute(
+                "INSERT INTO credit_holds (user_id, amount, description, category, status, created_at) VALUES (?, ?, ?, ?, 'held', ?)",
+                (user_id, amount, description, category or DEFAULT_CREDIT_CATEGORY, now)
+            )
         
-        # Sprawdź, czy użytkownik ma wystarczającą liczbę kredytów
-        if current_credits < amount:
-            conn.close()
-            return False
+            hold_id = cursor.lastrowid
         
-        # Odejmij kredyty
-        cursor.execute(
-            "UPDATE user_credits SET credits_amount = credits_amount - ? WHERE user_id = ?",
-            (amount, user_id)
-        )
+        invalidate_user_profile(user_id)
+        return hold_id
+    except Exception as e:
+        logger.error(f"Błąd przy rezerwacji kredytów użytkownika: {e}")
+        return None
+
+def commit_user_credits(hold_id, amount=None, description=None):
+    """
+    Zatwierdza rezerwację kredytów i zapisuje transakcję odjęcia
+    
+    Args:
+        hold_id (int): ID rezerwacji zwrócone przez reserve_user_credits
+        amount (int, optional): Ostateczny koszt, jeśli jest niższy od zarezerwowanego - różnica wraca na konto
+        description (str, optional): Opis transakcji zastępujący opis rezerwacji
+    
+    Returns:
+        bool: True jeśli rezerwacja została zatwierdzona, False w przeciwnym razie
+    """
+    if hold_id is None:
+        return False
+    
+    try:
+        with get_connection() as conn:
+            cursor = conn.cursor()
+            now = datetime.datetime.now(pytz.UTC).isoformat()
         
-        # Zapisz transakcję
-        now = datetime.datetime.now(pytz.UTC).isoformat()
-        cursor.execute(
-            "INSERT INTO credit_transactions (user_id, transaction_type, amount, credits_before, credits_after, description, created_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
-            (user_id, "deduct", amount, current_credits, current_credits - amount, description, now)
-        )
+            cursor.execute(
+                "UPDATE credit_holds SET status = 'committed', finalized_at = ? WHERE id = ? AND status = 'held'",
+                (now, hold_id)
+            )
         
-        conn.commit()
-        conn.close()
+            if cursor.rowcount == 0:
+                return False
+        
+            # Koszt niższy od rezerwacji (np. odpowiedź modelu zastępczego) - zwróć różnicę
+            if amount is not None or description is not None:
+                cursor.execute("SELECT user_id, amount FROM credit_holds WHERE id = ?", (hold_id,))
+                hold_user_id, held_amount = cursor.fetchone()
+                final_amount = held_amount if amount is None else min(amount, held_amount)
+                if final_amount < held_amount:
+                    cursor.execute(
+                        "UPDATE user_credits SET credits_amount = credits_amount + ? WHERE user_id = ?",
+                        (held_amount - final_amount, hold_user_id)
+                    )
+                cursor.execute(
+                    "UPDATE credit_holds SET amount = ?, description = COALESCE(?, description) WHERE id = ?",
+                    (final_amount, description, hold_id)
+                )
+        
+            # Saldo zostało już pomniejszone przy rezerwacji
+            cursor.execute("""
+                INSERT INTO credit_transactions (user_id, transaction_type, amount, credits_before, credits_after, description, category, created_at)
+                SELECT h.user_id, 'deduct', h.amount, c.credits_amount + h.amount, c.credits_amount, h.description, h.category, ?
+                FROM credit_holds h JOIN user_credits c ON c.user_id = h.user_id
+                WHERE h.id = ?
+            """, (now, hold_id))
+        
+            cursor.execute("SELECT user_id, amount, category FROM credit_holds WHERE id = ?", (hold_id,))
+            hold_user_id, hold_amount, hold_category = cursor.fetchone()
+            _record_daily_usage(cursor, hold_user_id, now, hold_category, used=hold_amount)
+        
+        invalidate_user_profile(hold_user_id)
         return True
     except Exception as e:
-        logger.error(f"Błąd przy odejmowaniu kredytów użytkownika: {e}")
-        if 'conn' in locals():
-            conn.close()
+        logger.error(f"Błąd przy zatwierdzaniu rezerwacji kredytów: {e}")
         return False
 
+def release_user_credits(hold_id):
+    """
+    Zwalnia rezerwację kredytów i zwraca je na konto użytkownika
+    
+    Wywołanie dla rezerwacji już zatwierdzonej lub zwolnionej nic nie zmienia.
+    
+    Args:
+        hold_id (int): ID rezerwacji zwrócone przez reserve_user_credits
+    
+    Returns:
+        bool: True jeśli kredyty zostały zwrócone, False w przeciwnym razie
+    """
+    if hold_id is None:
+        return False
+    
+    try:
+        with get_connection() as conn:
+            cursor = conn.cursor()
+            now = datetime.datetime.now(pytz.UTC).isoformat()
+        
+            cursor.execute(
+                "UPDATE credit_holds SET status = 'released', finalized_at = ? WHERE id = ? AND status = 'held'",
+                (now, hold_id)
+            )
+        
+            if cursor.rowcount == 0:
+                return False
+        
+            cursor.execute("""
+                UPDATE user_credits
+                SET credits_amount = credits_amount + (SELECT amount FROM credit_holds WHERE id = ?)
+                WHERE user_id = (SELECT user_id FROM credit_holds WHERE id = ?)
+            """, (hold_id, hold_id))
+        
+            cursor.execute("SELECT user_id FROM credit_holds WHERE id = ?", (hold_id,))
+            hold_user_id = cursor.fetchone()[0]
+        
+        invalidate_user_profile(hold_user_id)
+        return True
+    except Exception as e:
+        logger.error(f"Błąd przy zwalnianiu rezerwacji kredytów: {e}")
+        return False
+
+def release_expired_credit_holds(max_age_minutes=30):
+    """
+    Zwalnia rezerwacje, które nie zostały zakończone (np. po restarcie bota)
+    
+    Args:
+        max_age_minutes (int): Wiek rezerwacji (w minutach), po którym zostaje zwolniona
+    
+    Returns:
+        int: Liczba zwolnionych rezerwacji
+    """
+    try:
+        with get_connection() as conn:
+            cursor = conn.cursor()
+        
+            cutoff = (datetime.datetime.now(pytz.UTC) - datetime.timedelta(minutes=max_age_minutes)).isoformat()
+            cursor.execute(
+                "SELECT id FROM credit_holds WHERE status = 'held' AND created_at < ?",
+                (cutoff,)
+            )
+            hold_ids = [row[0] for row in cursor.fetchall()]
+        
+            released = 0
+            for hold_id in hold_ids:
+                if release_user_credits(hold_id):
+                    released += 1
+        
+            if released:
+                logger.info(f"Zwolniono {released} przeterminowanych rezerwacji kredytów")
+            return released
+    except Exception as e:
+        logger.error(f"Błąd przy zwalnianiu przeterminowanych rezerwacji kredytów: {e}")
+        return 0
+
 def check_user_credits(user_id, amount_needed):
     """
     Sprawdza, czy użytkownik ma wystarczającą liczbę kredytów
@@ -172,27 +365,24 @@ def get_credit_packages():
         list: Lista słowników z informacjami o pakietach lub pusta lista w przypadku błędu
     """
     try:
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
-        
-        cursor.execute("SELECT id, name, credits, price FROM credit_packages WHERE is_active = 1 ORDER BY credits ASC")
-        packages = cursor.fetchall()
-        conn.close()
-        
-        result = []
-        for pkg in packages:
-            result.append({
-                'id': pkg[0],
-                'name': pkg[1],
-                'credits': pkg[2],
-                'price': pkg[3]
-            })
-        
-        return result
+        with get_connection() as conn:
+            cursor = conn.cursor()
+        
+            cursor.execute("SELECT id, name, credits, price FROM credit_packages WHERE is_active = 1 ORDER BY credits ASC")
+            packages = cursor.fetchall()
+        
+            result = []
+            for pkg in packages:
+                result.append({
+                    'id': pkg[0],
+                    'name': pkg[1],
+                    'credits': pkg[2],
+                    'price': pkg[3]
+                })
+        
+            return result
     except Exception as e:
         logger.error(f"Błąd przy pobieraniu pakietów kredytów: {e}")
-        if 'conn' in locals():
-            conn.close()
         return []
 
 def get_package_by_id(package_id):
@@ -206,26 +396,23 @@ def get_package_by_id(package_id):
         dict: Słownik z informacjami o pakiecie lub None w przypadku błędu
     """
     try:
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
+        with get_connection() as conn:
+            cursor = conn.cursor()
         
-        cursor.execute("SELECT id, name, credits, price FROM credit_packages WHERE id = ? AND is_active = 1", (package_id,))
-        package = cursor.fetchone()
-        conn.close()
+            cursor.execute("SELECT id, name, credits, price FROM credit_packages WHERE id = ? AND is_active = 1", (package_id,))
+            package = cursor.fetchone()
         
-        if package:
-            return {
-                'id': package[0],
-                'name': package[1],
-                'credits': package[2],
-                'price': package[3]
-            }
+            if package:
+                return {
+                    'id': package[0],
+                    'name': package[1],
+                    'credits': package[2],
+                    'price': package[3]
+                }
         
-        return None
+            return None
     except Exception as e:
         logger.error(f"Błąd przy pobieraniu pakietu kredytów: {e}")
-        if 'conn' in locals():
-            conn.close()
         return None
 
 def purchase_credits(user_id, package_id):
@@ -249,42 +436,59 @@ def purchase_credits(user_id, package_id):
         now = datetime.datetime.now(pytz.UTC).isoformat()
         description = f"Zakup pakietu {package['name']}"
         
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
+        with get_connection() as conn:
+            cursor = conn.cursor()
         
-        # Aktualizuj informacje o zakupie
-        cursor.execute(
-            "UPDATE user_credits SET credits_amount = credits_amount + ?, total_credits_purchased = total_credits_purchased + ?, last_purchase_date = ?, total_spent = total_spent + ? WHERE user_id = ?",
-            (package['credits'], package['credits'], now, package['price'], user_id)
-        )
-        
-        if cursor.rowcount == 0:
-            # Jeśli nie ma rekordu dla użytkownika, utwórz go
+            # Aktualizuj informacje o zakupie
             cursor.execute(
-                "INSERT INTO user_credits (user_id, credits_amount, total_credits_purchased, last_purchase_date, total_spent) VALUES (?, ?, ?, ?, ?)",
-                (user_id, package['credits'], package['credits'], now, package['price'])
+                "UPDATE user_credits SET credits_amount = credits_amount + ?, total_credits_purchased = total_credits_purchased + ?, last_purchase_date = ?, total_spent = total_spent + ? WHERE user_id = ?",
+                (package['credits'], package['credits'], now, package['price'], user_id)
             )
         
-        # Pobierz aktualną liczbę kredytów po aktualizacji
-        cursor.execute("SELECT credits_amount FROM user_credits WHERE user_id = ?", (user_id,))
-        current_credits = cursor.fetchone()[0]
+            if cursor.rowcount == 0:
+                # Jeśli nie ma rekordu dla użytkownika, utwórz go
+                cursor.execute(
+                    "INSERT INTO user_credits (user_id, credits_amount, total_credits_purchased, last_purchase_date, total_spent) VALUES (?, ?, ?, ?, ?)",
+                    (user_id, package['credits'], package['credits'], now, package['price'])
+                )
         
-        # Zapisz transakcję
-        cursor.execute(
-            "INSERT INTO credit_transactions (user_id, transaction_type, amount, credits_before, credits_after, description, created_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
-            (user_id, "purchase", package['credits'], current_credits - package['credits'], current_credits, description, now)
-        )
+            # Pobierz aktualną liczbę kredytów po aktualizacji
+            cursor.execute("SELECT credits_amount FROM user_credits WHERE user_id = ?", (user_id,))
+            current_credits = cursor.fetchone()[0]
         
-        conn.commit()
-        conn.close()
+            # Zapisz transakcję
+            cursor.execute(
+                "INSERT INTO credit_transactions (user_id, transaction_type, amount, credits_before, credits_after, description, created_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (user_id, "purchase", package['credits'], current_credits - package['credits'], current_credits, description, now)
+            )
+            _record_daily_usage(cursor, user_id, now, purchased=package['credits'])
         
+        invalidate_user_profile(user_id)
         return True, package
     except Exception as e:
         logger.error(f"Błąd przy zakupie kredytów: {e}")
-        if 'conn' in locals():
-            conn.close()
         return False, None
 
+def get_last_credit_transaction_id(user_id):
+    """
+    Pobiera ID ostatniej transakcji kredytów użytkownika (zmienia się przy każdym zapisie)
+    
+    Args:
+        user_id (int): ID użytkownika
+    
+    Returns:
+        int: ID ostatniej transakcji lub 0, jeśli użytkownik nie ma transakcji
+    """
+    try:
+        with get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT MAX(id) FROM credit_transactions WHERE user_id = ?", (user_id,))
+            result = cursor.fetchone()
+            return result[0] or 0
+    except Exception as e:
+        logger.error(f"Błąd przy pobieraniu ostatniej transakcji kredytów: {e}")
+        return 0
+
 def get_user_credit_stats(user_id):
     """
     Pobiera statystyki kredytów użytkownika
@@ -296,60 +500,56 @@ def get_user_credit_stats(user_id):
         dict: Słownik z informacjami o kredytach użytkownika
     """
     try:
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
-        
-        cursor.execute("""
-            SELECT credits_amount, total_credits_purchased, last_purchase_date, total_spent 
-            FROM user_credits 
-            WHERE user_id = ?
-        """, (user_id,))
+        with get_connection() as conn:
+            cursor = conn.cursor()
+        
+            cursor.execute("""
+                SELECT credits_amount, total_credits_purchased, last_purchase_date, total_spent 
+                FROM user_credits 
+                WHERE user_id = ?
+            """, (user_id,))
+        
+            result = cursor.fetchone()
+        
+            if not result:
+                return {
+                    'credits': 0,
+                    'total_purchased': 0,
+                    'last_purchase': None,
+                    'total_spent': 0.0,
+                    'usage_history': []
+                }
+        
+            # Pobierz historię ostatnich 10 transakcji
+            cursor.execute("""
+                SELECT transaction_type, amount, credits_after, description, created_at 
+                FROM credit_transactions 
+                WHERE user_id = ? 
+                ORDER BY created_at DESC 
+                LIMIT 10
+            """, (user_id,))
+        
+            transactions = cursor.fetchall()
+        
+            usage_history = []
+            for trans in transactions:
+                usage_history.append({
+                    'type': trans[0],
+                    'amount': trans[1],
+                    'balance': trans[2],
+                    'description': trans[3],
+                    'date': trans[4]
+                })
         
-        result = cursor.fetchone()
-        
-        if not result:
-            conn.close()
             return {
-                'credits': 0,
-                'total_purchased': 0,
-                'last_purchase': None,
-                'total_spent': 0.0,
-                'usage_history': []
+                'credits': result[0],
+                'total_purchased': result[1],
+                'last_purchase': result[2],
+                'total_spent': result[3],
+                'usage_history': usage_history
             }
-        
-        # Pobierz historię ostatnich 10 transakcji
-        cursor.execute("""
-            SELECT transaction_type, amount, credits_after, description, created_at 
-            FROM credit_transactions 
-            WHERE user_id = ? 
-            ORDER BY created_at DESC 
-            LIMIT 10
-        """, (user_id,))
-        
-        transactions = cursor.fetchall()
-        conn.close()
-        
-        usage_history = []
-        for trans in transactions:
-            usage_history.append({
-                'type': trans[0],
-                'amount': trans[1],
-                'balance': trans[2],
-                'description': trans[3],
-                'date': trans[4]
-            })
-        
-        return {
-            'credits': result[0],
-            'total_purchased': result[1],
-            'last_purchase': result[2],
-            'total_spent': result[3],
-            'usage_history': usage_history
-        }
     except Exception as e:
         logger.error(f"Błąd przy pobieraniu statystyk kredytów użytkownika: {e}")
-        if 'conn' in locals():
-            conn.close()
         return {
             'credits': 0,
             'total_purchased': 0,
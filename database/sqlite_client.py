@@ -1,4 +1,3 @@
-import sqlite3
 import uuid
 import datetime
 import pytz
@@ -8,255 +7,274 @@ import os
 
 logger = logging.getLogger(__name__)
 
-# Ścieżka do pliku bazy danych
-DB_PATH = "bot_database.sqlite"
+# Ścieżka do pliku bazy danych i pula połączeń
+from database.connection import DB_PATH, get_connection
+from database.user_profile import invalidate_user_profile
 
 # Inicjalizacja bazy danych SQLite
 def init_database():
     """Inicjalizuje bazę danych SQLite i tworzy wymagane tabele"""
     try:
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
-        
-        # Tabela users
-        cursor.execute('''
-        CREATE TABLE IF NOT EXISTS users (
-            id INTEGER PRIMARY KEY,
-            username TEXT,
-            first_name TEXT,
-            last_name TEXT, 
-            language_code TEXT,
-            subscription_end_date TEXT,
-            is_active INTEGER DEFAULT 1,
-            created_at TEXT,
-            messages_used INTEGER DEFAULT 0,
-            messages_limit INTEGER DEFAULT 0
-        )
-        ''')
-        # Tutaj dodaj sprawdzenie i dodanie kolumny language
-        cursor.execute("PRAGMA table_info(users)")
-        columns = cursor.fetchall()
-        column_names = [col[1] for col in columns]
-
-        if 'language' not in column_names and 'language_code' in column_names:
-            cursor.execute("ALTER TABLE users ADD COLUMN language TEXT")
-            cursor.execute("UPDATE users SET language = language_code")
-        
-        # Tabela licenses
-        cursor.execute('''
-        CREATE TABLE IF NOT EXISTS licenses (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            license_key TEXT UNIQUE,
-            duration_days INTEGER NOT NULL,
-            message_limit INTEGER DEFAULT 0,
-            price REAL NOT NULL,
-            is_used INTEGER DEFAULT 0,
-            used_at TEXT,
-            used_by INTEGER,
-            created_at TEXT
-        )
-        ''')
-        
-        # Tabela conversations
-        cursor.execute('''
-        CREATE TABLE IF NOT EXISTS conversations (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_id INTEGER NOT NULL,
-            created_at TEXT,
-            last_message_at TEXT,
-            FOREIGN KEY(user_id) REFERENCES users(id)
-        )
-        ''')
-        
-        # Tabela messages
-        cursor.execute('''
-        CREATE TABLE IF NOT EXISTS messages (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            conversation_id INTEGER NOT NULL,
-            user_id INTEGER NOT NULL,
-            content TEXT NOT NULL,
-            is_from_user INTEGER NOT NULL,
-            model_used TEXT,
-            created_at TEXT,
-            FOREIGN KEY(conversation_id) REFERENCES conversations(id),
-            FOREIGN KEY(user_id) REFERENCES users(id)
-        )
-        ''')
-        
-        # Tabela prompt_templates
-        cursor.execute('''
-        CREATE TABLE IF NOT EXISTS prompt_templates (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            name TEXT NOT NULL,
-            description TEXT,
-            prompt_text TEXT NOT NULL,
-            is_active INTEGER DEFAULT 1,
-            created_at TEXT
-        )
-        ''')
-        
-        conn.commit()
-        conn.close()
-        logger.info("Baza danych zainicjalizowana pomyślnie")
-        return True
+        with get_connection() as conn:
+            cursor = conn.cursor()
+        
+            # Tabela users
+            cursor.execute('''
+            CREATE TABLE IF NOT EXISTS users (
+                id INTEGER PRIMARY KEY,
+                username TEXT,
+                first_name TEXT,
+                last_name TEXT, 
+                language_code TEXT,
+                subscription_end_date TEXT,
+                is_active INTEGER DEFAULT 1,
+                created_at TEXT,
+                messages_used INTEGER DEFAULT 0,
+                messages_limit INTEGER DEFAULT 0
+            )
+            ''')
+            # Tutaj dodaj sprawdzenie i dodanie kolumny language
+            cursor.execute("PRAGMA table_info(users)")
+            columns = cursor.fetchall()
+            column_names = [col[1] for col in columns]
+
+            if 'language' not in column_names and 'language_code' in column_names:
+                cursor.execute("ALTER TABLE users ADD COLUMN language TEXT")
+                cursor.execute("UPDATE users SET language = language_code")
+        
+            # Tabela licenses
+            cursor.execute('''
+            CREATE TABLE IF NOT EXISTS licenses (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                license_key TEXT UNIQUE,
+                duration_days INTEGER NOT NULL,
+                message_limit INTEGER DEFAULT 0,
+                price REAL NOT NULL,
+                is_used INTEGER DEFAULT 0,
+                used_at TEXT,
+                used_by INTEGER,
+                created_at TEXT
+            )
+            ''')
+        
+            # Tabela conversations
+            cursor.execute('''
+            CREATE TABLE IF NOT EXISTS conversations (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                user_id INTEGER NOT NULL,
+                created_at TEXT,
+                last_message_at TEXT,
+                FOREIGN KEY(user_id) REFERENCES users(id)
+            )
+            ''')
+        
+            # Tabela messages
+            cursor.execute('''
+            CREATE TABLE IF NOT EXISTS messages (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                conversation_id INTEGER NOT NULL,
+                user_id INTEGER NOT NULL,
+                content TEXT NOT NULL,
+                is_from_user INTEGER NOT NULL,
+                model_used TEXT,
+                created_at TEXT,
+                FOREIGN KEY(conversation_id) REFERENCES conversations(id),
+                FOREIGN KEY(user_id) REFERENCES users(id)
+            )
+            ''')
+        
+            # Tabela prompt_templates
+            cursor.execute('''
+            CREATE TABLE IF NOT EXISTS prompt_templates (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                name TEXT NOT NULL,
+                description TEXT,
+                prompt_text TEXT NOT NULL,
+                is_active INTEGER DEFAULT 1,
+                created_at TEXT
+            )
+            ''')
+        
+            logger.info("Baza danych zainicjalizowana pomyślnie")
+            return True
     except Exception as e:
         logger.error(f"Błąd inicjalizacji bazy danych SQLite: {e}")
         return False
  
-# Inicjalizacja bazy danych przy imporcie modułu
-init_database()
 
 def update_user_language(user_id, language):
     """Aktualizuje język użytkownika w bazie danych"""
     try:
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
+        with get_connection() as conn:
+            cursor = conn.cursor()
         
-        cursor.execute("UPDATE users SET language = ? WHERE id = ?", (language, user_id))
-        conn.commit()
-        conn.close()
+            cursor.execute("UPDATE users SET language = ? WHERE id = ?", (language, user_id))
+        invalidate_user_profile(user_id)
         return True
     except Exception as e:
         logger.error(f"Błąd przy aktualizacji języka użytkownika: {e}")
-        if 'conn' in locals():
-            conn.close()
         return False
 
 def get_or_create_user(user_id, username=None, first_name=None, last_name=None, language_code=None):
     """Pobierz lub utwórz użytkownika w bazie danych"""
     try:
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
-        
-        # Sprawdź czy użytkownik istnieje
-        cursor.execute("SELECT * FROM users WHERE id = ?", (user_id,))
-        user = cursor.fetchone()
-        
-        if user:
-            # Konwertuj krotkę na słownik
-            user_dict = {
-                'id': user[0],
-                'username': user[1],
-                'first_name': user[2],
-                'last_name': user[3],
-                'language_code': user[4],
-                'subscription_end_date': user[5],
-                'is_active': bool(user[6]),
-                'created_at': user[7],
-                'messages_used': user[8] if len(user) > 8 else 0,
-                'messages_limit': user[9] if len(user) > 9 else 0
-            }
-            conn.close()
-            return user_dict
-        
-        # Jeśli nie istnieje, utwórz nowego
-        now = datetime.datetime.now(pytz.UTC).isoformat()
-        cursor.execute(
-            "INSERT INTO users (id, username, first_name, last_name, language_code, is_active, created_at, messages_used, messages_limit) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
-            (user_id, username, first_name, last_name, language_code, 1, now, 0, 0)
-        )
-        conn.commit()
-        
-        # Pobierz utworzonego użytkownika
-        cursor.execute("SELECT * FROM users WHERE id = ?", (user_id,))
-        new_user = cursor.fetchone()
-        conn.close()
-        
-        if new_user:
-            return {
-                'id': new_user[0],
-                'username': new_user[1],
-                'first_name': new_user[2],
-                'last_name': new_user[3],
-                'language_code': new_user[4],
-                'subscription_end_date': new_user[5],
-                'is_active': bool(new_user[6]),
-                'created_at': new_user[7],
-                'messages_used': new_user[8] if len(new_user) > 8 else 0,
-                'messages_limit': new_user[9] if len(new_user) > 9 else 0
-            }
+        with get_connection() as conn:
+            cursor = conn.cursor()
+        
+            # Sprawdź czy użytkownik istnieje
+            cursor.execute("SELECT * FROM users WHERE id = ?", (user_id,))
+            user = cursor.fetchone()
+        
+            if user:
+                # Konwertuj krotkę na słownik
+                user_dict = {
+                    'id': user[0],
+                    'username': user[1],
+                    'first_name': user[2],
+                    'last_name': user[3],
+                    'language_code': user[4],
+                    'subscription_end_date': user[5],
+                    'is_active': bool(user[6]),
+                    'created_at': user[7],
+                    'messages_used': user[8] if len(user) > 8 else 0,
+                    'messages_limit': user[9] if len(user) > 9 else 0
+                }
+                return user_dict
+        
+            # Jeśli nie istnieje, utwórz nowego
+            now = datetime.datetime.now(pytz.UTC).isoformat()
+            cursor.execute(
+                "INSERT INTO users (id, username, first_name, last_name, language_code, is_active, created_at, messages_used, messages_limit) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (user_id, username, first_name, last_name, language_code, 1, now, 0, 0)
+            )
+        
+            # Pobierz utworzonego użytkownika
+            cursor.execute("SELECT * FROM users WHERE id = ?", (user_id,))
+            new_user = cursor.fetchone()
+        
+            if new_user:
+                return {
+                    'id': new_user[0],
+                    'username': new_user[1],
+                    'first_name': new_user[2],
+                    'last_name': new_user[3],
+                    'language_code': new_user[4],
+                    'subscription_end_date': new_user[5],
+                    'is_active': bool(new_user[6]),
+                    'created_at': new_user[7],
+                    'messages_used': new_user[8] if len(new_user) > 8 else 0,
+                    'messages_limit': new_user[9] if len(new_user) > 9 else 0
+                }
         
     except Exception as e:
         logger.error(f"Błąd przy pobieraniu/tworzeniu użytkownika: {e}")
-        if 'conn' in locals():
-            conn.close()
     
     return None
 
 def check_active_subscription(user_id):
     """Sprawdź czy użytkownik ma aktywną subskrypcję czasową lub wiadomości"""
     try:
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
+        with get_connection() as conn:
+            cursor = conn.cursor()
         
-        # Sprawdź subskrypcję czasową
-        cursor.execute("SELECT subscription_end_date FROM users WHERE id = ?", (user_id,))
-        result = cursor.fetchone()
+            # Sprawdź subskrypcję czasową
+            cursor.execute("SELECT subscription_end_date FROM users WHERE id = ?", (user_id,))
+            result = cursor.fetchone()
         
-        if result and result[0]:
-            end_date = datetime.datetime.fromisoformat(result[0].replace('Z', '+00:00'))
-            now = datetime.datetime.now(pytz.UTC)
-            if end_date > now:
-                conn.close()
-                return True
+            if result and result[0]:
+                end_date = datetime.datetime.fromisoformat(result[0].replace('Z', '+00:00'))
+                now = datetime.datetime.now(pytz.UTC)
+                if end_date > now:
+                    return True
         
-        # Sprawdź limit wiadomości
-        if check_message_limit(user_id):
-            conn.close()
-            return True
+            # Sprawdź limit wiadomości
+            if check_message_limit(user_id):
+                return True
             
-        conn.close()
-        return False
+            return False
     except Exception as e:
         logger.error(f"Błąd przy sprawdzaniu subskrypcji: {e}")
-        if 'conn' in locals():
-            conn.close()
         return False
 
 def get_subscription_end_date(user_id):
     """Pobierz datę końca subskrypcji użytkownika"""
     try:
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
+        with get_connection() as conn:
+            cursor = conn.cursor()
         
-        cursor.execute("SELECT subscription_end_date FROM users WHERE id = ?", (user_id,))
-        result = cursor.fetchone()
-        conn.close()
+            cursor.execute("SELECT subscription_end_date FROM users WHERE id = ?", (user_id,))
+            result = cursor.fetchone()
         
-        if not result or not result[0]:
-            return None
+            if not result or not result[0]:
+                return None
         
-        return datetime.datetime.fromisoformat(result[0].replace('Z', '+00:00'))
+            return datetime.datetime.fromisoformat(result[0].replace('Z', '+00:00'))
     except Exception as e:
         logger.error(f"Błąd przy pobieraniu daty końca subskrypcji: {e}")
-        if 'conn' in locals():
-            conn.close()
         return None
 
 def create_license(message_limit, price, duration_days=0):
     """Utwórz nową licencję opartą na liczbie wiadomości"""
     try:
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
+        with get_connection() as conn:
+            cursor = conn.cursor()
         
-        license_key = str(uuid.uuid4())
-        now = datetime.datetime.now(pytz.UTC).isoformat()
+            license_key = str(uuid.uuid4())
+            now = datetime.datetime.now(pytz.UTC).isoformat()
         
-        cursor.execute(
-            "INSERT INTO licenses (license_key, duration_days, message_limit, price, created_at) VALUES (?, ?, ?, ?, ?)",
-            (license_key, duration_days, message_limit, price, now)
-        )
+            cursor.execute(
+                "INSERT INTO licenses (license_key, duration_days, message_limit, price, created_at) VALUES (?, ?, ?, ?, ?)",
+                (license_key, duration_days, message_limit, price, now)
+            )
         
-        license_id = cursor.lastrowid
-        conn.commit()
+            license_id = cursor.lastrowid
+        
+            # Pobierz utworzoną licencję
+            cursor.execute("SELECT * FROM licenses WHERE id = ?", (license_id,))
+            license_data = cursor.fetchone()
+        
+            if license_data:
+                return {
+                    'id': license_data[0],
+                    'license_key': license_data[1],
+                    'duration_days': license_data[2],
+                    'message_limit': license_data[3],
+                    'price': license_data[4],
+                    'is_used': bool(license_data[5]),
+                    'used_at': license_data[6],
+                    'used_by': license_data[7],
+                    'created_at': license_data[8]
+                }
+    except Exception as e:
+        logger.error(f"Błąd przy tworzeniu licencji: {e}")
+    
+    return None
+
+def activate_user_license(user_id, license_key):
+    """Aktywuj licencję dla użytkownika"""
+    try:
+        with get_connection() as conn:
+            cursor = conn.cursor()
         
-        # Pobierz utworzoną licencję
-        cursor.execute("SELECT * FROM licenses WHERE id = ?", (license_id,))
-        license_data = cursor.fetchone()
-        conn.close()
+            # Pobierz licencję
+            cursor.execute(
+                "SELECT * FROM licenses WHERE license_key = ? AND is_used = 0", 
+                (license_key,)
+            )
+            license_data = cursor.fetchone()
         
-        if license_data:
-            return {
+            if not license_data:
+                return False, None, 0  # Dodano trzeci parametr dla message_limit
+        
+            # Pobierz obecny limit wiadomości użytkownika (jeśli istnieje)
+            cursor.execute("SELECT messages_limit, messages_used FROM users WHERE id = ?", (user_id,))
+            user_messages = cursor.fetchone()
+        
+            current_limit = user_messages[0] if user_messages and user_messages[0] else 0
+            current_used = user_messages[1] if user_messages and user_messages[1] else 0
+        
+            # Utwórz słownik z danych licencji - przyjmuję, że message_limit jest na pozycji 3
+            license_dict = {
                 'id': license_data[0],
                 'license_key': license_data[1],
                 'duration_days': license_data[2],
@@ -267,171 +285,111 @@ def create_license(message_limit, price, duration_days=0):
                 'used_by': license_data[7],
                 'created_at': license_data[8]
             }
-    except Exception as e:
-        logger.error(f"Błąd przy tworzeniu licencji: {e}")
-        if 'conn' in locals():
-            conn.close()
-    
-    return None
-
-def activate_user_license(user_id, license_key):
-    """Aktywuj licencję dla użytkownika"""
-    try:
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
-        
-        # Pobierz licencję
-        cursor.execute(
-            "SELECT * FROM licenses WHERE license_key = ? AND is_used = 0", 
-            (license_key,)
-        )
-        license_data = cursor.fetchone()
-        
-        if not license_data:
-            conn.close()
-            return False, None, 0  # Dodano trzeci parametr dla message_limit
-        
-        # Pobierz obecny limit wiadomości użytkownika (jeśli istnieje)
-        cursor.execute("SELECT messages_limit, messages_used FROM users WHERE id = ?", (user_id,))
-        user_messages = cursor.fetchone()
-        
-        current_limit = user_messages[0] if user_messages and user_messages[0] else 0
-        current_used = user_messages[1] if user_messages and user_messages[1] else 0
-        
-        # Utwórz słownik z danych licencji - przyjmuję, że message_limit jest na pozycji 3
-        license_dict = {
-            'id': license_data[0],
-            'license_key': license_data[1],
-            'duration_days': license_data[2],
-            'message_limit': license_data[3],
-            'price': license_data[4],
-            'is_used': bool(license_data[5]),
-            'used_at': license_data[6],
-            'used_by': license_data[7],
-            'created_at': license_data[8]
-        }
-        
-        # Oblicz datę końca subskrypcji jeśli duration_days > 0
-        now = datetime.datetime.now(pytz.UTC)
-        end_date = None
-        if license_dict['duration_days'] > 0:
-            end_date = now + datetime.timedelta(days=license_dict['duration_days'])
-        
-        # Aktualizuj licencję
-        cursor.execute(
-            "UPDATE licenses SET is_used = 1, used_at = ?, used_by = ? WHERE id = ?",
-            (now.isoformat(), user_id, license_dict['id'])
-        )
         
-        # Aktualizuj limity wiadomości użytkownika - dodaj nowe do istniejących
-        new_message_limit = current_limit + license_dict['message_limit']
+            # Oblicz datę końca subskrypcji jeśli duration_days > 0
+            now = datetime.datetime.now(pytz.UTC)
+            end_date = None
+            if license_dict['duration_days'] > 0:
+                end_date = now + datetime.timedelta(days=license_dict['duration_days'])
         
-        # Aktualizuj użytkownika
-        if end_date:
-            cursor.execute(
-                "UPDATE users SET subscription_end_date = ?, messages_limit = ? WHERE id = ?",
-                (end_date.isoformat(), new_message_limit, user_id)
-            )
-        else:
+            # Aktualizuj licencję
             cursor.execute(
-                "UPDATE users SET messages_limit = ? WHERE id = ?",
-                (new_message_limit, user_id)
+                "UPDATE licenses SET is_used = 1, used_at = ?, used_by = ? WHERE id = ?",
+                (now.isoformat(), user_id, license_dict['id'])
             )
         
-        conn.commit()
-        conn.close()
-        
-        return True, end_date, license_dict['message_limit']
+            # Aktualizuj limity wiadomości użytkownika - dodaj nowe do istniejących
+            new_message_limit = current_limit + license_dict['message_limit']
+        
+            # Aktualizuj użytkownika
+            if end_date:
+                cursor.execute(
+                    "UPDATE users SET subscription_end_date = ?, messages_limit = ? WHERE id = ?",
+                    (end_date.isoformat(), new_message_limit, user_id)
+                )
+            else:
+                cursor.execute(
+                    "UPDATE users SET messages_limit = ? WHERE id = ?",
+                    (new_message_limit, user_id)
+                )
+        
+            return True, end_date, license_dict['message_limit']
     except Exception as e:
         logger.error(f"Błąd przy aktywacji licencji: {e}")
-        if 'conn' in locals():
-            conn.close()
         return False, None, 0
 
 def check_message_limit(user_id):
     """Sprawdź czy użytkownik ma dostępne wiadomości"""
     try:
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
+        with get_connection() as conn:
+            cursor = conn.cursor()
         
-        cursor.execute("SELECT messages_limit, messages_used FROM users WHERE id = ?", (user_id,))
-        result = cursor.fetchone()
-        conn.close()
+            cursor.execute("SELECT messages_limit, messages_used FROM users WHERE id = ?", (user_id,))
+            result = cursor.fetchone()
         
-        if not result:
-            return False
+            if not result:
+                return False
         
-        message_limit = result[0] or 0
-        messages_used = result[1] or 0
+            message_limit = result[0] or 0
+            messages_used = result[1] or 0
         
-        return messages_used < message_limit
+            return messages_used < message_limit
     except Exception as e:
         logger.error(f"Błąd przy sprawdzaniu limitu wiadomości: {e}")
-        if 'conn' in locals():
-            conn.close()
         return False
 
 def increment_messages_used(user_id):
     """Zwiększ licznik wykorzystanych wiadomości"""
     try:
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
+        with get_connection() as conn:
+            cursor = conn.cursor()
         
-        cursor.execute("SELECT messages_used FROM users WHERE id = ?", (user_id,))
-        result = cursor.fetchone()
+            cursor.execute("SELECT messages_used FROM users WHERE id = ?", (user_id,))
+            result = cursor.fetchone()
         
-        if not result:
-            conn.close()
-            return False
-        
-        messages_used = result[0] or 0
-        messages_used += 1
+            if not result:
+                return False
         
-        cursor.execute(
-            "UPDATE users SET messages_used = ? WHERE id = ?",
-            (messages_used, user_id)
-        )
+            messages_used = result[0] or 0
+            messages_used += 1
         
-        conn.commit()
-        conn.close()
+            cursor.execute(
+                "UPDATE users SET messages_used = ? WHERE id = ?",
+                (messages_used, user_id)
+            )
         
-        return True
+            return True
     except Exception as e:
         logger.error(f"Błąd przy aktualizacji licznika wiadomości: {e}")
-        if 'conn' in locals():
-            conn.close()
         return False
 
 def get_message_status(user_id):
     """Pobierz status wiadomości użytkownika"""
     try:
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
+        with get_connection() as conn:
+            cursor = conn.cursor()
         
-        cursor.execute("SELECT messages_limit, messages_used FROM users WHERE id = ?", (user_id,))
-        result = cursor.fetchone()
-        conn.close()
+            cursor.execute("SELECT messages_limit, messages_used FROM users WHERE id = ?", (user_id,))
+            result = cursor.fetchone()
         
-        if not result:
-            return {
-                "messages_limit": 0,
-                "messages_used": 0,
-                "messages_left": 0
-            }
+            if not result:
+                return {
+                    "messages_limit": 0,
+                    "messages_used": 0,
+                    "messages_left": 0
+                }
         
-        messages_limit = result[0] or 0
-        messages_used = result[1] or 0
-        messages_left = max(0, messages_limit - messages_used)
+            messages_limit = result[0] or 0
+            messages_used = result[1] or 0
+            messages_left = max(0, messages_limit - messages_used)
         
-        return {
-            "messages_limit": messages_limit,
-            "messages_used": messages_used,
-            "messages_left": messages_left
-        }
+            return {
+                "messages_limit": messages_limit,
+                "messages_used": messages_used,
+                "messages_left": messages_left
+            }
     except Exception as e:
         logger.error(f"Błąd przy pobieraniu statusu wiadomości: {e}")
-        if 'conn' in locals():
-            conn.close()
         return {
             "messages_limit": 0,
             "messages_used": 0,
@@ -441,277 +399,276 @@ def get_message_status(user_id):
 def create_new_conversation(user_id):
     """Utwórz nową konwersację dla użytkownika"""
     try:
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
+        with get_connection() as conn:
+            cursor = conn.cursor()
         
-        now = datetime.datetime.now(pytz.UTC).isoformat()
+            now = datetime.datetime.now(pytz.UTC).isoformat()
         
-        cursor.execute(
-            "INSERT INTO conversations (user_id, created_at, last_message_at) VALUES (?, ?, ?)",
-            (user_id, now, now)
-        )
+            cursor.execute(
+                "INSERT INTO conversations (user_id, created_at, last_message_at) VALUES (?, ?, ?)",
+                (user_id, now, now)
+            )
         
-        conversation_id = cursor.lastrowid
-        conn.commit()
+            conversation_id = cursor.lastrowid
         
-        # Pobierz utworzoną konwersację
-        cursor.execute("SELECT * FROM conversations WHERE id = ?", (conversation_id,))
-        conversation_data = cursor.fetchone()
-        conn.close()
+            # Pobierz utworzoną konwersację
+            cursor.execute("SELECT * FROM conversations WHERE id = ?", (conversation_id,))
+            conversation_data = cursor.fetchone()
         
-        if conversation_data:
-            return {
-                'id': conversation_data[0],
-                'user_id': conversation_data[1],
-                'created_at': conversation_data[2],
-                'last_message_at': conversation_data[3]
-            }
+            if conversation_data:
+                return {
+                    'id': conversation_data[0],
+                    'user_id': conversation_data[1],
+                    'created_at': conversation_data[2],
+                    'last_message_at': conversation_data[3]
+                }
     except Exception as e:
         logger.error(f"Błąd przy tworzeniu nowej konwersacji: {e}")
-        if 'conn' in locals():
-            conn.close()
     
     return None
 
 def get_active_conversation(user_id):
     """Pobierz aktywną konwersację użytkownika (ostatnią)"""
     try:
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
+        with get_connection() as conn:
+            cursor = conn.cursor()
         
-        cursor.execute(
-            "SELECT * FROM conversations WHERE user_id = ? ORDER BY last_message_at DESC LIMIT 1",
-            (user_id,)
-        )
+            cursor.execute(
+                "SELECT * FROM conversations WHERE user_id = ? ORDER BY last_message_at DESC LIMIT 1",
+                (user_id,)
+            )
         
-        conversation_data = cursor.fetchone()
-        conn.close()
+            conversation_data = cursor.fetchone()
         
-        if conversation_data:
-            return {
-                'id': conversation_data[0],
-                'user_id': conversation_data[1],
-                'created_at': conversation_data[2],
-                'last_message_at': conversation_data[3]
-            }
+            if conversation_data:
+                return {
+                    'id': conversation_data[0],
+                    'user_id': conversation_data[1],
+                    'created_at': conversation_data[2],
+                    'last_message_at': conversation_data[3]
+                }
         
-        # Jeśli nie ma żadnej konwersacji, utwórz nową
-        return create_new_conversation(user_id)
+            # Jeśli nie ma żadnej konwersacji, utwórz nową
+            return create_new_conversation(user_id)
     except Exception as e:
         logger.error(f"Błąd przy pobieraniu aktywnej konwersacji: {e}")
-        if 'conn' in locals():
-            conn.close()
         return create_new_conversation(user_id)
 
 def save_message(conversation_id, user_id, content, is_from_user, model_used=None):
     """Zapisz wiadomość w bazie danych"""
     try:
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
+        with get_connection() as conn:
+            cursor = conn.cursor()
         
-        now = datetime.datetime.now(pytz.UTC).isoformat()
+            now = datetime.datetime.now(pytz.UTC).isoformat()
         
-        # Zapisz wiadomość
-        cursor.execute(
-            "INSERT INTO messages (conversation_id, user_id, content, is_from_user, model_used, created_at) "
-            "VALUES (?, ?, ?, ?, ?, ?)",
-            (conversation_id, user_id, content, 1 if is_from_user else 0, model_used, now)
-        )
-        
-        # Aktualizuj czas ostatniej wiadomości w konwersacji
-        cursor.execute(
-            "UPDATE conversations SET last_message_at = ? WHERE id = ?",
-            (now, conversation_id)
-        )
-        
-        message_id = cursor.lastrowid
-        conn.commit()
+            # Zapisz wiadomość
+            cursor.execute(
+                "INSERT INTO messages (conversation_id, user_id, content, is_from_user, model_used, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (conversation_id, user_id, content, 1 if is_from_user else 0, model_used, now)
+            )
         
-        # Pobierz zapisaną wiadomość
-        cursor.execute("SELECT * FROM messages WHERE id = ?", (message_id,))
-        message_data = cursor.fetchone()
-        conn.close()
+            # Aktualizuj czas ostatniej wiadomości w konwersacji
+            cursor.execute(
+                "UPDATE conversations SET last_message_at = ? WHERE id = ?",
+                (now, conversation_id)
+            )
         
-        if message_data:
-            return {
-                'id': message_data[0],
-                'conversation_id': message_data[1],
-                'user_id': message_data[2],
-                'content': message_data[3],
-                'is_from_user': bool(message_data[4]),
-                'model_used': message_data[5],
-                'created_at': message_data[6]
-            }
+            message_id = cursor.lastrowid
+        
+            # Pobierz zapisaną wiadomość
+            cursor.execute("SELECT * FROM messages WHERE id = ?", (message_id,))
+            message_data = cursor.fetchone()
+        
+            if message_data:
+                return {
+                    'id': message_data[0],
+                    'conversation_id': message_data[1],
+                    'user_id': message_data[2],
+                    'content': message_data[3],
+                    'is_from_user': bool(message_data[4]),
+                    'model_used': message_data[5],
+                    'created_at': message_data[6]
+                }
     except Exception as e:
         logger.error(f"Błąd przy zapisywaniu wiadomości: {e}")
-        if 'conn' in locals():
-            conn.close()
     
     return None
 
-def get_conversation_history(conversation_id, limit=20):
-    """Pobierz historię konwersacji"""
+def get_conversation_history(conversation_id, limit=20, before_id=None, after_id=None):
+    """
+    Pobierz historię konwersacji (stronicowanie po ID wiadomości)
+    
+    Domyślnie zwraca `limit` najnowszych wiadomości. Z `before_id` zwraca
+    wiadomości starsze od podanej, a z `after_id` - kolejne wiadomości po podanej.
+    Wynik jest zawsze w kolejności chronologicznej.
+    
+    Args:
+        conversation_id (int): ID konwersacji
+        limit (int): Maksymalna liczba wiadomości
+        before_id (int, optional): Zwróć wiadomości starsze od tej wiadomości
+        after_id (int, optional): Zwróć wiadomości nowsze od tej wiadomości
+    
+    Returns:
+        list: Lista wiadomości w kolejności chronologicznej
+    """
     try:
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
-        
-        cursor.execute(
-            "SELECT * FROM messages WHERE conversation_id = ? ORDER BY created_at ASC LIMIT ?",
-            (conversation_id, limit)
-        )
-        
-        messages = cursor.fetchall()
-        conn.close()
-        
-        # Konwertuj na listę słowników
-        result = []
-        for msg in messages:
-            result.append({
-                'id': msg[0],
-                'conversation_id': msg[1],
-                'user_id': msg[2],
-                'content': msg[3],
-                'is_from_user': bool(msg[4]),
-                'model_used': msg[5],
-                'created_at': msg[6]
-            })
-        
-        return result
+        with get_connection() as conn:
+            cursor = conn.cursor()
+        
+            if after_id is not None:
+                cursor.execute(
+                    "SELECT * FROM messages WHERE conversation_id = ? AND id > ? ORDER BY id ASC LIMIT ?",
+                    (conversation_id, after_id, limit)
+                )
+                messages = cursor.fetchall()
+            else:
+                if before_id is not None:
+                    cursor.execute(
+                        "SELECT * FROM messages WHERE conversation_id = ? AND id < ? ORDER BY id DESC LIMIT ?",
+                        (conversation_id, before_id, limit)
+                    )
+                else:
+                    cursor.execute(
+                        "SELECT * FROM messages WHERE conversation_id = ? ORDER BY id DESC LIMIT ?",
+                        (conversation_id, limit)
+                    )
+                messages = cursor.fetchall()[::-1]
+        
+            # Konwertuj na listę słowników
+            result = []
+            for msg in messages:
+                result.append({
+                    'id': msg[0],
+                    'conversation_id': msg[1],
+                    'user_id': msg[2],
+                    'content': msg[3],
+                    'is_from_user': bool(msg[4]),
+                    'model_used': msg[5],
+                    'created_at': msg[6]
+                })
+        
+            return result
     except Exception as e:
         logger.error(f"Błąd przy pobieraniu historii konwersacji: {e}")
-        if 'conn' in locals():
-            conn.close()
         return []
 
 def save_prompt_template(name, description, prompt_text):
     """Zapisz szablon prompta w bazie danych"""
     try:
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
-        
-        now = datetime.datetime.now(pytz.UTC).isoformat()
-        
-        cursor.execute(
-            "INSERT INTO prompt_templates (name, description, prompt_text, is_active, created_at) "
-            "VALUES (?, ?, ?, ?, ?)",
-            (name, description, prompt_text, 1, now)
-        )
+        with get_connection() as conn:
+            cursor = conn.cursor()
         
-        template_id = cursor.lastrowid
-        conn.commit()
+            now = datetime.datetime.now(pytz.UTC).isoformat()
         
-        # Pobierz zapisany szablon
-        cursor.execute("SELECT * FROM prompt_templates WHERE id = ?", (template_id,))
-        template_data = cursor.fetchone()
-        conn.close()
+            cursor.execute(
+                "INSERT INTO prompt_templates (name, description, prompt_text, is_active, created_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (name, description, prompt_text, 1, now)
+            )
         
-        if template_data:
-            return {
-                'id': template_data[0],
-                'name': template_data[1],
-                'description': template_data[2],
-                'prompt_text': template_data[3],
-                'is_active': bool(template_data[4]),
-                'created_at': template_data[5]
-            }
+            template_id = cursor.lastrowid
+        
+            # Pobierz zapisany szablon
+            cursor.execute("SELECT * FROM prompt_templates WHERE id = ?", (template_id,))
+            template_data = cursor.fetchone()
+        
+            if template_data:
+                return {
+                    'id': template_data[0],
+                    'name': template_data[1],
+                    'description': template_data[2],
+                    'prompt_text': template_data[3],
+                    'is_active': bool(template_data[4]),
+                    'created_at': template_data[5]
+                }
     except Exception as e:
         logger.error(f"Błąd przy zapisywaniu szablonu prompta: {e}")
-        if 'conn' in locals():
-            conn.close()
     
     return None
 
 def get_prompt_templates():
     """Pobierz wszystkie aktywne szablony promptów"""
     try:
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
-        
-        cursor.execute("SELECT * FROM prompt_templates WHERE is_active = 1")
-        
-        templates = cursor.fetchall()
-        conn.close()
-        
-        # Konwertuj na listę słowników
-        result = []
-        for tmpl in templates:
-            result.append({
-                'id': tmpl[0],
-                'name': tmpl[1],
-                'description': tmpl[2],
-                'prompt_text': tmpl[3],
-                'is_active': bool(tmpl[4]),
-                'created_at': tmpl[5]
-            })
-        
-        return result
+        with get_connection() as conn:
+            cursor = conn.cursor()
+        
+            cursor.execute("SELECT * FROM prompt_templates WHERE is_active = 1")
+        
+            templates = cursor.fetchall()
+        
+            # Konwertuj na listę słowników
+            result = []
+            for tmpl in templates:
+                result.append({
+                    'id': tmpl[0],
+                    'name': tmpl[1],
+                    'description': tmpl[2],
+                    'prompt_text': tmpl[3],
+                    'is_active': bool(tmpl[4]),
+                    'created_at': tmpl[5]
+                })
+        
+            return result
     except Exception as e:
         logger.error(f"Błąd przy pobieraniu szablonów promptów: {e}")
-        if 'conn' in locals():
-            conn.close()
         return []
 
 def get_prompt_template_by_id(template_id):
     """Pobierz szablon prompta po ID"""
     try:
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
-        
-        cursor.execute("SELECT * FROM prompt_templates WHERE id = ?", (template_id,))
-        
-        template_data = cursor.fetchone()
-        conn.close()
-        
-        if template_data:
-            return {
-                'id': template_data[0],
-                'name': template_data[1],
-                'description': template_data[2],
-                'prompt_text': template_data[3],
-                'is_active': bool(template_data[4]),
-                'created_at': template_data[5]
-            }
+        with get_connection() as conn:
+            cursor = conn.cursor()
+        
+            cursor.execute("SELECT * FROM prompt_templates WHERE id = ?", (template_id,))
+        
+            template_data = cursor.fetchone()
+        
+            if template_data:
+                return {
+                    'id': template_data[0],
+                    'name': template_data[1],
+                    'description': template_data[2],
+                    'prompt_text': template_data[3],
+                    'is_active': bool(template_data[4]),
+                    'created_at': template_data[5]
+                }
     except Exception as e:
         logger.error(f"Błąd przy pobieraniu szablonu prompta: {e}")
-        if 'conn' in locals():
-            conn.close()
     
     return None
 
 def init_themes_table():
     """Inicjalizuje tabelę tematów konwersacji"""
     try:
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
-        
-        # Tabela tematów konwersacji
-        cursor.execute('''
-        CREATE TABLE IF NOT EXISTS conversation_themes (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_id INTEGER NOT NULL,
-            theme_name TEXT NOT NULL,
-            is_active INTEGER DEFAULT 1,
-            created_at TEXT,
-            last_used_at TEXT,
-            FOREIGN KEY(user_id) REFERENCES users(id)
-        )
-        ''')
-        
-        # Dodaj pole theme_id do tabeli conversations
-        cursor.execute("PRAGMA table_info(conversations)")
-        columns = cursor.fetchall()
-        column_names = [col[1] for col in columns]
-        
-        if 'theme_id' not in column_names:
-            cursor.execute("ALTER TABLE conversations ADD COLUMN theme_id INTEGER")
-        
-        conn.commit()
-        conn.close()
-        return True
+        with get_connection() as conn:
+            cursor = conn.cursor()
+        
+            # Tabela tematów konwersacji
+            cursor.execute('''
+            CREATE TABLE IF NOT EXISTS conversation_themes (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                user_id INTEGER NOT NULL,
+                theme_name TEXT NOT NULL,
+                is_active INTEGER DEFAULT 1,
+                created_at TEXT,
+                last_used_at TEXT,
+                FOREIGN KEY(user_id) REFERENCES users(id)
+            )
+            ''')
+        
+            # Dodaj pole theme_id do tabeli conversations
+            cursor.execute("PRAGMA table_info(conversations)")
+            columns = cursor.fetchall()
+            column_names = [col[1] for col in columns]
+        
+            if 'theme_id' not in column_names:
+                cursor.execute("ALTER TABLE conversations ADD COLUMN theme_id INTEGER")
+        
+            return True
     except Exception as e:
         logger.error(f"Błąd inicjalizacji tabeli tematów: {e}")
-        if 'conn' in locals():
-            conn.close()
         return False
 
 def create_conversation_theme(user_id, theme_name):
@@ -726,39 +683,35 @@ def create_conversation_theme(user_id, theme_name):
         dict: Dane utworzonego tematu lub None w przypadku błędu
     """
     try:
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
+        with get_connection() as conn:
+            cursor = conn.cursor()
         
-        now = datetime.datetime.now(pytz.UTC).isoformat()
+            now = datetime.datetime.now(pytz.UTC).isoformat()
         
-        cursor.execute(
-            "INSERT INTO conversation_themes (user_id, theme_name, created_at, last_used_at) VALUES (?, ?, ?, ?)",
-            (user_id, theme_name, now, now)
-        )
+            cursor.execute(
+                "INSERT INTO conversation_themes (user_id, theme_name, created_at, last_used_at) VALUES (?, ?, ?, ?)",
+                (user_id, theme_name, now, now)
+            )
         
-        theme_id = cursor.lastrowid
-        conn.commit()
+            theme_id = cursor.lastrowid
         
-        # Pobierz utworzony temat
-        cursor.execute("SELECT * FROM conversation_themes WHERE id = ?", (theme_id,))
-        theme_data = cursor.fetchone()
-        conn.close()
+            # Pobierz utworzony temat
+            cursor.execute("SELECT * FROM conversation_themes WHERE id = ?", (theme_id,))
+            theme_data = cursor.fetchone()
         
-        if theme_data:
-            return {
-                'id': theme_data[0],
-                'user_id': theme_data[1],
-                'theme_name': theme_data[2],
-                'is_active': bool(theme_data[3]),
-                'created_at': theme_data[4],
-                'last_used_at': theme_data[5]
-            }
+            if theme_data:
+                return {
+                    'id': theme_data[0],
+                    'user_id': theme_data[1],
+                    'theme_name': theme_data[2],
+                    'is_active': bool(theme_data[3]),
+                    'created_at': theme_data[4],
+                    'last_used_at': theme_data[5]
+                }
         
-        return None
+            return None
     except Exception as e:
         logger.error(f"Błąd przy tworzeniu tematu konwersacji: {e}")
-        if 'conn' in locals():
-            conn.close()
         return None
 
 def get_user_themes(user_id):
@@ -772,33 +725,30 @@ def get_user_themes(user_id):
         list: Lista tematów konwersacji
     """
     try:
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
+        with get_connection() as conn:
+            cursor = conn.cursor()
         
-        cursor.execute(
-            "SELECT * FROM conversation_themes WHERE user_id = ? AND is_active = 1 ORDER BY last_used_at DESC",
-            (user_id,)
-        )
+            cursor.execute(
+                "SELECT * FROM conversation_themes WHERE user_id = ? AND is_active = 1 ORDER BY last_used_at DESC",
+                (user_id,)
+            )
         
-        themes = cursor.fetchall()
-        conn.close()
+            themes = cursor.fetchall()
         
-        result = []
-        for theme in themes:
-            result.append({
-                'id': theme[0],
-                'user_id': theme[1],
-                'theme_name': theme[2],
-                'is_active': bool(theme[3]),
-                'created_at': theme[4],
-                'last_used_at': theme[5]
-            })
+            result = []
+            for theme in themes:
+                result.append({
+                    'id': theme[0],
+                    'user_id': theme[1],
+                    'theme_name': theme[2],
+                    'is_active': bool(theme[3]),
+                    'created_at': theme[4],
+                    'last_used_at': theme[5]
+                })
         
-        return result
+            return result
     except Exception as e:
         logger.error(f"Błąd przy pobieraniu tematów konwersacji: {e}")
-        if 'conn' in locals():
-            conn.close()
         return []
 
 def get_theme_by_id(theme_id):
@@ -812,28 +762,25 @@ def get_theme_by_id(theme_id):
         dict: Dane tematu lub None w przypadku błędu
     """
     try:
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
+        with get_connection() as conn:
+            cursor = conn.cursor()
+        
+            cursor.execute("SELECT * FROM conversation_themes WHERE id = ?", (theme_id,))
+            theme = cursor.fetchone()
+        
+            if theme:
+                return {
+                    'id': theme[0],
+                    'user_id': theme[1],
+                    'theme_name': theme[2],
+                    'is_active': bool(theme[3]),
+                    'created_at': theme[4],
+                    'last_used_at': theme[5]
+                }
         
-        cursor.execute("SELECT * FROM conversation_themes WHERE id = ?", (theme_id,))
-        theme = cursor.fetchone()
-        conn.close()
-        
-        if theme:
-            return {
-                'id': theme[0],
-                'user_id': theme[1],
-                'theme_name': theme[2],
-                'is_active': bool(theme[3]),
-                'created_at': theme[4],
-                'last_used_at': theme[5]
-            }
-        
-        return None
+            return None
     except Exception as e:
         logger.error(f"Błąd przy pobieraniu tematu konwersacji: {e}")
-        if 'conn' in locals():
-            conn.close()
         return None
 
 def create_themed_conversation(user_id, theme_id):
@@ -848,45 +795,40 @@ def create_themed_conversation(user_id, theme_id):
         dict: Dane utworzonej konwersacji lub None w przypadku błędu
     """
     try:
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
+        with get_connection() as conn:
+            cursor = conn.cursor()
         
-        now = datetime.datetime.now(pytz.UTC).isoformat()
+            now = datetime.datetime.now(pytz.UTC).isoformat()
         
-        cursor.execute(
-            "INSERT INTO conversations (user_id, created_at, last_message_at, theme_id) VALUES (?, ?, ?, ?)",
-            (user_id, now, now, theme_id)
-        )
+            cursor.execute(
+                "INSERT INTO conversations (user_id, created_at, last_message_at, theme_id) VALUES (?, ?, ?, ?)",
+                (user_id, now, now, theme_id)
+            )
         
-        conversation_id = cursor.lastrowid
+            conversation_id = cursor.lastrowid
         
-        # Aktualizuj czas ostatniego użycia tematu
-        cursor.execute(
-            "UPDATE conversation_themes SET last_used_at = ? WHERE id = ?",
-            (now, theme_id)
-        )
+            # Aktualizuj czas ostatniego użycia tematu
+            cursor.execute(
+                "UPDATE conversation_themes SET last_used_at = ? WHERE id = ?",
+                (now, theme_id)
+            )
         
-        conn.commit()
+            # Pobierz utworzoną konwersację
+            cursor.execute("SELECT * FROM conversations WHERE id = ?", (conversation_id,))
+            conversation_data = cursor.fetchone()
         
-        # Pobierz utworzoną konwersację
-        cursor.execute("SELECT * FROM conversations WHERE id = ?", (conversation_id,))
-        conversation_data = cursor.fetchone()
-        conn.close()
+            if conversation_data:
+                return {
+                    'id': conversation_data[0],
+                    'user_id': conversation_data[1],
+                    'created_at': conversation_data[2],
+                    'last_message_at': conversation_data[3],
+                    'theme_id': conversation_data[4] if len(conversation_data) > 4 else None
+                }
         
-        if conversation_data:
-            return {
-                'id': conversation_data[0],
-                'user_id': conversation_data[1],
-                'created_at': conversation_data[2],
-                'last_message_at': conversation_data[3],
-                'theme_id': conversation_data[4] if len(conversation_data) > 4 else None
-            }
-        
-        return None
+            return None
     except Exception as e:
         logger.error(f"Błąd przy tworzeniu konwersacji dla tematu: {e}")
-        if 'conn' in locals():
-            conn.close()
         return None
 
 def get_active_themed_conversation(user_id, theme_id):
@@ -901,30 +843,529 @@ def get_active_themed_conversation(user_id, theme_id):
         dict: Dane konwersacji lub None w przypadku błędu
     """
     try:
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
+        with get_connection() as conn:
+            cursor = conn.cursor()
+        
+            cursor.execute(
+                "SELECT * FROM conversations WHERE user_id = ? AND theme_id = ? ORDER BY last_message_at DESC LIMIT 1",
+                (user_id, theme_id)
+            )
+        
+            conversation_data = cursor.fetchone()
+        
+            if conversation_data:
+                return {
+                    'id': conversation_data[0],
+                    'user_id': conversation_data[1],
+                    'created_at': conversation_data[2],
+                    'last_message_at': conversation_data[3],
+                    'theme_id': conversation_data[4] if len(conversation_data) > 4 else None
+                }
+        
+            # Jeśli nie znaleziono konwersacji dla tego tematu, utwórz nową
+            return create_themed_conversation(user_id, theme_id)
+    except Exception as e:
+        logger.error(f"Błąd przy pobieraniu aktywnej konwersacji dla tematu: {e}")
+        return None
+
+def init_summaries_table():
+    """Inicjalizuje tabelę podsumowań konwersacji"""
+    try:
+        with get_connection() as conn:
+            cursor = conn.cursor()
+        
+            # Tabela podsumowań - jedno kroczące podsumowanie na konwersację
+            cursor.execute('''
+            CREATE TABLE IF NOT EXISTS conversation_summaries (
+                conversation_id INTEGER PRIMARY KEY,
+                summary TEXT NOT NULL,
+                last_message_id INTEGER NOT NULL,
+                updated_at TEXT
+            )
+            ''')
+        
+            return True
+    except Exception as e:
+        logger.error(f"Błąd inicjalizacji tabeli podsumowań konwersacji: {e}")
+        return False
+
+def get_conversation_summary(conversation_id):
+    """
+    Pobiera podsumowanie wcześniejszej części konwersacji
+    
+    Args:
+        conversation_id (int): ID konwersacji
+    
+    Returns:
+        dict: Podsumowanie i ID ostatniej podsumowanej wiadomości lub None
+    """
+    try:
+        with get_connection() as conn:
+            cursor = conn.cursor()
+        
+            cursor.execute(
+                "SELECT summary, last_message_id, updated_at FROM conversation_summaries WHERE conversation_id = ?",
+                (conversation_id,)
+            )
+            result = cursor.fetchone()
+        
+            if not result:
+                return None
+        
+            return {
+                'conversation_id': conversation_id,
+                'summary': result[0],
+                'last_message_id': result[1],
+                'updated_at': result[2]
+            }
+    except Exception as e:
+        logger.error(f"Błąd przy pobieraniu podsumowania konwersacji: {e}")
+        return None
+
+def save_conversation_summary(conversation_id, summary, last_message_id):
+    """
+    Zapisuje (lub zastępuje) podsumowanie konwersacji
+    
+    Args:
+        conversation_id (int): ID konwersacji
+        summary (str): Treść podsumowania
+        last_message_id (int): ID ostatniej wiadomości objętej podsumowaniem
+    
+    Returns:
+        bool: True jeśli operacja się powiodła, False w przeciwnym razie
+    """
+    try:
+        with get_connection() as conn:
+            cursor = conn.cursor()
+            now = datetime.datetime.now(pytz.UTC).isoformat()
+        
+            cursor.execute(
+                """
+                INSERT INTO conversation_summaries (conversation_id, summary, last_message_id, updated_at)
+                VALUES (?, ?, ?, ?)
+                ON CONFLICT(conversation_id) DO UPDATE SET
+                    summary = excluded.summary,
+                    last_message_id = excluded.last_message_id,
+                    updated_at = excluded.updated_at
+                """,
+                (conversation_id, summary, last_message_id, now)
+            )
+        
+            return True
+    except Exception as e:
+        logger.error(f"Błąd przy zapisywaniu podsumowania konwersacji: {e}")
+        return False
+
+def init_response_cache_table():
+    """Inicjalizuje tabelę pamięci podręcznej odpowiedzi"""
+    try:
+        with get_connection() as conn:
+            cursor = conn.cursor()
+        
+            cursor.execute('''
+            CREATE TABLE IF NOT EXISTS response_cache (
+                cache_key TEXT PRIMARY KEY,
+                model TEXT,
+                response TEXT NOT NULL,
+                created_at TEXT NOT NULL,
+                last_used_at TEXT NOT NULL,
+                hits INTEGER DEFAULT 0
+            )
+            ''')
         
-        cursor.execute(
-            "SELECT * FROM conversations WHERE user_id = ? AND theme_id = ? ORDER BY last_message_at DESC LIMIT 1",
-            (user_id, theme_id)
-        )
+            return True
+    except Exception as e:
+        logger.error(f"Błąd inicjalizacji tabeli pamięci podręcznej odpowiedzi: {e}")
+        return False
+
+def get_cached_response(cache_key, ttl_hours):
+    """
+    Pobiera zapisaną odpowiedź z pamięci podręcznej, jeśli nie jest przeterminowana
+    
+    Args:
+        cache_key (str): Klucz zapytania
+        ttl_hours (int): Czas ważności wpisu (w godzinach)
+    
+    Returns:
+        str: Zapisana odpowiedź lub None
+    """
+    try:
+        with get_connection() as conn:
+            cursor = conn.cursor()
+            now = datetime.datetime.now(pytz.UTC)
+            cutoff = (now - datetime.timedelta(hours=ttl_hours)).isoformat()
+        
+            cursor.execute(
+                "SELECT response FROM response_cache WHERE cache_key = ? AND created_at >= ?",
+                (cache_key, cutoff)
+            )
+            result = cursor.fetchone()
+        
+            if not result:
+                return None
+        
+            cursor.execute(
+                "UPDATE response_cache SET last_used_at = ?, hits = hits + 1 WHERE cache_key = ?",
+                (now.isoformat(), cache_key)
+            )
+        
+            return result[0]
+    except Exception as e:
+        logger.error(f"Błąd przy pobieraniu odpowiedzi z pamięci podręcznej: {e}")
+        return None
+
+def save_cached_response(cache_key, model, response):
+    """
+    Zapisuje (lub zastępuje) odpowiedź w pamięci podręcznej
+    
+    Args:
+        cache_key (str): Klucz zapytania
+        model (str): Model, który wygenerował odpowiedź
+        response (str): Treść odpowiedzi
+    
+    Returns:
+        bool: True jeśli operacja się powiodła, False w przeciwnym razie
+    """
+    try:
+        with get_connection() as conn:
+            cursor = conn.cursor()
+            now = datetime.datetime.now(pytz.UTC).isoformat()
+        
+            cursor.execute(
+                """
+                INSERT INTO response_cache (cache_key, model, response, created_at, last_used_at, hits)
+                VALUES (?, ?, ?, ?, ?, 0)
+                ON CONFLICT(cache_key) DO UPDATE SET
+                    model = excluded.model,
+                    response = excluded.response,
+                    created_at = excluded.created_at,
+                    last_used_at = excluded.last_used_at,
+                    hits = 0
+                """,
+                (cache_key, model, response, now, now)
+            )
+        
+            return True
+    except Exception as e:
+        logger.error(f"Błąd przy zapisywaniu odpowiedzi w pamięci podręcznej: {e}")
+        return False
+
+def evict_response_cache(ttl_hours, max_entries):
+    """
+    Usuwa przeterminowane wpisy pamięci podręcznej oraz najdawniej używane ponad limit
+    
+    Args:
+        ttl_hours (int): Czas ważności wpisu (w godzinach)
+        max_entries (int): Maksymalna liczba wpisów
+    
+    Returns:
+        int: Liczba usuniętych wpisów
+    """
+    try:
+        with get_connection() as conn:
+            cursor = conn.cursor()
+            cutoff = (datetime.datetime.now(pytz.UTC) - datetime.timedelta(hours=ttl_hours)).isoformat()
+        
+            cursor.execute("DELETE FROM response_cache WHERE created_at < ?", (cutoff,))
+            removed = cursor.rowcount
+        
+            cursor.execute(
+                """
+                DELETE FROM response_cache WHERE cache_key IN (
+                    SELECT cache_key FROM response_cache ORDER BY last_used_at DESC LIMIT -1 OFFSET ?
+                )
+                """,
+                (max_entries,)
+            )
+            removed += cursor.rowcount
+        
+            return removed
+    except Exception as e:
+        logger.error(f"Błąd przy czyszczeniu pamięci podręcznej odpowiedzi: {e}")
+        return 0
+
+# ==================== PRZYPOMNIENIA ====================
+# Statusy przypomnień: pending (oczekuje) -> sending (pobrane do wysłania) -> sent lub failed,
+# albo done (oznaczone przez użytkownika jako wykonane przed terminem)
+
+def _reminder_time(value, round_up=True):
+    """
+    Zamienia datę na znacznik ISO UTC o stałej długości (bez mikrosekund),
+    dzięki czemu porządek tekstowy w bazie odpowiada porządkowi czasowemu
+    
+    Czas przypomnienia jest zaokrąglany w górę do pełnej sekundy, aby przypomnienie
+    nie zostało wysłane przed terminem. Bieżący czas (round_up=False) jest obcinany.
+    """
+    value = value.astimezone(pytz.UTC)
+    if round_up and value.microsecond:
+        value += datetime.timedelta(seconds=1)
+    return value.replace(microsecond=0).isoformat()
+
+def init_reminders_table():
+    """Inicjalizuje tabelę przypomnień"""
+    try:
+        with get_connection() as conn:
+            cursor = conn.cursor()
+        
+            cursor.execute('''
+            CREATE TABLE IF NOT EXISTS reminders (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                user_id INTEGER NOT NULL,
+                content TEXT NOT NULL,
+                remind_at TEXT NOT NULL,
+                status TEXT NOT NULL DEFAULT 'pending',
+                created_at TEXT,
+                claimed_at TEXT,
+                finished_at TEXT
+            )
+            ''')
+            
+            _migrate_legacy_reminders(cursor)
+        
+            return True
+    except Exception as e:
+        logger.error(f"Błąd inicjalizacji tabeli przypomnień: {e}")
+        return False
+
+def _migrate_legacy_reminders(cursor):
+    """
+    Dostosowuje tabelę przypomnień w starym schemacie (is_completed, completed_at)
+    do harmonogramu przypomnień: dodaje kolumny statusu i ujednolica format remind_at
+    oczekujących przypomnień. Kolumny is_completed i completed_at pozostają w tabeli.
+    """
+    cursor.execute("PRAGMA table_info(reminders)")
+    columns = [column[1] for column in cursor.fetchall()]
+    if 'status' in columns:
+        return
+    
+    logger.info("Migracja tabeli przypomnień do schematu ze statusem")
+    cursor.execute("ALTER TABLE reminders ADD COLUMN status TEXT NOT NULL DEFAULT 'pending'")
+    for column in ('created_at', 'claimed_at', 'finished_at'):
+        if column not in columns:
+            cursor.execute(f"ALTER TABLE reminders ADD COLUMN {column} TEXT")
+    
+    # Wykonane przypomnienia były już wysłane - nie mogą trafić ponownie do harmonogramu
+    if 'is_completed' in columns:
+        finished_at = "completed_at" if 'completed_at' in columns else "NULL"
+        cursor.execute(f"UPDATE reminders SET status = 'sent', finished_at = {finished_at} WHERE is_completed = 1")
+    
+    # Porządek tekstowy remind_at musi odpowiadać porządkowi czasowemu (indeks status, remind_at)
+    cursor.execute("SELECT id, remind_at FROM reminders WHERE status = 'pending'")
+    for reminder_id, remind_at in cursor.fetchall():
+        try:
+            value = datetime.datetime.fromisoformat(remind_at.replace('Z', '+00:00'))
+        except (AttributeError, ValueError):
+            logger.warning(f"Nieprawidłowy czas przypomnienia {reminder_id}: {remind_at}")
+            cursor.execute("UPDATE reminders SET status = 'failed' WHERE id = ?", (reminder_id,))
+            continue
+        if value.tzinfo is None:
+            value = pytz.UTC.localize(value)
+        cursor.execute("UPDATE reminders SET remind_at = ? WHERE id = ?", (_reminder_time(value), reminder_id))
+
+def create_reminder(user_id, content, remind_at):
+    """
+    Tworzy nowe przypomnienie
+    
+    Args:
+        user_id (int): ID użytkownika
+        content (str): Treść przypomnienia
+        remind_at (datetime): Czas przypomnienia (ze strefą czasową)
+    
+    Returns:
+        dict: Utworzone przypomnienie lub None w przypadku błędu
+    """
+    try:
+        with get_connection() as conn:
+            cursor = conn.cursor()
         
-        conversation_data = cursor.fetchone()
-        conn.close()
+            now = datetime.datetime.now(pytz.UTC).isoformat()
+            remind_at = _reminder_time(remind_at)
+            cursor.execute(
+                "INSERT INTO reminders (user_id, content, remind_at, status, created_at) VALUES (?, ?, ?, 'pending', ?)",
+                (user_id, content, remind_at, now)
+            )
         
-        if conversation_data:
             return {
-                'id': conversation_data[0],
-                'user_id': conversation_data[1],
-                'created_at': conversation_data[2],
-                'last_message_at': conversation_data[3],
-                'theme_id': conversation_data[4] if len(conversation_data) > 4 else None
+                'id': cursor.lastrowid,
+                'user_id': user_id,
+                'content': content,
+                'remind_at': remind_at,
+                'status': 'pending'
             }
+    except Exception as e:
+        logger.error(f"Błąd tworzenia przypomnienia: {e}")
+        return None
+
+def get_user_pending_reminders(user_id):
+    """
+    Pobiera oczekujące przypomnienia użytkownika (od najbliższego)
+    
+    Args:
+        user_id (int): ID użytkownika
+    
+    Returns:
+        list: Lista przypomnień
+    """
+    try:
+        with get_connection() as conn:
+            cursor = conn.cursor()
         
-        # Jeśli nie znaleziono konwersacji dla tego tematu, utwórz nową
-        return create_themed_conversation(user_id, theme_id)
+            cursor.execute(
+                "SELECT id, content, remind_at FROM reminders WHERE user_id = ? AND status = 'pending' ORDER BY remind_at",
+                (user_id,)
+            )
+            return [
+                {'id': row[0], 'user_id': user_id, 'content': row[1], 'remind_at': row[2]}
+                for row in cursor.fetchall()
+            ]
     except Exception as e:
-        logger.error(f"Błąd przy pobieraniu aktywnej konwersacji dla tematu: {e}")
-        if 'conn' in locals():
-            conn.close()
-        return None
\ No newline at end of file
+        logger.error(f"Błąd pobierania przypomnień użytkownika: {e}")
+        return []
+
+def complete_reminder(reminder_id, user_id=None):
+    """
+    Oznacza oczekujące przypomnienie jako wykonane
+    
+    Args:
+        reminder_id (int): ID przypomnienia
+        user_id (int, optional): ID właściciela - jeśli podano, zmieniane są tylko jego przypomnienia
+    
+    Returns:
+        bool: True jeśli przypomnienie zostało oznaczone, False w przeciwnym razie
+    """
+    try:
+        with get_connection() as conn:
+            cursor = conn.cursor()
+        
+            now = datetime.datetime.now(pytz.UTC).isoformat()
+            if user_id is None:
+                cursor.execute(
+                    "UPDATE reminders SET status = 'done', finished_at = ? WHERE id = ? AND status = 'pending'",
+                    (now, reminder_id)
+                )
+            else:
+                cursor.execute(
+                    "UPDATE reminders SET status = 'done', finished_at = ? WHERE id = ? AND user_id = ? AND status = 'pending'",
+                    (now, reminder_id, user_id)
+                )
+            return cursor.rowcount > 0
+    except Exception as e:
+        logger.error(f"Błąd oznaczania przypomnienia jako wykonane: {e}")
+        return False
+
+def claim_due_reminders(now, limit):
+    """
+    Pobiera partię przypomnień, dla których nadszedł czas, i oznacza je jako wysyłane
+    
+    Odczyt i zmiana statusu odbywają się w jednej transakcji, więc każde
+    przypomnienie zostaje pobrane do wysłania tylko raz.
+    
+    Args:
+        now (datetime): Bieżący czas (ze strefą czasową)
+        limit (int): Maksymalna liczba przypomnień w partii
+    
+    Returns:
+        list: Lista przypomnień (id, user_id, content, remind_at)
+    """
+    try:
+        with get_connection() as conn:
+            cursor = conn.cursor()
+        
+            # Blokada zapisu od początku transakcji - odczyt i zmiana statusu są niepodzielne
+            if not conn.in_transaction:
+                cursor.execute("BEGIN IMMEDIATE")
+        
+            cursor.execute(
+                "SELECT id, user_id, content, remind_at FROM reminders "
+                "WHERE status = 'pending' AND remind_at <= ? ORDER BY remind_at LIMIT ?",
+                (_reminder_time(now, round_up=False), limit)
+            )
+            reminders = [
+                {'id': row[0], 'user_id': row[1], 'content': row[2], 'remind_at': row[3]}
+                for row in cursor.fetchall()
+            ]
+        
+            if reminders:
+                claimed_at = datetime.datetime.now(pytz.UTC).isoformat()
+                cursor.executemany(
+                    "UPDATE reminders SET status = 'sending', claimed_at = ? WHERE id = ?",
+                    [(claimed_at, reminder['id']) for reminder in reminders]
+                )
+        
+            return reminders
+    except Exception as e:
+        logger.error(f"Błąd pobierania zaległych przypomnień: {e}")
+        return []
+
+def finish_reminders(sent_ids, failed_ids):
+    """
+    Zapisuje wynik wysyłki partii przypomnień
+    
+    Args:
+        sent_ids (list): ID wysłanych przypomnień
+        failed_ids (list): ID przypomnień, których nie udało się wysłać
+    
+    Returns:
+        bool: True jeśli zapisano, False w przypadku błędu
+    """
+    try:
+        with get_connection() as conn:
+            cursor = conn.cursor()
+        
+            now = datetime.datetime.now(pytz.UTC).isoformat()
+            cursor.executemany(
+                "UPDATE reminders SET status = ?, finished_at = ? WHERE id = ? AND status = 'sending'",
+                [('sent', now, reminder_id) for reminder_id in sent_ids] +
+                [('failed', now, reminder_id) for reminder_id in failed_ids]
+            )
+            return True
+    except Exception as e:
+        logger.error(f"Błąd zapisywania wyniku wysyłki przypomnień: {e}")
+        return False
+
+def reset_claimed_reminders():
+    """
+    Przywraca do kolejki przypomnienia pobrane do wysłania przed restartem bota
+    
+    Returns:
+        int: Liczba przywróconych przypomnień
+    """
+    try:
+        with get_connection() as conn:
+            cursor = conn.cursor()
+        
+            cursor.execute("UPDATE reminders SET status = 'pending', claimed_at = NULL WHERE status = 'sending'")
+            return cursor.rowcount
+    except Exception as e:
+        logger.error(f"Błąd przywracania przypomnień do kolejki: {e}")
+        return 0
+
+def get_pending_reminder_times(limit, after=None):
+    """
+    Pobiera terminy najbliższych oczekujących przypomnień
+    
+    Args:
+        limit (int): Maksymalna liczba terminów
+        after (str, optional): Pobierz tylko terminy późniejsze niż podany znacznik (ISO UTC)
+    
+    Returns:
+        list: Posortowana lista znaczników czasu (ISO UTC)
+    """
+    try:
+        with get_connection() as conn:
+            cursor = conn.cursor()
+        
+            if after is None:
+                cursor.execute(
+                    "SELECT remind_at FROM reminders WHERE status = 'pending' ORDER BY remind_at LIMIT ?",
+                    (limit,)
+                )
+            else:
+                cursor.execute(
+                    "SELECT remind_at FROM reminders WHERE status = 'pending' AND remind_at > ? ORDER BY remind_at LIMIT ?",
+                    (after, limit)
+                )
+            return [row[0] for row in cursor.fetchall()]
+    except Exception as e:
+        logger.error(f"Błąd pobierania terminów przypomnień: {e}")
+        return []
@@ -4,6 +4,7 @@ import datetime
 import pytz
 import logging
 from config import SUPABASE_URL, SUPABASE_KEY
+from database.user_profile import invalidate_user_profile
 
 logger = logging.getLogger(__name__)
 
@@ -31,6 +32,10 @@ except Exception as e:
             return self
         def limit(self, *args, **kwargs):
             return self
+        def lt(self, *args, **kwargs):
+            return self
+        def gt(self, *args, **kwargs):
+            return self
         def execute(self, *args, **kwargs):
             logger.warning("Używanie dummy klienta Supabase - brak połączenia z bazą danych")
             return type('obj', (object,), {'data': []})
@@ -76,6 +81,7 @@ def update_user_language(user_id, language):
     """Aktualizuje język użytkownika w bazie danych"""
     try:
         response = supabase.table('users').update({'language': language}).eq('id', user_id).execute()
+        invalidate_user_profile(user_id)
         return True if response.data else False
     except Exception as e:
         logger.error(f"Błąd przy aktualizacji języka użytkownika: {e}")
@@ -575,12 +581,26 @@ def save_message(conversation_id, user_id, content, is_from_user, model_used=Non
         logger.error(f"Błąd przy zapisywaniu wiadomości: {e}")
         return None
 
-def get_conversation_history(conversation_id, limit=20):
-    """Pobiera historię konwersacji"""
+def get_conversation_history(conversation_id, limit=20, before_id=None, after_id=None):
+    """
+    Pobiera historię konwersacji (stronicowanie po ID wiadomości)
+    
+    Domyślnie zwraca `limit` najnowszych wiadomości. Z `before_id` zwraca
+    wiadomości starsze od podanej, a z `after_id` - kolejne wiadomości po podanej.
+    Wynik jest zawsze w kolejności chronologicznej.
+    """
     try:
-        response = supabase.table('messages').select('*').eq('conversation_id', conversation_id).order('created_at', ascending=True).limit(limit).execute()
+        query = supabase.table('messages').select('*').eq('conversation_id', conversation_id)
         
-        return response.data
+        if after_id is not None:
+            response = query.gt('id', after_id).order('id', desc=False).limit(limit).execute()
+            return response.data
+        
+        if before_id is not None:
+            query = query.lt('id', before_id)
+        
+        response = query.order('id', desc=True).limit(limit).execute()
+        return list(reversed(response.data))
     except Exception as e:
         logger.error(f"Błąd przy pobieraniu historii konwersacji: {e}")
         return []
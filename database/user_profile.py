@@ -0,0 +1,175 @@
+"""
+Moduł pamięci podręcznej profili użytkowników (język, tryb, model, stan kredytów)
+
+Dane z bazy (język, nazwa, kredyty) są pobierane jednym zapytaniem i przechowywane
+w ograniczonej pamięci LRU z czasem ważności. Tryb i model czatu pochodzą z kontekstu
+bota (context.chat_data). Wpis jest usuwany przy każdej zmianie języka, nazwy
+lub salda kredytów użytkownika.
+
+Handlery działają w pętli zdarzeń, dlatego profil nadawcy jest wczytywany w wątku
+bazodanowym przed ich wywołaniem (preload_user_profile) - synchroniczne funkcje
+odczytu korzystają wtedy z pamięci.
+"""
+import logging
+import threading
+import time
+from collections import OrderedDict
+from config import CHAT_MODES, AVAILABLE_MODELS, DEFAULT_MODEL
+from database.connection import get_connection
+
+logger = logging.getLogger(__name__)
+
+# Maksymalna liczba profili przechowywanych w pamięci
+PROFILE_CACHE_SIZE = 10000
+
+# Czas ważności profilu w pamięci (w sekundach)
+PROFILE_TTL_SECONDS = 300
+
+# Język używany, gdy użytkownik nie ma go zapisanego
+DEFAULT_LANGUAGE = "pl"
+
+_profiles = OrderedDict()
+# Wpisy są usuwane także z wątków bazodanowych (zapisy kredytów przez run_db)
+_lock = threading.Lock()
+
+def _load_profile(user_id):
+    """Pobiera dane profilu z bazy jednym zapytaniem"""
+    try:
+        with get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                SELECT u.language, u.language_code, u.first_name, c.credits_amount
+                FROM (SELECT ? AS id) q
+                LEFT JOIN users u ON u.id = q.id
+                LEFT JOIN user_credits c ON c.user_id = q.id
+            """, (user_id,))
+            language, language_code, name, credits = cursor.fetchone()
+    except Exception as e:
+        logger.error(f"Błąd pobierania profilu użytkownika: {e}")
+        return None
+
+    return {
+        'language': language or language_code,
+        'name': name,
+        'credits': credits or 0
+    }
+
+def _lookup_profile(user_id):
+    """Zwraca aktualny profil z pamięci lub None"""
+    with _lock:
+        entry = _profiles.get(user_id)
+        if entry is not None and entry[0] > time.monotonic():
+            _profiles.move_to_end(user_id)
+            return entry[1]
+    return None
+
+def _store_profile(user_id, profile):
+    """Zapamiętuje profil pobrany z bazy (None - błąd odczytu, profil nie jest zapamiętywany)"""
+    if profile is None:
+        return {'language': None, 'name': None, 'credits': 0}
+
+    with _lock:
+        _profiles[user_id] = (time.monotonic() + PROFILE_TTL_SECONDS, profile)
+        _profiles.move_to_end(user_id)
+        if len(_profiles) > PROFILE_CACHE_SIZE:
+            _profiles.popitem(last=False)
+    return profile
+
+def _get_cached_profile(user_id):
+    profile = _lookup_profile(user_id)
+    if profile is None:
+        profile = _store_profile(user_id, _load_profile(user_id))
+    return profile
+
+async def load_user_profile(user_id):
+    """
+    Wczytuje profil użytkownika do pamięci bez blokowania pętli zdarzeń
+
+    Args:
+        user_id (int): ID użytkownika
+
+    Returns:
+        dict: Dane profilu z bazy (language, name, credits)
+    """
+    profile = _lookup_profile(user_id)
+    if profile is None:
+        # Import lokalny - async_storage importuje moduły kredytów, które korzystają z tego modułu
+        from database.async_storage import run_db
+        profile = _store_profile(user_id, await run_db(_load_profile, user_id))
+    return profile
+
+async def preload_user_profile(update, context):
+    """
+    Handler wywoływany przed pozostałymi (grupa -1) - wczytuje profil nadawcy aktualizacji
+
+    Dzięki temu get_user_language i get_cached_user_credits w handlerach nie wykonują
+    zapytań do bazy w pętli zdarzeń.
+    """
+    user = getattr(update, 'effective_user', None)
+    if user is not None:
+        await load_user_profile(user.id)
+
+def _get_session_data(context, user_id):
+    """Zwraca dane użytkownika zapisane w kontekście bota (lub pusty słownik)"""
+    chat_data = getattr(context, 'chat_data', None) or {}
+    return chat_data.get('user_data', {}).get(user_id, {})
+
+def get_user_profile(context, user_id):
+    """
+    Zwraca profil użytkownika
+
+    Args:
+        context: Kontekst bota (może być None)
+        user_id (int): ID użytkownika
+
+    Returns:
+        dict: Słownik z kluczami language, name, credits, current_mode, current_model
+    """
+    profile = dict(_get_cached_profile(user_id))
+    session = _get_session_data(context, user_id)
+
+    # Język wybrany w bieżącej sesji ma pierwszeństwo przed zapisanym w bazie
+    profile['language'] = session.get('language') or profile['language'] or DEFAULT_LANGUAGE
+    profile['current_mode'] = session.get('current_mode') if session.get('current_mode') in CHAT_MODES else "no_mode"
+    profile['current_model'] = session.get('current_model') if session.get('current_model') in AVAILABLE_MODELS else DEFAULT_MODEL
+    return profile
+
+def get_user_language(context, user_id):
+    """
+    Pobiera język użytkownika z kontekstu lub profilu zapisanego w bazie danych
+
+    Args:
+        context: Kontekst bota
+        user_id (int): ID użytkownika
+
+    Returns:
+        str: Kod języka (pl, en, ru)
+    """
+    language = _get_session_data(context, user_id).get('language')
+    if language:
+        return language
+    return _get_cached_profile(user_id)['language'] or DEFAULT_LANGUAGE
+
+def get_cached_user_credits(user_id):
+    """
+    Zwraca stan kredytów użytkownika z profilu (do wyświetlania w menu i komunikatach)
+
+    Do decyzji o pobraniu opłaty należy używać funkcji z credits_client.
+
+    Args:
+        user_id (int): ID użytkownika
+
+    Returns:
+        int: Liczba kredytów
+    """
+    return _get_cached_profile(user_id)['credits']
+
+def invalidate_user_profile(user_id):
+    """
+    Usuwa profil użytkownika z pamięci (po zmianie języka, nazwy lub salda)
+
+    Args:
+        user_id (int): ID użytkownika
+    """
+    with _lock:
+        _profiles.pop(user_id, None)
@@ -8,9 +8,10 @@ from database.supabase_client import (
     increment_messages_used, get_message_status
 )
 from utils.openai_client import chat_completion_stream, prepare_messages_from_history
+from utils.openai_resilience import OpenAIServiceError
 from utils.translations import get_text
+from utils.streaming_editor import StreamingEditor
 from handlers.menu_handler import get_user_language
-import asyncio
 
 async def message_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Obsługa wiadomości tekstowych od użytkownika ze strumieniowaniem odpowiedzi"""
@@ -27,15 +28,16 @@ async def message_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     conversation = get_active_conversation(user_id)
     conversation_id = conversation['id']
     
+    # Pobierz historię konwersacji - przed zapisem bieżącej wiadomości, która
+    # jest dołączana do kontekstu osobno
+    history = get_conversation_history(conversation_id, limit=MAX_CONTEXT_MESSAGES)
+    
     # Zapisz wiadomość użytkownika do bazy danych
     save_message(conversation_id, user_id, user_message, is_from_user=True)
     
     # Wyślij informację, że bot pisze
     await update.message.chat.send_action(action=ChatAction.TYPING)
     
-    # Pobierz historię konwersacji
-    history = get_conversation_history(conversation_id, limit=MAX_CONTEXT_MESSAGES)
-    
     # Określ model do użycia - domyślny lub wybrany przez użytkownika
     model_to_use = DEFAULT_MODEL
     if 'user_data' in context.chat_data and user_id in context.chat_data['user_data']:
@@ -51,42 +53,32 @@ async def message_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
             system_prompt = CHAT_MODES[user_data['current_mode']]["prompt"]
     
     # Przygotuj wiadomości dla API OpenAI
-    messages = prepare_messages_from_history(history, user_message, system_prompt)
+    messages = prepare_messages_from_history(history, user_message, system_prompt, model_to_use)
     
     # Wyślij początkową pustą wiadomość, którą będziemy aktualizować
     response_message = await update.message.reply_text(get_text("generating_response", language))
     
     # Zainicjuj pełną odpowiedź
     full_response = ""
-    buffer = ""
-    last_update = asyncio.get_event_loop().time()
+    editor = StreamingEditor(response_message)
     
-    # Generuj odpowiedź strumieniowo
-    async for chunk in chat_completion_stream(messages, model=model_to_use):
-        full_response += chunk
-        buffer += chunk
-        
-        # Aktualizuj wiadomość co 1 sekundę lub gdy bufor jest wystarczająco duży
-        current_time = asyncio.get_event_loop().time()
-        if current_time - last_update >= 1.0 or len(buffer) > 100:
-            try:
-                # Dodaj migający kursor na końcu wiadomości
-                await response_message.edit_text(full_response + "▌", parse_mode=ParseMode.MARKDOWN)
-                buffer = ""
-                last_update = current_time
-            except Exception as e:
-                # Jeśli wystąpi błąd (np. wiadomość nie została zmieniona), kontynuuj
-                pass
-                
-    # Aktualizuj wiadomość z pełną odpowiedzią bez kursora
+    # Generuj odpowiedź strumieniowo - edytor scala zmiany i pilnuje limitów Telegram
+    stream = chat_completion_stream(messages, model=model_to_use, user_id=user_id)
     try:
-        await response_message.edit_text(full_response, parse_mode=ParseMode.MARKDOWN)
-    except Exception as e:
-        # Jeśli wystąpi błąd formatowania Markdown, wyślij bez formatowania
-        await response_message.edit_text(full_response)
+        async for chunk in stream:
+            full_response += chunk
+            editor.update(full_response)
+    except OpenAIServiceError as e:
+        # Nieudana odpowiedź nie jest zapisywana ani wliczana do limitu wiadomości
+        print(f"Błąd OpenAI podczas generowania odpowiedzi: {e}")
+        await editor.finish(get_text("openai_unavailable", language))
+        return
+    
+    # Aktualizuj wiadomość z pełną odpowiedzią bez kursora
+    await editor.finish(full_response)
     
-    # Zapisz odpowiedź do bazy danych
-    save_message(conversation_id, user_id, full_response, is_from_user=False, model_used=model_to_use)
+    # Zapisz odpowiedź do bazy danych (z modelem, który faktycznie odpowiedział)
+    save_message(conversation_id, user_id, full_response, is_from_user=False, model_used=stream.model)
     
     # Zwiększ licznik wykorzystanych wiadomości
     increment_messages_used(user_id)
@@ -8,58 +8,93 @@ from database.credits_client import (
     get_credit_packages, get_package_by_id, purchase_credits,
     get_user_credit_stats
 )
+from database.async_storage import run_db
 # Add imports at the beginning of the file
-from utils.credit_analytics import (
-    generate_credit_usage_chart, generate_usage_breakdown_chart, 
-    get_credit_usage_breakdown, predict_credit_depletion
-)
-import matplotlib
-matplotlib.use('Agg')  # Required for operation without a graphical interface
+from utils.credit_analytics import get_credit_usage_breakdown, predict_credit_depletion
+from utils.chart_cache import send_credit_chart
+from utils.callback_router import iter_callback_data
 
 from database.credits_client import add_stars_payment_option, get_stars_conversion_rate
+from database.user_profile import get_user_language, get_cached_user_credits
 
+# ==================== KLAWIATURY ====================
 
-# Function moved from menu_handler.py to avoid circular import
-def get_user_language(context, user_id):
-    """
-    Get the user's language from context or database
-    
-    Args:
-        context: Bot context
-        user_id: User ID
-        
-    Returns:
-        str: Language code (pl, en, ru)
-    """
-    # Check if language is saved in context
-    if 'user_data' in context.chat_data and user_id in context.chat_data['user_data'] and 'language' in context.chat_data['user_data'][user_id]:
-        return context.chat_data['user_data'][user_id]['language']
-    
-    # If not, get from database
-    try:
-        from database.supabase_client import sqlite3, DB_PATH
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
-        
-        cursor.execute("SELECT language FROM users WHERE id = ?", (user_id,))
-        result = cursor.fetchone()
-        conn.close()
-        
-        if result and result[0]:
-            # Save in context for future use
-            if 'user_data' not in context.chat_data:
-                context.chat_data['user_data'] = {}
-            
-            if user_id not in context.chat_data['user_data']:
-                context.chat_data['user_data'][user_id] = {}
-            
-            context.chat_data['user_data'][user_id]['language'] = result[0]
-            return result[0]
-    except Exception as e:
-        print(f"Error getting language from database: {e}")
-    
-    # Default language if not found in database
-    return "pl"
+def create_buy_credits_markup():
+    """Tworzy klawiaturę z przyciskiem zakupu kredytów (komendy /credits i /creditstats)"""
+    return InlineKeyboardMarkup([[InlineKeyboardButton("🛒 Buy credits", callback_data="buy_credits")]])
+
+def _package_rows(packages, credits_label):
+    return [
+        [InlineKeyboardButton(
+            f"{pkg['name']} - {pkg['credits']} {credits_label} ({pkg['price']} PLN)",
+            callback_data=f"buy_package_{pkg['id']}"
+        )]
+        for pkg in packages
+    ]
+
+def create_packages_markup(packages):
+    """Tworzy klawiaturę pakietów kredytów dla komendy /buy"""
+    return InlineKeyboardMarkup(_package_rows(packages, "credits"))
+
+def create_buy_menu_markup(packages, language):
+    """Tworzy klawiaturę zakupu kredytów z menu (pakiety, gwiazdki i powrót)"""
+    keyboard = _package_rows(packages, get_text('credits', language))
+    keyboard.extend([
+        [InlineKeyboardButton(get_text("buy_with_stars", language), callback_data="show_stars_options")],
+        [InlineKeyboardButton(get_text("back", language), callback_data="menu_section_credits")]
+    ])
+    return InlineKeyboardMarkup(keyboard)
+
+def create_credit_balance_markup(language):
+    """Tworzy klawiaturę pod stanem konta i historią kredytów"""
+    return InlineKeyboardMarkup([
+        [InlineKeyboardButton(get_text("buy_more_credits", language), callback_data="menu_credits_buy")],
+        [InlineKeyboardButton(get_text("credit_stats", language), callback_data="credit_advanced_analytics")],
+        [InlineKeyboardButton(get_text("back", language), callback_data="menu_section_credits")]
+    ])
+
+def create_purchase_result_markup(language, success):
+    """Tworzy klawiaturę pod wynikiem zakupu pakietu"""
+    if not success:
+        return InlineKeyboardMarkup([[InlineKeyboardButton(get_text("back", language), callback_data="credits_buy")]])
+    return InlineKeyboardMarkup([
+        [InlineKeyboardButton(get_text("menu_credits", language), callback_data="menu_section_credits")],
+        [InlineKeyboardButton(get_text("back", language), callback_data="menu_back_main")]
+    ])
+
+def create_analytics_back_markup():
+    """Tworzy klawiaturę z przyciskiem powrotu pod analizą kredytów"""
+    return InlineKeyboardMarkup([[InlineKeyboardButton("Powrót", callback_data="menu_credits_check")]])
+
+def create_stars_markup(conversion_rates, language):
+    """Tworzy klawiaturę zakupu kredytów za gwiazdki (z menu zakupu)"""
+    keyboard = [
+        [InlineKeyboardButton(f"⭐ {stars} gwiazdek = {credits} kredytów", callback_data=f"buy_stars_{stars}")]
+        for stars, credits in conversion_rates.items()
+    ]
+    keyboard.append([InlineKeyboardButton(get_text("back", language), callback_data="credits_buy")])
+    return InlineKeyboardMarkup(keyboard)
+
+def create_stars_command_markup(conversion_rates):
+    """Tworzy klawiaturę zakupu kredytów za gwiazdki dla komendy"""
+    keyboard = [
+        [InlineKeyboardButton(f"⭐ {stars} stars = {credits} credits", callback_data=f"buy_stars_{stars}")]
+        for stars, credits in conversion_rates.items()
+    ]
+    keyboard.append([InlineKeyboardButton("🔙 Return to purchase options", callback_data="buy_credits")])
+    return InlineKeyboardMarkup(keyboard)
+
+def iter_credit_callback_data(language):
+    """Zwraca callback_data przycisków wszystkich klawiatur modułu (z przykładowym pakietem)"""
+    packages = [{'id': 1, 'name': "Pakiet", 'credits': 100, 'price': 10}]
+    conversion_rates = get_stars_conversion_rate()
+    return iter_callback_data((
+        create_buy_credits_markup(), create_packages_markup(packages),
+        create_buy_menu_markup(packages, language), create_credit_balance_markup(language),
+        create_purchase_result_markup(language, True), create_purchase_result_markup(language, False),
+        create_analytics_back_markup(), create_stars_markup(conversion_rates, language),
+        create_stars_command_markup(conversion_rates)
+    ))
 
 async def credits_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """
@@ -68,11 +103,10 @@ async def credits_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """
     user_id = update.effective_user.id
     language = get_user_language(context, user_id)
-    credits = get_user_credits(user_id)
+    credits = get_cached_user_credits(user_id)
     
     # Create buttons to buy credits
-    keyboard = [[InlineKeyboardButton("🛒 Buy credits", callback_data="buy_credits")]]
-    reply_markup = InlineKeyboardMarkup(keyboard)
+    reply_markup = create_buy_credits_markup()
     
     # Send credit information
     await update.message.reply_text(
@@ -107,16 +141,7 @@ async def buy_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         packages_text += f"*{pkg['id']}.* {pkg['name']} - *{pkg['credits']}* credits - *{pkg['price']} PLN*\n"
     
     # Create buttons to buy credits
-    keyboard = []
-    for pkg in packages:
-        keyboard.append([
-            InlineKeyboardButton(
-                f"{pkg['name']} - {pkg['credits']} credits ({pkg['price']} PLN)", 
-                callback_data=f"buy_package_{pkg['id']}"
-            )
-        ])
-    
-    reply_markup = InlineKeyboardMarkup(keyboard)
+    reply_markup = create_packages_markup(packages)
     
     await update.message.reply_text(
         get_text("buy_credits", language, packages=packages_text),
@@ -205,12 +230,7 @@ async def handle_credit_callback(update: Update, context: ContextTypes.DEFAULT_T
             message += f"\n{get_text('no_transactions', language)}"
         
         # Utwórz klawiaturę
-        keyboard = [
-            [InlineKeyboardButton(get_text("buy_more_credits", language), callback_data="menu_credits_buy")],
-            [InlineKeyboardButton(get_text("credit_stats", language), callback_data="credit_advanced_analytics")],
-            [InlineKeyboardButton(get_text("back", language), callback_data="menu_section_credits")]
-        ]
-        reply_markup = InlineKeyboardMarkup(keyboard)
+        reply_markup = create_credit_balance_markup(language)
         
         # Zaktualizuj wiadomość
         try:
@@ -224,7 +244,7 @@ async def handle_credit_callback(update: Update, context: ContextTypes.DEFAULT_T
         return True
     
     # Obsługa zakupu kredytów
-    if query.data == "credits_buy" or query.data == "menu_credits_buy":
+    if query.data in ("credits_buy", "menu_credits_buy", "buy_credits"):
         # Pobierz dostępne pakiety kredytów
         packages = get_credit_packages()
         
@@ -232,22 +252,7 @@ async def handle_credit_callback(update: Update, context: ContextTypes.DEFAULT_T
         message = f"🛒 *{get_text('buy_credits_btn', language)}*\n\n{get_text('select_package', language)}:\n\n"
         
         # Utwórz klawiaturę z pakietami
-        keyboard = []
-        for pkg in packages:
-            keyboard.append([
-                InlineKeyboardButton(
-                    f"{pkg['name']} - {pkg['credits']} {get_text('credits', language)} ({pkg['price']} PLN)", 
-                    callback_data=f"buy_package_{pkg['id']}"
-                )
-            ])
-        
-        # Dodaj przyciski dodatkowe
-        keyboard.extend([
-            [InlineKeyboardButton(get_text("buy_with_stars", language), callback_data="show_stars_options")],
-            [InlineKeyboardButton(get_text("back", language), callback_data="menu_section_credits")]
-        ])
-        
-        reply_markup = InlineKeyboardMarkup(keyboard)
+        reply_markup = create_buy_menu_markup(packages, language)
         
         # Zaktualizuj wiadomość
         try:
@@ -271,11 +276,7 @@ async def handle_credit_callback(update: Update, context: ContextTypes.DEFAULT_T
             current_credits = get_user_credits(user_id)
             
             # Utwórz klawiaturę
-            keyboard = [
-                [InlineKeyboardButton(get_text("menu_credits", language), callback_data="menu_section_credits")],
-                [InlineKeyboardButton(get_text("back", language), callback_data="menu_back_main")]
-            ]
-            reply_markup = InlineKeyboardMarkup(keyboard)
+            reply_markup = create_purchase_result_markup(language, True)
             
             # Przygotuj wiadomość o sukcesie
             try:
@@ -293,8 +294,7 @@ async def handle_credit_callback(update: Update, context: ContextTypes.DEFAULT_T
                 print(f"Błąd przy aktualizacji wiadomości: {e}")
         else:
             # Klawiatura powrotu
-            keyboard = [[InlineKeyboardButton(get_text("back", language), callback_data="credits_buy")]]
-            reply_markup = InlineKeyboardMarkup(keyboard)
+            reply_markup = create_purchase_result_markup(language, False)
             
             await query.edit_message_text(
                 get_text("purchase_error", language),
@@ -321,7 +321,7 @@ async def handle_credit_callback(update: Update, context: ContextTypes.DEFAULT_T
         days = 30
         
         # Pobierz prognozę zużycia kredytów
-        depletion_info = predict_credit_depletion(user_id, days)
+        depletion_info = await run_db(predict_credit_depletion, user_id, days)
         
         if not depletion_info:
             if hasattr(query.message, 'caption'):
@@ -346,7 +346,7 @@ async def handle_credit_callback(update: Update, context: ContextTypes.DEFAULT_T
             message += f"Za mało danych, aby przewidzieć wyczerpanie kredytów.\n\n"
         
         # Pobierz rozkład zużycia kredytów
-        usage_breakdown = get_credit_usage_breakdown(user_id, days)
+        usage_breakdown = await run_db(get_credit_usage_breakdown, user_id, days)
         
         if usage_breakdown:
             message += f"*Rozkład zużycia kredytów:*\n"
@@ -368,26 +368,19 @@ async def handle_credit_callback(update: Update, context: ContextTypes.DEFAULT_T
         
         # Generuj i wysyłaj wykresy
         # Wykres historii użycia
-        usage_chart = generate_credit_usage_chart(user_id, days)
-        if usage_chart:
-            await context.bot.send_photo(
-                chat_id=query.message.chat_id,
-                photo=usage_chart,
-                caption=f"📈 Historia wykorzystania kredytów z ostatnich {days} dni"
-            )
+        await send_credit_chart(
+            context.bot, query.message.chat_id, user_id, "usage", days, language,
+            f"📈 Historia wykorzystania kredytów z ostatnich {days} dni"
+        )
         
         # Wykres rozkładu użycia
-        breakdown_chart = generate_usage_breakdown_chart(user_id, days)
-        if breakdown_chart:
-            await context.bot.send_photo(
-                chat_id=query.message.chat_id,
-                photo=breakdown_chart,
-                caption=f"📊 Rozkład wykorzystania kredytów z ostatnich {days} dni"
-            )
+        await send_credit_chart(
+            context.bot, query.message.chat_id, user_id, "breakdown", days, language,
+            f"📊 Rozkład wykorzystania kredytów z ostatnich {days} dni"
+        )
         
         # Dodaj przycisk powrotu
-        keyboard = [[InlineKeyboardButton("Powrót", callback_data="menu_credits_check")]]
-        reply_markup = InlineKeyboardMarkup(keyboard)
+        reply_markup = create_analytics_back_markup()
         
         # Zaktualizuj wiadomość z przyciskiem powrotu
         try:
@@ -406,21 +399,7 @@ async def handle_credit_callback(update: Update, context: ContextTypes.DEFAULT_T
         conversion_rates = get_stars_conversion_rate()
         
         # Utwórz klawiaturę
-        keyboard = []
-        for stars, credits in conversion_rates.items():
-            keyboard.append([
-                InlineKeyboardButton(
-                    f"⭐ {stars} gwiazdek = {credits} kredytów", 
-                    callback_data=f"buy_stars_{stars}"
-                )
-            ])
-        
-        # Dodaj przycisk powrotu
-        keyboard.append([
-            InlineKeyboardButton(get_text("back", language), callback_data="credits_buy")
-        ])
-        
-        reply_markup = InlineKeyboardMarkup(keyboard)
+        reply_markup = create_stars_markup(conversion_rates, language)
         
         await query.edit_message_text(
             get_text("stars_purchase_info", language, default="🌟 *Zakup kredytów za Telegram Stars* 🌟\n\nWybierz jedną z opcji poniżej, aby wymienić gwiazdki Telegram na kredyty.\nIm więcej gwiazdek wymienisz jednorazowo, tym lepszy bonus otrzymasz!\n\n⚠️ *Uwaga:* Aby dokonać zakupu gwiazdkami, wymagane jest konto Telegram Premium."),
@@ -471,7 +450,7 @@ async def credit_stats_command(update: Update, context: ContextTypes.DEFAULT_TYP
     """
     user_id = update.effective_user.id
     language = get_user_language(context, user_id)
-    stats = get_user_credit_stats(user_id)
+    stats = await run_db(get_user_credit_stats, user_id)
     
     # Format the date of last purchase
     last_purchase = "None" if not stats['last_purchase'] else stats['last_purchase'].split('T')[0]
@@ -503,8 +482,7 @@ Last purchase: *{last_purchase}*
                     message += f" - {transaction['description']}"
     
     # Add button to buy credits
-    keyboard = [[InlineKeyboardButton("🛒 Buy credits", callback_data="buy_credits")]]
-    reply_markup = InlineKeyboardMarkup(keyboard)
+    reply_markup = create_buy_credits_markup()
     
     await update.message.reply_text(
         message,
@@ -540,7 +518,7 @@ async def credit_analytics_command(update: Update, context: ContextTypes.DEFAULT
     )
     
     # Get credit depletion forecast
-    depletion_info = predict_credit_depletion(user_id, days)
+    depletion_info = await run_db(predict_credit_depletion, user_id, days)
     
     if not depletion_info:
         await status_message.edit_text(
@@ -562,7 +540,7 @@ async def credit_analytics_command(update: Update, context: ContextTypes.DEFAULT
         message += f"Not enough data to predict credit depletion.\n\n"
     
     # Get credit usage breakdown
-    usage_breakdown = get_credit_usage_breakdown(user_id, days)
+    usage_breakdown = await run_db(get_credit_usage_breakdown, user_id, days)
     
     if usage_breakdown:
         message += f"*Credit usage breakdown:*\n"
@@ -577,24 +555,16 @@ async def credit_analytics_command(update: Update, context: ContextTypes.DEFAULT
     )
     
     # Generate and send usage history chart
-    usage_chart = generate_credit_usage_chart(user_id, days)
-    
-    if usage_chart:
-        await context.bot.send_photo(
-            chat_id=update.effective_chat.id,
-            photo=usage_chart,
-            caption=f"📈 Credit usage history for the last {days} days"
-        )
+    await send_credit_chart(
+        context.bot, update.effective_chat.id, user_id, "usage", days, language,
+        f"📈 Credit usage history for the last {days} days"
+    )
     
     # Generate and send usage breakdown chart
-    breakdown_chart = generate_usage_breakdown_chart(user_id, days)
-    
-    if breakdown_chart:
-        await context.bot.send_photo(
-            chat_id=update.effective_chat.id,
-            photo=breakdown_chart,
-            caption=f"📊 Credit usage breakdown for the last {days} days"
-        )
+    await send_credit_chart(
+        context.bot, update.effective_chat.id, user_id, "breakdown", days, language,
+        f"📊 Credit usage breakdown for the last {days} days"
+    )
 
 async def show_stars_purchase_options(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """
@@ -607,21 +577,7 @@ async def show_stars_purchase_options(update: Update, context: ContextTypes.DEFA
     conversion_rates = get_stars_conversion_rate()
     
     # Create buttons for different star purchase options
-    keyboard = []
-    for stars, credits in conversion_rates.items():
-        keyboard.append([
-            InlineKeyboardButton(
-                f"⭐ {stars} stars = {credits} credits", 
-                callback_data=f"buy_stars_{stars}"
-            )
-        ])
-    
-    # Add return button
-    keyboard.append([
-        InlineKeyboardButton("🔙 Return to purchase options", callback_data="buy_credits")
-    ])
-    
-    reply_markup = InlineKeyboardMarkup(keyboard)
+    reply_markup = create_stars_command_markup(conversion_rates)
     
     await update.message.reply_text(
         "🌟 *Purchase Credits with Telegram Stars* 🌟\n\n"
@@ -3,12 +3,14 @@ from telegram import Update
 from telegram.ext import ContextTypes
 from telegram.constants import ParseMode, ChatAction
 from database.supabase_client import get_active_conversation, get_conversation_history, get_or_create_user
-from utils.pdf_generator import generate_conversation_pdf
 from config import BOT_NAME
 from utils.translations import get_text
 from handlers.menu_handler import get_user_language
 import io
 
+# Liczba wiadomości pobieranych z bazy w jednym zapytaniu podczas eksportu
+EXPORT_PAGE_SIZE = 200
+
 async def export_conversation(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """
     Eksportuje aktualną konwersację użytkownika do PDF
@@ -32,8 +34,15 @@ async def export_conversation(update: Update, context: ContextTypes.DEFAULT_TYPE
         await status_message.edit_text(get_text("conversation_error", language))
         return
     
-    # Pobierz historię konwersacji
-    history = get_conversation_history(conversation['id'])
+    # Pobierz całą historię konwersacji, strona po stronie
+    history = []
+    last_id = 0
+    while True:
+        page = get_conversation_history(conversation['id'], limit=EXPORT_PAGE_SIZE, after_id=last_id)
+        history.extend(page)
+        if len(page) < EXPORT_PAGE_SIZE:
+            break
+        last_id = page[-1]['id']
     
     if not history:
         await status_message.edit_text(get_text("export_empty", language))
@@ -44,6 +53,8 @@ async def export_conversation(update: Update, context: ContextTypes.DEFAULT_TYPE
     
     # Generuj PDF
     try:
+        # reportlab jest importowany dopiero przy pierwszym eksporcie
+        from utils.pdf_generator import generate_conversation_pdf
         pdf_buffer = generate_conversation_pdf(history, user_info, BOT_NAME)
         
         # Przygotuj nazwę pliku
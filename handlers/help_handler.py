@@ -4,7 +4,7 @@ from telegram.constants import ParseMode
 from config import DEFAULT_MODEL, BOT_NAME, SUBSCRIPTION_PLANS, CREDIT_COSTS, AVAILABLE_MODELS, CHAT_MODES
 from utils.translations import get_text
 from handlers.menu_handler import get_user_language
-from database.credits_client import get_user_credits
+from database.user_profile import get_cached_user_credits
 from database.supabase_client import get_message_status
 
 async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -57,7 +57,7 @@ async def check_status(update: Update, context: ContextTypes.DEFAULT_TYPE):
     language = get_user_language(context, user_id)
     
     # Pobierz status kredytów
-    credits = get_user_credits(user_id)
+    credits = get_cached_user_credits(user_id)
     
     # Pobranie aktualnego trybu czatu
     current_mode = get_text("no_mode", language)
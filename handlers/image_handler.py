@@ -4,7 +4,10 @@ from telegram.constants import ParseMode, ChatAction
 from config import CREDIT_COSTS, DALL_E_MODEL
 from utils.translations import get_text
 from handlers.menu_handler import get_user_language
-from database.credits_client import check_user_credits, deduct_user_credits, get_user_credits
+from database.async_storage import (
+    reserve_user_credits_async, commit_user_credits_async,
+    release_user_credits_async, get_user_credits_async
+)
 from utils.openai_client import generate_image_dall_e
 
 async def generate_image(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -15,14 +18,9 @@ async def generate_image(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = update.effective_user.id
     language = get_user_language(context, user_id)
     
-    # Sprawdź, czy użytkownik ma wystarczającą liczbę kredytów
     quality = "standard"  # domyślna jakość
     credit_cost = CREDIT_COSTS["image"][quality]
     
-    if not check_user_credits(user_id, credit_cost):
-        await update.message.reply_text(get_text("subscription_expired", language))
-        return
-    
     # Sprawdź, czy podano opis obrazu
     if not context.args or len(' '.join(context.args)) < 3:
         await update.message.reply_text(f"{get_text('image_usage', language, default='Użycie: /image [opis obrazu]')}\nNa przykład: /image pies na rowerze w parku")
@@ -30,6 +28,12 @@ async def generate_image(update: Update, context: ContextTypes.DEFAULT_TYPE):
     
     prompt = ' '.join(context.args)
     
+    # Zarezerwuj kredyty - zostaną pobrane dopiero po wygenerowaniu obrazu
+    hold_id = await reserve_user_credits_async(user_id, credit_cost, "Generowanie obrazu", "image")
+    if hold_id is None:
+        await update.message.reply_text(get_text("subscription_expired", language))
+        return
+    
     # Powiadom użytkownika o rozpoczęciu generowania
     message = await update.message.reply_text(get_text("generating_image", language))
     
@@ -37,12 +41,16 @@ async def generate_image(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await update.message.chat.send_action(action=ChatAction.UPLOAD_PHOTO)
     
     # Generuj obraz
-    image_url = await generate_image_dall_e(prompt)
-    
-    # Odejmij kredyty
-    deduct_user_credits(user_id, credit_cost, "Generowanie obrazu")
+    try:
+        image_url = await generate_image_dall_e(prompt, user_id=user_id)
+    except Exception:
+        await release_user_credits_async(hold_id)
+        raise
     
     if image_url:
+        # Zatwierdź pobranie kredytów
+        await commit_user_credits_async(hold_id)
+        
         # Usuń wiadomość o ładowaniu
         await message.delete()
         
@@ -53,11 +61,14 @@ async def generate_image(update: Update, context: ContextTypes.DEFAULT_TYPE):
             parse_mode=ParseMode.MARKDOWN
         )
     else:
+        # Nie pobieraj kredytów za nieudane generowanie
+        await release_user_credits_async(hold_id)
+        
         # Aktualizuj wiadomość o błędzie
         await message.edit_text(get_text("image_generation_error", language, default="Przepraszam, wystąpił błąd podczas generowania obrazu. Spróbuj ponownie z innym opisem."))
     
     # Sprawdź aktualny stan kredytów
-    credits = get_user_credits(user_id)
+    credits = await get_user_credits_async(user_id)
     if credits < 5:
         await update.message.reply_text(
             f"*{get_text('low_credits_warning', language, default='Uwaga:')}* {get_text('low_credits_message', language, default=f'Pozostało Ci tylko *{credits}* kredytów. Kup więcej za pomocą komendy /buy.', credits=credits)}",
@@ -1,54 +1,17 @@
+import functools
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup, ReplyKeyboardRemove
 from telegram.ext import ContextTypes
 from telegram.constants import ParseMode
 from config import CHAT_MODES, AVAILABLE_LANGUAGES, AVAILABLE_MODELS, CREDIT_COSTS, DEFAULT_MODEL, BOT_NAME
-from utils.translations import get_text
-from database.credits_client import get_user_credits
-from database.supabase_client import update_user_language
+from utils.translations import get_text, get_keyboard_labels, on_catalog_compiled
+from utils.callback_router import iter_callback_data
 from database.credits_client import get_user_credits, get_credit_packages
-from config import BOT_NAME
+from database.supabase_client import update_user_language
+from database.user_profile import get_user_language, get_cached_user_credits, invalidate_user_profile
+from database.connection import get_connection
 
 # ==================== FUNKCJE POMOCNICZE DO ZARZĄDZANIA DANYMI UŻYTKOWNIKA ====================
 
-def get_user_language(context, user_id):
-    """Pobiera język użytkownika z kontekstu lub bazy danych"""
-    # Sprawdź, czy język jest zapisany w kontekście
-    if 'user_data' in context.chat_data and user_id in context.chat_data['user_data'] and 'language' in context.chat_data['user_data'][user_id]:
-        return context.chat_data['user_data'][user_id]['language']
-    
-    # Jeśli nie, pobierz z bazy danych
-    try:
-        from database.supabase_client import sqlite3, DB_PATH
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
-        
-        # Sprawdź najpierw kolumnę 'language'
-        cursor.execute("SELECT language FROM users WHERE id = ?", (user_id,))
-        result = cursor.fetchone()
-        
-        # Jeśli nie ma wyników, sprawdź 'language_code'
-        if not result or not result[0]:
-            cursor.execute("SELECT language_code FROM users WHERE id = ?", (user_id,))
-            result = cursor.fetchone()
-        
-        conn.close()
-        
-        if result and result[0]:
-            # Zapisz w kontekście na przyszłość
-            if 'user_data' not in context.chat_data:
-                context.chat_data['user_data'] = {}
-            
-            if user_id not in context.chat_data['user_data']:
-                context.chat_data['user_data'][user_id] = {}
-            
-            context.chat_data['user_data'][user_id]['language'] = result[0]
-            return result[0]
-    except Exception as e:
-        print(f"Błąd pobierania języka z bazy: {e}")
-    
-    # Domyślny język, jeśli nie znaleziono w bazie
-    return "pl"
-
 def get_user_current_mode(context, user_id):
     """Pobiera aktualny tryb czatu użytkownika"""
     if 'user_data' in context.chat_data and user_id in context.chat_data['user_data']:
@@ -118,26 +81,47 @@ def get_menu_message_id(context, user_id):
 
 # ==================== FUNKCJE GENERUJĄCE UKŁADY MENU ====================
 
-def create_main_menu_markup(language):
+# Zapamiętane klawiatury menu: {(menu, język, wybrana opcja): InlineKeyboardMarkup}
+# Klawiatury zależą tylko od tłumaczeń i konfiguracji (CHAT_MODES, AVAILABLE_MODELS,
+# AVAILABLE_LANGUAGES), a obiekty python-telegram-bot są niezmienne - można je współdzielić
+_markup_cache = {}
+
+def cached_markup(builder):
+    """Dekorator zapamiętujący klawiaturę menu dla pary (język, wybrana opcja)"""
+    @functools.wraps(builder)
+    def wrapper(language, selected=None):
+        key = (builder.__name__, language, selected)
+        markup = _markup_cache.get(key)
+        if markup is None:
+            markup = builder(language, selected)
+            _markup_cache[key] = markup
+        return markup
+    return wrapper
+
+@on_catalog_compiled
+def invalidate_menu_markups():
+    """Usuwa zapamiętane klawiatury menu (po zmianie konfiguracji lub tłumaczeń)"""
+    _markup_cache.clear()
+
+# Układ głównego menu: wiersze par (klucz tłumaczenia, callback_data)
+MAIN_MENU_LAYOUT = (
+    (("menu_chat_mode", "menu_section_chat_modes"), ("image_generate", "menu_image_generate")),
+    (("menu_credits", "menu_section_credits"), ("menu_dialog_history", "menu_section_history")),
+    (("menu_settings", "menu_section_settings"), ("menu_help", "menu_help")),
+)
+
+@cached_markup
+def create_main_menu_markup(language, selected=None):
     """Tworzy klawiaturę dla głównego menu"""
     keyboard = [
-        [
-            InlineKeyboardButton(get_text("menu_chat_mode", language), callback_data="menu_section_chat_modes"),
-            InlineKeyboardButton(get_text("image_generate", language), callback_data="menu_image_generate")
-        ],
-        [
-            InlineKeyboardButton(get_text("menu_credits", language), callback_data="menu_section_credits"),
-            InlineKeyboardButton(get_text("menu_dialog_history", language), callback_data="menu_section_history")
-        ],
-        [
-            InlineKeyboardButton(get_text("menu_settings", language), callback_data="menu_section_settings"),
-            InlineKeyboardButton(get_text("menu_help", language), callback_data="menu_help")
-        ]
+        [InlineKeyboardButton(text, callback_data=callback_data) for text, callback_data in row]
+        for row in get_keyboard_labels(MAIN_MENU_LAYOUT, language)
     ]
     
     return InlineKeyboardMarkup(keyboard)
 
-def create_chat_modes_markup(language):
+@cached_markup
+def create_chat_modes_markup(language, selected=None):
     """Tworzy klawiaturę dla menu trybów czatu"""
     keyboard = []
     for mode_id, mode_info in CHAT_MODES.items():
@@ -162,7 +146,8 @@ def create_chat_modes_markup(language):
     
     return InlineKeyboardMarkup(keyboard)
 
-def create_credits_menu_markup(language):
+@cached_markup
+def create_credits_menu_markup(language, selected=None):
     """Tworzy klawiaturę dla menu kredytów"""
     keyboard = [
         [InlineKeyboardButton(get_text("check_balance", language), callback_data="menu_credits_check")],
@@ -171,7 +156,8 @@ def create_credits_menu_markup(language):
     ]
     return InlineKeyboardMarkup(keyboard)
 
-def create_settings_menu_markup(language):
+@cached_markup
+def create_settings_menu_markup(language, selected=None):
     """Tworzy klawiaturę dla menu ustawień"""
     keyboard = [
         [InlineKeyboardButton(get_text("settings_model", language), callback_data="settings_model")],
@@ -182,7 +168,8 @@ def create_settings_menu_markup(language):
     ]
     return InlineKeyboardMarkup(keyboard)
 
-def create_history_menu_markup(language):
+@cached_markup
+def create_history_menu_markup(language, selected=None):
     """Tworzy klawiaturę dla menu historii"""
     keyboard = [
         [InlineKeyboardButton(get_text("new_chat", language), callback_data="history_new")],
@@ -192,15 +179,18 @@ def create_history_menu_markup(language):
     ]
     return InlineKeyboardMarkup(keyboard)
 
-def create_model_selection_markup(language):
-    """Tworzy klawiaturę dla wyboru modelu AI"""
+@cached_markup
+def create_model_selection_markup(language, selected=None):
+    """Tworzy klawiaturę dla wyboru modelu AI (selected - ID aktualnego modelu)"""
     keyboard = []
     for model_id, model_name in AVAILABLE_MODELS.items():
         # Dodaj informację o koszcie kredytów
         credit_cost = CREDIT_COSTS["message"].get(model_id, CREDIT_COSTS["message"]["default"])
+        # Oznacz aktualnie wybrany model
+        prefix = "✅ " if model_id == selected else ""
         keyboard.append([
             InlineKeyboardButton(
-                text=f"{model_name} ({credit_cost} {get_text('credits_per_message', language)})", 
+                text=f"{prefix}{model_name} ({credit_cost} {get_text('credits_per_message', language)})", 
                 callback_data=f"model_{model_id}"
             )
         ])
@@ -212,13 +202,16 @@ def create_model_selection_markup(language):
     
     return InlineKeyboardMarkup(keyboard)
 
-def create_language_selection_markup(language):
-    """Tworzy klawiaturę dla wyboru języka"""
+@cached_markup
+def create_language_selection_markup(language, selected=None):
+    """Tworzy klawiaturę dla wyboru języka (selected - kod aktualnego języka)"""
     keyboard = []
     for lang_code, lang_name in AVAILABLE_LANGUAGES.items():
+        # Oznacz aktualnie wybrany język
+        prefix = "✅ " if lang_code == selected else ""
         keyboard.append([
             InlineKeyboardButton(
-                lang_name, 
+                f"{prefix}{lang_name}", 
                 callback_data=f"start_lang_{lang_code}"
             )
         ])
@@ -309,7 +302,7 @@ async def handle_credits_section(update, context):
     user_id = query.from_user.id
     language = get_user_language(context, user_id)
     
-    message_text = f"{get_text('credits_status', language, credits=get_user_credits(user_id))}\n\n{get_text('credit_options', language)}"
+    message_text = f"{get_text('credits_status', language, credits=get_cached_user_credits(user_id))}\n\n{get_text('credit_options', language)}"
     reply_markup = create_credits_menu_markup(language)
     
     result = await update_message(
@@ -454,7 +447,7 @@ async def handle_model_selection(update, context):
     user_id = query.from_user.id
     language = get_user_language(context, user_id)
     
-    reply_markup = create_model_selection_markup(language)
+    reply_markup = create_model_selection_markup(language, get_user_current_model(context, user_id))
     result = await update_message(
         query,
         get_text("settings_choose_model", language),
@@ -470,7 +463,7 @@ async def handle_language_selection(update, context):
     user_id = query.from_user.id
     language = get_user_language(context, user_id)
     
-    reply_markup = create_language_selection_markup(language)
+    reply_markup = create_language_selection_markup(language, language)
     result = await update_message(
         query,
         get_text("settings_choose_language", language),
@@ -526,8 +519,8 @@ async def handle_history_view(update, context):
         )
         return True
     
-    # Pobierz historię konwersacji
-    history = get_conversation_history(conversation['id'])
+    # Pobierz ostatnie 10 wiadomości
+    history = get_conversation_history(conversation['id'], limit=10)
     
     if not history:
         # Informacja przez notyfikację
@@ -549,7 +542,7 @@ async def handle_history_view(update, context):
     # Przygotuj tekst z historią
     message_text = f"*{get_text('history_title', language)}*\n\n"
     
-    for i, msg in enumerate(history[-10:]):  # Ostatnie 10 wiadomości
+    for i, msg in enumerate(history):
         sender = get_text("history_user", language) if msg['is_from_user'] else get_text("history_bot", language)
         
         # Skróć treść wiadomości, jeśli jest zbyt długa
@@ -687,22 +680,7 @@ async def handle_onboarding_callback(update: Update, context: ContextTypes.DEFAU
         welcome_text = welcome_text.replace("*", "").replace("_", "").replace("`", "").replace("[", "").replace("]", "")
         
         # Utwórz klawiaturę menu
-        keyboard = [
-            [
-                InlineKeyboardButton(get_text("menu_chat_mode", language), callback_data="menu_section_chat_modes"),
-                InlineKeyboardButton(get_text("image_generate", language), callback_data="menu_image_generate")
-            ],
-            [
-                InlineKeyboardButton(get_text("menu_credits", language), callback_data="menu_section_credits"),
-                InlineKeyboardButton(get_text("menu_dialog_history", language), callback_data="menu_section_history")
-            ],
-            [
-                InlineKeyboardButton(get_text("menu_settings", language), callback_data="menu_section_settings"),
-                InlineKeyboardButton(get_text("menu_help", language), callback_data="menu_help")
-            ]
-        ]
-        
-        reply_markup = InlineKeyboardMarkup(keyboard)
+        reply_markup = create_main_menu_markup(language)
         
         try:
             # Próba wysłania zwykłej wiadomości tekstowej zamiast zdjęcia
@@ -857,131 +835,97 @@ async def update_menu(update: Update, context: ContextTypes.DEFAULT_TYPE, menu_s
     # Zapisz nowy stan menu
     store_menu_state(context, user_id, menu_state)
 
-async def handle_menu_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """
-    Obsługuje wszystkie callbacki związane z menu
-    
-    Returns:
-        bool: True jeśli callback został obsłużony, False w przeciwnym razie
-    """
+async def handle_credits_buy_section(update, context):
+    """Obsługuje wyświetlanie pakietów kredytów do zakupu"""
     query = update.callback_query
+    user_id = query.from_user.id
+    language = get_user_language(context, user_id)
     
-    # Sekcje menu
-    if query.data == "menu_section_chat_modes":
-        return await handle_chat_modes_section(update, context)
-    elif query.data == "menu_section_credits":
-        return await handle_credits_section(update, context)
-    elif query.data == "menu_section_history":
-        return await handle_history_section(update, context)
-    elif query.data == "menu_section_settings":
-        return await handle_settings_section(update, context)
-    elif query.data == "menu_help":
-        return await handle_help_section(update, context)
-    elif query.data == "menu_image_generate":
-        return await handle_image_section(update, context)
-    elif query.data == "menu_back_main":
-        return await handle_back_to_main(update, context)
-    
-    # Obsługa kredytów bezpośrednio z menu
-    elif query.data == "menu_credits_buy" or query.data == "credits_buy":
-        user_id = query.from_user.id
-        language = get_user_language(context, user_id)
-        
-        # Pobierz pakiety kredytów
-        from database.credits_client import get_credit_packages
-        packages = get_credit_packages()
-        
-        packages_text = ""
-        for pkg in packages:
-            packages_text += f"*{pkg['id']}.* {pkg['name']} - *{pkg['credits']}* {get_text('credits', language)} - *{pkg['price']} PLN*\n"
-        
-        # Utwórz klawiaturę z pakietami
-        keyboard = []
-        for pkg in packages:
-            keyboard.append([
-                InlineKeyboardButton(
-                    f"{pkg['name']} - {pkg['credits']} {get_text('credits', language)} ({pkg['price']} PLN)", 
-                    callback_data=f"buy_package_{pkg['id']}"
-                )
-            ])
-        
-        # Dodaj przycisk powrotu
-        keyboard.append([
-            InlineKeyboardButton(get_text("back", language), callback_data="menu_section_credits")
-        ])
-        
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        
-        # Tekst informacyjny o zakupie kredytów
-        message = get_text("buy_credits", language, packages=packages_text)
-        
-        await update_message(
-            query,
-            message,
-            reply_markup,
-            parse_mode=ParseMode.MARKDOWN
-        )
-        return True
+    # Pobierz pakiety kredytów
+    packages = get_credit_packages()
     
-    elif query.data == "menu_credits_buy" or query.data == "credits_buy":
-        user_id = query.from_user.id
-        language = get_user_language(context, user_id)
-        
-        # Pobierz pakiety kredytów
-        packages = get_credit_packages()
-        
-        packages_text = ""
-        for pkg in packages:
-            packages_text += f"*{pkg['id']}.* {pkg['name']} - *{pkg['credits']}* {get_text('credits', language)} - *{pkg['price']} PLN*\n"
-        
-        # Utwórz klawiaturę z pakietami
-        keyboard = []
-        for pkg in packages:
-            keyboard.append([
-                InlineKeyboardButton(
-                    f"{pkg['name']} - {pkg['credits']} {get_text('credits', language)} ({pkg['price']} PLN)", 
-                    callback_data=f"buy_package_{pkg['id']}"
-                )
-            ])
-        
-        # Dodaj przycisk dla gwiazdek Telegram
-        keyboard.append([
-            InlineKeyboardButton("⭐ " + get_text("buy_with_stars", language, default="Kup za gwiazdki Telegram"), 
-                                callback_data="show_stars_options")
-        ])
-        
-        # Dodaj przycisk powrotu
+    packages_text = ""
+    for pkg in packages:
+        packages_text += f"*{pkg['id']}.* {pkg['name']} - *{pkg['credits']}* {get_text('credits', language)} - *{pkg['price']} PLN*\n"
+    
+    # Utwórz klawiaturę z pakietami
+    keyboard = []
+    for pkg in packages:
         keyboard.append([
-            InlineKeyboardButton(get_text("back", language), callback_data="menu_section_credits")
+            InlineKeyboardButton(
+                f"{pkg['name']} - {pkg['credits']} {get_text('credits', language)} ({pkg['price']} PLN)", 
+                callback_data=f"buy_package_{pkg['id']}"
+            )
         ])
-        
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        
-        # Tekst informacyjny o zakupie kredytów
-        message = get_text("buy_credits", language, packages=packages_text)
-        
-        await update_message(
-            query,
-            message,
-            reply_markup,
-            parse_mode=ParseMode.MARKDOWN
-        )
-        return True
+    
+    # Dodaj przycisk dla gwiazdek Telegram
+    keyboard.append([
+        InlineKeyboardButton("⭐ " + get_text("buy_with_stars", language, default="Kup za gwiazdki Telegram"), 
+                            callback_data="show_stars_options")
+    ])
+    
+    # Dodaj przycisk powrotu
+    keyboard.append([
+        InlineKeyboardButton(get_text("back", language), callback_data="menu_section_credits")
+    ])
+    
+    reply_markup = InlineKeyboardMarkup(keyboard)
+    
+    # Tekst informacyjny o zakupie kredytów
+    message = get_text("buy_credits", language, packages=packages_text)
+    
+    return await update_message(
+        query,
+        message,
+        reply_markup,
+        parse_mode=ParseMode.MARKDOWN
+    )
+
+# Obsługa callbacków menu: {callback_data: funkcja obsługi}
+MENU_CALLBACKS = {
+    # Sekcje menu
+    "menu_section_chat_modes": handle_chat_modes_section,
+    "menu_section_credits": handle_credits_section,
+    "menu_section_history": handle_history_section,
+    "menu_section_settings": handle_settings_section,
+    "menu_help": handle_help_section,
+    "menu_image_generate": handle_image_section,
+    "menu_back_main": handle_back_to_main,
+    
+    # Zakup kredytów bezpośrednio z menu
+    "menu_credits_buy": handle_credits_buy_section,
+    "credits_buy": handle_credits_buy_section,
     
     # Ustawienia
-    elif query.data == "settings_model":
-        return await handle_model_selection(update, context)
-    elif query.data == "settings_language":
-        return await handle_language_selection(update, context)
-    elif query.data == "settings_name":
-        return await handle_name_settings(update, context)
+    "settings_model": handle_model_selection,
+    "settings_language": handle_language_selection,
+    "settings_name": handle_name_settings,
     
     # Historia
-    elif query.data == "history_view":
-        return await handle_history_view(update, context)
+    "history_view": handle_history_view,
+}
+
+def iter_menu_callback_data():
+    """Zwraca callback_data wszystkich przycisków klawiatur menu we wszystkich językach"""
+    builders = (
+        create_main_menu_markup, create_chat_modes_markup, create_credits_menu_markup,
+        create_settings_menu_markup, create_history_menu_markup,
+        create_model_selection_markup, create_language_selection_markup
+    )
+    for language in AVAILABLE_LANGUAGES:
+        yield from iter_callback_data(builder(language) for builder in builders)
+
+async def handle_menu_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """
+    Obsługuje wszystkie callbacki związane z menu
     
-    # Jeśli dotarliśmy tutaj, oznacza to, że callback nie został obsłużony
-    return False
+    Returns:
+        bool: True jeśli callback został obsłużony, False w przeciwnym razie
+    """
+    handler = MENU_CALLBACKS.get(update.callback_query.data)
+    if handler is None:
+        return False
+    return await handler(update, context)
 
 async def set_user_name(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """
@@ -1008,16 +952,13 @@ async def set_user_name(update: Update, context: ContextTypes.DEFAULT_TYPE):
     
     try:
         # Zaktualizuj nazwę użytkownika w bazie danych
-        from database.supabase_client import sqlite3, DB_PATH
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
-        
-        cursor.execute(
-            "UPDATE users SET first_name = ? WHERE id = ?", 
-            (new_name, user_id)
-        )
-        conn.commit()
-        conn.close()
+        with get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                "UPDATE users SET first_name = ? WHERE id = ?", 
+                (new_name, user_id)
+            )
+        invalidate_user_profile(user_id)
         
         # Zaktualizuj nazwę w kontekście, jeśli istnieje
         if 'user_data' not in context.chat_data:
@@ -3,7 +3,7 @@ from telegram.ext import ContextTypes
 from telegram.constants import ParseMode
 from config import CHAT_MODES
 from utils.translations import get_text
-from database.credits_client import get_user_credits
+from database.user_profile import get_cached_user_credits
 from handlers.menu_handler import get_user_language
 
 async def show_modes(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -12,7 +12,7 @@ async def show_modes(update: Update, context: ContextTypes.DEFAULT_TYPE):
     language = get_user_language(context, user_id)
     
     # Sprawdź, czy użytkownik ma kredyty
-    credits = get_user_credits(user_id)
+    credits = get_cached_user_credits(user_id)
     if credits <= 0:
         await update.message.reply_text(get_text("subscription_expired", language))
         return
@@ -7,6 +7,33 @@ from database.sqlite_client import create_note, get_user_notes, get_note_by_id,
 from utils.translations import get_text
 from handlers.menu_handler import get_user_language
 
+def _note_title(note):
+    """Zwraca tytuł notatki lub jej numer, gdy tytuł jest pusty"""
+    return note['title'] or f"Notatka #{note['id']}"
+
+def create_note_list_markup(notes):
+    """Tworzy klawiaturę z listą notatek i przyciskiem nowej notatki"""
+    keyboard = [
+        [InlineKeyboardButton(f"📄 {_note_title(note)}", callback_data=f"note_view_{note['id']}")]
+        for note in notes
+    ]
+    keyboard.append([InlineKeyboardButton("➕ Utwórz nową notatkę", callback_data="new_note")])
+    return InlineKeyboardMarkup(keyboard)
+
+def create_note_view_markup(note_id):
+    """Tworzy klawiaturę wyświetlanej notatki (usunięcie, powrót do listy)"""
+    return InlineKeyboardMarkup([[
+        InlineKeyboardButton("🗑️ Usuń notatkę", callback_data=f"note_delete_{note_id}"),
+        InlineKeyboardButton("🔙 Powrót", callback_data="note_list")
+    ]])
+
+def create_note_delete_markup(note_id):
+    """Tworzy klawiaturę potwierdzenia usunięcia notatki"""
+    return InlineKeyboardMarkup([[
+        InlineKeyboardButton("✅ Tak, usuń", callback_data=f"note_confirm_delete_{note_id}"),
+        InlineKeyboardButton("❌ Nie, anuluj", callback_data=f"note_view_{note_id}")
+    ]])
+
 async def note_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """
     Tworzy nową notatkę lub wyświetla listę istniejących notatek
@@ -81,27 +108,13 @@ async def show_notes_list(update: Update, context: ContextTypes.DEFAULT_TYPE):
         )
         return
     
-    # Utwórz przyciski dla każdej notatki
-    keyboard = []
     message_text = "📝 *Twoje notatki*\n\n"
     
     for i, note in enumerate(notes):
-        title = note['title'] or f"Notatka #{note['id']}"
-        message_text += f"{i+1}. {title}\n"
-        
-        keyboard.append([
-            InlineKeyboardButton(
-                f"📄 {title}", 
-                callback_data=f"note_view_{note['id']}"
-            )
-        ])
+        message_text += f"{i+1}. {_note_title(note)}\n"
     
-    # Dodaj przycisk do tworzenia nowej notatki
-    keyboard.append([
-        InlineKeyboardButton("➕ Utwórz nową notatkę", callback_data="new_note")
-    ])
-    
-    reply_markup = InlineKeyboardMarkup(keyboard)
+    # Przyciski notatek i tworzenia nowej notatki
+    reply_markup = create_note_list_markup(notes)
     
     await update.message.reply_text(
         message_text,
@@ -141,14 +154,7 @@ async def handle_note_callback(update: Update, context: ContextTypes.DEFAULT_TYP
             return
         
         # Utwórz przyciski akcji dla notatki
-        keyboard = [
-            [
-                InlineKeyboardButton("🗑️ Usuń notatkę", callback_data=f"note_delete_{note['id']}"),
-                InlineKeyboardButton("🔙 Powrót", callback_data="note_list")
-            ]
-        ]
-        
-        reply_markup = InlineKeyboardMarkup(keyboard)
+        reply_markup = create_note_view_markup(note['id'])
         
         # Formatuj datę utworzenia
         created_at = datetime.datetime.fromisoformat(note['created_at'].replace('Z', '+00:00'))
@@ -176,14 +182,7 @@ async def handle_note_callback(update: Update, context: ContextTypes.DEFAULT_TYP
             return
         
         # Utwórz przyciski potwierdzenia usunięcia
-        keyboard = [
-            [
-                InlineKeyboardButton("✅ Tak, usuń", callback_data=f"note_confirm_delete_{note['id']}"),
-                InlineKeyboardButton("❌ Nie, anuluj", callback_data=f"note_view_{note['id']}")
-            ]
-        ]
-        
-        reply_markup = InlineKeyboardMarkup(keyboard)
+        reply_markup = create_note_delete_markup(note['id'])
         
         await query.edit_message_text(
             f"Czy na pewno chcesz usunąć notatkę *{note['title']}*?",
@@ -235,27 +234,13 @@ async def show_notes_list_inline(update: Update, context: ContextTypes.DEFAULT_T
         )
         return
     
-    # Utwórz przyciski dla każdej notatki
-    keyboard = []
     message_text = "📝 *Twoje notatki*\n\n"
     
     for i, note in enumerate(notes):
-        title = note['title'] or f"Notatka #{note['id']}"
-        message_text += f"{i+1}. {title}\n"
-        
-        keyboard.append([
-            InlineKeyboardButton(
-                f"📄 {title}", 
-                callback_data=f"note_view_{note['id']}"
-            )
-        ])
-    
-    # Dodaj przycisk do tworzenia nowej notatki
-    keyboard.append([
-        InlineKeyboardButton("➕ Utwórz nową notatkę", callback_data="new_note")
-    ])
+        message_text += f"{i+1}. {_note_title(note)}\n"
     
-    reply_markup = InlineKeyboardMarkup(keyboard)
+    # Przyciski notatek i tworzenia nowej notatki
+    reply_markup = create_note_list_markup(notes)
     
     await query.edit_message_text(
         message_text,
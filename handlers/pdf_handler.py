@@ -1,24 +1,32 @@
+import io
+import os
+import time
+import asyncio
 from telegram import Update
 from telegram.ext import ContextTypes
 from telegram.constants import ParseMode, ChatAction
+from config import CREDIT_COSTS
 from utils.translations import get_text
-from utils.pdf_translator import translate_pdf_first_paragraph
-from database.credits_client import check_user_credits, deduct_user_credits, get_user_credits
+from utils.pdf_translator import translate_pdf_document, count_pdf_pages
+from database.async_storage import (
+    reserve_user_credits_async, commit_user_credits_async,
+    release_user_credits_async, get_user_credits_async
+)
 from handlers.menu_handler import get_user_language
 
+# Maksymalna liczba stron tłumaczonego dokumentu
+MAX_PDF_TRANSLATION_PAGES = 100
+
+# Minimalny odstęp (w sekundach) między aktualizacjami komunikatu o postępie
+PROGRESS_UPDATE_INTERVAL = 3
+
 async def handle_pdf_translation(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """
-    Obsługuje tłumaczenie pierwszego akapitu z pliku PDF
+    Obsługuje tłumaczenie całego pliku PDF (wynik wysyłany jako dokument tekstowy)
     """
     user_id = update.effective_user.id
     language = get_user_language(context, user_id)
     
-    # Sprawdź, czy użytkownik ma wystarczającą liczbę kredytów
-    credit_cost = 8  # Ustalamy koszt operacji tłumaczenia PDF na 8 kredytów
-    if not check_user_credits(user_id, credit_cost):
-        await update.message.reply_text(get_text("subscription_expired", language))
-        return
-    
     # Sprawdź, czy wiadomość zawiera plik PDF
     if not update.message.document or not update.message.document.file_name.lower().endswith('.pdf'):
         await update.message.reply_text(get_text("not_pdf_file", language, default="Plik nie jest w formacie PDF."))
@@ -33,39 +41,99 @@ async def handle_pdf_translation(update: Update, context: ContextTypes.DEFAULT_T
         return
     
     # Wyślij informację o rozpoczęciu tłumaczenia
-    status_message = await update.message.reply_text(get_text("translating_pdf", language))
+    status_message = await update.message.reply_text(get_text("translating_pdf_document", language))
     
     # Wyślij informację o aktywności bota
     await update.message.chat.send_action(action=ChatAction.TYPING)
     
+    await translate_pdf_file(context, user_id, language, document.file_id, file_name, status_message, update.message)
+
+async def translate_pdf_file(context, user_id, language, file_id, file_name, status_message, reply_to):
+    """
+    Pobiera plik PDF, rezerwuje kredyty według liczby stron i tłumaczy cały dokument
+    
+    Kredyty są pobierane dopiero po przetłumaczeniu wszystkich fragmentów. Po nieudanym
+    tłumaczeniu ponowne przesłanie tego samego pliku tłumaczy tylko brakujące fragmenty.
+    
+    Args:
+        context: Kontekst aplikacji
+        user_id (int): ID użytkownika
+        language (str): Język użytkownika
+        file_id (str): Identyfikator pliku w Telegram
+        file_name (str): Nazwa pliku (None - nazwa pliku na serwerze Telegram)
+        status_message: Wiadomość, w której pokazywany jest postęp tłumaczenia
+        reply_to: Wiadomość, na którą wysyłane jest tłumaczenie
+    """
     # Pobierz plik
-    file = await context.bot.get_file(document.file_id)
+    file = await context.bot.get_file(file_id)
     file_bytes = await file.download_as_bytearray()
+    file_name = file_name or os.path.basename(file.file_path or "") or "document.pdf"
     
-    # Przetłumacz pierwszy akapit
-    result = await translate_pdf_first_paragraph(file_bytes)
+    # Koszt zależy od liczby stron dokumentu
+    try:
+        pages = await asyncio.to_thread(count_pdf_pages, file_bytes)
+    except Exception as e:
+        await status_message.edit_text(f"{get_text('pdf_translation_error', language)}\n\n{str(e)}")
+        return
+    
+    if pages > MAX_PDF_TRANSLATION_PAGES:
+        await status_message.edit_text(
+            get_text("pdf_too_many_pages", language, pages=pages, max_pages=MAX_PDF_TRANSLATION_PAGES)
+        )
+        return
+    
+    credit_cost = max(CREDIT_COSTS["pdf_translation_min"], pages * CREDIT_COSTS["pdf_translation_page"])
+    hold_id = await reserve_user_credits_async(user_id, credit_cost, f"Tłumaczenie pliku PDF: {file_name}", "document")
+    if hold_id is None:
+        await status_message.edit_text(get_text("subscription_expired", language))
+        return
+    
+    last_update = 0
+    
+    async def report_progress(done, total):
+        nonlocal last_update
+        now = time.monotonic()
+        if now - last_update < PROGRESS_UPDATE_INTERVAL:
+            return
+        last_update = now
+        await status_message.edit_text(
+            get_text("pdf_translation_progress", language, done=done, total=total if total is not None else "…")
+        )
+    
+    # Przetłumacz cały dokument
+    try:
+        result = await translate_pdf_document(
+            file_bytes, user_id=user_id, progress_callback=report_progress, resume_key=file.file_unique_id
+        )
+    except Exception:
+        await release_user_credits_async(hold_id)
+        raise
+    
+    if not result["success"]:
+        await release_user_credits_async(hold_id)
+        if result["chunks"] and result["failed_chunks"] < result["chunks"]:
+            response = get_text("pdf_translation_partial", language, failed=result["failed_chunks"], total=result["chunks"])
+        else:
+            response = f"{get_text('pdf_translation_error', language)}\n\n{result['error']}"
+        await status_message.edit_text(response)
+        return
     
-    # Odejmij kredyty
-    deduct_user_credits(user_id, credit_cost, f"Tłumaczenie pliku PDF: {file_name}")
+    # Zatwierdź pobranie kredytów
+    await commit_user_credits_async(hold_id)
     
-    # Przygotuj odpowiedź
-    if result["success"]:
-        response = f"*{get_text('pdf_translation_result', language)}*\n\n"
-        response += f"*{get_text('original_text', language)}:*\n{result['original_text']}\n\n"
-        response += f"*{get_text('translated_text', language)}:*\n{result['translated_text']}"
-    else:
-        response = f"*{get_text('pdf_translation_error', language)}*\n\n{result['error']}"
+    # Wyślij tłumaczenie jako dokument tekstowy
+    output = io.BytesIO(result["translated_text"].encode('utf-8'))
+    output_name = f"{os.path.splitext(file_name)[0]}_en.txt"
+    await reply_to.reply_document(document=output, filename=output_name)
     
-    # Wyślij wynik tłumaczenia
     await status_message.edit_text(
-        text=response,
-        parse_mode=ParseMode.MARKDOWN
+        get_text("pdf_translation_done", language, file_name=file_name, chunks=result["chunks"])
     )
     
     # Sprawdź aktualny stan kredytów
-    credits = get_user_credits(user_id)
+    credits = await get_user_credits_async(user_id)
     if credits < 5:
-        await update.message.reply_text(
+        await reply_to.reply_text(
             f"*{get_text('low_credits_warning', language)}* {get_text('low_credits_message', language, credits=credits)}",
             parse_mode=ParseMode.MARKDOWN
         )
\ No newline at end of file
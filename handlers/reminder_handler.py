@@ -5,9 +5,12 @@ from telegram.constants import ParseMode
 import datetime
 import pytz
 import re
-from database.sqlite_client import create_reminder, get_user_pending_reminders, complete_reminder, get_due_reminders
+from database.sqlite_client import create_reminder, get_user_pending_reminders, complete_reminder
+from database.async_storage import run_db
 from utils.translations import get_text
+from utils.reminder_scheduler import reminder_scheduler
 from handlers.menu_handler import get_user_language
+from utils.callback_router import iter_callback_data
 
 # Wyrażenia regularne do rozpoznawania wzorców czasowych
 TIME_PATTERNS = [
@@ -22,6 +25,24 @@ TIME_PATTERNS = [
      ) - datetime.datetime.now())
 ]
 
+def create_reminder_list_markup(listed):
+    """
+    Tworzy klawiaturę listy przypomnień
+    
+    Args:
+        listed: lista par (numer na liście, id przypomnienia)
+    """
+    keyboard = [
+        [InlineKeyboardButton(f"✅ Oznacz #{number} jako wykonane", callback_data=f"reminder_complete_{reminder_id}")]
+        for number, reminder_id in listed
+    ]
+    keyboard.append([InlineKeyboardButton("➕ Utwórz nowe przypomnienie", callback_data="new_reminder")])
+    return InlineKeyboardMarkup(keyboard)
+
+def iter_reminder_callback_data():
+    """Zwraca callback_data przycisków klawiatur przypomnień (z przykładowym przypomnieniem)"""
+    return iter_callback_data([create_reminder_list_markup([(1, 1)])])
+
 async def remind_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """
     Tworzy nowe przypomnienie
@@ -105,7 +126,7 @@ async def remind_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     remind_at = now + remind_delta
     
     # Utwórz przypomnienie
-    reminder = create_reminder(user_id, content, remind_at)
+    reminder = await run_db(create_reminder, user_id, content, remind_at)
     
     if not reminder:
         await update.message.reply_text(
@@ -114,12 +135,8 @@ async def remind_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         )
         return
     
-    # Zaplanuj przypomnienie w kontekście bota
-    context.job_queue.run_once(
-        send_reminder,
-        remind_delta.total_seconds(),
-        data={'user_id': user_id, 'reminder_id': reminder['id'], 'content': content}
-    )
+    # Zaplanuj przypomnienie (zapisane w bazie - przetrwa restart bota)
+    reminder_scheduler.schedule(remind_at)
     
     # Formatuj czas przypomnienia
     formatted_time = remind_at.astimezone(pytz.timezone('Europe/Warsaw')).strftime("%d.%m.%Y %H:%M")
@@ -141,7 +158,7 @@ async def reminders_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     language = get_user_language(context, user_id)
     
     # Pobierz listę przypomnień użytkownika
-    reminders = get_user_pending_reminders(user_id)
+    reminders = await run_db(get_user_pending_reminders, user_id)
     
     if not reminders:
         await update.message.reply_text(
@@ -151,8 +168,8 @@ async def reminders_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         )
         return
     
-    # Utwórz przyciski dla każdego przypomnienia
-    keyboard = []
+    # Numery i identyfikatory wyświetlonych przypomnień
+    listed = []
     message_text = "⏰ *Twoje przypomnienia*\n\n"
     
     for i, reminder in enumerate(reminders):
@@ -162,21 +179,11 @@ async def reminders_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
             
             message_text += f"{i+1}. {formatted_time} - {reminder['content']}\n"
             
-            keyboard.append([
-                InlineKeyboardButton(
-                    f"✅ Oznacz #{i+1} jako wykonane", 
-                    callback_data=f"reminder_complete_{reminder['id']}"
-                )
-            ])
+            listed.append((i + 1, reminder['id']))
         except Exception as e:
             print(f"Błąd przy formatowaniu przypomnienia: {e}")
     
-    # Dodaj przycisk do tworzenia nowego przypomnienia
-    keyboard.append([
-        InlineKeyboardButton("➕ Utwórz nowe przypomnienie", callback_data="new_reminder")
-    ])
-    
-    reply_markup = InlineKeyboardMarkup(keyboard)
+    reply_markup = create_reminder_list_markup(listed)
     
     await update.message.reply_text(
         message_text,
@@ -184,25 +191,6 @@ async def reminders_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         reply_markup=reply_markup
     )
 
-async def send_reminder(context: ContextTypes.DEFAULT_TYPE):
-    """
-    Wysyła przypomnienie do użytkownika
-    """
-    job = context.job
-    user_id = job.data['user_id']
-    reminder_id = job.data['reminder_id']
-    content = job.data['content']
-    
-    # Oznacz przypomnienie jako zakończone
-    complete_reminder(reminder_id)
-    
-    # Wyślij przypomnienie
-    await context.bot.send_message(
-        chat_id=user_id,
-        text=f"⏰ *PRZYPOMNIENIE*\n\n{content}",
-        parse_mode=ParseMode.MARKDOWN
-    )
-
 async def handle_reminder_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """
     Obsługuje przyciski związane z przypomnieniami
@@ -230,7 +218,7 @@ async def handle_reminder_callback(update: Update, context: ContextTypes.DEFAULT
         reminder_id = int(query.data.split("_")[2])
         
         # Oznacz przypomnienie jako zakończone
-        success = complete_reminder(reminder_id)
+        success = await run_db(complete_reminder, reminder_id, user_id)
         
         if success:
             await query.edit_message_text(
@@ -243,21 +231,3 @@ async def handle_reminder_callback(update: Update, context: ContextTypes.DEFAULT
                 parse_mode=ParseMode.MARKDOWN
             )
         return
-
-async def check_due_reminders(context: ContextTypes.DEFAULT_TYPE):
-    """
-    Sprawdza przypomnienia, dla których nadszedł czas i wysyła je do użytkowników
-    """
-    # Pobierz przypomnienia, dla których nadszedł czas
-    reminders = get_due_reminders()
-    
-    for reminder in reminders:
-        # Oznacz przypomnienie jako zakończone
-        complete_reminder(reminder['id'])
-        
-        # Wyślij przypomnienie
-        await context.bot.send_message(
-            chat_id=reminder['user_id'],
-            text=f"⏰ *PRZYPOMNIENIE*\n\n{reminder['content']}",
-            parse_mode=ParseMode.MARKDOWN
-        )
\ No newline at end of file
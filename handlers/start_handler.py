@@ -4,7 +4,7 @@ from telegram.constants import ParseMode
 from config import BOT_NAME, AVAILABLE_LANGUAGES
 from utils.translations import get_text
 from database.supabase_client import get_or_create_user, get_message_status
-from database.credits_client import get_user_credits
+from database.user_profile import get_user_language, get_cached_user_credits
 
 # Zabezpieczony import z awaryjnym fallbackiem
 try:
@@ -25,69 +25,6 @@ except ImportError:
             return True, referrer_id
         return False, None
 
-def get_user_language(context, user_id):
-    """
-    Pobiera język użytkownika z kontekstu lub bazy danych
-    
-    Args:
-        context: Kontekst bota
-        user_id: ID użytkownika
-        
-    Returns:
-        str: Kod języka (pl, en, ru)
-    """
-    # Sprawdź, czy język jest zapisany w kontekście
-    if 'user_data' in context.chat_data and user_id in context.chat_data['user_data'] and 'language' in context.chat_data['user_data'][user_id]:
-        return context.chat_data['user_data'][user_id]['language']
-    
-    # Jeśli nie, pobierz z bazy danych
-    try:
-        from database.supabase_client import sqlite3, DB_PATH
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
-        
-        cursor.execute("SELECT language FROM users WHERE id = ?", (user_id,))
-        result = cursor.fetchone()
-        conn.close()
-        
-        if result and result[0]:
-            # Zapisz w kontekście na przyszłość
-            if 'user_data' not in context.chat_data:
-                context.chat_data['user_data'] = {}
-            
-            if user_id not in context.chat_data['user_data']:
-                context.chat_data['user_data'][user_id] = {}
-            
-            context.chat_data['user_data'][user_id]['language'] = result[0]
-            return result[0]
-    except Exception as e:
-        print(f"Błąd pobierania języka z bazy: {e}")
-    
-    # Sprawdź language_code, jeśli nie znaleziono language
-        try:
-            conn = sqlite3.connect(DB_PATH)
-            cursor = conn.cursor()
-            
-            cursor.execute("SELECT language_code FROM users WHERE id = ?", (user_id,))
-            result = cursor.fetchone()
-            conn.close()
-            
-            if result and result[0]:
-                # Zapisz w kontekście na przyszłość
-                if 'user_data' not in context.chat_data:
-                    context.chat_data['user_data'] = {}
-                
-                if user_id not in context.chat_data['user_data']:
-                    context.chat_data['user_data'][user_id] = {}
-                
-                context.chat_data['user_data'][user_id]['language'] = result[0]
-                return result[0]
-        except Exception as e:
-            print(f"Błąd pobierania language_code z bazy: {e}")
-        
-        # Domyślny język, jeśli wszystkie metody zawiodły
-        return "pl"
-
 async def start_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """
     Obsługa komendy /start
@@ -197,22 +134,8 @@ async def handle_language_selection(update: Update, context: ContextTypes.DEFAUL
         welcome_text = get_text("welcome_message", language, bot_name=BOT_NAME)
         
         # Utwórz klawiaturę menu z przetłumaczonymi tekstami
-        keyboard = [
-            [
-                InlineKeyboardButton(get_text("menu_chat_mode", language), callback_data="menu_section_chat_modes"),
-                InlineKeyboardButton(get_text("image_generate", language), callback_data="menu_image_generate")
-            ],
-            [
-                InlineKeyboardButton(get_text("menu_credits", language), callback_data="menu_section_credits"),
-                InlineKeyboardButton(get_text("menu_dialog_history", language), callback_data="menu_section_history")
-            ],
-            [
-                InlineKeyboardButton(get_text("menu_settings", language), callback_data="menu_section_settings"),
-                InlineKeyboardButton(get_text("menu_help", language), callback_data="menu_help")
-            ]
-        ]
-        
-        reply_markup = InlineKeyboardMarkup(keyboard)
+        from handlers.menu_handler import create_main_menu_markup
+        reply_markup = create_main_menu_markup(language)
         
         # Aktualizuj wiadomość
         try:
@@ -266,7 +189,7 @@ async def show_welcome_message(update: Update, context: ContextTypes.DEFAULT_TYP
         context.chat_data['user_data'][user_id]['language'] = language
         
         # Pobierz stan kredytów
-        credits = get_user_credits(user_id)
+        credits = get_cached_user_credits(user_id)
         
         # Link do zdjęcia bannera
         banner_url = "https://i.imgur.com/YPubLDE.png"
@@ -275,22 +198,8 @@ async def show_welcome_message(update: Update, context: ContextTypes.DEFAULT_TYP
         welcome_text = get_text("welcome_message", language, bot_name=BOT_NAME)
         
         # Utwórz klawiaturę menu
-        keyboard = [
-            [
-                InlineKeyboardButton(get_text("menu_chat_mode", language), callback_data="menu_section_chat_modes"),
-                InlineKeyboardButton(get_text("image_generate", language), callback_data="menu_image_generate")
-            ],
-            [
-                InlineKeyboardButton(get_text("menu_credits", language), callback_data="menu_section_credits"),
-                InlineKeyboardButton(get_text("menu_dialog_history", language), callback_data="menu_section_history")
-            ],
-            [
-                InlineKeyboardButton(get_text("menu_settings", language), callback_data="menu_section_settings"),
-                InlineKeyboardButton(get_text("menu_help", language), callback_data="menu_help")
-            ]
-        ]
-        
-        reply_markup = InlineKeyboardMarkup(keyboard)
+        from handlers.menu_handler import create_main_menu_markup
+        reply_markup = create_main_menu_markup(language)
         
         # Wyślij zdjęcie z podpisem i menu
         message = await update.message.reply_photo(
@@ -8,6 +8,21 @@ from database.supabase_client import (
 )
 from utils.translations import get_text
 from handlers.menu_handler import get_user_language
+from utils.callback_router import iter_callback_data
+
+def create_theme_list_markup(themes):
+    """Tworzy klawiaturę z listą tematów, nowym tematem i rozmową bez tematu"""
+    keyboard = [
+        [InlineKeyboardButton(theme['theme_name'], callback_data=f"theme_{theme['id']}")]
+        for theme in themes
+    ]
+    keyboard.append([InlineKeyboardButton("➕ Utwórz nowy temat", callback_data="new_theme")])
+    keyboard.append([InlineKeyboardButton("🔄 Rozmowa bez tematu", callback_data="no_theme")])
+    return InlineKeyboardMarkup(keyboard)
+
+def iter_theme_callback_data():
+    """Zwraca callback_data przycisków klawiatur tematów (z przykładowym tematem)"""
+    return iter_callback_data([create_theme_list_markup([{'id': 1, 'theme_name': "Temat"}])])
 
 async def theme_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """
@@ -87,24 +102,8 @@ async def show_themes_list(update: Update, context: ContextTypes.DEFAULT_TYPE):
         )
         return
     
-    # Utwórz przyciski dla każdego tematu
-    keyboard = []
-    for theme in themes:
-        keyboard.append([
-            InlineKeyboardButton(theme['theme_name'], callback_data=f"theme_{theme['id']}")
-        ])
-    
-    # Dodaj przycisk do utworzenia nowego tematu
-    keyboard.append([
-        InlineKeyboardButton("➕ Utwórz nowy temat", callback_data="new_theme")
-    ])
-    
-    # Dodaj przycisk do rozmowy bez tematu
-    keyboard.append([
-        InlineKeyboardButton("🔄 Rozmowa bez tematu", callback_data="no_theme")
-    ])
-    
-    reply_markup = InlineKeyboardMarkup(keyboard)
+    # Przyciski tematów, nowego tematu i rozmowy bez tematu
+    reply_markup = create_theme_list_markup(themes)
     
     # Pobierz aktualny temat
     current_theme_id = None
@@ -3,7 +3,10 @@ from telegram.ext import ContextTypes
 from telegram.constants import ParseMode, ChatAction
 from utils.translations import get_text
 from utils.openai_client import analyze_image, analyze_document
-from database.credits_client import check_user_credits, deduct_user_credits, get_user_credits
+from utils.openai_resilience import OpenAIServiceError
+from database.async_storage import (
+    get_user_credits_async, reserve_user_credits_async, commit_user_credits_async, release_user_credits_async
+)
 from handlers.menu_handler import get_user_language
 import re
 
@@ -64,9 +67,10 @@ async def translate_photo(update: Update, context: ContextTypes.DEFAULT_TYPE, ph
     user_id = update.effective_user.id
     language = get_user_language(context, user_id)
     
-    # Sprawdź, czy użytkownik ma wystarczającą liczbę kredytów
+    # Zarezerwuj kredyty - zostaną pobrane dopiero po wykonaniu tłumaczenia
     credit_cost = 8  # Koszt tłumaczenia zdjęcia
-    if not check_user_credits(user_id, credit_cost):
+    hold_id = await reserve_user_credits_async(user_id, credit_cost, f"Tłumaczenie tekstu ze zdjęcia na język {target_lang}", "photo")
+    if hold_id is None:
         await update.message.reply_text(get_text("subscription_expired", language))
         return
     
@@ -75,18 +79,27 @@ async def translate_photo(update: Update, context: ContextTypes.DEFAULT_TYPE, ph
         get_text("translating_image", language, default="Tłumaczę tekst ze zdjęcia, proszę czekać...")
     )
     
-    # Wyślij informację o aktywności bota
-    await update.message.chat.send_action(action=ChatAction.TYPING)
-    
-    # Pobierz zdjęcie
-    file = await context.bot.get_file(photo.file_id)
-    file_bytes = await file.download_as_bytearray()
-    
-    # Tłumacz tekst ze zdjęcia w określonym kierunku
-    result = await analyze_image(file_bytes, f"photo_{photo.file_unique_id}.jpg", mode="translate", target_language=target_lang)
+    try:
+        # Wyślij informację o aktywności bota
+        await update.message.chat.send_action(action=ChatAction.TYPING)
+        
+        # Pobierz zdjęcie
+        file = await context.bot.get_file(photo.file_id)
+        file_bytes = await file.download_as_bytearray()
+        
+        # Tłumacz tekst ze zdjęcia w określonym kierunku
+        result = await analyze_image(file_bytes, f"photo_{photo.file_unique_id}.jpg", mode="translate", target_language=target_lang, user_id=user_id, raise_on_error=True, content_id=photo.file_unique_id)
+    except OpenAIServiceError:
+        # Nieudane tłumaczenie nie jest rozliczane
+        await release_user_credits_async(hold_id)
+        await message.edit_text(get_text("openai_unavailable", language))
+        return
+    except Exception:
+        await release_user_credits_async(hold_id)
+        raise
     
-    # Odejmij kredyty
-    deduct_user_credits(user_id, credit_cost, f"Tłumaczenie tekstu ze zdjęcia na język {target_lang}")
+    # Zatwierdź pobranie kredytów
+    await commit_user_credits_async(hold_id)
     
     # Wyślij tłumaczenie
     await message.edit_text(
@@ -95,7 +108,7 @@ async def translate_photo(update: Update, context: ContextTypes.DEFAULT_TYPE, ph
     )
     
     # Sprawdź aktualny stan kredytów
-    credits = get_user_credits(user_id)
+    credits = await get_user_credits_async(user_id)
     if credits < 5:
         await update.message.reply_text(
             f"{get_text('low_credits_warning', language)} {get_text('low_credits_message', language, credits=credits)}",
@@ -107,12 +120,7 @@ async def translate_document(update: Update, context: ContextTypes.DEFAULT_TYPE,
     user_id = update.effective_user.id
     language = get_user_language(context, user_id)
     
-    # Sprawdź, czy użytkownik ma wystarczającą liczbę kredytów
     credit_cost = 8  # Koszt tłumaczenia dokumentu
-    if not check_user_credits(user_id, credit_cost):
-        await update.message.reply_text(get_text("subscription_expired", language))
-        return
-    
     file_name = document.file_name
     
     # Sprawdź rozmiar pliku (limit 25MB)
@@ -120,23 +128,38 @@ async def translate_document(update: Update, context: ContextTypes.DEFAULT_TYPE,
         await update.message.reply_text(get_text("file_too_large", language))
         return
     
+    # Zarezerwuj kredyty - zostaną pobrane dopiero po wykonaniu tłumaczenia
+    hold_id = await reserve_user_credits_async(user_id, credit_cost, f"Tłumaczenie dokumentu na język {target_lang}: {file_name}", "document")
+    if hold_id is None:
+        await update.message.reply_text(get_text("subscription_expired", language))
+        return
+    
     # Wyślij informację o rozpoczęciu tłumaczenia
     message = await update.message.reply_text(
         get_text("translating_document", language, default="Tłumaczę dokument, proszę czekać...")
     )
     
-    # Wyślij informację o aktywności bota
-    await update.message.chat.send_action(action=ChatAction.TYPING)
-    
-    # Pobierz plik
-    file = await context.bot.get_file(document.file_id)
-    file_bytes = await file.download_as_bytearray()
-    
-    # Tłumacz dokument
-    result = await analyze_document(file_bytes, file_name, mode="translate", target_language=target_lang)
+    try:
+        # Wyślij informację o aktywności bota
+        await update.message.chat.send_action(action=ChatAction.TYPING)
+        
+        # Pobierz plik
+        file = await context.bot.get_file(document.file_id)
+        file_bytes = await file.download_as_bytearray()
+        
+        # Tłumacz dokument
+        result = await analyze_document(file_bytes, file_name, mode="translate", target_language=target_lang, user_id=user_id, raise_on_error=True, content_id=document.file_unique_id)
+    except OpenAIServiceError:
+        # Nieudane tłumaczenie nie jest rozliczane
+        await release_user_credits_async(hold_id)
+        await message.edit_text(get_text("openai_unavailable", language))
+        return
+    except Exception:
+        await release_user_credits_async(hold_id)
+        raise
     
-    # Odejmij kredyty
-    deduct_user_credits(user_id, credit_cost, f"Tłumaczenie dokumentu na język {target_lang}: {file_name}")
+    # Zatwierdź pobranie kredytów
+    await commit_user_credits_async(hold_id)
     
     # Wyślij tłumaczenie
     await message.edit_text(
@@ -145,7 +168,7 @@ async def translate_document(update: Update, context: ContextTypes.DEFAULT_TYPE,
     )
     
     # Sprawdź aktualny stan kredytów
-    credits = get_user_credits(user_id)
+    credits = await get_user_credits_async(user_id)
     if credits < 5:
         await update.message.reply_text(
             f"{get_text('low_credits_warning', language)} {get_text('low_credits_message', language, credits=credits)}",
@@ -159,9 +182,10 @@ async def translate_text(update: Update, context: ContextTypes.DEFAULT_TYPE, tex
     user_id = update.effective_user.id
     language = get_user_language(context, user_id)
     
-    # Sprawdź, czy użytkownik ma wystarczającą liczbę kredytów
+    # Zarezerwuj kredyty - zostaną pobrane dopiero po wykonaniu tłumaczenia
     credit_cost = 3  # Koszt tłumaczenia tekstu
-    if not check_user_credits(user_id, credit_cost):
+    hold_id = await reserve_user_credits_async(user_id, credit_cost, f"Translation to {target_lang}", "message")
+    if hold_id is None:
         await update.message.reply_text(get_text("subscription_expired", language))
         return
     
@@ -170,9 +194,6 @@ async def translate_text(update: Update, context: ContextTypes.DEFAULT_TYPE, tex
         get_text("translating_text", language, default="Translating text, please wait...")
     )
     
-    # Wyślij informację o aktywności bota
-    await update.message.chat.send_action(action=ChatAction.TYPING)
-    
     # Wykonaj tłumaczenie korzystając z API OpenAI
     from utils.openai_client import chat_completion
     
@@ -185,11 +206,23 @@ async def translate_text(update: Update, context: ContextTypes.DEFAULT_TYPE, tex
         {"role": "user", "content": text}
     ]
     
-    # Wykonaj tłumaczenie
-    translation = await chat_completion(messages, model="gpt-3.5-turbo")
+    try:
+        # Wyślij informację o aktywności bota
+        await update.message.chat.send_action(action=ChatAction.TYPING)
+        
+        # Wykonaj tłumaczenie
+        translation = await chat_completion(messages, model="gpt-3.5-turbo", raise_on_error=True, user_id=user_id)
+    except OpenAIServiceError:
+        # Nieudane tłumaczenie nie jest rozliczane
+        await release_user_credits_async(hold_id)
+        await message.edit_text(get_text("openai_unavailable", language))
+        return
+    except Exception:
+        await release_user_credits_async(hold_id)
+        raise
     
-    # Odejmij kredyty
-    deduct_user_credits(user_id, credit_cost, f"Translation to {target_lang}")
+    # Zatwierdź pobranie kredytów
+    await commit_user_credits_async(hold_id)
     
     # Wyślij tłumaczenie
     source_lang_name = get_language_name(language)
@@ -201,7 +234,7 @@ async def translate_text(update: Update, context: ContextTypes.DEFAULT_TYPE, tex
     )
     
     # Sprawdź aktualny stan kredytów
-    credits = get_user_credits(user_id)
+    credits = await get_user_credits_async(user_id)
     if credits < 5:
         await update.message.reply_text(
             f"{get_text('low_credits_warning', language)} {get_text('low_credits_message', language, credits=credits)}",
@@ -1,5 +1,10 @@
 import logging
 import os
+import time
+
+# Początek startu procesu (do pomiaru czasu do gotowości bota)
+STARTUP_STARTED_AT = time.perf_counter()
+
 import re
 import datetime
 import pytz
@@ -9,13 +14,15 @@ from handlers.help_handler import help_command, check_status
 from handlers.translate_handler import translate_command
 from telegram.ext import (
     Application, CommandHandler, MessageHandler, 
-    CallbackQueryHandler, ContextTypes, filters
+    CallbackQueryHandler, TypeHandler, ContextTypes, filters
 )
 from telegram.constants import ParseMode, ChatAction
 from config import (
     TELEGRAM_TOKEN, DEFAULT_MODEL, AVAILABLE_MODELS, 
     MAX_CONTEXT_MESSAGES, CHAT_MODES, BOT_NAME, CREDIT_COSTS,
-    AVAILABLE_LANGUAGES, ADMIN_USER_IDS
+    AVAILABLE_LANGUAGES, ADMIN_USER_IDS, BOT_UPDATE_MODE, WEBHOOK_URL,
+    WEBHOOK_LISTEN, WEBHOOK_PORT, WEBHOOK_PATH, WEBHOOK_SECRET_TOKEN,
+    HEALTH_PORT, CONCURRENT_UPDATES
 )
 
 # Import funkcji z modułu tłumaczeń
@@ -34,12 +41,24 @@ from database.credits_client import (
     check_user_credits
 )
 
+# Import asynchronicznej fasady bazy danych (zapytania poza pętlą zdarzeń)
+from database.async_storage import (
+    get_active_conversation_async, save_message_async,
+    get_conversation_history_async, get_conversation_summary_async, get_user_credits_async,
+    reserve_user_credits_async, commit_user_credits_async,
+    release_user_credits_async, shutdown_storage
+)
+
 # Import handlerów kredytów
 from handlers.credit_handler import (
+    iter_credit_callback_data,
     credits_command, buy_command, handle_credit_callback,
     credit_stats_command, credit_analytics_command
 )
 
+# Profil użytkownika wczytywany przed obsługą każdej aktualizacji
+from database.user_profile import preload_user_profile
+
 # Import handlerów kodu aktywacyjnego
 from handlers.code_handler import (
     code_command, admin_generate_code
@@ -47,7 +66,8 @@ from handlers.code_handler import (
 
 # Import handlerów menu
 from handlers.menu_handler import (
-    handle_menu_callback, set_user_name, get_user_language, store_menu_state
+    set_user_name, get_user_language, store_menu_state, create_main_menu_markup,
+    handle_back_to_main, iter_menu_callback_data, MENU_CALLBACKS
 )
 
 # Import handlera start
@@ -62,14 +82,27 @@ from handlers.image_handler import generate_image
 from handlers.mode_handler import handle_mode_selection, show_modes
 
 from utils.openai_client import (
-    chat_completion_stream, prepare_messages_from_history,
+    chat_completion_stream, prepare_context_from_history,
     generate_image_dall_e, analyze_document, analyze_image
 )
 
+from utils.openai_resilience import OpenAIServiceError
+from utils.conversation_summary import compact_conversation
+from utils.response_cache import (
+    is_cacheable, get_cache_key, get_cached_response, store_response, stream_cached_response
+)
+from utils.streaming_editor import StreamingEditor
+from utils.health_server import start_health_server, stop_health_server
+from utils.callback_router import callback_router, iter_callback_data
+
 # Import handlera eksportu
 from handlers.export_handler import export_conversation
-from handlers.theme_handler import theme_command, notheme_command, handle_theme_callback
-from utils.credit_analytics import generate_credit_usage_chart, generate_usage_breakdown_chart
+from handlers.theme_handler import theme_command, notheme_command, handle_theme_callback, iter_theme_callback_data
+from handlers.reminder_handler import (
+    remind_command, reminders_command, handle_reminder_callback, iter_reminder_callback_data
+)
+from utils.reminder_scheduler import reminder_scheduler
+from utils.credit_analytics import shutdown_chart_pool
 
 # Konfiguracja loggera
 logging.basicConfig(
@@ -78,6 +111,101 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# ==================== KLAWIATURY ====================
+
+def create_onboarding_markup(language, current_step, steps_count):
+    """Tworzy klawiaturę nawigacji onboardingu dla podanego kroku"""
+    row = []
+    
+    # Przycisk "Wstecz" jeśli nie jesteśmy na pierwszym kroku
+    if current_step > 0:
+        row.append(InlineKeyboardButton(get_text("onboarding_back", language), callback_data="onboarding_back"))
+    
+    # Przycisk "Dalej" lub "Zakończ" w zależności od kroku
+    if current_step < steps_count - 1:
+        row.append(InlineKeyboardButton(get_text("onboarding_next", language), callback_data="onboarding_next"))
+    else:
+        row.append(InlineKeyboardButton(get_text("onboarding_finish_button", language), callback_data="onboarding_finish"))
+    
+    return InlineKeyboardMarkup([row])
+
+def create_models_markup(language):
+    """Tworzy klawiaturę wyboru modelu AI z kosztem wiadomości"""
+    keyboard = []
+    for model_id, model_name in AVAILABLE_MODELS.items():
+        credit_cost = CREDIT_COSTS["message"].get(model_id, CREDIT_COSTS["message"]["default"])
+        keyboard.append([
+            InlineKeyboardButton(
+                text=f"{model_name} ({credit_cost} {get_text('credits_per_message', language)})", 
+                callback_data=f"model_{model_id}"
+            )
+        ])
+    return InlineKeyboardMarkup(keyboard)
+
+def create_low_credits_markup(language):
+    """Tworzy klawiaturę ostrzeżenia o niskim stanie kredytów"""
+    return InlineKeyboardMarkup([[
+        InlineKeyboardButton("🛒 " + get_text("buy_credits_btn", language, default="Kup kredyty"), callback_data="menu_credits_buy")
+    ]])
+
+def create_translate_pdf_markup(file_id, language):
+    """Tworzy przycisk tłumaczenia przeanalizowanego dokumentu PDF"""
+    return InlineKeyboardMarkup([[
+        InlineKeyboardButton(get_text("pdf_translate_button", language), callback_data=f"translate_pdf_{file_id}")
+    ]])
+
+def create_translate_photo_markup(file_id):
+    """Tworzy przycisk tłumaczenia tekstu z przeanalizowanego zdjęcia"""
+    return InlineKeyboardMarkup([[
+        InlineKeyboardButton("🔄 Przetłumacz tekst z tego zdjęcia", callback_data=f"translate_photo_{file_id}")
+    ]])
+
+def create_history_back_markup(language):
+    """Tworzy przycisk powrotu do sekcji historii"""
+    return InlineKeyboardMarkup([[InlineKeyboardButton(get_text("back", language), callback_data="menu_section_history")]])
+
+def create_history_delete_markup(language):
+    """Tworzy klawiaturę potwierdzenia usunięcia historii"""
+    return InlineKeyboardMarkup([[
+        InlineKeyboardButton(get_text("yes", language), callback_data="history_confirm_delete"),
+        InlineKeyboardButton(get_text("no", language), callback_data="menu_section_history")
+    ]])
+
+def create_credits_check_markup(language):
+    """Tworzy klawiaturę z opcjami kredytów"""
+    return InlineKeyboardMarkup([
+        [InlineKeyboardButton(get_text("buy_credits_btn", language), callback_data="credits_buy")],
+        [InlineKeyboardButton(get_text("credit_stats", language, default="Statystyki"), callback_data="credits_stats")],
+        [InlineKeyboardButton(get_text("back", language), callback_data="menu_section_credits")]
+    ])
+
+def iter_all_callback_data():
+    """
+    Zwraca callback_data przycisków wszystkich klawiatur inline bota
+    
+    Moduł notatek jest importowany przy pierwszym użyciu - jego przyciski sprawdza test źródeł handlerów.
+    
+    Yields:
+        str: callback_data przycisku
+    """
+    yield from iter_menu_callback_data()
+    yield from iter_theme_callback_data()
+    yield from iter_reminder_callback_data()
+    
+    for language in AVAILABLE_LANGUAGES:
+        yield from iter_credit_callback_data(language)
+        yield from iter_callback_data([
+            create_onboarding_markup(language, 0, 2),
+            create_onboarding_markup(language, 1, 2),
+            create_models_markup(language),
+            create_low_credits_markup(language),
+            create_translate_pdf_markup("file_id", language),
+            create_translate_photo_markup("file_id"),
+            create_history_back_markup(language),
+            create_history_delete_markup(language),
+            create_credits_check_markup(language)
+        ])
+
 # Funkcje onboardingu
 async def onboarding_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """
@@ -110,18 +238,8 @@ async def onboarding_command(update: Update, context: ContextTypes.DEFAULT_TYPE)
     # Przygotuj tekst dla aktualnego kroku
     text = get_text(f"onboarding_{step_name}", language, bot_name=BOT_NAME)
     
-    # Przygotuj klawiaturę nawigacyjną
-    keyboard = []
-    row = []
-    
     # Na pierwszym kroku tylko przycisk "Dalej"
-    row.append(InlineKeyboardButton(
-        get_text("onboarding_next", language), 
-        callback_data=f"onboarding_next"
-    ))
-    
-    keyboard.append(row)
-    reply_markup = InlineKeyboardMarkup(keyboard)
+    reply_markup = create_onboarding_markup(language, current_step, len(steps))
     
     # Wysyłamy zdjęcie z podpisem dla pierwszego kroku
     await update.message.reply_photo(
@@ -216,30 +334,7 @@ async def handle_onboarding_callback(update: Update, context: ContextTypes.DEFAU
     text = get_text(f"onboarding_{step_name}", language, bot_name=BOT_NAME)
     
     # Przygotuj klawiaturę nawigacyjną
-    keyboard = []
-    row = []
-    
-    # Przycisk "Wstecz" jeśli nie jesteśmy na pierwszym kroku
-    if current_step > 0:
-        row.append(InlineKeyboardButton(
-            get_text("onboarding_back", language),
-            callback_data="onboarding_back"
-        ))
-    
-    # Przycisk "Dalej" lub "Zakończ" w zależności od kroku
-    if current_step < len(steps) - 1:
-        row.append(InlineKeyboardButton(
-            get_text("onboarding_next", language),
-            callback_data="onboarding_next"
-        ))
-    else:
-        row.append(InlineKeyboardButton(
-            get_text("onboarding_finish_button", language),
-            callback_data="onboarding_finish"
-        ))
-    
-    keyboard.append(row)
-    reply_markup = InlineKeyboardMarkup(keyboard)
+    reply_markup = create_onboarding_markup(language, current_step, len(steps))
     
     # Pobierz URL obrazu dla aktualnego kroku
     image_url = get_onboarding_image_url(step_name)
@@ -303,22 +398,7 @@ async def restart_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         restart_message = get_text("restart_command", language)
         
         # Utwórz klawiaturę menu
-        keyboard = [
-            [
-                InlineKeyboardButton(get_text("menu_chat_mode", language), callback_data="menu_section_chat_modes"),
-                InlineKeyboardButton(get_text("image_generate", language), callback_data="menu_image_generate")
-            ],
-            [
-                InlineKeyboardButton(get_text("menu_credits", language), callback_data="menu_section_credits"),
-                InlineKeyboardButton(get_text("menu_dialog_history", language), callback_data="menu_section_history")
-            ],
-            [
-                InlineKeyboardButton(get_text("menu_settings", language), callback_data="menu_section_settings"),
-                InlineKeyboardButton(get_text("menu_help", language), callback_data="menu_help")
-            ]
-        ]
-        
-        reply_markup = InlineKeyboardMarkup(keyboard)
+        reply_markup = create_main_menu_markup(language)
         
         # Wyślij wiadomość z menu
         try:
@@ -368,7 +448,7 @@ async def check_status(update: Update, context: ContextTypes.DEFAULT_TYPE):
     language = get_user_language(context, user_id)
     
     # Pobierz status kredytów
-    credits = get_user_credits(user_id)
+    credits = await get_user_credits_async(user_id)
     
     # Pobranie aktualnego trybu czatu
     current_mode = get_text("no_mode", language)
@@ -424,19 +504,8 @@ async def show_models(update: Update, context: ContextTypes.DEFAULT_TYPE, edit_m
     user_id = update.effective_user.id if hasattr(update, 'effective_user') else callback_query.from_user.id
     language = get_user_language(context, user_id)
     
-    # Utwórz przyciski dla dostępnych modeli
-    keyboard = []
-    for model_id, model_name in AVAILABLE_MODELS.items():
-        # Dodaj informację o koszcie kredytów
-        credit_cost = CREDIT_COSTS["message"].get(model_id, CREDIT_COSTS["message"]["default"])
-        keyboard.append([
-            InlineKeyboardButton(
-                text=f"{model_name} ({credit_cost} {get_text('credits_per_message', language)})", 
-                callback_data=f"model_{model_id}"
-            )
-        ])
-    
-    reply_markup = InlineKeyboardMarkup(keyboard)
+    # Utwórz przyciski dla dostępnych modeli (z kosztem kredytów)
+    reply_markup = create_models_markup(language)
     
     if edit_message and callback_query:
         await callback_query.edit_message_text(
@@ -467,44 +536,6 @@ async def message_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
             current_mode = user_data['current_mode']
             credit_cost = CHAT_MODES[current_mode]["credit_cost"]
     
-    print(f"Tryb: {current_mode}, koszt kredytów: {credit_cost}")
-    
-    # Sprawdź, czy użytkownik ma wystarczającą liczbę kredytów
-    has_credits = check_user_credits(user_id, credit_cost)
-    print(f"Czy użytkownik ma wystarczająco kredytów: {has_credits}")
-    
-    if not has_credits:
-        await update.message.reply_text(get_text("subscription_expired", language))
-        return
-    
-    # Pobierz lub utwórz aktywną konwersację
-    try:
-        conversation = get_active_conversation(user_id)
-        conversation_id = conversation['id']
-        print(f"Aktywna konwersacja: {conversation_id}")
-    except Exception as e:
-        print(f"Błąd przy pobieraniu konwersacji: {e}")
-        await update.message.reply_text("Wystąpił błąd przy pobieraniu konwersacji. Spróbuj /newchat aby utworzyć nową.")
-        return
-    
-    # Zapisz wiadomość użytkownika do bazy danych
-    try:
-        save_message(conversation_id, user_id, user_message, is_from_user=True)
-        print("Wiadomość użytkownika zapisana w bazie")
-    except Exception as e:
-        print(f"Błąd przy zapisie wiadomości użytkownika: {e}")
-    
-    # Wyślij informację, że bot pisze
-    await update.message.chat.send_action(action=ChatAction.TYPING)
-    
-    # Pobierz historię konwersacji
-    try:
-        history = get_conversation_history(conversation_id, limit=MAX_CONTEXT_MESSAGES)
-        print(f"Pobrano historię konwersacji, liczba wiadomości: {len(history)}")
-    except Exception as e:
-        print(f"Błąd przy pobieraniu historii: {e}")
-        history = []
-    
     # Określ model do użycia - domyślny lub z trybu czatu
     model_to_use = CHAT_MODES[current_mode].get("model", DEFAULT_MODEL)
     
@@ -516,74 +547,139 @@ async def message_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
             # Aktualizuj koszt kredytów na podstawie modelu
             credit_cost = CREDIT_COSTS["message"].get(model_to_use, CREDIT_COSTS["message"]["default"])
     
-    print(f"Używany model: {model_to_use}")
-    
-    # Przygotuj system prompt z wybranego trybu
-    system_prompt = CHAT_MODES[current_mode]["prompt"]
+    print(f"Tryb: {current_mode}, model: {model_to_use}, koszt kredytów: {credit_cost}")
     
-    # Przygotuj wiadomości dla API OpenAI
-    messages = prepare_messages_from_history(history, user_message, system_prompt)
-    print(f"Przygotowano {len(messages)} wiadomości dla API")
+    # Zarezerwuj kredyty - zostaną pobrane dopiero po wygenerowaniu odpowiedzi
+    hold_id = await reserve_user_credits_async(user_id, credit_cost, f"Wiadomość ({model_to_use})", "message")
     
-    # Wyślij początkową pustą wiadomość, którą będziemy aktualizować
-    response_message = await update.message.reply_text(get_text("generating_response", language))
-    
-    # Zainicjuj pełną odpowiedź
-    full_response = ""
-    buffer = ""
-    last_update = datetime.datetime.now().timestamp()
+    if hold_id is None:
+        await update.message.reply_text(get_text("subscription_expired", language))
+        return
     
-    # Spróbuj wygenerować odpowiedź
+    # Rezerwacja jest zwalniana, jeśli obsługa wiadomości zakończy się przed zatwierdzeniem kredytów
+    committed = False
     try:
-        print("Rozpoczynam generowanie odpowiedzi strumieniowej...")
-        # Generuj odpowiedź strumieniowo
-        async for chunk in chat_completion_stream(messages, model=model_to_use):
-            full_response += chunk
-            buffer += chunk
-            
-            # Aktualizuj wiadomość co 1 sekundę lub gdy bufor jest wystarczająco duży
-            current_time = datetime.datetime.now().timestamp()
-            if current_time - last_update >= 1.0 or len(buffer) > 100:
-                try:
-                    # Dodaj migający kursor na końcu wiadomości
-                    await response_message.edit_text(full_response + "▌", parse_mode=ParseMode.MARKDOWN)
-                    buffer = ""
-                    last_update = current_time
-                except Exception as e:
-                    # Jeśli wystąpi błąd (np. wiadomość nie została zmieniona), kontynuuj
-                    print(f"Błąd przy aktualizacji wiadomości: {e}")
+        # Pobierz lub utwórz aktywną konwersację
+        try:
+            conversation = await get_active_conversation_async(user_id)
+            conversation_id = conversation['id']
+            print(f"Aktywna konwersacja: {conversation_id}")
+        except Exception as e:
+            print(f"Błąd przy pobieraniu konwersacji: {e}")
+            await update.message.reply_text("Wystąpił błąd przy pobieraniu konwersacji. Spróbuj /newchat aby utworzyć nową.")
+            return
+        
+        # Pobierz historię konwersacji - przed zapisem bieżącej wiadomości, która
+        # jest dołączana do kontekstu osobno
+        try:
+            history = await get_conversation_history_async(conversation_id, limit=MAX_CONTEXT_MESSAGES)
+            print(f"Pobrano historię konwersacji, liczba wiadomości: {len(history)}")
+        except Exception as e:
+            print(f"Błąd przy pobieraniu historii: {e}")
+            history = []
+        
+        # Zapisz wiadomość użytkownika do bazy danych
+        try:
+            await save_message_async(conversation_id, user_id, user_message, is_from_user=True)
+            print("Wiadomość użytkownika zapisana w bazie")
+        except Exception as e:
+            print(f"Błąd przy zapisie wiadomości użytkownika: {e}")
+        
+        # Wyślij informację, że bot pisze
+        await update.message.chat.send_action(action=ChatAction.TYPING)
         
-        print("Zakończono generowanie odpowiedzi")
+        # Pobierz podsumowanie wcześniejszej części konwersacji (jeśli istnieje)
+        summary = await get_conversation_summary_async(conversation_id)
         
-        # Aktualizuj wiadomość z pełną odpowiedzią bez kursora
+        # Przygotuj system prompt z wybranego trybu
+        system_prompt = CHAT_MODES[current_mode]["prompt"]
+        
+        # Przygotuj wiadomości dla API OpenAI
+        messages, context_tokens = prepare_context_from_history(history, user_message, system_prompt, model_to_use, summary)
+        print(f"Przygotowano {len(messages)} wiadomości dla API ({context_tokens} tokenów)")
+        
+        # Powtarzalne pytania na początku rozmowy mogą mieć gotową odpowiedź w pamięci podręcznej
+        cache_key = None
+        cached_response = None
+        if is_cacheable(current_mode, messages):
+            cache_key = get_cache_key(model_to_use, messages)
+            cached_response = await get_cached_response(cache_key)
+        
+        # Wyślij początkową pustą wiadomość, którą będziemy aktualizować
+        response_message = await update.message.reply_text(get_text("generating_response", language))
+        
+        # Zainicjuj pełną odpowiedź
+        full_response = ""
+        editor = StreamingEditor(response_message)
+        
+        # Spróbuj wygenerować odpowiedź
         try:
-            await response_message.edit_text(full_response, parse_mode=ParseMode.MARKDOWN)
+            print("Rozpoczynam generowanie odpowiedzi strumieniowej...")
+            if cached_response is not None:
+                print("Odpowiedź pochodzi z pamięci podręcznej")
+                stream = stream_cached_response(cached_response)
+            else:
+                stream = chat_completion_stream(messages, model=model_to_use, user_id=user_id)
+            
+            # Generuj odpowiedź strumieniowo - edytor scala zmiany i pilnuje limitów Telegram
+            async for chunk in stream:
+                full_response += chunk
+                editor.update(full_response)
+            
+            print("Zakończono generowanie odpowiedzi")
+            
+            # Aktualizuj wiadomość z pełną odpowiedzią bez kursora
+            await editor.finish(full_response)
+        except OpenAIServiceError as e:
+            # Nieudana odpowiedź nie jest zapisywana ani rozliczana
+            print(f"Błąd OpenAI podczas generowania odpowiedzi: {e}")
+            await editor.finish(get_text("openai_unavailable", language))
+            return
         except Exception as e:
-            # Jeśli wystąpi błąd formatowania Markdown, wyślij bez formatowania
-            print(f"Błąd formatowania Markdown: {e}")
-            await response_message.edit_text(full_response)
+            print(f"Wystąpił błąd podczas generowania odpowiedzi: {e}")
+            # Komunikat przez edytor - oczekująca edycja fragmentu odpowiedzi nie może go nadpisać
+            await editor.finish(f"Wystąpił błąd podczas generowania odpowiedzi: {str(e)}")
+            return
         
-        # Zapisz odpowiedź do bazy danych
-        save_message(conversation_id, user_id, full_response, is_from_user=False, model_used=model_to_use)
+        # Model, który faktycznie odpowiedział - po awarii wybranego modelu może to być model zastępczy
+        answered_model = model_to_use if cached_response is not None else stream.model
         
-        # Odejmij kredyty
-        deduct_user_credits(user_id, credit_cost, f"Wiadomość ({model_to_use})")
+        # Odpowiedź dotarła do użytkownika - zatwierdź pobranie zarezerwowanych kredytów
+        if answered_model == model_to_use:
+            committed = await commit_user_credits_async(hold_id)
+        else:
+            # Odpowiedź modelu zastępczego nie może kosztować więcej niż odpowiedź wybranego modelu
+            credit_cost = min(credit_cost, CREDIT_COSTS["message"].get(answered_model, CREDIT_COSTS["message"]["default"]))
+            committed = await commit_user_credits_async(hold_id, credit_cost, f"Wiadomość ({answered_model})")
         print(f"Odjęto {credit_cost} kredytów za wiadomość")
-    except Exception as e:
-        print(f"Wystąpił błąd podczas generowania odpowiedzi: {e}")
-        await response_message.edit_text(f"Wystąpił błąd podczas generowania odpowiedzi: {str(e)}")
-        return
+        
+        # Zapis historii i pamięci podręcznej nie może już cofnąć wysłanej odpowiedzi
+        try:
+            await save_message_async(conversation_id, user_id, full_response, is_from_user=False, model_used=answered_model)
+        except Exception as e:
+            print(f"Błąd przy zapisie odpowiedzi: {e}")
+        
+        # Zapamiętaj nową odpowiedź na powtarzalne pytanie (klucz dotyczy wybranego modelu)
+        if cache_key is not None and cached_response is None and answered_model == model_to_use:
+            try:
+                await store_response(cache_key, model_to_use, full_response)
+            except Exception as e:
+                print(f"Błąd przy zapisie odpowiedzi w pamięci podręcznej: {e}")
+    finally:
+        if not committed:
+            await release_user_credits_async(hold_id)
+    
+    # Kompaktowanie długiej konwersacji w tle - poza ścieżką odpowiedzi
+    context.application.create_task(compact_conversation(conversation_id))
     
     # Sprawdź aktualny stan kredytów
-    credits = get_user_credits(user_id)
+    credits = await get_user_credits_async(user_id)
     if credits < 5:
         # Dodaj przycisk doładowania kredytów
-        keyboard = [[InlineKeyboardButton("🛒 " + get_text("buy_credits_btn", language, default="Kup kredyty"), callback_data="menu_credits_buy")]]
-        
         await update.message.reply_text(
 
 f"*{get_text('low_credits_warning', language)}* {get_text('low_credits_message', language, credits=credits)}",
-            reply_markup=InlineKeyboardMarkup(keyboard),
+            reply_markup=create_low_credits_markup(language),
             parse_mode=ParseMode.MARKDOWN
         )
 
@@ -592,11 +688,7 @@ async def handle_document(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = update.effective_user.id
     language = get_user_language(context, user_id)
     
-    # Sprawdź, czy użytkownik ma wystarczającą liczbę kredytów
     credit_cost = CREDIT_COSTS["document"]
-    if not check_user_credits(user_id, credit_cost):
-        await update.message.reply_text(get_text("subscription_expired", language))
-        return
     
     document = update.message.document
     file_name = document.file_name
@@ -621,49 +713,57 @@ async def handle_document(update: Update, context: ContextTypes.DEFAULT_TYPE):
         from handlers.pdf_handler import handle_pdf_translation
         await handle_pdf_translation(update, context)
         return
-    elif translate_mode:
-        message = await update.message.reply_text(get_text("translating_document", language))
-    else:
-        message = await update.message.reply_text(get_text("analyzing_file", language))
     
-    # Wyślij informację o aktywności bota
-    await update.message.chat.send_action(action=ChatAction.TYPING)
-    
-    file = await context.bot.get_file(document.file_id)
-    file_bytes = await file.download_as_bytearray()
-    
-    # Analizuj plik - w trybie tłumaczenia lub analizy w zależności od opcji
-    if translate_mode:
-        analysis = await analyze_document(file_bytes, file_name, mode="translate")
-        header = f"*{get_text('translated_text', language)}:*\n\n"
-    else:
-        analysis = await analyze_document(file_bytes, file_name)
-        header = f"*{get_text('file_analysis', language)}:* {file_name}\n\n"
-    
-    # Odejmij kredyty
+    # Zarezerwuj kredyty na analizę lub tłumaczenie dokumentu
     description = "Tłumaczenie dokumentu" if translate_mode else "Analiza dokumentu"
-    deduct_user_credits(user_id, credit_cost, f"{description}: {file_name}")
+    hold_id = await reserve_user_credits_async(user_id, credit_cost, f"{description}: {file_name}", "document")
+    if hold_id is None:
+        await update.message.reply_text(get_text("subscription_expired", language))
+        return
     
-    # Wyślij analizę do użytkownika
-    await message.edit_text(
-        f"{header}{analysis}",
-        parse_mode=ParseMode.MARKDOWN
-    )
+    # Rezerwacja jest zwalniana, jeśli analiza nie dotrze do użytkownika
+    committed = False
+    try:
+        if translate_mode:
+            message = await update.message.reply_text(get_text("translating_document", language))
+        else:
+            message = await update.message.reply_text(get_text("analyzing_file", language))
+        
+        # Wyślij informację o aktywności bota
+        await update.message.chat.send_action(action=ChatAction.TYPING)
+        
+        file = await context.bot.get_file(document.file_id)
+        file_bytes = await file.download_as_bytearray()
+        
+        # Analizuj plik - w trybie tłumaczenia lub analizy w zależności od opcji
+        if translate_mode:
+            analysis = await analyze_document(file_bytes, file_name, mode="translate", user_id=user_id, raise_on_error=True, content_id=document.file_unique_id)
+            header = f"*{get_text('translated_text', language)}:*\n\n"
+        else:
+            analysis = await analyze_document(file_bytes, file_name, user_id=user_id, raise_on_error=True, content_id=document.file_unique_id)
+            header = f"*{get_text('file_analysis', language)}:* {file_name}\n\n"
+        
+        # Wyślij analizę do użytkownika i zatwierdź pobranie kredytów
+        sent_messages = await StreamingEditor(message).finish(f"{header}{analysis}")
+        committed = await commit_user_credits_async(hold_id)
+    except OpenAIServiceError:
+        await message.edit_text(get_text("openai_unavailable", language))
+        return
+    finally:
+        if not committed:
+            await release_user_credits_async(hold_id)
     
     # Dodaj klawiaturę z dodatkowymi opcjami dla plików PDF
     if is_pdf and not translate_mode:
-        keyboard = [[
-            InlineKeyboardButton(get_text("pdf_translate_button", language), callback_data=f"translate_pdf_{document.file_id}")
-        ]]
-        reply_markup = InlineKeyboardMarkup(keyboard)
+        reply_markup = create_translate_pdf_markup(document.file_id, language)
         
         try:
-            await message.edit_reply_markup(reply_markup=reply_markup)
+            await sent_messages[-1].edit_reply_markup(reply_markup=reply_markup)
         except Exception as e:
             print(f"Błąd dodawania klawiatury: {e}")
     
     # Sprawdź aktualny stan kredytów
-    credits = get_user_credits(user_id)
+    credits = await get_user_credits_async(user_id)
     if credits < 5:
         await update.message.reply_text(
             f"*{get_text('low_credits_warning', language)}* {get_text('low_credits_message', language, credits=credits)}",
@@ -675,12 +775,6 @@ async def handle_photo(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = update.effective_user.id
     language = get_user_language(context, user_id)
     
-    # Sprawdź, czy użytkownik ma wystarczającą liczbę kredytów
-    credit_cost = CREDIT_COSTS["photo"]
-    if not check_user_credits(user_id, credit_cost):
-        await update.message.reply_text(get_text("subscription_expired", language))
-        return
-    
     # Sprawdź, czy zdjęcie zostało przesłane z komendą tłumaczenia
     caption = update.message.caption or ""
     translate_mode = False
@@ -688,53 +782,61 @@ async def handle_photo(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if caption.lower().startswith("/translate") or caption.lower().startswith("przetłumacz"):
         translate_mode = True
     
+    # Zarezerwuj kredyty - zostaną pobrane po udanej analizie
+    credit_cost = CREDIT_COSTS["photo"]
+    description = "Tłumaczenie tekstu ze zdjęcia" if translate_mode else "Analiza zdjęcia"
+    hold_id = await reserve_user_credits_async(user_id, credit_cost, description, "photo")
+    if hold_id is None:
+        await update.message.reply_text(get_text("subscription_expired", language))
+        return
+    
     # Wybierz zdjęcie o najwyższej rozdzielczości
     photo = update.message.photo[-1]
     
-    # Pobierz zdjęcie
-    if translate_mode:
-        message = await update.message.reply_text("Tłumaczę tekst ze zdjęcia, proszę czekać...")
-    else:
-        message = await update.message.reply_text(get_text("analyzing_photo", language))
-    
-    # Wyślij informację o aktywności bota
-    await update.message.chat.send_action(action=ChatAction.TYPING)
-    
-    file = await context.bot.get_file(photo.file_id)
-    file_bytes = await file.download_as_bytearray()
-    
-    # Analizuj zdjęcie w odpowiednim trybie
-    if translate_mode:
-        result = await analyze_image(file_bytes, f"photo_{photo.file_unique_id}.jpg", mode="translate")
-        header = "*Tłumaczenie tekstu ze zdjęcia:*\n\n"
-    else:
-        result = await analyze_image(file_bytes, f"photo_{photo.file_unique_id}.jpg", mode="analyze")
-        header = "*Analiza zdjęcia:*\n\n"
-    
-    # Odejmij kredyty
-    description = "Tłumaczenie tekstu ze zdjęcia" if translate_mode else "Analiza zdjęcia"
-    deduct_user_credits(user_id, credit_cost, description)
-    
-    # Wyślij analizę/tłumaczenie do użytkownika
-    await message.edit_text(
-        f"{header}{result}",
-        parse_mode=ParseMode.MARKDOWN
-    )
+    # Rezerwacja jest zwalniana, jeśli analiza nie dotrze do użytkownika
+    committed = False
+    try:
+        # Pobierz zdjęcie
+        if translate_mode:
+            message = await update.message.reply_text("Tłumaczę tekst ze zdjęcia, proszę czekać...")
+        else:
+            message = await update.message.reply_text(get_text("analyzing_photo", language))
+        
+        # Wyślij informację o aktywności bota
+        await update.message.chat.send_action(action=ChatAction.TYPING)
+        
+        file = await context.bot.get_file(photo.file_id)
+        file_bytes = await file.download_as_bytearray()
+        
+        # Analizuj zdjęcie w odpowiednim trybie
+        if translate_mode:
+            result = await analyze_image(file_bytes, f"photo_{photo.file_unique_id}.jpg", mode="translate", user_id=user_id, raise_on_error=True, content_id=photo.file_unique_id)
+            header = "*Tłumaczenie tekstu ze zdjęcia:*\n\n"
+        else:
+            result = await analyze_image(file_bytes, f"photo_{photo.file_unique_id}.jpg", mode="analyze", user_id=user_id, raise_on_error=True, content_id=photo.file_unique_id)
+            header = "*Analiza zdjęcia:*\n\n"
+        
+        # Wyślij analizę/tłumaczenie do użytkownika i zatwierdź pobranie kredytów
+        sent_messages = await StreamingEditor(message).finish(f"{header}{result}")
+        committed = await commit_user_credits_async(hold_id)
+    except OpenAIServiceError:
+        await message.edit_text(get_text("openai_unavailable", language))
+        return
+    finally:
+        if not committed:
+            await release_user_credits_async(hold_id)
     
     # Dodaj klawiaturę z dodatkowymi opcjami
     if not translate_mode:
-        keyboard = [[
-            InlineKeyboardButton("🔄 Przetłumacz tekst z tego zdjęcia", callback_data=f"translate_photo_{photo.file_id}")
-        ]]
-        reply_markup = InlineKeyboardMarkup(keyboard)
+        reply_markup = create_translate_photo_markup(photo.file_id)
         
         try:
-            await message.edit_reply_markup(reply_markup=reply_markup)
+            await sent_messages[-1].edit_reply_markup(reply_markup=reply_markup)
         except Exception as e:
             print(f"Błąd dodawania klawiatury: {e}")
     
     # Sprawdź aktualny stan kredytów
-    credits = get_user_credits(user_id)
+    credits = await get_user_credits_async(user_id)
     if credits < 5:
         await update.message.reply_text(
             f"*Uwaga:* Pozostało Ci tylko *{credits}* kredytów. "
@@ -747,38 +849,43 @@ async def handle_photo_translate(update: Update, context: ContextTypes.DEFAULT_T
     user_id = update.effective_user.id
     language = get_user_language(context, user_id)
     
-    # Sprawdź, czy użytkownik ma wystarczającą liczbę kredytów
+    # Zarezerwuj kredyty - zostaną pobrane po udanym tłumaczeniu
     credit_cost = CREDIT_COSTS["photo"]
-    if not check_user_credits(user_id, credit_cost):
+    hold_id = await reserve_user_credits_async(user_id, credit_cost, "Tłumaczenie tekstu ze zdjęcia", "photo")
+    if hold_id is None:
         await update.message.reply_text(get_text("subscription_expired", language))
         return
     
     # Wybierz zdjęcie o najwyższej rozdzielczości
     photo = update.message.photo[-1]
     
-    # Pobierz zdjęcie
-    message = await update.message.reply_text("Tłumaczę tekst ze zdjęcia, proszę czekać...")
-    
-    # Wyślij informację o aktywności bota
-    await update.message.chat.send_action(action=ChatAction.TYPING)
-    
-    file = await context.bot.get_file(photo.file_id)
-    file_bytes = await file.download_as_bytearray()
-    
-    # Analizuj zdjęcie w trybie tłumaczenia
-    translation = await analyze_image(file_bytes, f"photo_{photo.file_unique_id}.jpg", mode="translate")
-    
-    # Odejmij kredyty
-    deduct_user_credits(user_id, credit_cost, "Tłumaczenie tekstu ze zdjęcia")
-    
-    # Wyślij tłumaczenie do użytkownika
-    await message.edit_text(
-        f"*Tłumaczenie tekstu ze zdjęcia:*\n\n{translation}",
-        parse_mode=ParseMode.MARKDOWN
-    )
+    # Rezerwacja jest zwalniana, jeśli tłumaczenie nie dotrze do użytkownika
+    committed = False
+    try:
+        # Pobierz zdjęcie
+        message = await update.message.reply_text("Tłumaczę tekst ze zdjęcia, proszę czekać...")
+        
+        # Wyślij informację o aktywności bota
+        await update.message.chat.send_action(action=ChatAction.TYPING)
+        
+        file = await context.bot.get_file(photo.file_id)
+        file_bytes = await file.download_as_bytearray()
+        
+        # Analizuj zdjęcie w trybie tłumaczenia
+        translation = await analyze_image(file_bytes, f"photo_{photo.file_unique_id}.jpg", mode="translate", user_id=user_id, raise_on_error=True, content_id=photo.file_unique_id)
+        
+        # Wyślij tłumaczenie do użytkownika i zatwierdź pobranie kredytów
+        await StreamingEditor(message).finish(f"*Tłumaczenie tekstu ze zdjęcia:*\n\n{translation}")
+        committed = await commit_user_credits_async(hold_id)
+    except OpenAIServiceError:
+        await message.edit_text(get_text("openai_unavailable", language))
+        return
+    finally:
+        if not committed:
+            await release_user_credits_async(hold_id)
     
     # Sprawdź aktualny stan kredytów
-    credits = get_user_credits(user_id)
+    credits = await get_user_credits_async(user_id)
     if credits < 5:
         await update.message.reply_text(
             f"*Uwaga:* Pozostało Ci tylko *{credits}* kredytów. "
@@ -803,665 +910,429 @@ async def show_translation_instructions(update: Update, context: ContextTypes.DE
 
 # Handlers dla przycisków i callbacków
 
-async def handle_callback_query(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Obsługa zapytań zwrotnych (z przycisków)"""
+async def handle_history_view_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Wyświetla ostatnie wiadomości aktywnej konwersacji"""
     query = update.callback_query
-    
-    # Dodaj debugowanie
-    print(f"Otrzymano callback: {query.data}")
     user_id = query.from_user.id
     language = get_user_language(context, user_id)
     
-    # Zawsze odpowiadaj na callback, aby usunąć oczekiwanie
-    await query.answer()
-    
-    # Obsługa przycisków onboardingu
-    if query.data.startswith("onboarding_"):
-        await handle_onboarding_callback(update, context)
-        return
-    
-    # Najpierw sprawdzamy, czy to callback związany z menu
-    if query.data.startswith("menu_"):
-        print(f"Rozpoznano callback menu: {query.data}")
-        try:
-            # Importuj funkcję obsługi menu
-            from handlers.menu_handler import handle_menu_callback
-            result = await handle_menu_callback(update, context)
-            print(f"Wynik obsługi menu: {result}")
-            if result:
-                return
-            # Jeśli menu_handler nie obsłużył callbacku, kontynuujemy poniżej
-        except Exception as e:
-            print(f"Błąd w obsłudze menu: {str(e)}")
-            import traceback
-            traceback.print_exc()
-            # Wyślij informację o błędzie
-            try:
-                # Sprawdź, czy wiadomość ma podpis (jest to zdjęcie lub inny typ mediów)
-                if hasattr(query.message, 'caption'):
-                    await query.edit_message_caption(
-                        caption=f"Wystąpił błąd podczas obsługi menu: {str(e)}",
-                        parse_mode=ParseMode.MARKDOWN
-                    )
-                else:
-                    await query.edit_message_text(
-                        text=f"Wystąpił błąd podczas obsługi menu: {str(e)}",
-                        parse_mode=ParseMode.MARKDOWN
-                    )
-            except:
-                pass
-    
-    # Obsługa wyboru języka
-    if query.data.startswith("start_lang_"):
-        from handlers.start_handler import handle_language_selection
-        await handle_language_selection(update, context)
-        return
-    
-    # Obsługa przycisku wyboru modelu
-    if query.data.startswith("model_"):
-        model_id = query.data[6:]  # Pobierz ID modelu (usuń prefix "model_")
-        await handle_model_selection(update, context, model_id)
-        return
-    
-    # Obsługa przycisków ustawień
-    elif query.data.startswith("settings_"):
-        print(f"Rozpoznano callback ustawień: {query.data}")
-        try:
-            from handlers.menu_handler import handle_menu_callback
-            result = await handle_menu_callback(update, context)
-            if not result:
-                await query.answer("Funkcja w trakcie implementacji.")
-            return
-        except Exception as e:
-            print(f"Błąd w obsłudze ustawień: {str(e)}")
-            import traceback
-            traceback.print_exc()
-            await query.answer(f"Error: {str(e)}")
-            return
-    
-    # Obsługa wyboru trybu czatu
-    if query.data.startswith("mode_"):
-        print(f"Rozpoznano callback trybu: {query.data}")
-        mode_id = query.data[5:]  # Pobierz ID trybu (usuń prefix "mode_")
-        await handle_mode_selection(update, context, mode_id)
-        return
-
-    # Obsługa tematów konwersacji
-    if query.data.startswith("theme_") or query.data == "new_theme" or query.data == "no_theme":
-        from handlers.theme_handler import handle_theme_callback
-        await handle_theme_callback(update, context)
-        return
+    # Pobierz aktywną konwersację
+    conversation = await get_active_conversation_async(user_id)
     
-    # POPRAWKA: Bezpośrednia obsługa history_view
-    if query.data == "history_view":
-        user_id = query.from_user.id
-        language = get_user_language(context, user_id)
-        
-        # Pobierz aktywną konwersację
-        from database.supabase_client import get_active_conversation, get_conversation_history
-        conversation = get_active_conversation(user_id)
-        
-        if not conversation:
-            # Informacja przez wiadomość
-            keyboard = [[InlineKeyboardButton(get_text("back", language), callback_data="menu_section_history")]]
-            reply_markup = InlineKeyboardMarkup(keyboard)
-            
-            if hasattr(query.message, 'caption'):
-                await query.edit_message_caption(
-                    caption=get_text("history_no_conversation", language),
-                    reply_markup=reply_markup
-                )
-            else:
-                await query.edit_message_text(
-                    text=get_text("history_no_conversation", language),
-                    reply_markup=reply_markup
-                )
-            return
-        
-        # Pobierz historię konwersacji
-        history = get_conversation_history(conversation['id'])
-        
-        if not history:
-            keyboard = [[InlineKeyboardButton(get_text("back", language), callback_data="menu_section_history")]]
-            reply_markup = InlineKeyboardMarkup(keyboard)
-            
-            if hasattr(query.message, 'caption'):
-                await query.edit_message_caption(
-                    caption=get_text("history_empty", language),
-                    reply_markup=reply_markup
-                )
-            else:
-                await query.edit_message_text(
-                    text=get_text("history_empty", language),
-                    reply_markup=reply_markup
-                )
-            return
-        
-        # Przygotuj tekst z historią - bez formatowania Markdown
-        message_text = f"{get_text('history_title', language)}\n\n"
-        
-        for i, msg in enumerate(history[-10:]):  # Ostatnie 10 wiadomości
-            sender = get_text("history_user", language) if msg['is_from_user'] else get_text("history_bot", language)
-            
-            # Skróć treść wiadomości
-            content = msg['content']
-            if len(content) > 100:
-                content = content[:97] + "..."
-                
-            message_text += f"{i+1}. {sender}: {content}\n\n"
-        
-        # Dodaj przycisk do powrotu
-        keyboard = [[InlineKeyboardButton(get_text("back", language), callback_data="menu_section_history")]]
-        reply_markup = InlineKeyboardMarkup(keyboard)
+    if not conversation:
+        # Informacja przez wiadomość
+        reply_markup = create_history_back_markup(language)
         
         if hasattr(query.message, 'caption'):
             await query.edit_message_caption(
-                caption=message_text,
+                caption=get_text("history_no_conversation", language),
                 reply_markup=reply_markup
             )
         else:
             await query.edit_message_text(
-                text=message_text,
+                text=get_text("history_no_conversation", language),
                 reply_markup=reply_markup
             )
         return
     
-    # POPRAWKA: Bezpośrednia obsługa menu_credits_check
-    if query.data == "menu_credits_check" or query.data == "credits_check":
-        user_id = query.from_user.id
-        language = get_user_language(context, user_id)
-        
-        # Pobierz stan kredytów
-        from database.credits_client import get_user_credits
-        credits = get_user_credits(user_id)
-        
-        # Klawiatura z opcjami kredytów
-        keyboard = [
-            [InlineKeyboardButton(get_text("buy_credits_btn", language), callback_data="credits_buy")],
-            [InlineKeyboardButton(get_text("credit_stats", language, default="Statystyki"), callback_data="credits_stats")],
-            [InlineKeyboardButton(get_text("back", language), callback_data="menu_section_credits")]
-        ]
-        
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        
-        # Tekst informacyjny o kredytach
-        message = get_text("credits_info", language, bot_name=BOT_NAME, credits=credits)
+    # Pobierz ostatnie 10 wiadomości
+    history = await get_conversation_history_async(conversation['id'], limit=10)
+    
+    if not history:
+        reply_markup = create_history_back_markup(language)
         
         if hasattr(query.message, 'caption'):
             await query.edit_message_caption(
-                caption=message,
-                reply_markup=reply_markup,
-                parse_mode=ParseMode.MARKDOWN
+                caption=get_text("history_empty", language),
+                reply_markup=reply_markup
             )
         else:
             await query.edit_message_text(
-                text=message,
-                reply_markup=reply_markup,
-                parse_mode=ParseMode.MARKDOWN
+                text=get_text("history_empty", language),
+                reply_markup=reply_markup
             )
         return
     
-    # POPRAWKA: Bezpośrednia obsługa menu_credits_buy
-    if query.data == "menu_credits_buy" or query.data == "credits_buy":
-        user_id = query.from_user.id
-        language = get_user_language(context, user_id)
-        
-        # Pobierz pakiety kredytów
-        from database.credits_client import get_credit_packages
-        packages = get_credit_packages()
-        
-        packages_text = ""
-        for pkg in packages:
-            packages_text += f"*{pkg['id']}.* {pkg['name']} - *{pkg['credits']}* {get_text('credits', language)} - *{pkg['price']} PLN*\n"
-        
-        # Utwórz klawiaturę z pakietami
-        keyboard = []
-        for pkg in packages:
-            keyboard.append([
-                InlineKeyboardButton(
-                    f"{pkg['name']} - {pkg['credits']} {get_text('credits', language)} ({pkg['price']} PLN)", 
-                    callback_data=f"buy_package_{pkg['id']}"
-                )
-            ])
-        
-        # Dodaj przycisk dla gwiazdek Telegram
-        keyboard.append([
-            InlineKeyboardButton("⭐ " + get_text("buy_with_stars", language, default="Kup za gwiazdki Telegram"), 
-                                callback_data="show_stars_options")
-        ])
-        
-        # Dodaj przycisk powrotu
-        keyboard.append([
-            InlineKeyboardButton(get_text("back", language), callback_data="menu_section_credits")
-        ])
-        
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        
-        # Tekst informacyjny o zakupie kredytów
-        message = get_text("buy_credits", language, packages=packages_text)
+    # Przygotuj tekst z historią - bez formatowania Markdown
+    message_text = f"{get_text('history_title', language)}\n\n"
+    
+    for i, msg in enumerate(history):
+        sender = get_text("history_user", language) if msg['is_from_user'] else get_text("history_bot", language)
         
-        if hasattr(query.message, 'caption'):
-            await query.edit_message_caption(
-                caption=message,
-                reply_markup=reply_markup,
+        # Skróć treść wiadomości
+        content = msg['content']
+        if len(content) > 100:
+            content = content[:97] + "..."
+            
+        message_text += f"{i+1}. {sender}: {content}\n\n"
+    
+    # Dodaj przycisk do powrotu
+    reply_markup = create_history_back_markup(language)
+    
+    if hasattr(query.message, 'caption'):
+        await query.edit_message_caption(
+            caption=message_text,
+            reply_markup=reply_markup
+        )
+    else:
+        await query.edit_message_text(
+            text=message_text,
+            reply_markup=reply_markup
+        )
+
+async def handle_credits_check_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Wyświetla stan kredytów użytkownika"""
+    query = update.callback_query
+    user_id = query.from_user.id
+    language = get_user_language(context, user_id)
+    
+    # Pobierz stan kredytów
+    from database.credits_client import get_user_credits
+    credits = await get_user_credits_async(user_id)
+    
+    # Klawiatura z opcjami kredytów
+    reply_markup = create_credits_check_markup(language)
+    
+    # Tekst informacyjny o kredytach
+    message = get_text("credits_info", language, bot_name=BOT_NAME, credits=credits)
+    
+    if hasattr(query.message, 'caption'):
+        await query.edit_message_caption(
+            caption=message,
+            reply_markup=reply_markup,
+            parse_mode=ParseMode.MARKDOWN
+        )
+    else:
+        await query.edit_message_text(
+            text=message,
+            reply_markup=reply_markup,
+            parse_mode=ParseMode.MARKDOWN
+        )
+
+async def handle_translate_photo_callback(update: Update, context: ContextTypes.DEFAULT_TYPE, photo_file_id):
+    """Tłumaczy tekst ze zdjęcia wskazanego w przycisku"""
+    query = update.callback_query
+    user_id = query.from_user.id
+    language = get_user_language(context, user_id)
+    
+    # Zarezerwuj kredyty - zostaną pobrane po udanym tłumaczeniu
+    credit_cost = CREDIT_COSTS["photo"]
+    hold_id = await reserve_user_credits_async(user_id, credit_cost, "Tłumaczenie tekstu ze zdjęcia", "photo")
+    if hold_id is None:
+        if hasattr(query.message, 'caption'):
+            await query.edit_message_caption(
+                caption=get_text("subscription_expired", language),
                 parse_mode=ParseMode.MARKDOWN
             )
         else:
             await query.edit_message_text(
-                text=message,
-                reply_markup=reply_markup,
+                text=get_text("subscription_expired", language),
                 parse_mode=ParseMode.MARKDOWN
             )
         return
     
-    # Obsługa przycisku tłumaczenia zdjęcia
-    if query.data.startswith("translate_photo_"):
-        photo_file_id = query.data.replace("translate_photo_", "")
-        user_id = query.from_user.id
-        language = get_user_language(context, user_id)
-        
-        # Sprawdź, czy użytkownik ma wystarczającą liczbę kredytów
-        credit_cost = CREDIT_COSTS["photo"]
-        if not check_user_credits(user_id, credit_cost):
-            if hasattr(query.message, 'caption'):
-                await query.edit_message_caption(
-                    caption=get_text("subscription_expired", language),
-                    parse_mode=ParseMode.MARKDOWN
-                )
-            else:
-                await query.edit_message_text(
-                    text=get_text("subscription_expired", language),
-                    parse_mode=ParseMode.MARKDOWN
-                )
-            return
-        
-        # Pobierz zdjęcie
-        try:
-            if hasattr(query.message, 'caption'):
-                message = await query.edit_message_caption(
-                    caption="Tłumaczę tekst ze zdjęcia, proszę czekać...",
-                    parse_mode=ParseMode.MARKDOWN
-                )
-            else:
-                message = await query.edit_message_text(
-                    text="Tłumaczę tekst ze zdjęcia, proszę czekać...",
-                    parse_mode=ParseMode.MARKDOWN
-                )
-            
-            file = await context.bot.get_file(photo_file_id)
-            file_bytes = await file.download_as_bytearray()
-            
-            # Tłumacz tekst ze zdjęcia
-            translation = await analyze_image(file_bytes, f"photo_{photo_file_id}.jpg", mode="translate")
-            
-            # Odejmij kredyty
-            deduct_user_credits(user_id, credit_cost, "Tłumaczenie tekstu ze zdjęcia")
-            
-            # Wyślij tłumaczenie
-            if hasattr(query.message, 'caption'):
-                await query.edit_message_caption(
-                    caption=f"*Tłumaczenie tekstu ze zdjęcia:*\n\n{translation}",
-                    parse_mode=ParseMode.MARKDOWN
-                )
-            else:
-                await query.edit_message_text(
-                    text=f"*Tłumaczenie tekstu ze zdjęcia:*\n\n{translation}",
-                    parse_mode=ParseMode.MARKDOWN
-                )
-            
-            # Sprawdź aktualny stan kredytów
-            credits = get_user_credits(user_id)
-            if credits < 5:
-                await context.bot.send_message(
-                    chat_id=query.message.chat_id,
-                    text=f"*{get_text('low_credits_warning', language)}* {get_text('low_credits_message', language, credits=credits)}",
-                    parse_mode=ParseMode.MARKDOWN
-                )
-            
-            return
-        except Exception as e:
-            print(f"Błąd przy tłumaczeniu zdjęcia: {e}")
-            if hasattr(query.message, 'caption'):
-                await query.edit_message_caption(
-                    caption=f"Wystąpił błąd podczas tłumaczenia zdjęcia: {str(e)}",
-                    parse_mode=ParseMode.MARKDOWN
-                )
-            else:
-                await query.edit_message_text(
-                    text=f"Wystąpił błąd podczas tłumaczenia zdjęcia: {str(e)}",
-                    parse_mode=ParseMode.MARKDOWN
-                )
-            return
-    
-    # Obsługa przycisku tłumaczenia PDF
-    if query.data.startswith("translate_pdf_"):
-        document_file_id = query.data.replace("translate_pdf_", "")
-        user_id = query.from_user.id
-        language = get_user_language(context, user_id)
-        
-        # Sprawdź, czy użytkownik ma wystarczającą liczbę kredytów
-        credit_cost = 8  # Koszt tłumaczenia PDF
-        if not check_user_credits(user_id, credit_cost):
-            await query.answer(get_text("subscription_expired_short", language, default="Niewystarczająca liczba kredytów."))
-            
-            if hasattr(query.message, 'caption'):
-                await query.edit_message_caption(
-                    caption=get_text("subscription_expired", language),
-                    parse_mode=ParseMode.MARKDOWN
-                )
-            else:
-                await query.edit_message_text(
-                    text=get_text("subscription_expired", language),
-                    parse_mode=ParseMode.MARKDOWN
-                )
-            return
-        
-        # Pobierz plik
-        try:
-            if hasattr(query.message, 'caption'):
-                await query.edit_message_caption(
-                    caption=get_text("translating_pdf", language),
-                    parse_mode=ParseMode.MARKDOWN
-                )
-            else:
-                await query.edit_message_text(
-                    text=get_text("translating_pdf", language),
-                    parse_mode=ParseMode.MARKDOWN
-                )
-            
-            file = await context.bot.get_file(document_file_id)
-            file_bytes = await file.download_as_bytearray()
-            
-            # Tłumacz pierwszy akapit z PDF
-            from utils.pdf_translator import translate_pdf_first_paragraph
-            result = await translate_pdf_first_paragraph(file_bytes)
-            
-            # Odejmij kredyty
-            deduct_user_credits(user_id, credit_cost, "Tłumaczenie pierwszego akapitu z PDF")
-            
-            # Przygotuj odpowiedź
-            if result["success"]:
-                response = f"*{get_text('pdf_translation_result', language)}*\n\n"
-                response += f"*{get_text('original_text', language)}:*\n{result['original_text'][:500]}...\n\n"
-                response += f"*{get_text('translated_text', language)}:*\n{result['translated_text'][:500]}..."
-            else:
-                response = f"*{get_text('pdf_translation_error', language)}*\n\n{result['error']}"
-            
-            # Wyślij wynik tłumaczenia
-            if hasattr(query.message, 'caption'):
-                await query.edit_message_caption(
-                    caption=response,
-                    parse_mode=ParseMode.MARKDOWN
-                )
-            else:
-                await query.edit_message_text(
-                    text=response,
-                    parse_mode=ParseMode.MARKDOWN
-                )
-            
-            # Sprawdź aktualny stan kredytów
-            credits = get_user_credits(user_id)
-            if credits < 5:
-                await context.bot.send_message(
-                    chat_id=query.message.chat_id,
-                    text=f"*{get_text('low_credits_warning', language)}* {get_text('low_credits_message', language, credits=credits)}",
-                    parse_mode=ParseMode.MARKDOWN
-                )
-            
-            return
-        except Exception as e:
-            print(f"Błąd przy tłumaczeniu PDF: {e}")
-            if hasattr(query.message, 'caption'):
-                await query.edit_message_caption(
-                    caption=f"{get_text('pdf_translation_error', language)}: {str(e)}",
-                    parse_mode=ParseMode.MARKDOWN
-                )
-            else:
-                await query.edit_message_text(
-                    text=f"{get_text('pdf_translation_error', language)}: {str(e)}",
-                    parse_mode=ParseMode.MARKDOWN
-                )
-            return
-
-    # Obsługa kredytów
-    if query.data.startswith("buy_") or query.data.startswith("credits_"):
-        from handlers.credit_handler import handle_credit_callback
-        await handle_credit_callback(update, context)
-        return
-    
-    # Obsługa historii
-    if query.data.startswith("history_"):
-        if query.data == "history_new":
-            # Twórz nową konwersację
-            conversation = create_new_conversation(user_id)
-            # Sprawdź, czy wiadomość ma podpis (jest to zdjęcie lub inny typ mediów)
-            if hasattr(query.message, 'caption'):
-                await query.edit_message_caption(
-                    caption=get_text("new_chat_success", get_user_language(context, user_id)),
-                    parse_mode=ParseMode.MARKDOWN
-                )
-            else:
-                await query.edit_message_text(
-                    text=get_text("new_chat_success", get_user_language(context, user_id)),
-                    parse_mode=ParseMode.MARKDOWN
-                )
-            return
-        elif query.data == "history_export":
-            # Eksportuj bieżącą konwersację
-            from handlers.export_handler import export_conversation
-            # Tworzymy sztuczny obiekt update do przekazania do funkcji export_conversation
-            class FakeUpdate:
-                class FakeMessage:
-                    def __init__(self, chat_id, message_id):
-                        self.chat_id = chat_id
-                        self.message_id = message_id
-                        self.chat = type('obj', (object,), {'send_action': lambda *args, **kwargs: None})
-                    async def reply_text(self, *args, **kwargs):
-                        pass
-                    async def reply_document(self, *args, **kwargs):
-                        pass
-                def __init__(self, query):
-                    self.message = self.FakeMessage(query.message.chat_id, query.message.message_id)
-                    self.effective_user = query.from_user
-                    self.effective_chat = type('obj', (object,), {'id': query.message.chat_id})
-            
-            fake_update = FakeUpdate(query)
-            await export_conversation(fake_update, context)
-            # Informacja o eksporcie
-            if hasattr(query.message, 'caption'):
-                await query.edit_message_caption(
-                    caption="Eksportowanie konwersacji do PDF...",
-                    parse_mode=ParseMode.MARKDOWN
-                )
-            else:
-                await query.edit_message_text(
-                    text="Eksportowanie konwersacji do PDF...",
-                    parse_mode=ParseMode.MARKDOWN
-                )
-            return
-        elif query.data == "history_delete":
-            # Pytanie o potwierdzenie usunięcia historii
-            keyboard = [
-                [
-                    InlineKeyboardButton(get_text("yes", get_user_language(context, user_id)), callback_data="history_confirm_delete"),
-                    InlineKeyboardButton(get_text("no", get_user_language(context, user_id)), callback_data="menu_section_history")
-                ]
-            ]
-            reply_markup = InlineKeyboardMarkup(keyboard)
-            if hasattr(query.message, 'caption'):
-                await query.edit_message_caption(
-                    caption=get_text("history_delete_confirm", get_user_language(context, user_id)),
-                    reply_markup=reply_markup,
-                    parse_mode=ParseMode.MARKDOWN
-                )
-            else:
-                await query.edit_message_text(
-                    text=get_text("history_delete_confirm", get_user_language(context, user_id)),
-                    reply_markup=reply_markup,
-                    parse_mode=ParseMode.MARKDOWN
-                )
-            return
-    
-    # Obsługa przycisku restartu bota
-    if query.data == "restart_bot":
-        user_id = query.from_user.id
-        chat_id = query.message.chat_id
-        language = get_user_language(context, user_id)
-        
-        restart_message = get_text("restarting_bot", language)
-        try:
-            if hasattr(query.message, 'caption'):
-                await query.edit_message_caption(caption=restart_message)
-            else:
-                await query.edit_message_text(text=restart_message)
-        except Exception as e:
-            print(f"Błąd przy aktualizacji wiadomości: {e}")
-        
-        # Resetowanie konwersacji - tworzymy nową konwersację i czyścimy kontekst
-        conversation = create_new_conversation(user_id)
-        
-        # Zachowujemy wybrane ustawienia użytkownika (język, model)
-        user_data = {}
-        if 'user_data' in context.chat_data and user_id in context.chat_data['user_data']:
-            # Pobieramy tylko podstawowe ustawienia, reszta jest resetowana
-            old_user_data = context.chat_data['user_data'][user_id]
-            if 'language' in old_user_data:
-                user_data['language'] = old_user_data['language']
-            if 'current_model' in old_user_data:
-                user_data['current_model'] = old_user_data['current_model']
-            if 'current_mode' in old_user_data:
-                user_data['current_mode'] = old_user_data['current_mode']
+    # Pobierz zdjęcie
+    try:
+        if hasattr(query.message, 'caption'):
+            message = await query.edit_message_caption(
+                caption="Tłumaczę tekst ze zdjęcia, proszę czekać...",
+                parse_mode=ParseMode.MARKDOWN
+            )
+        else:
+            message = await query.edit_message_text(
+                text="Tłumaczę tekst ze zdjęcia, proszę czekać...",
+                parse_mode=ParseMode.MARKDOWN
+            )
         
-        # Resetujemy dane użytkownika w kontekście i ustawiamy tylko zachowane ustawienia
-        if 'user_data' not in context.chat_data:
-            context.chat_data['user_data'] = {}
-        context.chat_data['user_data'][user_id] = user_data
+        file = await context.bot.get_file(photo_file_id)
+        file_bytes = await file.download_as_bytearray()
         
-        # Potwierdź restart
-        restart_complete = get_text("restart_command", language)
+        # Tłumacz tekst ze zdjęcia
+        translation = await analyze_image(file_bytes, f"photo_{photo_file_id}.jpg", mode="translate", user_id=user_id, raise_on_error=True, content_id=file.file_unique_id)
         
-        # Utwórz klawiaturę menu
-        keyboard = [
-            [
-                InlineKeyboardButton(get_text("menu_chat_mode", language), callback_data="menu_section_chat_modes"),
-                InlineKeyboardButton(get_text("image_generate", language), callback_data="menu_image_generate")
-            ],
-            [
-                InlineKeyboardButton(get_text("menu_credits", language), callback_data="menu_section_credits"),
-                InlineKeyboardButton(get_text("menu_dialog_history", language), callback_data="menu_section_history")
-            ],
-            [
-                InlineKeyboardButton(get_text("menu_settings", language), callback_data="menu_section_settings"),
-                InlineKeyboardButton(get_text("menu_help", language), callback_data="menu_help")
-            ]
-        ]
+        # Zatwierdź pobranie kredytów
+        await commit_user_credits_async(hold_id)
         
-        reply_markup = InlineKeyboardMarkup(keyboard)
+        # Wyślij tłumaczenie
+        if hasattr(query.message, 'caption'):
+            await query.edit_message_caption(
+                caption=f"*Tłumaczenie tekstu ze zdjęcia:*\n\n{translation}",
+                parse_mode=ParseMode.MARKDOWN
+            )
+        else:
+            await query.edit_message_text(
+                text=f"*Tłumaczenie tekstu ze zdjęcia:*\n\n{translation}",
+                parse_mode=ParseMode.MARKDOWN
+            )
         
-        # Wyślij nową wiadomość z menu
-        try:
-            # Używamy welcome_message zamiast main_menu + status
-            welcome_text = get_text("welcome_message", language, bot_name=BOT_NAME)
-            message = await context.bot.send_message(
-                chat_id=chat_id,
-                text=restart_complete + "\n\n" + welcome_text,
-                reply_markup=reply_markup,
+        # Sprawdź aktualny stan kredytów
+        credits = await get_user_credits_async(user_id)
+        if credits < 5:
+            await context.bot.send_message(
+                chat_id=query.message.chat_id,
+                text=f"*{get_text('low_credits_warning', language)}* {get_text('low_credits_message', language, credits=credits)}",
                 parse_mode=ParseMode.MARKDOWN
             )
-            
-            # Zapisz ID wiadomości menu i stan menu
-            from handlers.menu_handler import store_menu_state
-            store_menu_state(context, user_id, 'main', message.message_id)
-        except Exception as e:
-            print(f"Błąd przy wysyłaniu wiadomości po restarcie: {e}")
-            # Próbuj wysłać prostą wiadomość
-            try:
-                await context.bot.send_message(
-                    chat_id=chat_id,
-                    text=restart_complete
-                )
-            except Exception as e2:
-                print(f"Nie udało się wysłać nawet prostej wiadomości: {e2}")
         
         return
-        
-    # Obsługa historii rozmów
-    if query.data == "history_confirm_delete":
-        user_id = query.from_user.id
-        # Twórz nową konwersację (efektywnie "usuwając" historię)
-        conversation = create_new_conversation(user_id)
-        
-        if conversation:
-            from handlers.menu_handler import update_menu
-            await update_menu(update, context, 'history')
+    except Exception as e:
+        print(f"Błąd przy tłumaczeniu zdjęcia: {e}")
+        await release_user_credits_async(hold_id)
+        if hasattr(query.message, 'caption'):
+            await query.edit_message_caption(
+                caption=f"Wystąpił błąd podczas tłumaczenia zdjęcia: {str(e)}",
+                parse_mode=ParseMode.MARKDOWN
+            )
         else:
-            if hasattr(query.message, 'caption'):
-                await query.edit_message_caption(
-                    caption="Wystąpił błąd podczas czyszczenia historii.",
-                    parse_mode=ParseMode.MARKDOWN
-                )
-            else:
-                await query.edit_message_text(
-                    text="Wystąpił błąd podczas czyszczenia historii.",
-                    parse_mode=ParseMode.MARKDOWN
-                )
+            await query.edit_message_text(
+                text=f"Wystąpił błąd podczas tłumaczenia zdjęcia: {str(e)}",
+                parse_mode=ParseMode.MARKDOWN
+            )
         return
+
+async def handle_translate_pdf_callback(update: Update, context: ContextTypes.DEFAULT_TYPE, document_file_id):
+    """Tłumaczy cały dokument PDF wskazany w przycisku (wynik wysyłany jako dokument tekstowy)"""
+    query = update.callback_query
+    user_id = query.from_user.id
+    language = get_user_language(context, user_id)
     
-    # Obsługa notatek
-    if query.data.startswith("note_"):
-        from handlers.note_handler import handle_note_callback
-        await handle_note_callback(update, context)
-        return
+    # Usuń przycisk, aby ten sam dokument nie był tłumaczony kilka razy naraz
+    try:
+        await query.edit_message_reply_markup(reply_markup=None)
+    except Exception as e:
+        print(f"Błąd usuwania klawiatury: {e}")
     
-    # Obsługa przypomnień  
-    if query.data.startswith("reminder_"):
-        from handlers.reminder_handler import handle_reminder_callback
-        await handle_reminder_callback(update, context)
-        return
+    status_message = await query.message.reply_text(get_text("translating_pdf_document", language))
     
-    # Specjalna obsługa przycisku powrotu do głównego menu
-    if query.data == "menu_back_main":
-        keyboard = [
-            [
-                InlineKeyboardButton(get_text("menu_chat_mode", language), callback_data="menu_section_chat_modes"),
-                InlineKeyboardButton(get_text("image_generate", language), callback_data="menu_image_generate")
-            ],
-            [
-                InlineKeyboardButton(get_text("menu_credits", language), callback_data="menu_section_credits"),
-                InlineKeyboardButton(get_text("menu_dialog_history", language), callback_data="menu_section_history")
-            ],
-            [
-                InlineKeyboardButton(get_text("menu_settings", language), callback_data="menu_section_settings"),
-                InlineKeyboardButton(get_text("menu_help", language), callback_data="menu_help")
-            ]
-        ]
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        
-        # Używanie welcome_message
+    try:
+        # Kredyty są rezerwowane według liczby stron i pobierane po przetłumaczeniu całego dokumentu
+        from handlers.pdf_handler import translate_pdf_file
+        await translate_pdf_file(context, user_id, language, document_file_id, None, status_message, query.message)
+    except Exception as e:
+        print(f"Błąd przy tłumaczeniu PDF: {e}")
+        await status_message.edit_text(f"{get_text('pdf_translation_error', language)}: {str(e)}")
+
+async def handle_history_new_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Rozpoczyna nową konwersację"""
+    query = update.callback_query
+    user_id = query.from_user.id
+    
+    # Twórz nową konwersację
+    conversation = create_new_conversation(user_id)
+    # Sprawdź, czy wiadomość ma podpis (jest to zdjęcie lub inny typ mediów)
+    if hasattr(query.message, 'caption'):
+        await query.edit_message_caption(
+            caption=get_text("new_chat_success", get_user_language(context, user_id)),
+            parse_mode=ParseMode.MARKDOWN
+        )
+    else:
+        await query.edit_message_text(
+            text=get_text("new_chat_success", get_user_language(context, user_id)),
+            parse_mode=ParseMode.MARKDOWN
+        )
+
+async def handle_history_export_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Eksportuje bieżącą konwersację do PDF"""
+    query = update.callback_query
+    
+    # Eksportuj bieżącą konwersację
+    from handlers.export_handler import export_conversation
+    # Tworzymy sztuczny obiekt update do przekazania do funkcji export_conversation
+    class FakeUpdate:
+        class FakeMessage:
+            def __init__(self, chat_id, message_id):
+                self.chat_id = chat_id
+                self.message_id = message_id
+                self.chat = type('obj', (object,), {'send_action': lambda *args, **kwargs: None})
+            async def reply_text(self, *args, **kwargs):
+                pass
+            async def reply_document(self, *args, **kwargs):
+                pass
+        def __init__(self, query):
+            self.message = self.FakeMessage(query.message.chat_id, query.message.message_id)
+            self.effective_user = query.from_user
+            self.effective_chat = type('obj', (object,), {'id': query.message.chat_id})
+    
+    fake_update = FakeUpdate(query)
+    await export_conversation(fake_update, context)
+    # Informacja o eksporcie
+    if hasattr(query.message, 'caption'):
+        await query.edit_message_caption(
+            caption="Eksportowanie konwersacji do PDF...",
+            parse_mode=ParseMode.MARKDOWN
+        )
+    else:
+        await query.edit_message_text(
+            text="Eksportowanie konwersacji do PDF...",
+            parse_mode=ParseMode.MARKDOWN
+        )
+
+async def handle_history_delete_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Pyta o potwierdzenie usunięcia historii"""
+    query = update.callback_query
+    user_id = query.from_user.id
+    
+    # Pytanie o potwierdzenie usunięcia historii
+    reply_markup = create_history_delete_markup(get_user_language(context, user_id))
+    if hasattr(query.message, 'caption'):
+        await query.edit_message_caption(
+            caption=get_text("history_delete_confirm", get_user_language(context, user_id)),
+            reply_markup=reply_markup,
+            parse_mode=ParseMode.MARKDOWN
+        )
+    else:
+        await query.edit_message_text(
+            text=get_text("history_delete_confirm", get_user_language(context, user_id)),
+            reply_markup=reply_markup,
+            parse_mode=ParseMode.MARKDOWN
+        )
+
+async def handle_restart_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Obsługa przycisku restartu bota"""
+    query = update.callback_query
+    user_id = query.from_user.id
+    chat_id = query.message.chat_id
+    language = get_user_language(context, user_id)
+    
+    restart_message = get_text("restarting_bot", language)
+    try:
+        if hasattr(query.message, 'caption'):
+            await query.edit_message_caption(caption=restart_message)
+        else:
+            await query.edit_message_text(text=restart_message)
+    except Exception as e:
+        print(f"Błąd przy aktualizacji wiadomości: {e}")
+    
+    # Resetowanie konwersacji - tworzymy nową konwersację i czyścimy kontekst
+    conversation = create_new_conversation(user_id)
+    
+    # Zachowujemy wybrane ustawienia użytkownika (język, model)
+    user_data = {}
+    if 'user_data' in context.chat_data and user_id in context.chat_data['user_data']:
+        # Pobieramy tylko podstawowe ustawienia, reszta jest resetowana
+        old_user_data = context.chat_data['user_data'][user_id]
+        if 'language' in old_user_data:
+            user_data['language'] = old_user_data['language']
+        if 'current_model' in old_user_data:
+            user_data['current_model'] = old_user_data['current_model']
+        if 'current_mode' in old_user_data:
+            user_data['current_mode'] = old_user_data['current_mode']
+    
+    # Resetujemy dane użytkownika w kontekście i ustawiamy tylko zachowane ustawienia
+    if 'user_data' not in context.chat_data:
+        context.chat_data['user_data'] = {}
+    context.chat_data['user_data'][user_id] = user_data
+    
+    # Potwierdź restart
+    restart_complete = get_text("restart_command", language)
+    
+    # Utwórz klawiaturę menu
+    reply_markup = create_main_menu_markup(language)
+    
+    # Wyślij nową wiadomość z menu
+    try:
+        # Używamy welcome_message zamiast main_menu + status
         welcome_text = get_text("welcome_message", language, bot_name=BOT_NAME)
+        message = await context.bot.send_message(
+            chat_id=chat_id,
+            text=restart_complete + "\n\n" + welcome_text,
+            reply_markup=reply_markup,
+            parse_mode=ParseMode.MARKDOWN
+        )
         
+        # Zapisz ID wiadomości menu i stan menu
+        from handlers.menu_handler import store_menu_state
+        store_menu_state(context, user_id, 'main', message.message_id)
+    except Exception as e:
+        print(f"Błąd przy wysyłaniu wiadomości po restarcie: {e}")
+        # Próbuj wysłać prostą wiadomość
         try:
-            # Wyślij nową wiadomość zamiast edytować starą
-            message = await context.bot.send_message(
-                chat_id=query.message.chat_id,
-                text=welcome_text,
-                reply_markup=reply_markup,
+            await context.bot.send_message(
+                chat_id=chat_id,
+                text=restart_complete
+            )
+        except Exception as e2:
+            print(f"Nie udało się wysłać nawet prostej wiadomości: {e2}")
+
+async def handle_history_confirm_delete_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Usuwa historię, rozpoczynając nową konwersację"""
+    query = update.callback_query
+    user_id = query.from_user.id
+    # Twórz nową konwersację (efektywnie "usuwając" historię)
+    conversation = create_new_conversation(user_id)
+    
+    if conversation:
+        from handlers.menu_handler import update_menu
+        await update_menu(update, context, 'history')
+    else:
+        if hasattr(query.message, 'caption'):
+            await query.edit_message_caption(
+                caption="Wystąpił błąd podczas czyszczenia historii.",
                 parse_mode=ParseMode.MARKDOWN
             )
-            # Zapisz ID nowej wiadomości menu
-            store_menu_state(context, user_id, 'main', message.message_id)
+        else:
+            await query.edit_message_text(
+                text="Wystąpił błąd podczas czyszczenia historii.",
+                parse_mode=ParseMode.MARKDOWN
+            )
+
+async def handle_back_to_main_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Powrót do głównego menu - nowa wiadomość, gdy nie udało się wysłać banera"""
+    query = update.callback_query
+    user_id = query.from_user.id
+    language = get_user_language(context, user_id)
+    
+    if await handle_back_to_main(update, context):
+        return
+    
+    reply_markup = create_main_menu_markup(language)
+    
+    # Używanie welcome_message
+    welcome_text = get_text("welcome_message", language, bot_name=BOT_NAME)
+    
+    try:
+        # Wyślij nową wiadomość zamiast edytować starą
+        message = await context.bot.send_message(
+            chat_id=query.message.chat_id,
+            text=welcome_text,
+            reply_markup=reply_markup,
+            parse_mode=ParseMode.MARKDOWN
+        )
+        # Zapisz ID nowej wiadomości menu
+        store_menu_state(context, user_id, 'main', message.message_id)
+        
+        # Opcjonalnie usuń starą wiadomość
+        try:
+            await query.message.delete()
+        except:
+            pass
             
-            # Opcjonalnie usuń starą wiadomość
-            try:
-                await query.message.delete()
-            except:
-                pass
-                
-            return
-        except Exception as e:
-            print(f"Błąd przy obsłudze menu_back_main: {e}")
-            # W przypadku błędu, kontynuujemy do standardowej obsługi
+        return
+    except Exception as e:
+        print(f"Błąd przy obsłudze menu_back_main: {e}")
 
+async def handle_callback_query(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Obsługa zapytań zwrotnych (z przycisków) - wywołuje trasę zarejestrowaną w routerze"""
+    query = update.callback_query
+    
+    # Zawsze odpowiadaj na callback, aby usunąć oczekiwanie
+    await query.answer()
+    
+    try:
+        if await callback_router.dispatch(update, context):
+            return
+    except Exception as e:
+        logger.error(f"Błąd obsługi callbacku {query.data}: {e}", exc_info=True)
+        try:
+            # Sprawdź, czy wiadomość ma podpis (jest to zdjęcie lub inny typ mediów)
+            if hasattr(query.message, 'caption'):
+                await query.edit_message_caption(caption=f"Wystąpił błąd podczas obsługi przycisku: {str(e)}")
+            else:
+                await query.edit_message_text(text=f"Wystąpił błąd podczas obsługi przycisku: {str(e)}")
+        except:
+            pass
+        return
+    
     # Jeśli dotarliśmy tutaj, oznacza to, że callback nie został obsłużony
     print(f"Nieobsłużony callback: {query.data}")
     try:
@@ -1563,7 +1434,7 @@ async def add_credits_admin(update: Update, context: ContextTypes.DEFAULT_TYPE):
     
     if success:
         # Pobierz aktualny stan kredytów
-        credits = get_user_credits(target_user_id)
+        credits = await get_user_credits_async(target_user_id)
         await update.message.reply_text(
             f"Dodano *{amount}* kredytów użytkownikowi ID: *{target_user_id}*\n"
             f"Aktualny stan kredytów: *{credits}*",
@@ -1597,7 +1468,7 @@ async def get_user_info(update: Update, context: ContextTypes.DEFAULT_TYPE):
     
     # Pobierz informacje o użytkowniku
     user = get_or_create_user(target_user_id)
-    credits = get_user_credits(target_user_id)
+    credits = await get_user_credits_async(target_user_id)
     
     if not user:
         await update.message.reply_text("Użytkownik nie istnieje w bazie danych.")
@@ -1629,10 +1500,128 @@ Dostępne kredyty: *{credits}*
 
 # Główna funkcja uruchamiająca bota
 
-def main():
-    """Funkcja uruchamiająca bota"""
-    # Inicjalizacja aplikacji
-    application = Application.builder().token(TELEGRAM_TOKEN).build()
+async def handle_note_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Obsługa przycisków notatek (moduł notatek jest importowany przy pierwszym użyciu)"""
+    from handlers.note_handler import handle_note_callback as note_callback
+    await note_callback(update, context)
+
+def register_callback_routes():
+    """Rejestruje trasy callbacków z przycisków inline w routerze"""
+    # Sekcje menu, ustawienia i zakup kredytów
+    for callback_data, handler in MENU_CALLBACKS.items():
+        callback_router.add(callback_data, handler)
+    
+    # Trasy z obsługą w main.py (zastępują odpowiedniki z menu)
+    callback_router.add("menu_back_main", handle_back_to_main_callback)
+    callback_router.add("history_view", handle_history_view_callback)
+    callback_router.add("menu_credits_check", handle_credits_check_callback)
+    callback_router.add("credits_check", handle_credits_check_callback)
+    callback_router.add("history_new", handle_history_new_callback)
+    callback_router.add("history_export", handle_history_export_callback)
+    callback_router.add("history_delete", handle_history_delete_callback)
+    callback_router.add("history_confirm_delete", handle_history_confirm_delete_callback)
+    callback_router.add("restart_bot", handle_restart_callback)
+    
+    # Przyciski z argumentem w callback_data
+    callback_router.add_prefix("onboarding_", handle_onboarding_callback)
+    callback_router.add_prefix("start_lang_", handle_language_selection)
+    callback_router.add_prefix("model_", handle_model_selection, str)
+    callback_router.add_prefix("mode_", handle_mode_selection, str)
+    callback_router.add_prefix("translate_photo_", handle_translate_photo_callback, str)
+    callback_router.add_prefix("translate_pdf_", handle_translate_pdf_callback, str)
+    
+    # Moduły z własną obsługą wielu przycisków
+    callback_router.add_prefix("theme_", handle_theme_callback)
+    callback_router.add("new_theme", handle_theme_callback)
+    callback_router.add("no_theme", handle_theme_callback)
+    callback_router.add_prefix("buy_", handle_credit_callback)
+    callback_router.add_prefix("credits_", handle_credit_callback)
+    callback_router.add("credit_advanced_analytics", handle_credit_callback)
+    callback_router.add("show_stars_options", handle_credit_callback)
+    callback_router.add_prefix("note_", handle_note_callback)
+    callback_router.add("new_note", handle_note_callback)
+    callback_router.add_prefix("reminder_", handle_reminder_callback)
+    callback_router.add("new_reminder", handle_reminder_callback)
+    
+    # Każdy przycisk musi mieć trasę
+    unrouted = callback_router.find_unrouted(iter_all_callback_data())
+    if unrouted:
+        logger.error(f"Przyciski bez obsługi: {', '.join(unrouted)}")
+
+def startup():
+    """
+    Faza startowa bota: inicjalizacja i aktualizacja bazy danych przed obsługą aktualizacji
+    
+    Moduły nie łączą się z bazą danych przy imporcie - schemat tworzony jest tutaj.
+    """
+    started = time.perf_counter()
+    
+    # Kompilacja katalogu tłumaczeń (braki zgłaszane są jednorazowo w logach)
+    from utils.translations import compile_catalog
+    compile_catalog()
+    
+    # Trasy przycisków inline
+    register_callback_routes()
+    
+    # Aktualizacja bazy danych przed uruchomieniem
+    from update_database import run_all_updates
+    run_all_updates()
+    
+    # Zwolnienie rezerwacji kredytów pozostałych po poprzednim uruchomieniu
+    from database.credits_client import release_expired_credit_holds
+    release_expired_credit_holds()
+    
+    logger.info(f"Baza danych gotowa w {(time.perf_counter() - started) * 1000:.0f} ms")
+
+async def on_startup(application):
+    """Uruchamia punkt kontroli stanu i harmonogram przypomnień oraz zapisuje w logach czas startu bota"""
+    if HEALTH_PORT:
+        await start_health_server(application, WEBHOOK_LISTEN, HEALTH_PORT, BOT_UPDATE_MODE)
+    
+    # Odtworzenie kolejki przypomnień z bazy danych
+    await reminder_scheduler.start(application.bot)
+    
+    logger.info(f"Bot gotowy do pobierania aktualizacji po {time.perf_counter() - STARTUP_STARTED_AT:.2f} s")
+
+async def on_stop(application):
+    """Wywoływana po obsłużeniu aktualizacji przyjętych przed zatrzymaniem bota"""
+    logger.info("Zakończono obsługę oczekujących aktualizacji")
+
+async def on_shutdown(application):
+    """Zatrzymuje harmonogram przypomnień i zwalnia zasoby bazy danych oraz pulę procesów wykresów"""
+    await stop_health_server()
+    await reminder_scheduler.stop()
+    shutdown_chart_pool()
+    shutdown_storage()
+
+def create_application(token=TELEGRAM_TOKEN, concurrent_updates=CONCURRENT_UPDATES, request=None):
+    """
+    Tworzy aplikację bota i rejestruje wszystkie handlery
+    
+    Args:
+        token (str, optional): Token bota. Domyślnie TELEGRAM_TOKEN.
+        concurrent_updates (int, optional): Liczba równocześnie obsługiwanych aktualizacji
+        request (BaseRequest, optional): Własna warstwa komunikacji z Bot API, także dla getUpdates
+            (np. w testach obciążeniowych i pomiarze czasu startu)
+    
+    Returns:
+        Application: Aplikacja gotowa do uruchomienia
+    """
+    builder = (
+        Application.builder()
+        .token(token)
+        .concurrent_updates(concurrent_updates)
+        .post_init(on_startup)
+        .post_stop(on_stop)
+        .post_shutdown(on_shutdown)
+    )
+    if request is not None:
+        builder = builder.request(request).get_updates_request(request)
+    application = builder.build()
+    
+    # Profil nadawcy (język, kredyty) jest wczytywany w wątku bazodanowym przed
+    # pozostałymi handlerami - jedno zapytanie na aktualizację, poza pętlą zdarzeń
+    application.add_handler(TypeHandler(Update, preload_user_profile), group=-1)
     
     # Handler dla help
     application.add_handler(CommandHandler("help", help_command))
@@ -1687,6 +1676,10 @@ def main():
     application.add_handler(CommandHandler("theme", theme_command))
     application.add_handler(CommandHandler("notheme", notheme_command))
     
+    # Handlery przypomnień
+    application.add_handler(CommandHandler("remind", remind_command))
+    application.add_handler(CommandHandler("reminders", reminders_command))
+    
     # WAŻNE: Handler callbacków (musi być przed handlerami mediów i tekstu)
     application.add_handler(CallbackQueryHandler(handle_callback_query))
     
@@ -1697,13 +1690,32 @@ def main():
     # Handler wiadomości tekstowych (zawsze na końcu)
     application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, message_handler))
     
-    # Uruchomienie bota
-    application.run_polling()
+    return application
 
-if __name__ == '__main__':
-    # Aktualizacja bazy danych przed uruchomieniem
-    from update_database import run_all_updates
-    run_all_updates()
+def main():
+    """Funkcja uruchamiająca bota"""
+    startup()
     
+    # Inicjalizacja aplikacji
+    application = create_application()
+    
+    # Uruchomienie bota - po sygnale zatrzymania przyjęte aktualizacje są obsługiwane do końca
+    if BOT_UPDATE_MODE == "webhook":
+        if not WEBHOOK_URL:
+            logger.error("Tryb webhook wymaga ustawienia WEBHOOK_URL")
+            return
+        
+        logger.info(f"Uruchamiam bota w trybie webhook na porcie {WEBHOOK_PORT}")
+        application.run_webhook(
+            listen=WEBHOOK_LISTEN,
+            port=WEBHOOK_PORT,
+            url_path=WEBHOOK_PATH,
+            webhook_url=f"{WEBHOOK_URL.rstrip('/')}/{WEBHOOK_PATH}",
+            secret_token=WEBHOOK_SECRET_TOKEN
+        )
+    else:
+        application.run_polling()
+
+if __name__ == '__main__':
     # Uruchomienie bota
     main()
\ No newline at end of file
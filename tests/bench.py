@@ -0,0 +1,54 @@
+"""
+Pomocnicze funkcje pomiarów wydajności w testach
+"""
+import asyncio
+import time
+
+def measure(func, repeat=1):
+    """
+    Mierzy czas wykonania funkcji
+
+    Returns:
+        float: Najkrótszy czas jednego z `repeat` wykonań (w sekundach)
+    """
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+def report(name, before, after, count=None):
+    """
+    Wypisuje wynik pomiaru (widoczny z opcją -s)
+
+    Args:
+        name (str): Opis pomiaru
+        before (float): Czas przed optymalizacją (w sekundach)
+        after (float): Czas po optymalizacji (w sekundach)
+        count (int, optional): Liczba operacji - wypisywana jest też przepustowość
+    """
+    line = f"\n{name}: przed {before * 1000:.1f} ms, po {after * 1000:.1f} ms ({before / after:.1f}x)"
+    if count:
+        line += f", {count / before:.0f} -> {count / after:.0f} operacji/s"
+    print(line)
+
+async def watch_loop_lag(stop, interval=0.005):
+    """Zwraca największe opóźnienie pętli zdarzeń (w sekundach) do momentu ustawienia `stop`"""
+    worst = 0.0
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(interval)
+        worst = max(worst, time.perf_counter() - started - interval)
+    return worst
+
+async def run_with_lag_watch(*coroutines):
+    """Wykonuje równocześnie korutyny i mierzy w tym czasie opóźnienie pętli zdarzeń"""
+    stop = asyncio.Event()
+    watcher = asyncio.create_task(watch_loop_lag(stop))
+    try:
+        results = await asyncio.gather(*coroutines)
+    finally:
+        stop.set()
+    return results, await watcher
@@ -0,0 +1,47 @@
+"""
+Wspólne fikstury testów
+
+Testy korzystają z tymczasowej bazy SQLite utworzonej przez run_all_updates(),
+dzięki czemu nie modyfikują pliku bot_database.sqlite.
+"""
+import os
+import pytest
+
+# Konfiguracja klienta OpenAI wymaga klucza API (testy nie wykonują zapytań)
+os.environ.setdefault("OPENAI_API_KEY", "test")
+
+def pytest_addoption(parser):
+    parser.addoption(
+        "--benchmark", action="store_true", default=False,
+        help="uruchom także pomiary wydajności (oznaczone jako benchmark)"
+    )
+
+def pytest_configure(config):
+    config.addinivalue_line("markers", "benchmark: pomiar wydajności (uruchamiany z opcją --benchmark lub -m benchmark)")
+
+def pytest_collection_modifyitems(config, items):
+    """
+    Pomiary wydajności porównują czasy wykonania, więc ich wynik zależy od obciążenia
+    maszyny - domyślnie są pomijane i uruchamiane tylko na żądanie
+    """
+    if config.getoption("--benchmark") or config.option.markexpr:
+        return
+    selected = [item for item in items if item.get_closest_marker("benchmark") is None]
+    deselected = [item for item in items if item.get_closest_marker("benchmark") is not None]
+    if deselected:
+        config.hook.pytest_deselected(items=deselected)
+        items[:] = selected
+
+@pytest.fixture
+def test_db(tmp_path, monkeypatch):
+    """Tymczasowa baza danych z pełnym schematem i migracjami indeksów"""
+    from database import connection
+    from update_database import run_all_updates
+
+    connection.close_all_connections()
+    monkeypatch.setattr(connection, "DB_PATH", str(tmp_path / "bot_database.sqlite"))
+    run_all_updates()
+
+    yield connection.DB_PATH
+
+    connection.close_all_connections()
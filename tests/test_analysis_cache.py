@@ -0,0 +1,96 @@
+"""
+Testy pamięci podręcznej analiz dokumentów i obrazów (utils/analysis_cache.py)
+"""
+import asyncio
+from collections import OrderedDict
+
+import pytest
+
+pytest.importorskip("supabase")
+
+from utils import analysis_cache, response_cache
+from utils.analysis_cache import get_analysis_key, get_or_create_analysis
+
+DOCUMENT = b"%PDF-1.4 raport kwartalny"
+
+@pytest.fixture
+def cache(test_db, monkeypatch):
+    """Puste pamięci procesu i wyzerowane statystyki obu pamięci podręcznych"""
+    monkeypatch.setattr(response_cache, "_memory_cache", OrderedDict())
+    monkeypatch.setattr(response_cache, "_metrics", dict.fromkeys(response_cache._metrics, 0))
+    monkeypatch.setattr(analysis_cache, "_in_flight", {})
+    monkeypatch.setattr(analysis_cache, "_metrics", dict.fromkeys(analysis_cache._metrics, 0))
+
+class CountingAnalysis:
+    """Analiza zliczająca wywołania; pierwsze wywołania mogą kończyć się błędem"""
+
+    def __init__(self, failures=0):
+        self.calls = 0
+        self.failures = failures
+
+    async def __call__(self):
+        self.calls += 1
+        await asyncio.sleep(0.01)
+        if self.calls <= self.failures:
+            raise RuntimeError("OpenAI niedostępne")
+        return f"Analiza nr {self.calls}"
+
+def test_key_depends_on_content_and_translation_language():
+    key = get_analysis_key("document", DOCUMENT, "analyze", "en")
+
+    assert key == get_analysis_key("document", DOCUMENT, "analyze", "pl")
+    assert key != get_analysis_key("document", DOCUMENT + b" v2", "analyze", "en")
+    assert get_analysis_key("document", DOCUMENT, "translate", "en") != get_analysis_key("document", DOCUMENT, "translate", "pl")
+    assert get_analysis_key("image", "unique-id", "analyze", "en") == "analysis:image:file:unique-id:analyze:"
+
+def test_concurrent_identical_uploads_share_one_call(cache):
+    analyze = CountingAnalysis()
+    key = get_analysis_key("document", DOCUMENT, "analyze", "pl")
+
+    async def uploads():
+        return await asyncio.gather(*(get_or_create_analysis(key, analyze) for _ in range(10)))
+
+    results = asyncio.run(uploads())
+
+    assert analyze.calls == 1
+    assert results == ["Analiza nr 1"] * 10
+    assert analysis_cache._in_flight == {}
+    metrics = analysis_cache.get_analysis_cache_metrics()
+    assert (metrics['misses'], metrics['joined']) == (1, 9)
+
+def test_failed_analysis_is_not_cached(cache):
+    analyze = CountingAnalysis(failures=1)
+    key = get_analysis_key("document", DOCUMENT, "analyze", "pl")
+
+    async def waiting_uploads():
+        return await asyncio.gather(*(get_or_create_analysis(key, analyze) for _ in range(3)), return_exceptions=True)
+
+    results = asyncio.run(waiting_uploads())
+    assert all(isinstance(result, RuntimeError) for result in results)
+    assert analyze.calls == 1
+
+    # Kolejne przesłanie wykonuje analizę ponownie
+    assert asyncio.run(get_or_create_analysis(key, analyze)) == "Analiza nr 2"
+    assert analysis_cache.get_analysis_cache_metrics()['failures'] == 1
+
+def test_analysis_survives_restart(cache, monkeypatch):
+    analyze = CountingAnalysis()
+    key = get_analysis_key("document", DOCUMENT, "analyze", "pl")
+    asyncio.run(get_or_create_analysis(key, analyze))
+
+    # Nowy proces - pusta pamięć procesu, wynik pozostaje w bazie danych
+    monkeypatch.setattr(response_cache, "_memory_cache", OrderedDict())
+
+    assert asyncio.run(get_or_create_analysis(key, analyze)) == "Analiza nr 1"
+    assert analyze.calls == 1
+    assert analysis_cache.get_analysis_cache_metrics()['hits'] == 1
+
+def test_analyses_do_not_change_response_cache_metrics(cache):
+    key = get_analysis_key("image", "unique-id", "analyze", "pl")
+
+    asyncio.run(get_or_create_analysis(key, CountingAnalysis()))
+    asyncio.run(get_or_create_analysis(key, CountingAnalysis()))
+
+    metrics = response_cache.get_cache_metrics()
+    assert (metrics['memory_hits'], metrics['db_hits'], metrics['misses'], metrics['stores']) == (0, 0, 0, 0)
+    assert analysis_cache.get_analysis_cache_metrics()['hits'] == 1
@@ -0,0 +1,67 @@
+"""
+Testy asynchronicznej fasady dostępu do danych (database/async_storage.py)
+"""
+import asyncio
+import time
+
+import pytest
+
+pytest.importorskip("supabase")
+
+from database import async_storage
+from database.credits_client import add_user_credits
+from tests.bench import run_with_lag_watch
+
+# Liczba równoczesnych użytkowników
+CONCURRENT_USERS = 100
+
+# Liczba operacji kredytowych wykonywanych przez każdego użytkownika
+OPERATIONS_PER_USER = 5
+
+# Czas trwania symulowanego wolnego zapytania (w sekundach)
+SLOW_QUERY_SECONDS = 0.05
+
+def test_concurrent_users_do_not_lose_updates(test_db):
+    for user_id in range(1, CONCURRENT_USERS + 1):
+        add_user_credits(user_id, 100, "Test")
+
+    async def user_session(user_id):
+        for _ in range(OPERATIONS_PER_USER):
+            assert await async_storage.deduct_user_credits_async(user_id, 1, "Wiadomość", "message")
+            hold_id = await async_storage.reserve_user_credits_async(user_id, 2, "Wiadomość", "message")
+            assert hold_id is not None
+            assert await async_storage.commit_user_credits_async(hold_id)
+        return await async_storage.get_user_credits_async(user_id)
+
+    balances, lag = asyncio.run(run_with_lag_watch(
+        *(user_session(user_id) for user_id in range(1, CONCURRENT_USERS + 1))
+    ))
+
+    assert balances == [100 - 3 * OPERATIONS_PER_USER] * CONCURRENT_USERS
+    assert lag < 0.1
+
+def test_concurrent_reservations_never_overdraw(test_db):
+    add_user_credits(1, 50, "Test")
+
+    holds, _ = asyncio.run(run_with_lag_watch(
+        *(async_storage.reserve_user_credits_async(1, 1, "Wiadomość", "message") for _ in range(CONCURRENT_USERS))
+    ))
+
+    assert len([hold_id for hold_id in holds if hold_id is not None]) == 50
+    assert asyncio.run(async_storage.get_user_credits_async(1)) == 0
+
+def test_slow_storage_calls_do_not_block_event_loop():
+    calls = async_storage.DB_WORKER_THREADS * 2
+
+    async def scenario():
+        started = time.perf_counter()
+        _, lag = await run_with_lag_watch(
+            *(async_storage.run_db(time.sleep, SLOW_QUERY_SECONDS) for _ in range(calls))
+        )
+        return time.perf_counter() - started, lag
+
+    elapsed, lag = asyncio.run(scenario())
+
+    # Wywołania wykonywane jedno po drugim trwałyby calls * SLOW_QUERY_SECONDS
+    assert elapsed < calls * SLOW_QUERY_SECONDS / 2
+    assert lag < SLOW_QUERY_SECONDS
@@ -0,0 +1,109 @@
+"""
+Testy routera callbacków z przycisków inline (utils/callback_router.py)
+"""
+import ast
+import asyncio
+from pathlib import Path
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("supabase")
+
+import main
+from utils.callback_router import CallbackRouter, callback_router
+
+ROOT = Path(main.__file__).parent
+
+def make_update(data):
+    return SimpleNamespace(callback_query=SimpleNamespace(data=data))
+
+def iter_source_callback_data():
+    """
+    Zwraca callback_data wpisane w kodzie handlerów i main.py
+
+    Dla f-stringów zwracany jest stały początek z przykładowym argumentem "1".
+    """
+    for path in [ROOT / "main.py", *sorted((ROOT / "handlers").glob("*.py"))]:
+        for node in ast.walk(ast.parse(path.read_text(encoding="utf-8"))):
+            if not isinstance(node, ast.keyword) or node.arg != "callback_data":
+                continue
+            if isinstance(node.value, ast.Constant):
+                yield path.name, node.value.value
+            elif isinstance(node.value, ast.JoinedStr):
+                prefix = node.value.values[0]
+                yield path.name, (prefix.value if isinstance(prefix, ast.Constant) else "") + "1"
+
+def test_every_button_has_route():
+    main.register_callback_routes()
+
+    callback_data = list(main.iter_all_callback_data())
+    for expected in ("menu_section_credits", "buy_package_1", "credits_stats", "show_stars_options",
+                     "theme_1", "reminder_complete_1", "onboarding_finish",
+                     "translate_pdf_file_id", "translate_photo_file_id", "history_confirm_delete"):
+        assert expected in callback_data
+    assert any(data.startswith("buy_stars_") for data in callback_data)
+    assert callback_router.find_unrouted(callback_data) == []
+
+def test_every_button_in_source_has_route():
+    main.register_callback_routes()
+
+    # Obejmuje też moduł notatek, którego nie można zaimportować bez magazynu notatek
+    source = list(iter_source_callback_data())
+    assert ("note_handler.py", "note_confirm_delete_1") in source
+    assert {name for name, _ in source} >= {"main.py", "credit_handler.py", "note_handler.py", "start_handler.py"}
+    assert [(name, data) for name, data in source if callback_router.resolve(data)[0] is None] == []
+
+def test_exact_route_takes_precedence_over_prefix():
+    router = CallbackRouter()
+    router.add_prefix("credits_", "prefix")
+    router.add("credits_check", "exact")
+
+    assert router.resolve("credits_check")[0].handler == "exact"
+    assert router.resolve("credits_history")[0].handler == "prefix"
+
+def test_longest_prefix_and_typed_payload():
+    router = CallbackRouter()
+    router.add_prefix("buy_", "buy")
+    router.add_prefix("buy_package_", "package", int)
+
+    route, payload = router.resolve("buy_package_3")
+    assert (route.handler, payload) == ("package", 3)
+
+    route, payload = router.resolve("buy_stars_50")
+    assert (route.handler, payload) == ("buy", "stars_50")
+
+    # Argument niezgodny z typem trasy - brak obsługi
+    assert router.resolve("buy_package_x") == (None, None)
+    assert router.resolve("unknown") == (None, None)
+
+def test_prefix_must_end_with_separator():
+    with pytest.raises(ValueError):
+        CallbackRouter().add_prefix("model", "handler")
+
+def test_dispatch_records_route_metrics():
+    router = CallbackRouter()
+    payloads = []
+
+    async def select_model(update, context, model_id):
+        payloads.append(model_id)
+
+    async def broken(update, context):
+        raise RuntimeError("błąd")
+
+    router.add_prefix("model_", select_model, str)
+    router.add("broken", broken)
+
+    async def press():
+        assert await router.dispatch(make_update("model_gpt-4o"), None)
+        assert not await router.dispatch(make_update("missing"), None)
+        with pytest.raises(RuntimeError):
+            await router.dispatch(make_update("broken"), None)
+
+    asyncio.run(press())
+
+    metrics = router.metrics()
+    assert payloads == ["gpt-4o"]
+    assert metrics['unhandled'] == 1
+    assert metrics['routes']['model_']['calls'] == 1
+    assert metrics['routes']['broken']['errors'] == 1
@@ -0,0 +1,167 @@
+"""
+Testy pamięci podręcznej wykresów kredytów (utils/chart_cache.py)
+"""
+import asyncio
+import io
+from collections import OrderedDict
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("supabase")
+
+from telegram.error import BadRequest
+
+from database.credits_client import add_user_credits
+from utils import chart_cache
+from utils.chart_cache import get_chart, get_chart_key, send_credit_chart
+
+USER_ID = 1
+
+class FakeRenderer:
+    """Generator wykresów zwracający PNG o zadanej wielkości i zliczający wywołania"""
+
+    def __init__(self, size=100):
+        self.size = size
+        self.calls = []
+
+    async def __call__(self, user_id, days):
+        self.calls.append((user_id, days))
+        await asyncio.sleep(0.01)
+        return io.BytesIO(bytes([len(self.calls) % 256]) * self.size)
+
+class FakeBot:
+    """Bot zapisujący wysłane zdjęcia; przesłany plik otrzymuje nowy file_id"""
+
+    def __init__(self):
+        self.sent = []
+
+    async def send_photo(self, chat_id, photo, caption=None):
+        if isinstance(photo, str):
+            if photo.startswith("expired"):
+                raise BadRequest("Wrong file identifier")
+            self.sent.append(("file_id", photo))
+            return SimpleNamespace(photo=[SimpleNamespace(file_id=photo)])
+
+        file_id = f"file-{len(self.sent)}"
+        self.sent.append(("upload", file_id))
+        return SimpleNamespace(photo=[SimpleNamespace(file_id="thumbnail"), SimpleNamespace(file_id=file_id)])
+
+@pytest.fixture
+def renderer(monkeypatch):
+    """Pusta pamięć wykresów, bez zapisu na dysku"""
+    fake = FakeRenderer()
+    monkeypatch.setattr(chart_cache, "CHART_GENERATORS", {"usage": fake, "breakdown": fake})
+    monkeypatch.setattr(chart_cache, "CHART_CACHE_DIR", None)
+    monkeypatch.setattr(chart_cache, "_png_cache", OrderedDict())
+    monkeypatch.setattr(chart_cache, "_png_cache_bytes", 0)
+    monkeypatch.setattr(chart_cache, "_file_ids", OrderedDict())
+    monkeypatch.setattr(chart_cache, "_in_flight", {})
+    monkeypatch.setattr(chart_cache, "_ledger_versions", {})
+    monkeypatch.setattr(chart_cache, "_metrics", dict.fromkeys(chart_cache._metrics, 0))
+    return fake
+
+def key(days, user_id=USER_ID, transaction_id=1):
+    return get_chart_key(user_id, "usage", days, "pl", transaction_id)
+
+def test_memory_cache_is_bounded_by_bytes(renderer, monkeypatch):
+    monkeypatch.setattr(chart_cache, "CHART_CACHE_MAX_BYTES", 250)
+
+    async def render_all():
+        for days in (7, 14, 30):
+            await get_chart(key(days))
+        # Odczyt odświeża wykres - usunięty zostaje najdawniej używany
+        await get_chart(key(14))
+        await get_chart(key(60))
+
+    asyncio.run(render_all())
+
+    assert list(chart_cache._png_cache) == [key(14), key(60)]
+    assert chart_cache._png_cache_bytes == 200
+    assert chart_cache.get_chart_cache_metrics()['memory_hits'] == 1
+
+def test_overwriting_chart_keeps_byte_count(renderer):
+    chart_cache._remember_png(key(7), b"x" * 100)
+    chart_cache._remember_png(key(7), b"y" * 40)
+
+    assert chart_cache._png_cache_bytes == 40
+    assert list(chart_cache._png_cache.values()) == [b"y" * 40]
+
+def test_concurrent_requests_share_one_render(renderer):
+    async def requests():
+        return await asyncio.gather(*(get_chart(key(30)) for _ in range(5)))
+
+    charts = asyncio.run(requests())
+
+    assert len(renderer.calls) == 1
+    assert len(set(charts)) == 1
+    assert chart_cache._in_flight == {}
+    assert chart_cache.get_chart_cache_metrics()['shared_renders'] == 4
+
+def test_evicted_charts_spill_to_disk(renderer, monkeypatch, tmp_path):
+    monkeypatch.setattr(chart_cache, "CHART_CACHE_DIR", str(tmp_path))
+    monkeypatch.setattr(chart_cache, "CHART_CACHE_MAX_BYTES", 150)
+
+    async def scenario():
+        first = await get_chart(key(7))
+        await get_chart(key(14))
+        assert len(list(tmp_path.glob("*.png"))) == 1
+
+        # Wykres usunięty z pamięci jest odczytywany z dysku, bez ponownego generowania
+        assert await get_chart(key(7)) == first
+
+    asyncio.run(scenario())
+
+    assert len(renderer.calls) == 2
+    assert chart_cache.get_chart_cache_metrics()['disk_hits'] == 1
+
+def test_sent_chart_is_reused_by_file_id(renderer, test_db):
+    add_user_credits(USER_ID, 100, "Test")
+    bot = FakeBot()
+
+    async def send_twice():
+        for _ in range(2):
+            assert await send_credit_chart(bot, 10, USER_ID, "usage", 30, "pl", "Wykres")
+
+    asyncio.run(send_twice())
+
+    assert bot.sent == [("upload", "file-0"), ("file_id", "file-0")]
+    assert len(renderer.calls) == 1
+    assert chart_cache.get_chart_cache_metrics()['file_id_hits'] == 1
+
+def test_rejected_file_id_falls_back_to_upload(renderer, test_db):
+    add_user_credits(USER_ID, 100, "Test")
+    bot = FakeBot()
+
+    async def scenario():
+        await send_credit_chart(bot, 10, USER_ID, "usage", 30, "pl", "Wykres")
+        chart_key = next(iter(chart_cache._file_ids))
+        chart_cache._file_ids[chart_key] = "expired-id"
+        await send_credit_chart(bot, 10, USER_ID, "usage", 30, "pl", "Wykres")
+
+    asyncio.run(scenario())
+
+    assert [kind for kind, _ in bot.sent] == ["upload", "upload"]
+    assert len(renderer.calls) == 1
+
+def test_new_transaction_invalidates_user_charts(renderer, test_db, monkeypatch, tmp_path):
+    monkeypatch.setattr(chart_cache, "CHART_CACHE_DIR", str(tmp_path))
+    add_user_credits(USER_ID, 100, "Test")
+    add_user_credits(USER_ID + 1, 100, "Test")
+    bot = FakeBot()
+    (tmp_path / f"{USER_ID}_stary.png").write_bytes(b"png")
+
+    async def scenario():
+        await send_credit_chart(bot, 10, USER_ID, "usage", 30, "pl", "Wykres")
+        await send_credit_chart(bot, 20, USER_ID + 1, "usage", 30, "pl", "Wykres")
+        add_user_credits(USER_ID, 50, "Doładowanie")
+        await send_credit_chart(bot, 10, USER_ID, "usage", 30, "pl", "Wykres")
+
+    asyncio.run(scenario())
+
+    # Wykres użytkownika jest generowany i przesyłany ponownie, wykres innego użytkownika zostaje
+    assert [kind for kind, _ in bot.sent] == ["upload", "upload", "upload"]
+    assert len(renderer.calls) == 3
+    assert sorted(chart_key[0] for chart_key in chart_cache._png_cache) == [USER_ID, USER_ID + 1]
+    assert len(chart_cache._file_ids) == 2
+    assert not (tmp_path / f"{USER_ID}_stary.png").exists()
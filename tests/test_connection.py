@@ -0,0 +1,82 @@
+"""
+Testy puli połączeń SQLite (database/connection.py)
+"""
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+import pytest
+
+from database import connection, credits_client, sqlite_client
+from tests.bench import measure, report
+
+# Liczba wiadomości w pomiarze wydajności
+BENCHMARK_MESSAGES = 300
+
+@contextmanager
+def connect_per_call(db_path=None):
+    """Dawny wzorzec dostępu: nowe połączenie dla każdego wywołania funkcji bazodanowej"""
+    conn = sqlite3.connect(db_path or connection.DB_PATH)
+    try:
+        yield conn
+        conn.commit()
+    finally:
+        conn.close()
+
+def handle_message(user_id, number):
+    """Zapytania wykonywane przy obsłudze jednej wiadomości czatu"""
+    sqlite_client.get_or_create_user(user_id)
+    hold_id = credits_client.reserve_user_credits(user_id, 1, "Wiadomość", "message")
+    conversation = sqlite_client.get_active_conversation(user_id)
+    sqlite_client.save_message(conversation['id'], user_id, f"Pytanie {number}", True)
+    sqlite_client.get_conversation_history(conversation['id'], limit=20)
+    sqlite_client.get_conversation_summary(conversation['id'])
+    sqlite_client.get_cached_response(f"klucz-{number}", 24)
+    sqlite_client.save_message(conversation['id'], user_id, f"Odpowiedź {number}", False, "gpt-4o")
+    credits_client.commit_user_credits(hold_id)
+    return credits_client.get_user_credits(user_id)
+
+def test_connection_is_reused_per_thread(test_db):
+    with connection.get_connection() as first:
+        pass
+    with connection.get_connection() as second:
+        pass
+    assert first is second
+
+    other = []
+    thread = threading.Thread(target=lambda: other.append(connection._get_thread_state(test_db)['conn']))
+    thread.start()
+    thread.join()
+    assert other[0] is not first
+
+def test_nested_use_shares_one_transaction(test_db):
+    with pytest.raises(RuntimeError):
+        with connection.get_connection() as conn:
+            conn.execute("INSERT INTO users (id, username) VALUES (1, 'a')")
+            with connection.get_connection() as inner:
+                inner.execute("INSERT INTO users (id, username) VALUES (2, 'b')")
+            raise RuntimeError("wycofaj")
+
+    with connection.get_connection() as conn:
+        assert conn.execute("SELECT COUNT(*) FROM users").fetchone()[0] == 0
+
+@pytest.mark.benchmark
+def test_benchmark_messages_per_second(test_db, monkeypatch):
+    user_id = 1
+    sqlite_client.get_or_create_user(user_id)
+    credits_client.add_user_credits(user_id, BENCHMARK_MESSAGES * 2, "Test")
+
+    def run(offset):
+        for number in range(BENCHMARK_MESSAGES):
+            handle_message(user_id, offset + number)
+
+    pooled = measure(lambda: run(0))
+
+    with monkeypatch.context() as patch:
+        patch.setattr(sqlite_client, "get_connection", connect_per_call)
+        patch.setattr(credits_client, "get_connection", connect_per_call)
+        per_call = measure(lambda: run(BENCHMARK_MESSAGES))
+
+    report("Obsługa wiadomości", per_call, pooled, count=BENCHMARK_MESSAGES)
+    assert credits_client.get_user_credits(user_id) == 0
+    assert pooled < per_call
@@ -0,0 +1,152 @@
+"""
+Testy kompaktowania długich konwersacji (utils/conversation_summary.py)
+"""
+import asyncio
+from collections import OrderedDict
+
+import pytest
+
+pytest.importorskip("supabase")
+
+from database.sqlite_client import get_conversation_summary, save_conversation_summary
+from utils import conversation_summary, token_counter
+from utils.conversation_summary import (
+    COMPACTION_BATCH_TOKENS, COMPACTION_TRIGGER_TOKENS, KEEP_RECENT_MESSAGES, compact_conversation
+)
+from utils.openai_client import prepare_context_from_history
+from utils.token_counter import SUMMARY_PREFIX, count_tokens
+
+CONVERSATION_ID = 1
+
+MODEL = "gpt-3.5-turbo"
+
+class FakeHistory:
+    """Historia konwersacji (Supabase) przechowywana w pamięci"""
+
+    def __init__(self):
+        self.messages = []
+
+    def add(self, count, tokens):
+        for _ in range(count):
+            message_id = len(self.messages) + 1
+            self.messages.append({
+                'id': message_id,
+                'content': f"wiadomość {message_id} " + "x" * (tokens * token_counter.CHARS_PER_TOKEN),
+                'is_from_user': message_id % 2 == 1
+            })
+
+    async def get(self, conversation_id, limit=20, before_id=None, after_id=None):
+        newer = [message for message in self.messages if after_id is None or message['id'] > after_id]
+        return newer[:limit]
+
+class FakeSummarizer:
+    """chat_completion zwracające kolejne podsumowania i zapisujące przekazany materiał"""
+
+    def __init__(self, error=None):
+        self.materials = []
+        self.error = error
+
+    async def __call__(self, messages, model=None, raise_on_error=False):
+        if self.error is not None:
+            raise self.error
+        self.materials.append(messages[1]['content'])
+        return f"Podsumowanie {len(self.materials)}"
+
+@pytest.fixture
+def history(test_db, monkeypatch):
+    """Pusta konwersacja; tokeny liczone na podstawie liczby znaków (bez tiktoken)"""
+    monkeypatch.setattr(token_counter, "tiktoken", None)
+    monkeypatch.setattr(token_counter, "_token_cache", OrderedDict())
+    fake = FakeHistory()
+    monkeypatch.setattr(conversation_summary, "get_conversation_history_async", fake.get)
+    return fake
+
+def use_summarizer(monkeypatch, summarizer):
+    monkeypatch.setattr(conversation_summary, "chat_completion", summarizer)
+    return summarizer
+
+def test_short_conversation_is_not_compacted(history, monkeypatch):
+    summarizer = use_summarizer(monkeypatch, FakeSummarizer())
+    history.add(KEEP_RECENT_MESSAGES + 5, tokens=COMPACTION_TRIGGER_TOKENS // (2 * (KEEP_RECENT_MESSAGES + 5)))
+
+    assert not asyncio.run(compact_conversation(CONVERSATION_ID))
+    assert summarizer.materials == []
+    assert get_conversation_summary(CONVERSATION_ID) is None
+
+def test_recent_messages_are_not_compacted(history, monkeypatch):
+    summarizer = use_summarizer(monkeypatch, FakeSummarizer())
+    # Sama najnowsza część przekracza próg, ale nie ma starszych wiadomości do podsumowania
+    history.add(KEEP_RECENT_MESSAGES, tokens=COMPACTION_TRIGGER_TOKENS)
+
+    assert not asyncio.run(compact_conversation(CONVERSATION_ID))
+    assert summarizer.materials == []
+
+def test_long_conversation_keeps_recent_messages(history, monkeypatch):
+    summarizer = use_summarizer(monkeypatch, FakeSummarizer())
+    history.add(30, tokens=COMPACTION_TRIGGER_TOKENS // 20)
+
+    assert asyncio.run(compact_conversation(CONVERSATION_ID))
+
+    summary = get_conversation_summary(CONVERSATION_ID)
+    assert summary['last_message_id'] == 30 - KEEP_RECENT_MESSAGES
+    assert summary['summary'] == f"Podsumowanie {len(summarizer.materials)}"
+    assert "wiadomość 1 " in summarizer.materials[0]
+    assert all(f"wiadomość {30 - KEEP_RECENT_MESSAGES + 1} " not in material for material in summarizer.materials)
+
+def test_large_backlog_is_summarized_in_batches(history, monkeypatch):
+    summarizer = use_summarizer(monkeypatch, FakeSummarizer())
+    history.add(60, tokens=COMPACTION_BATCH_TOKENS // 10)
+
+    assert asyncio.run(compact_conversation(CONVERSATION_ID))
+
+    assert len(summarizer.materials) > 1
+    # Każda partia łączy poprzednie podsumowanie z nowymi wiadomościami
+    for index, material in enumerate(summarizer.materials[1:], start=1):
+        assert material.startswith(f"Dotychczasowe podsumowanie:\nPodsumowanie {index}")
+    assert get_conversation_summary(CONVERSATION_ID)['last_message_id'] == 60 - KEEP_RECENT_MESSAGES
+
+def test_next_compaction_continues_after_stored_summary(history, monkeypatch):
+    summarizer = use_summarizer(monkeypatch, FakeSummarizer())
+    save_conversation_summary(CONVERSATION_ID, "Wcześniejsze ustalenia", 20)
+    history.add(50, tokens=COMPACTION_TRIGGER_TOKENS // 20)
+
+    assert asyncio.run(compact_conversation(CONVERSATION_ID))
+
+    material = summarizer.materials[0]
+    assert material.startswith("Dotychczasowe podsumowanie:\nWcześniejsze ustalenia")
+    assert "wiadomość 20 " not in material and "wiadomość 21 " in material
+    assert get_conversation_summary(CONVERSATION_ID)['last_message_id'] == 50 - KEEP_RECENT_MESSAGES
+
+def test_failed_summary_keeps_previous_state(history, monkeypatch):
+    use_summarizer(monkeypatch, FakeSummarizer(error=RuntimeError("OpenAI niedostępne")))
+    history.add(30, tokens=COMPACTION_TRIGGER_TOKENS // 20)
+
+    assert not asyncio.run(compact_conversation(CONVERSATION_ID))
+    assert get_conversation_summary(CONVERSATION_ID) is None
+    assert conversation_summary._in_progress == set()
+
+def test_concurrent_compaction_runs_once(history, monkeypatch):
+    summarizer = use_summarizer(monkeypatch, FakeSummarizer())
+    history.add(30, tokens=COMPACTION_TRIGGER_TOKENS // 20)
+
+    async def compact_twice():
+        return await asyncio.gather(compact_conversation(CONVERSATION_ID), compact_conversation(CONVERSATION_ID))
+
+    assert sorted(asyncio.run(compact_twice())) == [False, True]
+    assert len(summarizer.materials) == 1
+
+def test_stored_summary_replaces_covered_history_in_context(history, monkeypatch):
+    use_summarizer(monkeypatch, FakeSummarizer())
+    history.add(30, tokens=COMPACTION_TRIGGER_TOKENS // 20)
+    asyncio.run(compact_conversation(CONVERSATION_ID))
+    summary = get_conversation_summary(CONVERSATION_ID)
+
+    messages, used = prepare_context_from_history(history.messages, "Pytanie", "Prompt", MODEL, summary)
+
+    assert messages[1] == {"role": "system", "content": SUMMARY_PREFIX + summary['summary']}
+    # Podsumowane wiadomości nie są wysyłane ponownie - kontekst zawiera tylko najnowsze
+    included = [message['content'] for message in messages[2:-1]]
+    assert included == [message['content'] for message in history.messages[-KEEP_RECENT_MESSAGES:]]
+    assert used == token_counter.TOKENS_PER_REPLY + sum(
+        token_counter.TOKENS_PER_MESSAGE + count_tokens(message['content'], MODEL) for message in messages
+    )
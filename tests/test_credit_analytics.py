@@ -0,0 +1,206 @@
+"""
+Testy analityki kredytów (utils/credit_analytics.py)
+"""
+import asyncio
+import datetime
+import random
+
+import pytest
+import pytz
+
+pytest.importorskip("supabase")
+
+from database.connection import get_connection
+from update_database import backfill_credit_usage_daily
+from utils import credit_analytics
+from tests.bench import measure, report, run_with_lag_watch
+
+USER_ID = 1
+
+# Liczba równoczesnych żądań /creditanalysis w pomiarze opóźnienia pętli zdarzeń
+CONCURRENT_CHART_REQUESTS = 4
+
+# Liczba transakcji użytkownika w pomiarze wydajności agregacji
+BENCHMARK_TRANSACTIONS = 100000
+
+# Rodzaje operacji: (kategoria, opis transakcji)
+OPERATIONS = [
+    ("message", "Wiadomość (gpt-4o)"),
+    ("image", "Generowanie obrazu DALL-E"),
+    ("photo", "Analiza zdjęcia"),
+    ("document", "Analiza dokumentu: raport.pdf")
+]
+
+def insert_transactions(user_id, count, days=30, seed=0):
+    """
+    Zapisuje historię transakcji użytkownika z ostatnich `days` dni i przebudowuje
+    dzienne podsumowania zużycia
+
+    Returns:
+        list: Zapisane wiersze (created_at, transaction_type, amount, credits_after, description, category)
+    """
+    rng = random.Random(seed)
+    now = datetime.datetime.now(pytz.UTC)
+    times = sorted(now - datetime.timedelta(seconds=rng.randint(0, (days - 1) * 86400)) for _ in range(count))
+
+    rows = []
+    balance = count * 10
+    for created_at in times:
+        if rng.random() < 0.1:
+            transaction_type, category, description, amount = "purchase", "other", "Zakup pakietu", rng.randint(50, 100)
+            balance += amount
+        else:
+            category, description = rng.choice(OPERATIONS)
+            transaction_type, amount = "deduct", rng.randint(1, 10)
+            balance -= amount
+        rows.append((created_at.isoformat(), transaction_type, amount, balance, description, category))
+
+    with get_connection() as conn:
+        conn.executemany(
+            "INSERT INTO credit_transactions (user_id, transaction_type, amount, credits_before, credits_after, description, category, created_at) "
+            "VALUES (?, ?, ?, 0, ?, ?, ?, ?)",
+            [(user_id, row[1], row[2], row[3], row[4], row[5], row[0]) for row in rows]
+        )
+        conn.execute(
+            "INSERT OR REPLACE INTO user_credits (user_id, credits_amount) VALUES (?, ?)",
+            (user_id, balance)
+        )
+
+    backfill_credit_usage_daily(rebuild=True)
+    return rows
+
+def legacy_daily_usage(user_id, days=30):
+    """Dawna agregacja: pętla po wszystkich transakcjach i wyszukiwanie dnia na liście (O(n·d))"""
+    start_date = (datetime.datetime.now(pytz.UTC) - datetime.timedelta(days=days)).isoformat()
+    with get_connection() as conn:
+        transactions = conn.execute("""
+            SELECT created_at, transaction_type, amount, credits_after
+            FROM credit_transactions
+            WHERE user_id = ? AND created_at >= ?
+            ORDER BY created_at ASC
+        """, (user_id, start_date)).fetchall()
+
+    dates, usage_amounts, purchase_amounts = [], [], []
+    for created_at, transaction_type, amount, _ in transactions:
+        dates.append(datetime.datetime.fromisoformat(created_at.replace('Z', '+00:00')))
+        usage_amounts.append(amount if transaction_type == 'deduct' else 0)
+        purchase_amounts.append(amount if transaction_type in ['add', 'purchase'] else 0)
+
+    unique_dates = sorted(set(dt.date() for dt in dates))
+    daily_usage = [0] * len(unique_dates)
+    daily_purchases = [0] * len(unique_dates)
+    for dt, usage, purchase in zip(dates, usage_amounts, purchase_amounts):
+        date_idx = unique_dates.index(dt.date())
+        daily_usage[date_idx] += usage
+        daily_purchases[date_idx] += purchase
+
+    return [(day.isoformat(), used, purchased) for day, used, purchased in zip(unique_dates, daily_usage, daily_purchases)]
+
+def legacy_usage_breakdown(user_id, days=30):
+    """Dawny rozkład zużycia: kategoria rozpoznawana po fragmentach opisu transakcji"""
+    start_date = (datetime.datetime.now(pytz.UTC) - datetime.timedelta(days=days)).isoformat()
+    with get_connection() as conn:
+        usage_breakdown = conn.execute("""
+            SELECT description, SUM(amount)
+            FROM credit_transactions
+            WHERE user_id = ? AND created_at >= ? AND transaction_type = 'deduct'
+            GROUP BY description
+        """, (user_id, start_date)).fetchall()
+
+    result = {}
+    for description, amount in usage_breakdown:
+        category = "Inne"
+        if "Wiadomość" in description:
+            category = "Wiadomości"
+        elif "obraz" in description or "DALL-E" in description:
+            category = "Obrazy"
+        elif "dokument" in description:
+            category = "Analiza dokumentów"
+        elif "zdjęci" in description:
+            category = "Analiza zdjęć"
+        result[category] = result.get(category, 0) + amount
+    return result
+
+@pytest.fixture
+def usage_history(test_db):
+    rows = insert_transactions(USER_ID, 3000)
+    yield rows
+    credit_analytics.shutdown_chart_pool()
+
+def test_daily_usage_matches_transactions(usage_history):
+    daily_usage = credit_analytics.get_daily_credit_usage(USER_ID)
+
+    used = sum(row[2] for row in usage_history if row[1] == "deduct")
+    purchased = sum(row[2] for row in usage_history if row[1] == "purchase")
+    assert sum(day[1] for day in daily_usage) == used
+    assert sum(day[2] for day in daily_usage) == purchased
+
+    # Saldo na koniec ostatniego dnia to bieżące saldo użytkownika
+    assert daily_usage[-1][3] == usage_history[-1][3]
+
+def test_async_charts_are_rendered_in_worker_processes(usage_history):
+    async def render():
+        return await asyncio.gather(
+            credit_analytics.generate_credit_usage_chart_async(USER_ID),
+            credit_analytics.generate_usage_breakdown_chart_async(USER_ID)
+        )
+
+    for chart in asyncio.run(render()):
+        assert chart.getvalue().startswith(b"\x89PNG")
+
+@pytest.mark.benchmark
+def test_benchmark_event_loop_lag_during_chart_requests(usage_history):
+    async def inline_request():
+        # Dawny handler: pobranie danych i renderowanie w pętli zdarzeń
+        credit_analytics.generate_credit_usage_chart(USER_ID)
+        await asyncio.sleep(0)
+
+    async def offloaded_request():
+        await credit_analytics.generate_credit_usage_chart_async(USER_ID)
+
+    async def scenario(request):
+        _, lag = await run_with_lag_watch(*(request() for _ in range(CONCURRENT_CHART_REQUESTS)))
+        return lag
+
+    # Import matplotlib (w tym procesie i w procesach roboczych) nie jest wliczany do pomiaru
+    credit_analytics.generate_credit_usage_chart(USER_ID)
+    asyncio.run(scenario(offloaded_request))
+
+    inline_lag = asyncio.run(scenario(inline_request))
+    offloaded_lag = asyncio.run(scenario(offloaded_request))
+
+    print(
+        f"\n{CONCURRENT_CHART_REQUESTS} równoczesnych /creditanalysis - największe opóźnienie pętli zdarzeń: "
+        f"renderowanie w handlerze {inline_lag * 1000:.0f} ms, w puli procesów {offloaded_lag * 1000:.0f} ms"
+    )
+    assert offloaded_lag < inline_lag / 2
+
+def test_breakdown_uses_category_column(test_db):
+    with get_connection() as conn:
+        conn.execute("INSERT INTO user_credits (user_id, credits_amount) VALUES (?, 0)", (USER_ID,))
+        conn.execute(
+            "INSERT INTO credit_transactions (user_id, transaction_type, amount, credits_before, credits_after, description, category, created_at) "
+            "VALUES (?, 'deduct', 8, 8, 0, 'Tłumaczenie tekstu ze zdjęcia na język en', 'photo', ?)",
+            (USER_ID, datetime.datetime.now(pytz.UTC).isoformat())
+        )
+    backfill_credit_usage_daily(rebuild=True)
+
+    assert credit_analytics.get_credit_usage_breakdown(USER_ID) == {"Analiza zdjęć": 8}
+
+@pytest.mark.benchmark
+def test_benchmark_aggregation_for_100k_transactions(test_db):
+    insert_transactions(USER_ID, BENCHMARK_TRANSACTIONS)
+
+    # Obie wersje zwracają te same sumy dzienne i ten sam rozkład
+    daily_usage = credit_analytics.get_daily_credit_usage(USER_ID)
+    assert [day[:3] for day in daily_usage] == legacy_daily_usage(USER_ID)
+    assert credit_analytics.get_credit_usage_breakdown(USER_ID) == legacy_usage_breakdown(USER_ID)
+
+    before = measure(lambda: (legacy_daily_usage(USER_ID), legacy_usage_breakdown(USER_ID)), repeat=3)
+    after = measure(lambda: (
+        credit_analytics.get_daily_credit_usage(USER_ID),
+        credit_analytics.get_credit_usage_breakdown(USER_ID)
+    ), repeat=3)
+
+    report(f"Agregacja {BENCHMARK_TRANSACTIONS} transakcji (dzienne sumy i rozkład)", before, after)
+    assert after * 10 < before
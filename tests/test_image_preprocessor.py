@@ -0,0 +1,84 @@
+"""
+Testy przygotowania zdjęć przed wysłaniem do modelu wizyjnego (utils/image_preprocessor.py)
+"""
+import base64
+import io
+import time
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from utils.image_preprocessor import (
+    prepare_image, detect_image_format, LOW_DETAIL_EDGE, HIGH_DETAIL_SHORT_EDGE
+)
+
+# Zakładana przepustowość łącza do API (w megabitach na sekundę)
+UPLINK_MBIT = 20
+
+def make_photo(width=4032, height=3024, quality=92):
+    """Tworzy zdjęcie JPEG o rozmiarze typowym dla aparatu w telefonie (gradient z szumem)"""
+    rng = np.random.default_rng(0)
+    y, x = np.mgrid[0:height, 0:width]
+    base = np.stack([x * 255 // width, y * 255 // height, (x + y) * 255 // (width + height)], -1)
+    pixels = np.clip(base + rng.normal(0, 12, (height, width, 3)), 0, 255).astype(np.uint8)
+    output = io.BytesIO()
+    Image.fromarray(pixels).save(output, format="JPEG", quality=quality)
+    return output.getvalue()
+
+def make_png(width, height, mode="RGBA"):
+    """Tworzy jednolity obraz PNG (domyślnie z przezroczystością)"""
+    output = io.BytesIO()
+    Image.new(mode, (width, height), (10, 20, 30, 128) if mode == "RGBA" else (10, 20, 30)).save(output, format="PNG")
+    return output.getvalue()
+
+def test_detects_real_format():
+    assert detect_image_format(make_png(10, 10)) == "png"
+    assert detect_image_format(make_photo(64, 48)) == "jpeg"
+
+def test_downscales_to_detail_limits():
+    photo = make_photo(2000, 1500)
+
+    low, mime = prepare_image(photo, "low")
+    with Image.open(io.BytesIO(low)) as image:
+        assert max(image.size) == LOW_DETAIL_EDGE
+    assert mime == "image/jpeg"
+
+    high, _ = prepare_image(photo, "high")
+    with Image.open(io.BytesIO(high)) as image:
+        assert min(image.size) == HIGH_DETAIL_SHORT_EDGE
+
+def test_transparent_image_is_encoded_as_webp():
+    _, mime = prepare_image(make_png(1600, 1600), "low")
+    assert mime == "image/webp"
+
+def test_small_image_is_sent_unchanged():
+    photo = make_photo(320, 240, quality=60)
+    assert prepare_image(photo, "high") == (photo, "image/jpeg")
+
+def test_invalid_data_falls_back_to_original():
+    assert prepare_image(b"not an image", "high") == (b"not an image", "image/jpeg")
+
+@pytest.mark.benchmark
+@pytest.mark.parametrize("detail", ["low", "high"])
+def test_benchmark_request_size_and_latency(detail):
+    photo = make_photo()
+
+    started = time.perf_counter()
+    prepared, _ = prepare_image(photo, detail)
+    payload = base64.b64encode(prepared)
+    prepare_time = time.perf_counter() - started
+    original_payload = base64.b64encode(photo)
+
+    # Czas wysyłki zakodowanego obrazu w treści zapytania
+    upload_before = len(original_payload) * 8 / (UPLINK_MBIT * 1_000_000)
+    upload_after = len(payload) * 8 / (UPLINK_MBIT * 1_000_000)
+
+    print(
+        f"\nZdjęcie 4032x3024, detail={detail}: {len(original_payload) // 1024} KB -> {len(payload) // 1024} KB "
+        f"w zapytaniu, przygotowanie {prepare_time * 1000:.0f} ms, "
+        f"wysyłka przy {UPLINK_MBIT} Mbit/s: {upload_before * 1000:.0f} ms -> {upload_after * 1000:.0f} ms"
+    )
+
+    assert len(payload) * 10 < len(original_payload)
+    assert prepare_time + upload_after < upload_before
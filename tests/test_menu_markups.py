@@ -0,0 +1,121 @@
+"""
+Testy zapamiętywania klawiatur menu (handlers/menu_handler.py)
+"""
+import asyncio
+import time
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("supabase")
+
+from config import AVAILABLE_LANGUAGES, AVAILABLE_MODELS
+from handlers import menu_handler
+from handlers.menu_handler import (
+    create_chat_modes_markup, create_language_selection_markup, create_model_selection_markup,
+    handle_menu_callback, invalidate_menu_markups
+)
+from tests.bench import report
+
+USER_ID = 1
+
+# Liczba obsłużonych callbacków w pomiarze przepustowości
+BENCHMARK_CALLBACKS = 5000
+
+# Przyciski menu naciskane w pomiarze (po kolei)
+BENCHMARK_CALLBACK_DATA = [
+    "menu_section_settings", "settings_model", "settings_language",
+    "menu_section_chat_modes", "menu_section_credits"
+]
+
+class StubCallbackQuery:
+    """Zapytanie zwrotne bez połączenia z Telegram - edycja wiadomości nic nie robi"""
+
+    def __init__(self, data):
+        self.data = data
+        self.from_user = SimpleNamespace(id=USER_ID)
+        self.message = SimpleNamespace(caption="Menu")
+
+    async def answer(self, *args, **kwargs):
+        pass
+
+    async def edit_message_caption(self, **kwargs):
+        pass
+
+    async def edit_message_text(self, **kwargs):
+        pass
+
+def make_context(language="en"):
+    return SimpleNamespace(chat_data={'user_data': {USER_ID: {'language': language}}})
+
+async def press_buttons(count, before_each=None):
+    """Obsługuje `count` callbacków menu i zwraca przepustowość (callbacki/s)"""
+    context = make_context()
+    started = time.perf_counter()
+    for index in range(count):
+        if before_each:
+            before_each()
+        query = StubCallbackQuery(BENCHMARK_CALLBACK_DATA[index % len(BENCHMARK_CALLBACK_DATA)])
+        assert await handle_menu_callback(SimpleNamespace(callback_query=query, effective_user=query.from_user), context)
+    return count / (time.perf_counter() - started)
+
+@pytest.fixture(autouse=True)
+def clean_markup_cache():
+    invalidate_menu_markups()
+    yield
+    invalidate_menu_markups()
+
+def test_markup_is_built_once_per_language():
+    for language in AVAILABLE_LANGUAGES:
+        assert create_chat_modes_markup(language) is create_chat_modes_markup(language)
+    assert create_chat_modes_markup("pl") is not create_chat_modes_markup("en")
+
+def test_invalidation_rebuilds_markups():
+    markup = create_chat_modes_markup("pl")
+    invalidate_menu_markups()
+    rebuilt = create_chat_modes_markup("pl")
+
+    assert rebuilt is not markup
+    assert rebuilt == markup
+
+def test_catalog_compilation_rebuilds_markups(monkeypatch):
+    from utils import translations
+
+    markup = create_chat_modes_markup("pl")
+    monkeypatch.setitem(translations.translations["pl"], "back", "Cofnij")
+    translations.compile_catalog()
+    try:
+        rebuilt = create_chat_modes_markup("pl")
+        assert rebuilt is not markup
+        assert rebuilt.inline_keyboard[-1][0].text == "Cofnij"
+    finally:
+        monkeypatch.undo()
+        translations.compile_catalog()
+
+def test_selected_option_is_part_of_cache_key():
+    models = list(AVAILABLE_MODELS)
+    first = create_model_selection_markup("pl", models[0])
+    second = create_model_selection_markup("pl", models[-1])
+    assert first is not second
+
+    def checked(markup):
+        return [button.callback_data for row in markup.inline_keyboard for button in row if "✅" in button.text]
+
+    assert checked(first) == [f"model_{models[0]}"]
+    assert checked(create_language_selection_markup("pl", "en")) == ["start_lang_en"]
+
+@pytest.mark.benchmark
+def test_benchmark_menu_callback_throughput(test_db):
+    # Rozgrzewka - profil użytkownika i tłumaczenia są już w pamięci
+    asyncio.run(press_buttons(len(BENCHMARK_CALLBACK_DATA)))
+
+    # Dawniej każda klawiatura była budowana od nowa przy każdym callbacku
+    rebuilt = asyncio.run(press_buttons(BENCHMARK_CALLBACKS, before_each=invalidate_menu_markups))
+    cached = asyncio.run(press_buttons(BENCHMARK_CALLBACKS))
+
+    report(
+        f"Obsługa {BENCHMARK_CALLBACKS} callbacków menu (edycja wiadomości pominięta)",
+        BENCHMARK_CALLBACKS / rebuilt, BENCHMARK_CALLBACKS / cached, BENCHMARK_CALLBACKS
+    )
+    assert cached > rebuilt * 3
+    assert len(menu_handler._markup_cache) == len(BENCHMARK_CALLBACK_DATA)
@@ -0,0 +1,218 @@
+"""
+Testy rozliczania kredytów w obsłudze wiadomości (main.message_handler, main.handle_photo)
+"""
+import asyncio
+import itertools
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("supabase")
+
+import main
+from config import CHAT_MODES, CREDIT_COSTS
+from database.connection import get_connection
+from database.credits_client import add_user_credits, get_user_credits
+from database.sqlite_client import get_or_create_user
+from utils.openai_resilience import OpenAIUnavailableError
+from utils.translations import get_text
+
+USER_ID = 1
+
+START_CREDITS = 100
+
+# Każdy test korzysta z innego czatu - ograniczniki edycji StreamingEditor są osobne dla czatów
+_chat_ids = itertools.count(1000)
+
+class FakeBot:
+    async def send_message(self, chat_id, text, parse_mode=None):
+        return FakeMessage(self, chat_id, text)
+
+    async def get_file(self, file_id):
+        raise RuntimeError("Telegram niedostępny")
+
+class FakeMessage:
+    """Wiadomość Telegram zapisująca odpowiedzi i edycje bota"""
+
+    def __init__(self, bot, chat_id, text=""):
+        self._bot = bot
+        self.chat_id = chat_id
+        self.text = text
+        self.caption = None
+        self.replies = []
+        self.chat = SimpleNamespace(send_action=self._send_action)
+
+    async def _send_action(self, action):
+        pass
+
+    def get_bot(self):
+        return self._bot
+
+    async def reply_text(self, text, **kwargs):
+        reply = FakeMessage(self._bot, self.chat_id, text)
+        self.replies.append(reply)
+        return reply
+
+    async def edit_text(self, text, **kwargs):
+        self.text = text
+
+    async def edit_reply_markup(self, **kwargs):
+        pass
+
+    async def delete(self):
+        pass
+
+def make_update(text="Jak działa fotosynteza?"):
+    bot = FakeBot()
+    message = FakeMessage(bot, next(_chat_ids), text)
+    update = SimpleNamespace(effective_user=SimpleNamespace(id=USER_ID), message=message)
+    context = SimpleNamespace(
+        bot=bot,
+        chat_data={},
+        application=SimpleNamespace(create_task=lambda coroutine: coroutine.close())
+    )
+    return update, context
+
+def hold_statuses():
+    with get_connection() as conn:
+        return [row[0] for row in conn.execute("SELECT status FROM credit_holds ORDER BY id")]
+
+@pytest.fixture
+def saved_messages(test_db, monkeypatch):
+    """Użytkownik z kredytami; konwersacje (Supabase) są zastąpione zapisem w pamięci"""
+    get_or_create_user(USER_ID, language_code="pl")
+    add_user_credits(USER_ID, START_CREDITS, "Test")
+    saved = []
+
+    async def get_active_conversation(user_id):
+        return {'id': 1, 'user_id': user_id}
+
+    async def get_conversation_history(conversation_id, limit=20, before_id=None, after_id=None):
+        return []
+
+    async def save_message(conversation_id, user_id, content, is_from_user, model_used=None):
+        saved.append((content, is_from_user, model_used))
+
+    monkeypatch.setattr(main, "get_active_conversation_async", get_active_conversation)
+    monkeypatch.setattr(main, "get_conversation_history_async", get_conversation_history)
+    monkeypatch.setattr(main, "save_message_async", save_message)
+    monkeypatch.setattr(main, "is_cacheable", lambda mode, messages: False)
+    return saved
+
+class FakeChatStream:
+    """Strumień odpowiedzi zastępujący ChatStream (bez zapytań do OpenAI)"""
+
+    def __init__(self, model, chunks, error=None):
+        self.model = model
+        self.chunks = chunks
+        self.error = error
+
+    async def __aiter__(self):
+        for chunk in self.chunks:
+            yield chunk
+            await asyncio.sleep(0)
+        if self.error is not None:
+            raise self.error
+
+def answer_with(monkeypatch, *chunks, error=None, answered_by=None):
+    def fake_stream(messages, model=None, user_id=None):
+        return FakeChatStream(answered_by or model, chunks, error)
+    monkeypatch.setattr(main, "chat_completion_stream", fake_stream)
+
+def test_answer_is_charged_after_delivery(saved_messages, monkeypatch):
+    answer_with(monkeypatch, "Fotosynteza ", "to proces.")
+    update, context = make_update()
+
+    asyncio.run(main.message_handler(update, context))
+
+    assert update.message.replies[0].text == "Fotosynteza to proces."
+    assert saved_messages[-1] == ("Fotosynteza to proces.", False, CHAT_MODES["no_mode"]["model"])
+    assert get_user_credits(USER_ID) == START_CREDITS - CHAT_MODES["no_mode"]["credit_cost"]
+    assert hold_statuses() == ["committed"]
+
+def test_hold_is_released_when_handler_fails_before_answer(saved_messages, monkeypatch):
+    answer_with(monkeypatch, "Odpowiedź")
+
+    async def broken_summary(conversation_id):
+        raise RuntimeError("baza danych niedostępna")
+
+    monkeypatch.setattr(main, "get_conversation_summary_async", broken_summary)
+    update, context = make_update()
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(main.message_handler(update, context))
+
+    assert get_user_credits(USER_ID) == START_CREDITS
+    assert hold_statuses() == ["released"]
+
+def test_history_write_failure_keeps_delivered_answer(saved_messages, monkeypatch):
+    answer_with(monkeypatch, "Odpowiedź")
+    async def failing_save(conversation_id, user_id, content, is_from_user, model_used=None):
+        if not is_from_user:
+            raise RuntimeError("dysk pełny")
+
+    monkeypatch.setattr(main, "save_message_async", failing_save)
+    update, context = make_update()
+
+    asyncio.run(main.message_handler(update, context))
+
+    assert update.message.replies[0].text == "Odpowiedź"
+    assert hold_statuses() == ["committed"]
+
+def test_error_after_partial_answer_is_not_overwritten(saved_messages, monkeypatch):
+    answer_with(monkeypatch, *(f"fragment {index} " for index in range(5)), error=RuntimeError("zerwane połączenie"))
+    update, context = make_update()
+
+    async def handle():
+        await main.message_handler(update, context)
+        # Czas na ewentualną oczekującą edycję fragmentu odpowiedzi
+        await asyncio.sleep(1.2)
+
+    asyncio.run(handle())
+
+    assert update.message.replies[0].text == "Wystąpił błąd podczas generowania odpowiedzi: zerwane połączenie"
+    assert hold_statuses() == ["released"]
+
+def test_fallback_answer_is_billed_and_saved_as_fallback_model(saved_messages, monkeypatch):
+    answer_with(monkeypatch, "Odpowiedź modelu zastępczego", answered_by="gpt-3.5-turbo")
+    stored = []
+
+    async def store_response(cache_key, model, response):
+        stored.append(model)
+
+    monkeypatch.setattr(main, "is_cacheable", lambda mode, messages: True)
+    monkeypatch.setattr(main, "store_response", store_response)
+    update, context = make_update("Pytanie do gpt-4o")
+    context.chat_data['user_data'] = {USER_ID: {'current_model': "gpt-4o"}}
+
+    asyncio.run(main.message_handler(update, context))
+
+    assert get_user_credits(USER_ID) == START_CREDITS - CREDIT_COSTS["message"]["gpt-3.5-turbo"]
+    assert saved_messages[-1] == ("Odpowiedź modelu zastępczego", False, "gpt-3.5-turbo")
+    # Odpowiedź modelu zastępczego nie trafia do pamięci podręcznej wybranego modelu
+    assert stored == []
+
+    with get_connection() as conn:
+        transaction = conn.execute("SELECT amount, description FROM credit_transactions WHERE transaction_type = 'deduct'").fetchone()
+    assert transaction == (CREDIT_COSTS["message"]["gpt-3.5-turbo"], "Wiadomość (gpt-3.5-turbo)")
+
+def test_openai_outage_is_not_charged(saved_messages, monkeypatch):
+    answer_with(monkeypatch, error=OpenAIUnavailableError("Model niedostępny", "gpt-4o"))
+    update, context = make_update()
+
+    asyncio.run(main.message_handler(update, context))
+
+    assert update.message.replies[0].text == get_text("openai_unavailable", "pl")
+    assert get_user_credits(USER_ID) == START_CREDITS
+    assert hold_statuses() == ["released"]
+
+def test_photo_hold_is_released_when_download_fails(saved_messages):
+    update, context = make_update()
+    update.message.caption = None
+    update.message.photo = [SimpleNamespace(file_id="photo", file_unique_id="unique")]
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(main.handle_photo(update, context))
+
+    assert get_user_credits(USER_ID) == START_CREDITS
+    assert hold_statuses() == ["released"]
@@ -0,0 +1,231 @@
+"""
+Testy ponawiania zapytań do OpenAI, circuit breakera i modeli zastępczych
+(utils/openai_resilience.py, utils/openai_client.py)
+"""
+import asyncio
+from types import SimpleNamespace
+
+import httpx
+import openai
+import pytest
+
+from utils import openai_client, openai_resilience
+from utils.openai_resilience import (
+    CIRCUIT_FAILURE_THRESHOLD, CIRCUIT_RESET_TIMEOUT, MAX_RETRIES, CircuitBreaker,
+    OpenAIRateLimitError, OpenAIRequestError, OpenAIServiceError, OpenAIUnavailableError,
+    is_retryable, retry_delay, to_service_error
+)
+
+REQUEST = httpx.Request("POST", "https://api.openai.com/v1/chat/completions")
+
+def status_error(status_code, headers=None):
+    response = httpx.Response(status_code, request=REQUEST, headers=headers)
+    if status_code == 429:
+        return openai.RateLimitError("Rate limit", response=response, body=None)
+    if status_code >= 500:
+        return openai.InternalServerError("Server error", response=response, body=None)
+    return openai.BadRequestError("Bad request", response=response, body=None)
+
+class FakeMonotonic:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeMonotonic()
+    monkeypatch.setattr(openai_resilience, "time", SimpleNamespace(monotonic=fake))
+    return fake
+
+@pytest.fixture
+def no_backoff(monkeypatch):
+    """Nowe circuit breakery i ponowienia bez czekania"""
+    monkeypatch.setattr(openai_resilience, "_breakers", {})
+    monkeypatch.setattr(openai_client, "retry_delay", lambda error, attempt: 0)
+
+# ==================== KLASYFIKACJA BŁĘDÓW ====================
+
+@pytest.mark.parametrize("error, retryable, service_error", [
+    (status_error(429), True, OpenAIRateLimitError),
+    (status_error(500), True, OpenAIUnavailableError),
+    (status_error(503), True, OpenAIUnavailableError),
+    (openai.APIConnectionError(request=REQUEST), True, OpenAIUnavailableError),
+    (status_error(400), False, OpenAIRequestError),
+    (ValueError("błąd programu"), False, OpenAIRequestError),
+])
+def test_error_classification(error, retryable, service_error):
+    assert is_retryable(error) is retryable
+    assert type(to_service_error(error, "gpt-4o")) is service_error
+
+def test_retry_after_header_is_respected():
+    assert retry_delay(status_error(429, {"retry-after": "7"}), attempt=0) == 7
+    # Zbyt długie oczekiwanie jest ograniczone
+    assert retry_delay(status_error(429, {"retry-after": "600"}), attempt=0) == openai_resilience.BACKOFF_MAX
+
+def test_exponential_backoff_without_retry_after():
+    for attempt in range(6):
+        delay = retry_delay(status_error(500), attempt)
+        assert 0 <= delay <= min(openai_resilience.BACKOFF_MAX, openai_resilience.BACKOFF_BASE * 2 ** attempt)
+
+# ==================== CIRCUIT BREAKER ====================
+
+def test_circuit_opens_after_consecutive_failures(clock):
+    breaker = CircuitBreaker("gpt-4o")
+    for _ in range(CIRCUIT_FAILURE_THRESHOLD - 1):
+        breaker.record_failure()
+    assert breaker.allow_request()
+
+    breaker.record_failure()
+    assert not breaker.allow_request()
+
+def test_half_open_circuit_lets_one_probe_through(clock):
+    breaker = CircuitBreaker("gpt-4o")
+    for _ in range(CIRCUIT_FAILURE_THRESHOLD):
+        breaker.record_failure()
+
+    clock.now += CIRCUIT_RESET_TIMEOUT
+    assert breaker.allow_request()
+    # Kolejne zapytania czekają na wynik zapytania próbnego
+    assert not breaker.allow_request()
+
+    breaker.record_success()
+    assert breaker.allow_request()
+    assert breaker.failures == 0
+
+def test_failed_probe_reopens_circuit(clock):
+    breaker = CircuitBreaker("gpt-4o")
+    for _ in range(CIRCUIT_FAILURE_THRESHOLD):
+        breaker.record_failure()
+
+    clock.now += CIRCUIT_RESET_TIMEOUT
+    assert breaker.allow_request()
+    breaker.record_failure()
+
+    assert not breaker.allow_request()
+    clock.now += CIRCUIT_RESET_TIMEOUT
+    assert breaker.allow_request()
+
+def test_unfinished_probe_is_repeated(clock):
+    breaker = CircuitBreaker("gpt-4o")
+    for _ in range(CIRCUIT_FAILURE_THRESHOLD):
+        breaker.record_failure()
+
+    clock.now += CIRCUIT_RESET_TIMEOUT
+    assert breaker.allow_request()
+
+    # Zapytanie próbne zostało anulowane i nie zgłosiło wyniku
+    clock.now += CIRCUIT_RESET_TIMEOUT
+    assert breaker.allow_request()
+
+# ==================== MODELE ZASTĘPCZE ====================
+
+def failing_request(failures):
+    """Zapytanie zwracające kolejne błędy z listy dla danego modelu, a potem odpowiedź"""
+    calls = []
+
+    async def request(model):
+        calls.append(model)
+        errors = failures.get(model, [])
+        if errors:
+            raise errors.pop(0)
+        return f"odpowiedź {model}"
+
+    return request, calls
+
+def test_transient_error_is_retried_on_same_model(no_backoff):
+    request, calls = failing_request({"gpt-4o": [status_error(500), status_error(429)]})
+
+    result = asyncio.run(openai_client.call_openai("gpt-4o", request))
+
+    assert result == ("odpowiedź gpt-4o", "gpt-4o")
+    assert calls == ["gpt-4o"] * 3
+
+def test_fallback_model_answers_after_retries(no_backoff):
+    request, calls = failing_request({"gpt-4o": [status_error(503)] * (MAX_RETRIES + 1)})
+
+    result = asyncio.run(openai_client.call_openai("gpt-4o", request))
+
+    assert result == ("odpowiedź gpt-3.5-turbo", "gpt-3.5-turbo")
+    assert calls == ["gpt-4o"] * (MAX_RETRIES + 1) + ["gpt-3.5-turbo"]
+
+def test_rejected_request_is_not_retried_or_redirected(no_backoff):
+    request, calls = failing_request({"gpt-4o": [status_error(400)]})
+
+    with pytest.raises(OpenAIRequestError):
+        asyncio.run(openai_client.call_openai("gpt-4o", request))
+    assert calls == ["gpt-4o"]
+
+def test_exhausted_model_chain_raises_service_error(no_backoff):
+    failures = {model: [status_error(500)] * (MAX_RETRIES + 1) for model in ("gpt-4", "gpt-4o", "gpt-3.5-turbo")}
+    request, calls = failing_request(failures)
+
+    with pytest.raises(OpenAIUnavailableError) as error:
+        asyncio.run(openai_client.call_openai("gpt-4", request))
+
+    assert error.value.model == "gpt-3.5-turbo"
+    assert [model for model in dict.fromkeys(calls)] == ["gpt-4", "gpt-4o", "gpt-3.5-turbo"]
+
+def test_open_circuit_skips_model_without_request(no_backoff):
+    breaker = openai_resilience.get_circuit_breaker("gpt-4o")
+    for _ in range(CIRCUIT_FAILURE_THRESHOLD):
+        breaker.record_failure()
+    request, calls = failing_request({})
+
+    assert asyncio.run(openai_client.call_openai("gpt-4o", request)) == ("odpowiedź gpt-3.5-turbo", "gpt-3.5-turbo")
+    assert calls == ["gpt-3.5-turbo"]
+
+# ==================== STRUMIENIOWANIE ====================
+
+class FakeCompletions:
+    """chat.completions.create zwracające strumień lub błąd dla wybranych modeli"""
+
+    def __init__(self, failures, fail_after_first_chunk=()):
+        self.failures = failures
+        self.fail_after_first_chunk = fail_after_first_chunk
+        self.calls = []
+
+    async def create(self, model, messages, stream):
+        self.calls.append(model)
+        errors = self.failures.get(model, [])
+        if errors:
+            raise errors.pop(0)
+        return self._chunks(model)
+
+    async def _chunks(self, model):
+        for text in ("Cześć", ", ", model):
+            yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=text))])
+            if model in self.fail_after_first_chunk:
+                raise status_error(500)
+
+def use_completions(monkeypatch, completions):
+    client = SimpleNamespace(chat=SimpleNamespace(completions=completions))
+    monkeypatch.setattr(openai_client, "get_client", lambda: client)
+
+async def collect(stream):
+    return "".join([chunk async for chunk in stream])
+
+def test_stream_reports_fallback_model(no_backoff, monkeypatch):
+    use_completions(monkeypatch, FakeCompletions({"gpt-4o": [status_error(500)] * (MAX_RETRIES + 1)}))
+    stream = openai_client.chat_completion_stream([{"role": "user", "content": "Hej"}], model="gpt-4o")
+
+    assert asyncio.run(collect(stream)) == "Cześć, gpt-3.5-turbo"
+    assert stream.model == "gpt-3.5-turbo"
+    assert stream.used_fallback
+
+def test_stream_from_requested_model(no_backoff, monkeypatch):
+    use_completions(monkeypatch, FakeCompletions({}))
+    stream = openai_client.chat_completion_stream([{"role": "user", "content": "Hej"}], model="gpt-4o")
+
+    assert asyncio.run(collect(stream)) == "Cześć, gpt-4o"
+    assert not stream.used_fallback
+
+def test_stream_error_after_first_chunk_is_not_retried(no_backoff, monkeypatch):
+    completions = FakeCompletions({}, fail_after_first_chunk={"gpt-4o"})
+    use_completions(monkeypatch, completions)
+    stream = openai_client.chat_completion_stream([{"role": "user", "content": "Hej"}], model="gpt-4o")
+
+    with pytest.raises(OpenAIServiceError):
+        asyncio.run(collect(stream))
+    assert completions.calls == ["gpt-4o"]
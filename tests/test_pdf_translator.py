@@ -0,0 +1,192 @@
+"""
+Testy tłumaczenia i odczytu dokumentów PDF (utils/pdf_translator.py, utils/openai_client.analyze_document)
+"""
+import asyncio
+import random
+from collections import OrderedDict
+from types import SimpleNamespace
+
+import pytest
+
+from utils import pdf_translator, token_counter
+from utils.pdf_translator import extract_pdf_text, iter_pdf_chunks, translate_pdf_document
+
+class FakePage:
+    def __init__(self, text, reads):
+        self.text = text
+        self.reads = reads
+
+    def extract_text(self):
+        self.reads.append(self.text)
+        return self.text
+
+class FakeReader:
+    """PdfReader zwracający podany tekst stron i zapisujący, które strony odczytano"""
+
+    def __init__(self, pages):
+        self.reads = []
+        self.pages = [FakePage(text, self.reads) for text in pages]
+
+@pytest.fixture
+def pdf(monkeypatch):
+    """Dokument PDF o podanych stronach; tokeny liczone jako 4 znaki (bez tiktoken)"""
+    monkeypatch.setattr(token_counter, "tiktoken", None)
+    monkeypatch.setattr(pdf_translator, "_partial_results", OrderedDict())
+    document = {}
+
+    def use_pages(*pages):
+        document['reader'] = FakeReader(pages)
+        return document['reader']
+
+    monkeypatch.setattr(pdf_translator, "PyPDF2", SimpleNamespace(PdfReader=lambda file: document['reader']))
+    return use_pages
+
+def paragraph(index, words=20):
+    return f"Akapit {index}. " + "słowo " * words
+
+def pages_of_paragraphs(pages, per_page, words=20):
+    return ["\n\n".join(paragraph(page * per_page + index, words) for index in range(per_page)) for page in range(pages)]
+
+def test_chunks_keep_whole_paragraphs_within_limit(pdf):
+    pdf(*pages_of_paragraphs(pages=3, per_page=4))
+
+    chunks = list(iter_pdf_chunks(b"pdf", max_tokens=100))
+
+    assert all(token_counter.count_tokens(chunk, "gpt-4o") <= 100 for chunk in chunks)
+    paragraphs = [part for chunk in chunks for part in chunk.split("\n\n")]
+    assert paragraphs == [paragraph(index).strip() for index in range(12)]
+
+def test_long_paragraph_is_split_by_sentences(pdf):
+    long_paragraph = " ".join(f"Zdanie numer {index} jest dość długie." for index in range(40))
+    pdf(long_paragraph)
+
+    chunks = list(iter_pdf_chunks(b"pdf", max_tokens=50))
+
+    assert len(chunks) > 1
+    assert all(token_counter.count_tokens(chunk, "gpt-4o") <= 50 for chunk in chunks)
+    assert " ".join(" ".join(chunk.split("\n\n")) for chunk in chunks) == long_paragraph
+
+def test_pages_are_read_only_when_needed(pdf):
+    reader = pdf(*pages_of_paragraphs(pages=5, per_page=4))
+
+    chunks = iter_pdf_chunks(b"pdf", max_tokens=100)
+    next(chunks)
+
+    assert len(reader.reads) < 5
+
+def test_extract_text_stops_at_token_limit(pdf):
+    reader = pdf(*pages_of_paragraphs(pages=10, per_page=4))
+
+    text, truncated = extract_pdf_text(b"pdf", max_tokens=150)
+
+    assert truncated
+    assert 0 < token_counter.count_tokens(text, "gpt-4o") <= 150
+    assert text.startswith(paragraph(0).strip())
+    assert len(reader.reads) < 10
+
+def test_extract_text_of_short_document(pdf):
+    pdf("Jedyny akapit dokumentu.")
+
+    assert extract_pdf_text(b"pdf", max_tokens=150) == ("Jedyny akapit dokumentu.", False)
+
+class FakeTranslator:
+    """translate_paragraph z losowym czasem odpowiedzi; wybrane fragmenty kończą się błędem"""
+
+    def __init__(self, failing=()):
+        self.failing = set(failing)
+        self.calls = []
+        self.active = 0
+        self.max_active = 0
+
+    async def __call__(self, text, source_lang, target_lang, user_id=None, raise_on_error=False):
+        self.calls.append(text)
+        self.active += 1
+        self.max_active = max(self.max_active, self.active)
+        try:
+            await asyncio.sleep(random.uniform(0, 0.01))
+            if text in self.failing:
+                raise RuntimeError("Błąd API")
+            return text.upper()
+        finally:
+            self.active -= 1
+
+def test_document_is_translated_in_order_with_limited_concurrency(pdf, monkeypatch):
+    pdf(*pages_of_paragraphs(pages=6, per_page=4, words=200))
+    translator = FakeTranslator()
+    monkeypatch.setattr(pdf_translator, "translate_paragraph", translator)
+    progress = []
+
+    async def report(done, total):
+        progress.append((done, total))
+
+    result = asyncio.run(translate_pdf_document(b"pdf", progress_callback=report))
+
+    chunks = list(iter_pdf_chunks(b"pdf", ))
+    assert result["success"]
+    assert result["chunks"] == len(chunks) > pdf_translator.TRANSLATION_CONCURRENCY
+    assert result["translated_text"] == "\n\n".join(chunk.upper() for chunk in chunks)
+    assert translator.max_active <= pdf_translator.TRANSLATION_CONCURRENCY
+    assert [done for done, _ in progress] == list(range(1, len(chunks) + 1))
+
+def test_failed_chunks_are_resumed_with_same_key(pdf, monkeypatch):
+    pdf(*pages_of_paragraphs(pages=3, per_page=4, words=200))
+    chunks = list(iter_pdf_chunks(b"pdf", ))
+
+    failing = FakeTranslator(failing=[chunks[1]])
+    monkeypatch.setattr(pdf_translator, "translate_paragraph", failing)
+    result = asyncio.run(translate_pdf_document(b"pdf", resume_key="unique-id"))
+
+    assert not result["success"]
+    assert (result["chunks"], result["failed_chunks"]) == (len(chunks), 1)
+
+    # Ponowne wysłanie pliku tłumaczy tylko brakujący fragment
+    retry = FakeTranslator()
+    monkeypatch.setattr(pdf_translator, "translate_paragraph", retry)
+    result = asyncio.run(translate_pdf_document(b"pdf", resume_key="unique-id"))
+
+    assert result["success"]
+    assert retry.calls == [chunks[1]]
+    assert result["translated_text"] == "\n\n".join(chunk.upper() for chunk in chunks)
+    assert pdf_translator._partial_results == OrderedDict()
+
+def test_partial_results_depend_on_target_language(pdf, monkeypatch):
+    pdf(*pages_of_paragraphs(pages=2, per_page=4, words=200))
+    chunks = list(iter_pdf_chunks(b"pdf", ))
+
+    monkeypatch.setattr(pdf_translator, "translate_paragraph", FakeTranslator(failing=[chunks[0]]))
+    asyncio.run(translate_pdf_document(b"pdf", target_lang="en", resume_key="unique-id"))
+
+    translator = FakeTranslator()
+    monkeypatch.setattr(pdf_translator, "translate_paragraph", translator)
+    asyncio.run(translate_pdf_document(b"pdf", target_lang="de", resume_key="unique-id"))
+
+    assert sorted(translator.calls) == sorted(chunks)
+
+def test_unreadable_pdf_is_reported(pdf, monkeypatch):
+    pdf("", "")
+    monkeypatch.setattr(pdf_translator, "translate_paragraph", FakeTranslator())
+
+    result = asyncio.run(translate_pdf_document(b"pdf"))
+
+    assert not result["success"]
+    assert result["chunks"] == 0
+
+def test_document_analysis_includes_pdf_text(pdf, test_db, monkeypatch):
+    pytest.importorskip("supabase")
+    from utils import openai_client, response_cache
+
+    monkeypatch.setattr(response_cache, "_memory_cache", OrderedDict())
+    pdf("Raport kwartalny\n\nPrzychody wzrosły o 12%.")
+    sent = []
+
+    async def create(model, messages, max_tokens):
+        sent.append(messages)
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content="Analiza raportu"))])
+
+    client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+    monkeypatch.setattr(openai_client, "get_client", lambda: client)
+
+    result = asyncio.run(openai_client.analyze_document(b"%PDF", "raport.pdf", content_id="raport-unique-id"))
+
+    assert result == "Analiza raportu"
+    assert "Przychody wzrosły o 12%." in sent[0][1]["content"]
@@ -0,0 +1,21 @@
+"""
+Testy planów zapytań - najczęściej wykonywane zapytania muszą korzystać z indeksów
+"""
+import pytest
+
+from database.connection import get_connection
+from update_database import HOT_QUERIES, INDEX_MIGRATIONS, find_table_scans
+
+def test_all_index_migrations_applied(test_db):
+    with get_connection() as conn:
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+    assert version == INDEX_MIGRATIONS[-1][0]
+
+@pytest.mark.parametrize("query, params", HOT_QUERIES, ids=[query for query, _ in HOT_QUERIES])
+def test_hot_query_does_not_scan_table(test_db, query, params):
+    with get_connection() as conn:
+        details = [row[3] for row in conn.execute(f"EXPLAIN QUERY PLAN {query}", params)]
+    assert not any(detail.startswith("SCAN") for detail in details), details
+
+def test_find_table_scans_reports_no_queries(test_db):
+    assert find_table_scans() == []
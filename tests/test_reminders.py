@@ -0,0 +1,312 @@
+"""
+Testy przypomnień: migracja starej tabeli i wysyłka (utils/reminder_scheduler.py)
+"""
+import asyncio
+import datetime
+import sqlite3
+import time
+from types import SimpleNamespace
+
+import pytest
+import pytz
+from telegram.constants import ParseMode
+from telegram.error import BadRequest
+
+pytest.importorskip("supabase")
+
+from database import connection
+from database.connection import get_connection
+from database.sqlite_client import claim_due_reminders, create_reminder
+from update_database import INDEX_MIGRATIONS, find_table_scans, run_all_updates
+from utils import reminder_scheduler as scheduler_module
+from utils.reminder_scheduler import ReminderScheduler
+
+# Początek czasu zegara testowego (pełna sekunda)
+START = datetime.datetime(2030, 1, 1, 12, 0, tzinfo=pytz.UTC)
+
+# Liczba przypomnień w pomiarze przepustowości
+BENCHMARK_REMINDERS = 3000
+
+# Opóźnienie odpowiedzi symulowanego Bot API w pomiarze przepustowości (w sekundach)
+API_LATENCY_SECONDS = 0.02
+
+# Tabela przypomnień w schemacie sprzed harmonogramu przypomnień
+LEGACY_REMINDERS_TABLE = """
+CREATE TABLE reminders (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id INTEGER NOT NULL,
+    content TEXT NOT NULL,
+    remind_at TEXT NOT NULL,
+    created_at TEXT,
+    is_completed INTEGER DEFAULT 0,
+    completed_at TEXT,
+    FOREIGN KEY(user_id) REFERENCES users(id)
+)
+"""
+
+@pytest.fixture
+def legacy_db(tmp_path, monkeypatch):
+    """Baza danych ze starą tabelą przypomnień, zaktualizowana przez run_all_updates()"""
+    path = str(tmp_path / "bot_database.sqlite")
+    legacy = sqlite3.connect(path)
+    legacy.execute(LEGACY_REMINDERS_TABLE)
+    legacy.executemany(
+        "INSERT INTO reminders (user_id, content, remind_at, created_at, is_completed, completed_at) VALUES (?, ?, ?, ?, ?, ?)",
+        [
+            (1, "Wysłane", "2024-01-01T10:00:00.123456+00:00", "2024-01-01T09:00:00+00:00", 1, "2024-01-01T10:00:01+00:00"),
+            (1, "Zaległe", "2024-01-02T10:00:00.5Z", "2024-01-01T09:00:00+00:00", 0, None),
+            (2, "Strefa czasowa", "2024-01-03T12:00:00+02:00", "2024-01-01T09:00:00+00:00", 0, None),
+            (2, "Bez strefy", "2099-01-01T10:00:00", "2024-01-01T09:00:00+00:00", 0, None),
+        ]
+    )
+    legacy.commit()
+    legacy.close()
+
+    connection.close_all_connections()
+    monkeypatch.setattr(connection, "DB_PATH", path)
+    run_all_updates()
+    yield path
+    connection.close_all_connections()
+
+def test_legacy_reminders_reach_latest_schema(legacy_db):
+    with get_connection() as conn:
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+        rows = conn.execute("SELECT content, status, remind_at, finished_at FROM reminders ORDER BY id").fetchall()
+
+    assert version == INDEX_MIGRATIONS[-1][0]
+    assert find_table_scans() == []
+    assert rows == [
+        ("Wysłane", "sent", "2024-01-01T10:00:00.123456+00:00", "2024-01-01T10:00:01+00:00"),
+        ("Zaległe", "pending", "2024-01-02T10:00:01+00:00", None),
+        ("Strefa czasowa", "pending", "2024-01-03T10:00:00+00:00", None),
+        ("Bez strefy", "pending", "2099-01-01T10:00:00+00:00", None),
+    ]
+
+def test_overdue_legacy_reminders_are_claimed_once(legacy_db):
+    now = datetime.datetime(2025, 1, 1, tzinfo=pytz.UTC)
+
+    claimed = claim_due_reminders(now, 100)
+    assert [reminder['content'] for reminder in claimed] == ["Zaległe", "Strefa czasowa"]
+    assert claim_due_reminders(now, 100) == []
+
+class FakeBot:
+    """Bot odrzucający treść z niepoprawnym formatowaniem Markdown"""
+
+    def __init__(self, error):
+        self.error = error
+        self.sent = []
+
+    async def send_message(self, chat_id, text, parse_mode=None):
+        if parse_mode is not None and self.error:
+            raise BadRequest(self.error)
+        self.sent.append((chat_id, text, parse_mode))
+
+def send(bot, content):
+    scheduler = ReminderScheduler()
+    scheduler._bot = bot
+    return asyncio.run(scheduler._send({'id': 1, 'user_id': 7, 'content': content}))
+
+def test_markdown_error_is_retried_as_plain_text():
+    bot = FakeBot("Can't parse entities: can't find end of the entity starting at byte offset 25")
+
+    assert send(bot, "Zapłacić za my_file_name")
+    assert bot.sent == [(7, "⏰ PRZYPOMNIENIE\n\nZapłacić za my_file_name", None)]
+
+def test_reminder_is_sent_with_markdown():
+    bot = FakeBot(None)
+
+    assert send(bot, "Spotkanie")
+    assert bot.sent == [(7, "⏰ *PRZYPOMNIENIE*\n\nSpotkanie", ParseMode.MARKDOWN)]
+
+def test_other_bad_request_is_not_retried():
+    bot = FakeBot("Chat not found")
+
+    assert not send(bot, "Spotkanie")
+    assert bot.sent == []
+
+class FakeClock:
+    """Zegar testowy - oczekiwanie timera przesuwa czas zamiast usypiać"""
+
+    def __init__(self):
+        self.now = START.timestamp()
+        self.timeouts = []
+
+    def time(self):
+        return self.now
+
+    async def wait_for(self, awaitable, timeout):
+        if timeout is None:
+            return await awaitable
+        awaitable.close()
+        self.timeouts.append(timeout)
+        self.now += timeout
+        await asyncio.sleep(0)
+        raise asyncio.TimeoutError
+
+class RecordingBot:
+    """Bot zapisujący czas wysłania (według zegara testowego) i treść przypomnień"""
+
+    def __init__(self, clock=None, latency=0):
+        self.clock = clock
+        self.latency = latency
+        self.sent = []
+
+    async def send_message(self, chat_id, text, parse_mode=None):
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        sent_at = self.clock.now - START.timestamp() if self.clock else None
+        self.sent.append((sent_at, text.split("\n\n", 1)[1]))
+
+@pytest.fixture
+def clock(test_db, monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(scheduler_module, "time", SimpleNamespace(time=fake.time))
+    monkeypatch.setattr(scheduler_module, "asyncio", SimpleNamespace(
+        Event=asyncio.Event, Semaphore=asyncio.Semaphore, create_task=asyncio.create_task,
+        gather=asyncio.gather, sleep=asyncio.sleep, wait_for=fake.wait_for,
+        TimeoutError=asyncio.TimeoutError, CancelledError=asyncio.CancelledError
+    ))
+    return fake
+
+def at(seconds):
+    return START + datetime.timedelta(seconds=seconds)
+
+def add_reminder(seconds, content=None, scheduler=None):
+    remind_at = at(seconds)
+    reminder = create_reminder(7, content or f"+{seconds}", remind_at)
+    if scheduler is not None:
+        scheduler.schedule(remind_at)
+    return reminder
+
+def deliver(scheduler, bot, count, after_start=None):
+    """Uruchamia harmonogram i czeka, aż `count` przypomnień zostanie wysłanych i zapisanych w bazie"""
+    async def run():
+        await scheduler.start(bot)
+        try:
+            if after_start:
+                after_start()
+            while scheduler.delivered + scheduler.failed < count:
+                await asyncio.sleep(0)
+        finally:
+            await scheduler.stop()
+
+    asyncio.run(asyncio.wait_for(run(), 60))
+    return bot.sent
+
+def reminder_statuses():
+    with get_connection() as conn:
+        return [row[0] for row in conn.execute("SELECT status FROM reminders ORDER BY id")]
+
+def test_timer_sleeps_until_earliest_reminder(clock):
+    add_reminder(100, "później")
+    add_reminder(30, "wcześniej")
+
+    sent = deliver(ReminderScheduler(), RecordingBot(clock), 2)
+
+    assert clock.timeouts[0] == 30
+    assert sent == [(30, "wcześniej"), (100, "później")]
+
+def test_reminder_is_not_sent_before_its_time(clock):
+    scheduler = ReminderScheduler()
+
+    sent = deliver(scheduler, RecordingBot(clock), 1, lambda: add_reminder(10.4, "spotkanie", scheduler))
+
+    # Czas zapisany z dokładnością do sekundy jest zaokrąglany w górę
+    assert sent == [(11, "spotkanie")]
+
+def test_reminders_beyond_heap_are_loaded_after_boundary(clock, monkeypatch):
+    monkeypatch.setattr(scheduler_module, "REMINDER_HEAP_SIZE", 3)
+    for seconds in range(1, 6):
+        add_reminder(seconds)
+    scheduler = ReminderScheduler()
+
+    # Termin późniejszy niż wszystkie w kopcu nie blokuje doładowania kolejnych terminów z bazy
+    sent = deliver(scheduler, RecordingBot(clock), 6, lambda: add_reminder(60, scheduler=scheduler))
+
+    assert sent == [(1, "+1"), (2, "+2"), (3, "+3"), (4, "+4"), (5, "+5"), (60, "+60")]
+
+def test_reload_does_not_duplicate_scheduled_times(test_db, monkeypatch):
+    monkeypatch.setattr(scheduler_module, "REMINDER_HEAP_SIZE", 3)
+    for seconds in range(1, 6):
+        add_reminder(seconds)
+    scheduler = ReminderScheduler()
+
+    async def scenario():
+        await scheduler._load()
+        add_reminder(60, scheduler=scheduler)
+        assert not scheduler._needs_reload()
+
+        for _ in range(3):
+            scheduler._heap.pop(0)
+        assert scheduler._needs_reload()
+        await scheduler._load(scheduler._load_boundary)
+
+    asyncio.run(scenario())
+
+    assert sorted(scheduler._heap) == [at(seconds).timestamp() for seconds in (4, 5, 60)]
+
+def test_start_restores_queue_from_database(clock):
+    for seconds in (5, 20, 40):
+        add_reminder(seconds)
+    scheduler = ReminderScheduler()
+
+    async def start():
+        await scheduler.start(RecordingBot(clock))
+        metrics = scheduler.metrics()
+        await scheduler.stop()
+        return metrics
+
+    metrics = asyncio.run(start())
+
+    assert (metrics['scheduled_in_memory'], metrics['next_due_in']) == (3, 5)
+    assert deliver(ReminderScheduler(), RecordingBot(clock), 3) == [(5, "+5"), (20, "+20"), (40, "+40")]
+
+def test_claimed_reminders_are_sent_after_crash(clock):
+    add_reminder(-10, "pierwsze")
+    add_reminder(-5, "drugie")
+    # Przypomnienia pobrane do wysłania przed awarią bota
+    assert len(claim_due_reminders(START, 100)) == 2
+    assert reminder_statuses() == ["sending", "sending"]
+
+    sent = deliver(ReminderScheduler(), RecordingBot(clock), 2)
+
+    assert sorted(content for _, content in sent) == ["drugie", "pierwsze"]
+    assert reminder_statuses() == ["sent", "sent"]
+
+def test_due_reminders_are_claimed_in_batches(clock, monkeypatch):
+    monkeypatch.setattr(scheduler_module, "REMINDER_CLAIM_BATCH", 10)
+    batches = []
+
+    def claim(now, limit):
+        reminders = claim_due_reminders(now, limit)
+        batches.append(len(reminders))
+        return reminders
+
+    monkeypatch.setattr(scheduler_module, "claim_due_reminders", claim)
+    for index in range(25):
+        add_reminder(-index, f"r{index}")
+    scheduler = ReminderScheduler()
+
+    sent = deliver(scheduler, RecordingBot(clock), 25)
+
+    assert batches == [10, 10, 5]
+    assert sorted(content for _, content in sent) == sorted(f"r{index}" for index in range(25))
+    assert scheduler.delivered == 25
+    assert set(reminder_statuses()) == {"sent"}
+
+@pytest.mark.benchmark
+def test_benchmark_reminder_throughput(test_db):
+    now = datetime.datetime.now(pytz.UTC)
+    for index in range(BENCHMARK_REMINDERS):
+        create_reminder(index, f"r{index}", now - datetime.timedelta(seconds=index % 60))
+    bot = RecordingBot(latency=API_LATENCY_SECONDS)
+
+    started = time.perf_counter()
+    deliver(ReminderScheduler(), bot, BENCHMARK_REMINDERS)
+    per_minute = BENCHMARK_REMINDERS / (time.perf_counter() - started) * 60
+
+    print(
+        f"\nPrzypomnienia: {BENCHMARK_REMINDERS} zaległych, opóźnienie Bot API {API_LATENCY_SECONDS * 1000:.0f} ms - "
+        f"{per_minute:.0f} przypomnień/min"
+    )
+    assert per_minute > 10000
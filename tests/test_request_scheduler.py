@@ -0,0 +1,189 @@
+"""
+Testy kolejek zapytań do OpenAI z limitami modeli (utils/request_scheduler.py)
+"""
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from utils import request_scheduler
+from utils.request_scheduler import RATE_WINDOW, ModelQueue, RequestScheduler
+
+class FakeTimer:
+    def __init__(self, when, callback):
+        self.when = when
+        self.callback = callback
+        self._cancelled = False
+
+    def cancel(self):
+        self._cancelled = True
+
+    def cancelled(self):
+        return self._cancelled
+
+class FakeClock:
+    """Zegar testowy - zaplanowane wywołania są wykonywane dopiero po przesunięciu czasu"""
+
+    def __init__(self):
+        self.now = 0.0
+        self.timers = []
+
+    def monotonic(self):
+        return self.now
+
+    def get_running_loop(self):
+        return self
+
+    def create_future(self):
+        return asyncio.get_running_loop().create_future()
+
+    def call_later(self, delay, callback):
+        timer = FakeTimer(self.now + delay, callback)
+        self.timers.append(timer)
+        return timer
+
+    async def advance(self, seconds):
+        self.now += seconds
+        due = [timer for timer in self.timers if timer.when <= self.now and not timer.cancelled()]
+        self.timers = [timer for timer in self.timers if timer not in due]
+        for timer in due:
+            timer.callback()
+        await settle()
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(request_scheduler, "time", SimpleNamespace(monotonic=fake.monotonic))
+    monkeypatch.setattr(request_scheduler, "asyncio", SimpleNamespace(
+        get_running_loop=fake.get_running_loop, CancelledError=asyncio.CancelledError
+    ))
+    return fake
+
+async def settle():
+    """Pozwala oczekującym zadaniom obsłużyć przydzielone miejsca"""
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+def start_requests(queue, requests, granted, release=False):
+    """Uruchamia zapytania (etykieta, użytkownik, tokeny) i zapisuje kolejność przydzielenia miejsc"""
+    async def request(label, user_id, tokens):
+        await queue.acquire(user_id, tokens)
+        granted.append(label)
+        if release:
+            queue.release()
+
+    return [asyncio.ensure_future(request(*item)) for item in requests]
+
+def test_waiting_users_are_served_round_robin(clock):
+    queue = ModelQueue("gpt-4o", concurrency=1)
+    granted = []
+
+    async def scenario():
+        await queue.acquire("blocking")
+        start_requests(queue, [
+            ("a1", "a", 0), ("a2", "a", 0), ("a3", "a", 0),
+            ("b1", "b", 0), ("b2", "b", 0),
+            ("c1", "c", 0)
+        ], granted)
+        await settle()
+        assert queue.queue_depth == 6
+
+        # Każde zwolnienie miejsca przydziela je kolejnemu użytkownikowi
+        for _ in range(6):
+            queue.release()
+            await settle()
+
+    asyncio.run(scenario())
+
+    assert granted == ["a1", "b1", "c1", "a2", "b2", "a3"]
+
+def test_concurrency_limit(clock):
+    queue = ModelQueue("gpt-4o", concurrency=2)
+    granted = []
+
+    async def scenario():
+        start_requests(queue, [(f"r{index}", index, 0) for index in range(5)], granted)
+        await settle()
+        assert (granted, queue.active, queue.queue_depth) == (["r0", "r1"], 2, 3)
+
+        queue.release()
+        await settle()
+        assert granted == ["r0", "r1", "r2"]
+
+    asyncio.run(scenario())
+
+def test_rpm_limit_delays_requests_until_window_passes(clock):
+    queue = ModelQueue("gpt-4o", concurrency=10, rpm=2)
+    granted = []
+
+    async def scenario():
+        start_requests(queue, [("r1", 1, 0), ("r2", 2, 0), ("r3", 3, 0)], granted, release=True)
+        await settle()
+        assert granted == ["r1", "r2"]
+
+        await clock.advance(RATE_WINDOW - 1)
+        assert granted == ["r1", "r2"]
+
+        await clock.advance(1)
+        assert granted == ["r1", "r2", "r3"]
+
+    asyncio.run(scenario())
+
+def test_tpm_limit_counts_estimated_tokens(clock):
+    queue = ModelQueue("gpt-4o", concurrency=10, tpm=1000)
+    granted = []
+
+    async def scenario():
+        start_requests(queue, [("large", 1, 600), ("medium", 2, 300)], granted, release=True)
+        await settle()
+        assert queue.metrics()['tokens_last_minute'] == 900
+
+        await clock.advance(10)
+        start_requests(queue, [("over", 3, 200)], granted, release=True)
+        await settle()
+        assert granted == ["large", "medium"]
+
+        # Budżet zwalnia się, gdy pierwsze zapytania wypadną z okna
+        await clock.advance(RATE_WINDOW - 10)
+        assert granted == ["large", "medium", "over"]
+        assert queue.metrics()['tokens_last_minute'] == 200
+
+    asyncio.run(scenario())
+
+def test_cancelled_waiter_does_not_take_slot(clock):
+    queue = ModelQueue("gpt-4o", concurrency=1)
+    granted = []
+
+    async def scenario():
+        await queue.acquire("blocking")
+        cancelled, waiting = start_requests(queue, [("cancelled", "a", 0), ("waiting", "b", 0)], granted)
+        await settle()
+
+        cancelled.cancel()
+        await settle()
+        queue.release()
+        await settle()
+
+        assert granted == ["waiting"]
+        assert queue.active == 1
+        assert queue.queue_depth == 0
+
+    asyncio.run(scenario())
+
+def test_scheduler_uses_model_limits(clock):
+    scheduler = RequestScheduler({
+        "gpt-4": {"concurrency": 1, "rpm": 5},
+        "default": {"concurrency": 3}
+    })
+
+    async def scenario():
+        async with scheduler.slot("gpt-4", user_id=1, tokens=100):
+            metrics = scheduler.metrics()
+        return metrics
+
+    metrics = asyncio.run(scenario())
+
+    assert metrics["gpt-4"]['active'] == 1
+    assert metrics["gpt-4"]['tokens_last_minute'] == 100
+    assert scheduler.metrics()["gpt-4"]['active'] == 0
+    assert scheduler._get_queue("other-model").concurrency == 3
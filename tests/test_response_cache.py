@@ -0,0 +1,113 @@
+"""
+Testy pamięci podręcznej odpowiedzi (utils/response_cache.py)
+"""
+import asyncio
+import datetime
+from collections import OrderedDict
+from types import SimpleNamespace
+
+import pytest
+import pytz
+
+pytest.importorskip("supabase")
+
+from database import sqlite_client
+from database.connection import get_connection
+from utils import response_cache
+from utils.response_cache import CACHE_TTL_HOURS, get_cache_key, get_cached_response, is_cacheable, store_response
+
+MESSAGES = [
+    {"role": "system", "content": "Jesteś pomocnym asystentem AI."},
+    {"role": "user", "content": "Jak działa fotosynteza?"}
+]
+
+class FakeMonotonic:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+@pytest.fixture
+def cache(test_db, monkeypatch):
+    """Pusta pamięć procesu i zegar testowy"""
+    clock = FakeMonotonic()
+    monkeypatch.setattr(response_cache, "_memory_cache", OrderedDict())
+    monkeypatch.setattr(response_cache, "_metrics", dict.fromkeys(response_cache._metrics, 0))
+    monkeypatch.setattr(response_cache, "time", SimpleNamespace(monotonic=clock))
+    return clock
+
+def test_key_ignores_case_and_whitespace():
+    variant = [MESSAGES[0], {"role": "user", "content": "  jak DZIAŁA\n fotosynteza? "}]
+
+    assert get_cache_key("gpt-3.5-turbo", MESSAGES) == get_cache_key("gpt-3.5-turbo", variant)
+
+def test_key_depends_on_model_role_and_content():
+    key = get_cache_key("gpt-3.5-turbo", MESSAGES)
+
+    assert key != get_cache_key("gpt-4o", MESSAGES)
+    assert key != get_cache_key("gpt-3.5-turbo", [MESSAGES[0], {"role": "system", "content": "Jak działa fotosynteza?"}])
+    assert key != get_cache_key("gpt-3.5-turbo", [MESSAGES[0], {"role": "user", "content": "Jak działa fotosynteza"}])
+
+def test_only_marked_modes_at_conversation_start_are_cacheable(monkeypatch):
+    monkeypatch.setitem(response_cache.CHAT_MODES, "faq", {"cacheable": True})
+
+    assert is_cacheable("faq", MESSAGES)
+    assert not is_cacheable("faq", MESSAGES + [{"role": "assistant", "content": "Odpowiedź"}])
+    assert not is_cacheable("no_mode", MESSAGES)
+    assert not is_cacheable("missing", MESSAGES)
+
+def test_memory_entry_expires_after_ttl(cache):
+    key = get_cache_key("gpt-3.5-turbo", MESSAGES)
+    asyncio.run(store_response(key, "gpt-3.5-turbo", "Odpowiedź"))
+
+    cache.now += CACHE_TTL_HOURS * 3600 - 1
+    assert asyncio.run(get_cached_response(key)) == "Odpowiedź"
+    assert response_cache._metrics['memory_hits'] == 1
+
+    # Wpis w bazie też jest przeterminowany - po upływie TTL odpowiedź nie jest zwracana
+    expired = (datetime.datetime.now(pytz.UTC) - datetime.timedelta(hours=CACHE_TTL_HOURS + 1)).isoformat()
+    with get_connection() as conn:
+        conn.execute("UPDATE response_cache SET created_at = ?", (expired,))
+    cache.now += 1
+
+    assert asyncio.run(get_cached_response(key)) is None
+    assert key not in response_cache._memory_cache
+    assert response_cache._metrics['misses'] == 1
+
+def test_database_entry_survives_process_restart(cache, monkeypatch):
+    key = get_cache_key("gpt-3.5-turbo", MESSAGES)
+    asyncio.run(store_response(key, "gpt-3.5-turbo", "Odpowiedź"))
+    monkeypatch.setattr(response_cache, "_memory_cache", OrderedDict())
+
+    assert asyncio.run(get_cached_response(key)) == "Odpowiedź"
+    assert response_cache._metrics['db_hits'] == 1
+    assert key in response_cache._memory_cache
+
+def test_memory_cache_evicts_least_recently_used(cache, monkeypatch):
+    monkeypatch.setattr(response_cache, "MEMORY_CACHE_SIZE", 2)
+
+    async def fill():
+        await store_response("a", "gpt-3.5-turbo", "A")
+        await store_response("b", "gpt-3.5-turbo", "B")
+        # Odczyt odświeża wpis "a" - usunięty zostaje "b"
+        await get_cached_response("a")
+        await store_response("c", "gpt-3.5-turbo", "C")
+
+    asyncio.run(fill())
+
+    assert list(response_cache._memory_cache) == ["a", "c"]
+
+def test_database_eviction_removes_expired_and_excess_entries(test_db):
+    for index in range(5):
+        sqlite_client.save_cached_response(f"klucz-{index}", "gpt-3.5-turbo", f"Odpowiedź {index}")
+    expired = (datetime.datetime.now(pytz.UTC) - datetime.timedelta(hours=CACHE_TTL_HOURS + 1)).isoformat()
+    with get_connection() as conn:
+        conn.execute("UPDATE response_cache SET created_at = ? WHERE cache_key = 'klucz-0'", (expired,))
+        conn.execute("UPDATE response_cache SET last_used_at = ? WHERE cache_key = 'klucz-1'", (expired,))
+
+    assert sqlite_client.evict_response_cache(CACHE_TTL_HOURS, 3) == 2
+
+    with get_connection() as conn:
+        keys = [row[0] for row in conn.execute("SELECT cache_key FROM response_cache ORDER BY cache_key")]
+    assert keys == ["klucz-2", "klucz-3", "klucz-4"]
@@ -0,0 +1,148 @@
+"""
+Pomiar czasu startu bota
+
+Import main jest profilowany przez python -X importtime, a pełny start (startup(),
+post_init i pierwsze zapytanie getUpdates) jest mierzony w osobnym procesie z Bot API
+symulowanym przez OfflineBotApi - bez połączenia z Telegram i na tymczasowej bazie.
+"""
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+pytest.importorskip("supabase")
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# Maksymalny czas importu modułu main (w sekundach)
+IMPORT_TIME_BUDGET_SECONDS = 3
+
+# Maksymalny czas od uruchomienia procesu do pierwszego zapytania getUpdates (w sekundach)
+FIRST_POLL_BUDGET_SECONDS = 6
+
+# Liczba najwolniej importowanych modułów wypisywanych w raporcie
+SLOWEST_IMPORTS = 10
+
+# Proces mierzący start: czasy liczone od początku procesu, wynik w JSON na stdout
+STARTUP_PROBE = """
+import time
+started = time.perf_counter()
+
+import asyncio
+import json
+import sys
+
+from database import connection
+connection.DB_PATH = sys.argv[1]
+
+import main
+imported = time.perf_counter()
+
+from tests.test_webhook_load import BOT_TOKEN, OfflineBotApi
+
+class PollingBotApi(OfflineBotApi):
+    def __init__(self):
+        super().__init__()
+        self.first_poll = asyncio.Event()
+
+    async def do_request(self, url, method, request_data=None, **kwargs):
+        if url.endswith("/getUpdates"):
+            self.first_poll.set()
+        return await super().do_request(url, method, request_data, **kwargs)
+
+async def run():
+    main.startup()
+    api = PollingBotApi()
+    application = main.create_application(token=BOT_TOKEN, request=api)
+    await application.initialize()
+    await application.post_init(application)
+    post_init = time.perf_counter()
+    await application.updater.start_polling()
+    await application.start()
+    await asyncio.wait_for(api.first_poll.wait(), 30)
+    first_poll = time.perf_counter()
+    await application.updater.stop()
+    await application.stop()
+    await application.shutdown()
+    return post_init, first_poll
+
+post_init, first_poll = asyncio.run(run())
+print(json.dumps({
+    "import_main": imported - started,
+    "post_init": post_init - started,
+    "first_get_updates": first_poll - started
+}))
+"""
+
+def probe_env():
+    env = dict(os.environ, OPENAI_API_KEY=os.environ.get("OPENAI_API_KEY", "test"), HEALTH_PORT="0")
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [str(ROOT), env.get("PYTHONPATH")]))
+    return env
+
+def parse_importtime(output):
+    """
+    Odczytuje wynik python -X importtime
+
+    Returns:
+        dict: Skumulowany czas importu każdego modułu (w sekundach)
+    """
+    times = {}
+    for line in output.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        _, cumulative, module = line[len("import time:"):].split("|")
+        times[module.strip()] = int(cumulative) / 1_000_000
+    return times
+
+def profile_main_import():
+    """Importuje main w nowym procesie z -X importtime i zwraca czasy importu modułów"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import main"],
+        cwd=ROOT, env=probe_env(), capture_output=True, text=True, check=True
+    )
+    return parse_importtime(result.stderr)
+
+def measure_startup(tmp_path):
+    """Uruchamia bota w nowym procesie do pierwszego getUpdates i zwraca czasy etapów startu"""
+    result = subprocess.run(
+        [sys.executable, "-c", STARTUP_PROBE, str(tmp_path / "bot_database.sqlite")],
+        cwd=ROOT, env=probe_env(), capture_output=True, text=True, check=True
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+def test_parse_importtime():
+    output = (
+        "import time: self [us] | cumulative | imported package\n"
+        "import time:       120 |        120 |     pytz.exceptions\n"
+        "import time:      4440 |    1094595 | main\n"
+    )
+
+    assert parse_importtime(output) == {"pytz.exceptions": 0.00012, "main": 1.094595}
+
+def test_bot_polls_after_startup(tmp_path):
+    timings = measure_startup(tmp_path)
+
+    assert 0 < timings["import_main"] < timings["post_init"] <= timings["first_get_updates"]
+    assert (tmp_path / "bot_database.sqlite").exists()
+
+@pytest.mark.benchmark
+def test_benchmark_startup_time(tmp_path):
+    imports = profile_main_import()
+    timings = measure_startup(tmp_path)
+
+    slowest = sorted(
+        ((seconds, module) for module, seconds in imports.items() if module != "main"), reverse=True
+    )[:SLOWEST_IMPORTS]
+    print(
+        f"\nStart bota: import main {imports['main'] * 1000:.0f} ms (importtime), "
+        f"post_init po {timings['post_init'] * 1000:.0f} ms, "
+        f"pierwsze getUpdates po {timings['first_get_updates'] * 1000:.0f} ms"
+    )
+    for seconds, module in slowest:
+        print(f"  {module}: {seconds * 1000:.0f} ms")
+
+    assert imports["main"] < IMPORT_TIME_BUDGET_SECONDS
+    assert timings["first_get_updates"] < FIRST_POLL_BUDGET_SECONDS
@@ -0,0 +1,182 @@
+"""
+Testy strumieniowej aktualizacji wiadomości (utils/streaming_editor.py, utils/message_formatter.py)
+"""
+import asyncio
+import itertools
+from types import SimpleNamespace
+
+import pytest
+from telegram.constants import ParseMode
+from telegram.error import BadRequest, RetryAfter
+
+from utils import streaming_editor
+from utils.message_formatter import split_message, is_valid_markdown
+from utils.streaming_editor import MAX_MESSAGE_LENGTH, STREAM_CURSOR, StreamingEditor, TokenBucket
+
+# Każdy test korzysta z innego czatu - ograniczniki edycji są osobne dla czatów
+_chat_ids = itertools.count(1)
+
+class FakeBot:
+    def __init__(self):
+        self.messages = []
+
+    async def send_message(self, chat_id, text, parse_mode=None):
+        message = FakeMessage(self, chat_id, text)
+        self.messages.append(message)
+        return message
+
+class FakeMessage:
+    """Wiadomość Telegram zapisująca edycje (tekst i tryb formatowania)"""
+
+    def __init__(self, bot, chat_id, text="", errors=()):
+        self._bot = bot
+        self.chat_id = chat_id
+        self.text = text
+        self.edits = []
+        self.errors = list(errors)
+        self.deleted = False
+
+    def get_bot(self):
+        return self._bot
+
+    async def edit_text(self, text, parse_mode=None):
+        if self.errors:
+            error = self.errors.pop(0)
+            if error is not None and (parse_mode is not None or not isinstance(error, BadRequest)):
+                raise error
+        self.text = text
+        self.edits.append((text, parse_mode))
+
+    async def delete(self):
+        self.deleted = True
+
+def make_message(errors=()):
+    bot = FakeBot()
+    return FakeMessage(bot, next(_chat_ids), "...", errors)
+
+class FakeClock:
+    """Zegar testowy - asyncio.sleep przesuwa czas zamiast czekać"""
+
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+
+    def monotonic(self):
+        return self.now
+
+    async def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(streaming_editor, "time", SimpleNamespace(monotonic=fake.monotonic))
+    monkeypatch.setattr(streaming_editor, "asyncio", SimpleNamespace(sleep=fake.sleep))
+    return fake
+
+def test_token_bucket_allows_burst_then_limits_rate(clock):
+    bucket = TokenBucket(rate=2.0, capacity=3)
+
+    async def acquire(count):
+        for _ in range(count):
+            await bucket.acquire()
+
+    asyncio.run(acquire(3))
+    assert clock.now == 0.0
+
+    # Kolejne tokeny co 1/rate sekundy
+    asyncio.run(acquire(2))
+    assert clock.now == pytest.approx(1.0)
+
+def test_token_bucket_backs_off_after_retry_after(clock):
+    bucket = TokenBucket(rate=1.0, capacity=2)
+    bucket.slow_down(5)
+
+    asyncio.run(bucket.acquire())
+    assert clock.now >= 5
+    assert bucket.rate == 0.5
+
+    # Po udanych wysyłkach częstotliwość wraca do bazowej
+    for _ in range(10):
+        bucket.recover()
+    assert bucket.rate == 1.0
+
+def test_split_message_keeps_whole_text_within_limit():
+    text = "\n\n".join(f"Akapit {index}. " + "słowo " * 150 for index in range(20))
+    parts = split_message(text, MAX_MESSAGE_LENGTH)
+
+    assert len(parts) > 1
+    assert all(len(part) <= MAX_MESSAGE_LENGTH for part in parts)
+    assert "".join(parts) == text
+
+def test_split_message_returns_short_text_unchanged():
+    assert split_message("krótki tekst") == ["krótki tekst"]
+
+@pytest.mark.parametrize("text, valid", [
+    ("*pogrubienie* i _kursywa_", True),
+    ("```\nkod z * i _\n```", True),
+    ("`a_b` poza kodem", True),
+    ("niezamknięte *pogrubienie", False),
+    ("niezamknięty ```blok", False),
+    ("[link](adres", True),
+    ("[link bez końca", False),
+])
+def test_is_valid_markdown(text, valid):
+    assert is_valid_markdown(text) is valid
+
+def test_long_answer_continues_in_next_messages(monkeypatch):
+    # Bez oczekiwania na limit edycji w czacie - każda część to osobna wiadomość
+    monkeypatch.setattr(streaming_editor, "CHAT_BURST", 10)
+    message = make_message()
+    text = "\n\n".join("zdanie " * 200 for _ in range(6))
+
+    messages = asyncio.run(StreamingEditor(message).finish(text))
+
+    assert len(messages) == len(split_message(text, MAX_MESSAGE_LENGTH)) > 1
+    assert "".join(sent.text for sent in messages) == text
+
+def test_invalid_markdown_is_sent_as_plain_text():
+    message = make_message()
+
+    asyncio.run(StreamingEditor(message).finish("Plik my_file.txt"))
+
+    assert message.edits == [("Plik my_file.txt", None)]
+
+def test_rejected_markdown_falls_back_to_plain_text():
+    message = make_message(errors=[BadRequest("Can't parse entities: unsupported start tag")])
+
+    asyncio.run(StreamingEditor(message).finish("*Odpowiedź*"))
+
+    assert message.edits == [("*Odpowiedź*", None)]
+
+def test_final_edit_is_retried_after_retry_after(monkeypatch):
+    monkeypatch.setattr(streaming_editor, "CHAT_RATE", 50.0)
+    message = make_message(errors=[RetryAfter(0.01)])
+    editor = StreamingEditor(message)
+
+    asyncio.run(editor.finish("*Odpowiedź*"))
+
+    assert message.edits == [("*Odpowiedź*", ParseMode.MARKDOWN)]
+    assert editor._chat_bucket.rate < streaming_editor.CHAT_RATE
+
+def test_updates_are_coalesced_and_finish_wins():
+    message = make_message()
+
+    async def stream():
+        editor = StreamingEditor(message)
+        text = ""
+        for index in range(50):
+            text += f"fragment {index} "
+            editor.update(text)
+            await asyncio.sleep(0)
+        await editor.finish(text)
+        # Anulowana edycja w tle nie może nadpisać końcowej wersji
+        await asyncio.sleep(0.05)
+        return text
+
+    text = asyncio.run(stream())
+
+    assert message.text == text
+    assert len(message.edits) < 5
+    assert all(edit.endswith(STREAM_CURSOR) for edit, _ in message.edits[:-1])
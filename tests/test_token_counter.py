@@ -0,0 +1,155 @@
+"""
+Testy liczenia tokenów i budowania kontekstu rozmowy (utils/token_counter.py)
+"""
+from collections import OrderedDict
+from types import SimpleNamespace
+
+import pytest
+
+from utils import token_counter
+from utils.token_counter import (
+    CHARS_PER_TOKEN, MIN_TRUNCATED_TOKENS, SUMMARY_PREFIX, TOKENS_PER_MESSAGE, TOKENS_PER_REPLY,
+    build_context, count_tokens, get_context_budget, truncate_to_tokens
+)
+
+MODEL = "gpt-3.5-turbo"
+
+class FakeEncoding:
+    """Koder, w którym każde słowo jest jednym tokenem"""
+
+    def __init__(self, name):
+        self.name = name
+
+    def encode(self, text):
+        return text.split(" ")
+
+    def decode(self, tokens):
+        return " ".join(tokens)
+
+class FakeTiktoken:
+    """Zastępuje bibliotekę tiktoken (nie jest zainstalowana w środowisku testów)"""
+
+    def __init__(self):
+        self.requested = []
+
+    def encoding_for_model(self, model):
+        self.requested.append(model)
+        if model.startswith("unknown"):
+            raise KeyError(model)
+        return FakeEncoding(f"{model}-encoding")
+
+    def get_encoding(self, name):
+        return FakeEncoding(name)
+
+def use_encoder(monkeypatch, kind):
+    monkeypatch.setattr(token_counter, "_encodings", {})
+    monkeypatch.setattr(token_counter, "_token_cache", OrderedDict())
+    monkeypatch.setattr(token_counter, "tiktoken", FakeTiktoken() if kind == "tiktoken" else None)
+
+@pytest.fixture(params=["tiktoken", "fallback"])
+def encoder(request, monkeypatch):
+    """Oba sposoby liczenia tokenów: koder tiktoken i przybliżenie na podstawie liczby znaków"""
+    use_encoder(monkeypatch, request.param)
+    return request.param
+
+def history_message(index, words=50, is_from_user=None):
+    return {
+        "id": index,
+        "content": f"wiadomość{index} " + "słowo " * words,
+        "is_from_user": index % 2 == 0 if is_from_user is None else is_from_user
+    }
+
+def context_tokens(messages):
+    return TOKENS_PER_REPLY + sum(TOKENS_PER_MESSAGE + count_tokens(message["content"], MODEL) for message in messages)
+
+def test_fallback_counts_characters(monkeypatch):
+    use_encoder(monkeypatch, "fallback")
+
+    assert count_tokens("", MODEL) == 0
+    assert count_tokens("abcd", MODEL) == 1
+    assert count_tokens("abcde", MODEL) == 2
+    assert truncate_to_tokens("a" * 40, 5, MODEL) == "a" * 5 * CHARS_PER_TOKEN + "…"
+
+def test_tiktoken_encoder_is_used_and_cached(monkeypatch):
+    use_encoder(monkeypatch, "tiktoken")
+
+    assert count_tokens("trzy krótkie słowa", MODEL) == 3
+    assert count_tokens("jeszcze dwa", MODEL) == 2
+    assert token_counter.tiktoken.requested == [MODEL]
+
+    # Nieznany model korzysta z kodera cl100k_base
+    count_tokens("tekst", "unknown-model")
+    assert token_counter._encodings["unknown-model"].name == "cl100k_base"
+
+def test_tiktoken_truncation_keeps_beginning(monkeypatch):
+    use_encoder(monkeypatch, "tiktoken")
+
+    assert truncate_to_tokens("jeden dwa trzy cztery", 2, MODEL) == "jeden dwa…"
+    assert truncate_to_tokens("jeden dwa", 2, MODEL) == "jeden dwa"
+
+def test_short_history_is_included_in_order(encoder):
+    history = [history_message(index, words=5) for index in range(4)]
+
+    messages, used = build_context(history, "Pytanie", "Prompt", MODEL)
+
+    assert [message["role"] for message in messages] == ["system", "user", "assistant", "user", "assistant", "user"]
+    assert [message["content"] for message in messages[1:-1]] == [message["content"] for message in history]
+    assert messages[-1] == {"role": "user", "content": "Pytanie"}
+    assert used == context_tokens(messages)
+
+def test_context_stays_within_budget_and_drops_oldest(encoder):
+    history = [history_message(index, words=200) for index in range(40)]
+
+    messages, used = build_context(history, "Pytanie", "Prompt", MODEL)
+
+    assert used <= get_context_budget(MODEL)
+    assert used == context_tokens(messages)
+    # Zachowane są najnowsze wiadomości, bez przerw w historii
+    kept = [message["content"] for message in messages[1:-1]]
+    assert 0 < len(kept) < len(history)
+    assert kept[-1] == history[-1]["content"]
+    assert [message["content"] for message in history[-len(kept) + 1:]] == kept[1:]
+
+def test_long_message_is_truncated_to_history_limit(encoder, monkeypatch):
+    monkeypatch.setattr(token_counter, "MAX_HISTORY_MESSAGE_TOKENS", 100)
+    history = [history_message(0, words=2000), history_message(1, words=5)]
+
+    messages, used = build_context(history, "Pytanie", "Prompt", MODEL)
+
+    truncated = messages[1]["content"]
+    assert truncated.endswith("…")
+    assert history[0]["content"].startswith(truncated[:-1])
+    assert count_tokens(truncated, MODEL) <= 100
+    assert messages[2]["content"] == history[1]["content"]
+    assert used <= get_context_budget(MODEL)
+
+def test_message_is_skipped_when_too_little_budget_remains(encoder, monkeypatch):
+    monkeypatch.setitem(token_counter.MODEL_CONTEXT_BUDGETS, MODEL, 200)
+    prompt = "Prompt " * (150 if encoder == "tiktoken" else 70)
+    history = [history_message(0, words=500), history_message(1, words=5)]
+
+    messages, used = build_context(history, "Pytanie", prompt, MODEL)
+
+    # Skrócona wiadomość byłaby krótsza niż MIN_TRUNCATED_TOKENS - starsza historia jest pomijana
+    assert get_context_budget(MODEL) - used < MIN_TRUNCATED_TOKENS + TOKENS_PER_MESSAGE
+    assert [message["content"] for message in messages[1:-1]] == [history[1]["content"]]
+
+def test_summary_follows_system_prompt_and_uses_budget(encoder):
+    history = [history_message(index, words=200) for index in range(40)]
+
+    without_summary, _ = build_context(history, "Pytanie", "Prompt", MODEL)
+    messages, used = build_context(history, "Pytanie", "Prompt", MODEL, summary="Rozmowa o fotosyntezie " * 40)
+
+    assert messages[1] == {"role": "system", "content": SUMMARY_PREFIX + "Rozmowa o fotosyntezie " * 40}
+    assert used == context_tokens(messages) <= get_context_budget(MODEL)
+    assert len(messages) < len(without_summary) + 1
+
+def test_message_tokens_are_cached_by_id(encoder):
+    message = history_message(7, words=10)
+
+    first = token_counter.count_message_tokens(message, MODEL)
+    # Zapisana wiadomość nie zmienia treści - wynik pochodzi z pamięci podręcznej
+    changed = dict(message, content="inna treść")
+
+    assert token_counter.count_message_tokens(changed, MODEL) == first
+    assert token_counter.count_message_tokens(dict(changed, id=None), MODEL) == count_tokens("inna treść", MODEL)
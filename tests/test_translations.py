@@ -0,0 +1,134 @@
+"""
+Testy skompilowanego katalogu tłumaczeń (utils/translations.py)
+"""
+import pytest
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup
+
+pytest.importorskip("supabase")
+
+from config import AVAILABLE_LANGUAGES
+from handlers.menu_handler import MAIN_MENU_LAYOUT, create_main_menu_markup
+from utils import translations
+from utils.translations import get_text, get_keyboard_labels
+from tests.bench import measure, report
+
+# Liczba renderowań menu (dla wszystkich języków) w pomiarze
+BENCHMARK_ROUNDS = 2000
+
+# Argumenty formatowania - część tekstów używa tylko niektórych z nich, część innych
+FORMAT_ARGS = {"credits": 5, "bot_name": "Bot", "total": 10, "model": "gpt-4o", "price": 9}
+
+def legacy_get_text(key, language="pl", **kwargs):
+    """Dawne get_text: wyszukiwanie w słowniku i str.format w bloku try/except"""
+    if language not in translations.translations:
+        language = "pl"
+    text = translations.translations[language].get(key, kwargs.get('default', key))
+    if kwargs:
+        try:
+            return text.format(**kwargs)
+        except KeyError:
+            return text
+    return text
+
+def legacy_main_menu_markup(language):
+    """Dawne create_main_menu_markup: tłumaczenie każdej etykiety przy każdym wywołaniu"""
+    keyboard = [
+        [
+            InlineKeyboardButton(legacy_get_text("menu_chat_mode", language), callback_data="menu_section_chat_modes"),
+            InlineKeyboardButton(legacy_get_text("image_generate", language), callback_data="menu_image_generate")
+        ],
+        [
+            InlineKeyboardButton(legacy_get_text("menu_credits", language), callback_data="menu_section_credits"),
+            InlineKeyboardButton(legacy_get_text("menu_dialog_history", language), callback_data="menu_section_history")
+        ],
+        [
+            InlineKeyboardButton(legacy_get_text("menu_settings", language), callback_data="menu_section_settings"),
+            InlineKeyboardButton(legacy_get_text("menu_help", language), callback_data="menu_help")
+        ]
+    ]
+    return InlineKeyboardMarkup(keyboard)
+
+def catalog_keys(language):
+    return translations.translations[language].keys()
+
+@pytest.mark.parametrize("language", list(AVAILABLE_LANGUAGES))
+def test_texts_match_legacy_get_text(language):
+    for key in catalog_keys(language):
+        assert get_text(key, language) == legacy_get_text(key, language)
+        assert get_text(key, language, **FORMAT_ARGS) == legacy_get_text(key, language, **FORMAT_ARGS)
+
+def test_missing_language_key_uses_fallback_text():
+    fallback = translations.translations[translations.FALLBACK_LANGUAGE]
+    for language in AVAILABLE_LANGUAGES:
+        for key in fallback.keys() - catalog_keys(language):
+            assert get_text(key, language) == get_text(key, translations.FALLBACK_LANGUAGE)
+
+def test_unknown_key_is_reported_once(caplog):
+    with caplog.at_level("WARNING", logger=translations.logger.name):
+        assert get_text("no_such_key", "en") == "no_such_key"
+        assert get_text("no_such_key", "en") == "no_such_key"
+    assert len(caplog.records) == 1
+
+    assert get_text("no_such_key", "en", default="Tekst") == "Tekst"
+
+def test_text_with_missing_arguments_is_not_formatted():
+    text = get_text("low_credits_message", "pl")
+    assert get_text("low_credits_message", "pl", unrelated=1) == text
+
+def test_simple_arguments_compile_to_printf_template():
+    assert translations._compile_template("{credits}% z {total}") == "%(credits)s%% z %(total)s"
+    assert translations._compile_template("Koszt: {price:.2f}") is None
+    assert translations._compile_template("{error!r}") is None
+
+def test_keyboard_labels_match_main_menu():
+    for language in AVAILABLE_LANGUAGES:
+        expected = legacy_main_menu_markup(language)
+        assert create_main_menu_markup(language) == expected
+
+        labels = get_keyboard_labels(((("menu_help", "menu_help"),),), language)
+        assert labels == (((get_text("menu_help", language), "menu_help"),),)
+
+@pytest.mark.benchmark
+def test_benchmark_main_menu_for_all_languages():
+    # Budowa klawiatury bez zapamiętywania gotowych obiektów (cached_markup)
+    build_main_menu = create_main_menu_markup.__wrapped__
+
+    def rounds(render):
+        def run():
+            for _ in range(BENCHMARK_ROUNDS):
+                for language in AVAILABLE_LANGUAGES:
+                    render(language)
+        return run
+
+    def legacy_labels(language):
+        for row in MAIN_MENU_LAYOUT:
+            for key, _ in row:
+                legacy_get_text(key, language)
+
+    def legacy_texts(language):
+        legacy_get_text("menu_help", language)
+        legacy_get_text("low_credits_message", language, credits=5)
+
+    def compiled_texts(language):
+        get_text("menu_help", language)
+        get_text("low_credits_message", language, credits=5)
+
+    cases = [
+        ("create_main_menu_markup", legacy_main_menu_markup, build_main_menu),
+        ("etykiety głównego menu", legacy_labels, lambda language: get_keyboard_labels(MAIN_MENU_LAYOUT, language)),
+        ("get_text (tekst stały i z argumentem)", legacy_texts, compiled_texts),
+    ]
+    count = BENCHMARK_ROUNDS * len(AVAILABLE_LANGUAGES)
+    results = {}
+    for name, legacy, compiled in cases:
+        before = measure(rounds(legacy), repeat=5)
+        after = measure(rounds(compiled), repeat=5)
+        report(f"{name} dla {len(AVAILABLE_LANGUAGES)} języków x {BENCHMARK_ROUNDS}", before, after, count)
+        results[name] = (before, after)
+
+    # Czas budowy całego menu zależy głównie od tworzenia obiektów InlineKeyboardButton
+    # (jest tylko raportowany) - porównywane są etykiety i formatowanie tekstów
+    before, after = results["etykiety głównego menu"]
+    assert after * 2 < before
+    before, after = results["get_text (tekst stały i z argumentem)"]
+    assert after < before
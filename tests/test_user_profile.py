@@ -0,0 +1,74 @@
+"""
+Testy pamięci podręcznej profili użytkowników (database/user_profile.py)
+"""
+import asyncio
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("supabase")
+
+from database import user_profile
+from database.credits_client import add_user_credits
+from database.sqlite_client import get_or_create_user, update_user_language
+
+USER_ID = 1
+
+@pytest.fixture
+def profile_loads(test_db, monkeypatch):
+    """Zapisuje nazwy wątków, w których profil był pobierany z bazy"""
+    monkeypatch.setattr(user_profile, "_profiles", type(user_profile._profiles)())
+    threads = []
+    load_profile = user_profile._load_profile
+
+    def recording_load(user_id):
+        threads.append(threading.current_thread().name)
+        return load_profile(user_id)
+
+    monkeypatch.setattr(user_profile, "_load_profile", recording_load)
+    return threads
+
+def make_update(user_id):
+    return SimpleNamespace(effective_user=SimpleNamespace(id=user_id))
+
+def test_preload_reads_database_outside_event_loop(profile_loads):
+    get_or_create_user(USER_ID, first_name="Anna", language_code="en")
+    add_user_credits(USER_ID, 25, "Test")
+
+    asyncio.run(user_profile.preload_user_profile(make_update(USER_ID), None))
+
+    assert len(profile_loads) == 1
+    assert profile_loads[0].startswith("db")
+
+    # Handlery korzystają już z profilu w pamięci
+    assert user_profile.get_user_language(None, USER_ID) == "en"
+    assert user_profile.get_cached_user_credits(USER_ID) == 25
+    assert len(profile_loads) == 1
+
+def test_preload_skips_cached_profile(profile_loads):
+    get_or_create_user(USER_ID)
+
+    async def two_updates():
+        await user_profile.preload_user_profile(make_update(USER_ID), None)
+        await user_profile.preload_user_profile(make_update(USER_ID), None)
+
+    asyncio.run(two_updates())
+    assert len(profile_loads) == 1
+
+def test_profile_is_reloaded_after_changes(profile_loads):
+    get_or_create_user(USER_ID, language_code="pl")
+    assert user_profile.get_user_language(None, USER_ID) == "pl"
+
+    update_user_language(USER_ID, "ru")
+    add_user_credits(USER_ID, 10, "Test")
+
+    assert user_profile.get_user_language(None, USER_ID) == "ru"
+    assert user_profile.get_cached_user_credits(USER_ID) == 10
+
+def test_session_language_takes_precedence(profile_loads):
+    get_or_create_user(USER_ID, language_code="pl")
+    context = SimpleNamespace(chat_data={'user_data': {USER_ID: {'language': 'en'}}})
+
+    assert user_profile.get_user_language(context, USER_ID) == "en"
+    assert profile_loads == []
@@ -0,0 +1,171 @@
+"""
+Test obciążeniowy trybu webhook
+
+Syntetyczne aktualizacje (JSON obiektu Update) są wysyłane metodą POST do lokalnego
+serwera webhook aplikacji utworzonej przez main.create_application. Bot API jest
+symulowane przez OfflineBotApi z opóźnieniem typowym dla połączenia z serwerami
+Telegram, więc pomiar obejmuje całą ścieżkę aktualizacji - serwer webhook, kolejkę,
+handlery i wywołania Bot API - bez dostępu do sieci.
+"""
+import asyncio
+import json
+import socket
+import time
+
+import pytest
+
+pytest.importorskip("supabase")
+pytest.importorskip("tornado")
+
+import httpx
+from telegram.request import BaseRequest
+
+import main
+
+# Token w formacie wymaganym przez python-telegram-bot (nie jest nigdzie wysyłany)
+BOT_TOKEN = "123456:LOAD-TEST"
+
+WEBHOOK_PATH = "telegram"
+SECRET_TOKEN = "load-test-secret"
+
+# Opóźnienie odpowiedzi symulowanego Bot API (w sekundach)
+API_LATENCY_SECONDS = 0.02
+
+# Liczba aktualizacji w pomiarze przepustowości
+LOAD_TEST_UPDATES = 100
+
+# Liczba równocześnie obsługiwanych aktualizacji w pomiarze (CONCURRENT_UPDATES)
+LOAD_TEST_CONCURRENCY = 32
+
+# Maksymalny czas oczekiwania na obsłużenie wszystkich aktualizacji (w sekundach)
+PROCESSING_TIMEOUT_SECONDS = 60
+
+BOT_USER = {"id": 123456, "is_bot": True, "first_name": "Bot", "username": "load_test_bot"}
+
+class OfflineBotApi(BaseRequest):
+    """Warstwa komunikacji z Bot API odpowiadająca lokalnie (bez połączenia z Telegram)"""
+
+    def __init__(self, latency=API_LATENCY_SECONDS):
+        self.latency = latency
+        self.calls = {}
+        self._message_id = 0
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
+
+    async def do_request(self, url, method, request_data=None, read_timeout=None,
+                         write_timeout=None, connect_timeout=None, pool_timeout=None):
+        endpoint = url.rsplit("/", 1)[-1]
+        self.calls[endpoint] = self.calls.get(endpoint, 0) + 1
+        await asyncio.sleep(self.latency)
+        parameters = request_data.parameters if request_data else {}
+        return 200, json.dumps({"ok": True, "result": self._result(endpoint, parameters)}).encode()
+
+    def _result(self, endpoint, parameters):
+        if endpoint == "getMe":
+            return BOT_USER
+        if endpoint == "getUpdates":
+            return []
+        if endpoint in ("sendMessage", "editMessageText"):
+            self._message_id += 1
+            return {
+                "message_id": self._message_id,
+                "date": int(time.time()),
+                "chat": {"id": parameters.get("chat_id"), "type": "private"},
+                "from": BOT_USER,
+                "text": parameters.get("text", "")
+            }
+        return True
+
+def make_command_update(update_id, user_id, command="/help"):
+    """Tworzy JSON aktualizacji z komendą wysłaną przez użytkownika"""
+    return {
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id,
+            "date": int(time.time()),
+            "chat": {"id": user_id, "type": "private"},
+            "from": {"id": user_id, "is_bot": False, "first_name": "Użytkownik"},
+            "text": command,
+            "entities": [{"type": "bot_command", "offset": 0, "length": len(command)}]
+        }
+    }
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+async def run_load_test(update_count, concurrent_updates, secret_token=SECRET_TOKEN):
+    """
+    Wysyła aktualizacje do lokalnego webhooka i czeka na odpowiedź bota na każdą z nich
+
+    Returns:
+        tuple: (czas obsługi wszystkich aktualizacji w sekundach, kody odpowiedzi HTTP, OfflineBotApi)
+    """
+    api = OfflineBotApi()
+    application = main.create_application(token=BOT_TOKEN, concurrent_updates=concurrent_updates, request=api)
+    port = free_port()
+
+    await application.initialize()
+    await application.updater.start_webhook(
+        listen="127.0.0.1",
+        port=port,
+        url_path=WEBHOOK_PATH,
+        webhook_url=f"https://bot.example/{WEBHOOK_PATH}",
+        secret_token=SECRET_TOKEN
+    )
+    await application.start()
+
+    async def wait_for_replies(expected):
+        while api.calls.get("sendMessage", 0) < expected:
+            await asyncio.sleep(0.005)
+
+    try:
+        started = time.perf_counter()
+        async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}") as client:
+            responses = await asyncio.gather(*(
+                client.post(
+                    f"/{WEBHOOK_PATH}",
+                    json=make_command_update(update_id, 1000 + update_id % 50),
+                    headers={"X-Telegram-Bot-Api-Secret-Token": secret_token}
+                )
+                for update_id in range(1, update_count + 1)
+            ))
+        accepted = sum(1 for response in responses if response.status_code == 200)
+        await asyncio.wait_for(wait_for_replies(accepted), PROCESSING_TIMEOUT_SECONDS)
+        elapsed = time.perf_counter() - started
+    finally:
+        await application.updater.stop()
+        await application.stop()
+        await application.shutdown()
+
+    return elapsed, [response.status_code for response in responses], api
+
+def test_webhook_handles_every_update(test_db):
+    _, status_codes, api = asyncio.run(run_load_test(10, concurrent_updates=1))
+
+    assert status_codes == [200] * 10
+    assert api.calls["setWebhook"] == 1
+    assert api.calls["sendMessage"] == 10
+
+def test_webhook_rejects_wrong_secret_token(test_db):
+    _, status_codes, api = asyncio.run(run_load_test(3, concurrent_updates=1, secret_token="wrong"))
+
+    assert status_codes == [403] * 3
+    assert "sendMessage" not in api.calls
+
+@pytest.mark.benchmark
+def test_benchmark_webhook_throughput(test_db):
+    sequential, _, _ = asyncio.run(run_load_test(LOAD_TEST_UPDATES, concurrent_updates=1))
+    concurrent, _, _ = asyncio.run(run_load_test(LOAD_TEST_UPDATES, concurrent_updates=LOAD_TEST_CONCURRENCY))
+
+    print(
+        f"\nWebhook, {LOAD_TEST_UPDATES} aktualizacji /help, opóźnienie Bot API {API_LATENCY_SECONDS * 1000:.0f} ms: "
+        f"CONCURRENT_UPDATES=1 - {LOAD_TEST_UPDATES / sequential:.0f} aktualizacji/s, "
+        f"CONCURRENT_UPDATES={LOAD_TEST_CONCURRENCY} - {LOAD_TEST_UPDATES / concurrent:.0f} aktualizacji/s"
+    )
+    assert concurrent * 3 < sequential
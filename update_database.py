@@ -1,4 +1,3 @@
-import sqlite3
 import logging
 
 # Konfiguracja loggera
@@ -8,8 +7,8 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-# Ścieżka do pliku bazy danych
-DB_PATH = "bot_database.sqlite"
+# Ścieżka do pliku bazy danych i pula połączeń
+from database.connection import DB_PATH, get_connection
 
 def update_database_credits():
     """
@@ -17,115 +16,357 @@ def update_database_credits():
     systemu kredytów.
     """
     try:
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
-        
-        # Dodaj tabelę kredytów użytkownika
-        cursor.execute('''
-        CREATE TABLE IF NOT EXISTS user_credits (
-            user_id INTEGER PRIMARY KEY,
-            credits_amount INTEGER DEFAULT 0,
-            total_credits_purchased INTEGER DEFAULT 0,
-            last_purchase_date TEXT,
-            total_spent REAL DEFAULT 0
-        )
-        ''')
-        
-        # Dodaj tabelę transakcji kredytów
-        cursor.execute('''
-        CREATE TABLE IF NOT EXISTS credit_transactions (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_id INTEGER NOT NULL,
-            transaction_type TEXT NOT NULL,
-            amount INTEGER NOT NULL,
-            credits_before INTEGER NOT NULL,
-            credits_after INTEGER NOT NULL,
-            description TEXT,
-            created_at TEXT NOT NULL,
-            FOREIGN KEY(user_id) REFERENCES users(id)
-        )
-        ''')
-        
-        # Dodaj tabelę pakietów kredytów
-        cursor.execute('''
-        CREATE TABLE IF NOT EXISTS credit_packages (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            name TEXT NOT NULL,
-            credits INTEGER NOT NULL,
-            price REAL NOT NULL,
-            is_active INTEGER DEFAULT 1,
-            created_at TEXT NOT NULL
-        )
-        ''')
-        
-        # Dodaj domyślne pakiety kredytów
-        cursor.execute("SELECT COUNT(*) FROM credit_packages")
-        if cursor.fetchone()[0] == 0:
-            # Jeśli nie ma pakietów, dodaj domyślne
-            import datetime
-            import pytz
-            now = datetime.datetime.now(pytz.UTC).isoformat()
+        with get_connection() as conn:
+            cursor = conn.cursor()
+        
+            # Dodaj tabelę kredytów użytkownika
+            cursor.execute('''
+            CREATE TABLE IF NOT EXISTS user_credits (
+                user_id INTEGER PRIMARY KEY,
+                credits_amount INTEGER DEFAULT 0,
+                total_credits_purchased INTEGER DEFAULT 0,
+                last_purchase_date TEXT,
+                total_spent REAL DEFAULT 0
+            )
+            ''')
+        
+            # Dodaj tabelę transakcji kredytów
+            cursor.execute('''
+            CREATE TABLE IF NOT EXISTS credit_transactions (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                user_id INTEGER NOT NULL,
+                transaction_type TEXT NOT NULL,
+                amount INTEGER NOT NULL,
+                credits_before INTEGER NOT NULL,
+                credits_after INTEGER NOT NULL,
+                description TEXT,
+                category TEXT,
+                created_at TEXT NOT NULL,
+                FOREIGN KEY(user_id) REFERENCES users(id)
+            )
+            ''')
+        
+            # Dodaj tabelę rezerwacji kredytów (kredyty zablokowane na czas operacji)
+            cursor.execute('''
+            CREATE TABLE IF NOT EXISTS credit_holds (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                user_id INTEGER NOT NULL,
+                amount INTEGER NOT NULL,
+                description TEXT,
+                category TEXT,
+                status TEXT NOT NULL DEFAULT 'held',
+                created_at TEXT NOT NULL,
+                finalized_at TEXT,
+                FOREIGN KEY(user_id) REFERENCES users(id)
+            )
+            ''')
+        
+            # Dodaj tabelę dziennych podsumowań zużycia kredytów (aktualizowaną razem z credit_transactions)
+            cursor.execute('''
+            CREATE TABLE IF NOT EXISTS credit_usage_daily (
+                user_id INTEGER NOT NULL,
+                day TEXT NOT NULL,
+                category TEXT NOT NULL,
+                used INTEGER NOT NULL DEFAULT 0,
+                purchased INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (user_id, day, category)
+            ) WITHOUT ROWID
+            ''')
+        
+            # Dodaj tabelę pakietów kredytów
+            cursor.execute('''
+            CREATE TABLE IF NOT EXISTS credit_packages (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                name TEXT NOT NULL,
+                credits INTEGER NOT NULL,
+                price REAL NOT NULL,
+                is_active INTEGER DEFAULT 1,
+                created_at TEXT NOT NULL
+            )
+            ''')
+        
+            # Dodaj domyślne pakiety kredytów
+            cursor.execute("SELECT COUNT(*) FROM credit_packages")
+            if cursor.fetchone()[0] == 0:
+                # Jeśli nie ma pakietów, dodaj domyślne
+                import datetime
+                import pytz
+                now = datetime.datetime.now(pytz.UTC).isoformat()
             
-            packages = [
-                ("Starter", 100, 4.99, now),
-                ("Standard", 300, 13.99, now),
-                ("Premium", 700, 29.99, now),
-                ("Pro", 1500, 59.99, now),
-                ("Biznes", 5000, 179.99, now)
-            ]
+                packages = [
+                    ("Starter", 100, 4.99, now),
+                    ("Standard", 300, 13.99, now),
+                    ("Premium", 700, 29.99, now),
+                    ("Pro", 1500, 59.99, now),
+                    ("Biznes", 5000, 179.99, now)
+                ]
             
-            cursor.executemany(
-                "INSERT INTO credit_packages (name, credits, price, created_at) VALUES (?, ?, ?, ?)",
-                packages
-            )
+                cursor.executemany(
+                    "INSERT INTO credit_packages (name, credits, price, created_at) VALUES (?, ?, ?, ?)",
+                    packages
+                )
         
-        # Zatwierdzenie zmian
-        conn.commit()
-        logger.info("Aktualizacja schematu bazy danych kredytów zakończona pomyślnie")
+            # Zmiany zostaną zatwierdzone przy wyjściu z bloku połączenia
+            logger.info("Aktualizacja schematu bazy danych kredytów zakończona pomyślnie")
         
-        # Wyświetl informacje o aktualnym schemacie
-        logger.info("Aktualny schemat tabeli user_credits:")
-        cursor.execute("PRAGMA table_info(user_credits)")
-        for column in cursor.fetchall():
-            logger.info(f" - {column[1]} ({column[2]})")
+            # Wyświetl informacje o aktualnym schemacie
+            logger.info("Aktualny schemat tabeli user_credits:")
+            cursor.execute("PRAGMA table_info(user_credits)")
+            for column in cursor.fetchall():
+                logger.info(f" - {column[1]} ({column[2]})")
         
-        logger.info("Aktualny schemat tabeli credit_transactions:")
-        cursor.execute("PRAGMA table_info(credit_transactions)")
-        for column in cursor.fetchall():
-            logger.info(f" - {column[1]} ({column[2]})")
+            logger.info("Aktualny schemat tabeli credit_transactions:")
+            cursor.execute("PRAGMA table_info(credit_transactions)")
+            for column in cursor.fetchall():
+                logger.info(f" - {column[1]} ({column[2]})")
         
-        logger.info("Aktualny schemat tabeli credit_packages:")
-        cursor.execute("PRAGMA table_info(credit_packages)")
-        for column in cursor.fetchall():
-            logger.info(f" - {column[1]} ({column[2]})")
+            logger.info("Aktualny schemat tabeli credit_packages:")
+            cursor.execute("PRAGMA table_info(credit_packages)")
+            for column in cursor.fetchall():
+                logger.info(f" - {column[1]} ({column[2]})")
         
-        conn.close()
-        return True
+            return True
     except Exception as e:
         logger.error(f"Błąd podczas aktualizacji schematu bazy danych kredytów: {e}")
-        if 'conn' in locals():
-            conn.close()
         return False
 
+# Kategorie transakcji rozpoznawane w opisach zapisanych przed dodaniem kolumny category
+CATEGORY_BACKFILL_SQL = """
+    UPDATE credit_transactions SET category = CASE
+        WHEN instr(description, 'Wiadomość') > 0 THEN 'message'
+        WHEN instr(description, 'obraz') > 0 OR instr(description, 'DALL-E') > 0 THEN 'image'
+        WHEN instr(description, 'dokument') > 0 OR instr(description, 'PDF') > 0 THEN 'document'
+        WHEN instr(description, 'zdjęc') > 0 OR instr(description, 'zdjęci') > 0 THEN 'photo'
+        ELSE 'other'
+    END
+    WHERE category IS NULL AND transaction_type = 'deduct'
+"""
+
+def update_credit_categories():
+    """
+    Dodaje kolumnę category do transakcji i rezerwacji kredytów oraz uzupełnia ją dla starych transakcji
+    
+    Returns:
+        bool: True jeśli operacja się powiodła, False w przeciwnym razie
+    """
+    try:
+        with get_connection() as conn:
+            cursor = conn.cursor()
+        
+            for table in ("credit_transactions", "credit_holds"):
+                cursor.execute(f"PRAGMA table_info({table})")
+                columns = [column[1] for column in cursor.fetchall()]
+                if "category" not in columns:
+                    logger.info(f"Dodaję kolumnę category do tabeli {table}")
+                    cursor.execute(f"ALTER TABLE {table} ADD COLUMN category TEXT")
+        
+            cursor.execute(CATEGORY_BACKFILL_SQL)
+            if cursor.rowcount:
+                logger.info(f"Uzupełniono kategorię dla {cursor.rowcount} transakcji")
+        
+            return True
+    except Exception as e:
+        logger.error(f"Błąd podczas dodawania kategorii transakcji kredytów: {e}")
+        return False
+
+def backfill_credit_usage_daily(rebuild=False):
+    """
+    Wypełnia tabelę credit_usage_daily na podstawie historii transakcji kredytów
+    
+    Args:
+        rebuild (bool): Przebuduj tabelę od zera, nawet jeśli zawiera już dane
+    
+    Returns:
+        bool: True jeśli operacja się powiodła, False w przeciwnym razie
+    """
+    try:
+        with get_connection() as conn:
+            cursor = conn.cursor()
+        
+            if not rebuild:
+                cursor.execute("SELECT 1 FROM credit_usage_daily LIMIT 1")
+                if cursor.fetchone():
+                    return True
+        
+            # Przebudowa w jednej transakcji - równoległe zapisy kredytów czekają na jej zakończenie
+            cursor.execute("DELETE FROM credit_usage_daily")
+            cursor.execute('''
+            INSERT INTO credit_usage_daily (user_id, day, category, used, purchased)
+            SELECT user_id, substr(created_at, 1, 10), COALESCE(category, 'other'),
+                   SUM(CASE WHEN transaction_type = 'deduct' THEN amount ELSE 0 END),
+                   SUM(CASE WHEN transaction_type IN ('add', 'purchase') THEN amount ELSE 0 END)
+            FROM credit_transactions
+            GROUP BY 1, 2, 3
+            ''')
+        
+            if cursor.rowcount:
+                logger.info(f"Utworzono {cursor.rowcount} dziennych podsumowań zużycia kredytów")
+        
+            return True
+    except Exception as e:
+        logger.error(f"Błąd podczas wypełniania dziennych podsumowań kredytów: {e}")
+        return False
+
+# Wersjonowane migracje indeksów - (wersja, opis, lista poleceń SQL).
+# Numer ostatniej zastosowanej migracji przechowywany jest w PRAGMA user_version,
+# więc nowe indeksy należy dopisywać jako kolejną wersję na końcu listy.
+INDEX_MIGRATIONS = [
+    (1, "Indeksy dla historii konwersacji, transakcji kredytów i tematów", [
+        # get_conversation_history: WHERE conversation_id = ? ORDER BY created_at
+        "CREATE INDEX IF NOT EXISTS idx_messages_conversation_created ON messages (conversation_id, created_at)",
+        # get_active_conversation: WHERE user_id = ? ORDER BY last_message_at DESC
+        "CREATE INDEX IF NOT EXISTS idx_conversations_user_last_message ON conversations (user_id, last_message_at)",
+        # get_active_themed_conversation: WHERE user_id = ? AND theme_id = ? ORDER BY last_message_at DESC
+        "CREATE INDEX IF NOT EXISTS idx_conversations_user_theme_last_message ON conversations (user_id, theme_id, last_message_at)",
+        # credit_analytics i get_user_credit_stats: WHERE user_id = ? AND created_at >= ? (indeks pokrywający)
+        "CREATE INDEX IF NOT EXISTS idx_credit_transactions_user_created ON credit_transactions (user_id, created_at, transaction_type, amount, credits_after)",
+        # get_user_themes: WHERE user_id = ? AND is_active = 1 ORDER BY last_used_at DESC
+        "CREATE INDEX IF NOT EXISTS idx_conversation_themes_user_active ON conversation_themes (user_id, is_active, last_used_at)",
+        # release_expired_credit_holds: WHERE status = 'held' AND created_at < ?
+        "CREATE INDEX IF NOT EXISTS idx_credit_holds_status_created ON credit_holds (status, created_at)",
+    ]),
+    (2, "Indeks dla stronicowania historii konwersacji po ID wiadomości", [
+        # get_conversation_history: WHERE conversation_id = ? AND id < ? ORDER BY id DESC
+        "CREATE INDEX IF NOT EXISTS idx_messages_conversation_id ON messages (conversation_id, id)",
+    ]),
+    (3, "Indeks pokrywający dla rozkładu zużycia kredytów według kategorii", [
+        # get_credit_usage_breakdown: WHERE user_id = ? AND created_at >= ? AND transaction_type = 'deduct' GROUP BY category
+        "CREATE INDEX IF NOT EXISTS idx_credit_transactions_user_created_category ON credit_transactions (user_id, created_at, transaction_type, category, amount)",
+    ]),
+    (4, "Indeks dla ostatniej transakcji użytkownika (wersja danych wykresów)", [
+        # get_last_credit_transaction_id: SELECT MAX(id) WHERE user_id = ?
+        "CREATE INDEX IF NOT EXISTS idx_credit_transactions_user_id ON credit_transactions (user_id, id)",
+    ]),
+    (5, "Indeksy dla harmonogramu przypomnień", [
+        # claim_due_reminders i get_pending_reminder_times: WHERE status = 'pending' AND remind_at <= ? ORDER BY remind_at
+        "CREATE INDEX IF NOT EXISTS idx_reminders_status_remind_at ON reminders (status, remind_at)",
+        # get_user_pending_reminders: WHERE user_id = ? AND status = 'pending' ORDER BY remind_at
+        "CREATE INDEX IF NOT EXISTS idx_reminders_user_status_remind_at ON reminders (user_id, status, remind_at)",
+    ]),
+]
+
+# Najczęściej wykonywane zapytania - żadne z nich nie powinno skanować całej tabeli
+HOT_QUERIES = [
+    ("SELECT * FROM messages WHERE conversation_id = ? ORDER BY id DESC LIMIT ?", (1, 20)),
+    ("SELECT * FROM messages WHERE conversation_id = ? AND id < ? ORDER BY id DESC LIMIT ?", (1, 100, 20)),
+    ("SELECT * FROM messages WHERE conversation_id = ? AND id > ? ORDER BY id ASC LIMIT ?", (1, 100, 20)),
+    ("SELECT * FROM conversations WHERE user_id = ? ORDER BY last_message_at DESC LIMIT 1", (1,)),
+    ("SELECT * FROM conversations WHERE user_id = ? AND theme_id = ? ORDER BY last_message_at DESC LIMIT 1", (1, 1)),
+    ("SELECT MAX(id) FROM credit_transactions WHERE user_id = ?", (1,)),
+    ("SELECT day, SUM(used), SUM(purchased) FROM credit_usage_daily WHERE user_id = ? AND day >= ? GROUP BY day ORDER BY day", (1, "")),
+    ("SELECT category, SUM(used) FROM credit_usage_daily WHERE user_id = ? AND day >= ? AND used > 0 GROUP BY category", (1, "")),
+    ("SELECT * FROM conversation_themes WHERE user_id = ? AND is_active = 1 ORDER BY last_used_at DESC", (1,)),
+    ("SELECT id, user_id, content, remind_at FROM reminders WHERE status = 'pending' AND remind_at <= ? ORDER BY remind_at LIMIT ?", ("", 500)),
+    ("SELECT remind_at FROM reminders WHERE status = 'pending' ORDER BY remind_at LIMIT ?", (10000,)),
+    ("SELECT remind_at FROM reminders WHERE status = 'pending' AND remind_at > ? ORDER BY remind_at LIMIT ?", ("", 10000)),
+    ("SELECT id, content, remind_at FROM reminders WHERE user_id = ? AND status = 'pending' ORDER BY remind_at", (1,)),
+]
+
+def update_database_indexes():
+    """
+    Stosuje brakujące migracje indeksów z listy INDEX_MIGRATIONS
+    
+    Returns:
+        bool: True jeśli schemat indeksów jest aktualny, False w przypadku błędu
+    """
+    try:
+        with get_connection() as conn:
+            cursor = conn.cursor()
+        
+            cursor.execute("PRAGMA user_version")
+            current_version = cursor.fetchone()[0]
+        
+            for version, description, statements in INDEX_MIGRATIONS:
+                if version <= current_version:
+                    continue
+            
+                logger.info(f"Migracja indeksów {version}: {description}")
+                for statement in statements:
+                    cursor.execute(statement)
+            
+                cursor.execute(f"PRAGMA user_version = {version}")
+                current_version = version
+        
+            # Odśwież statystyki planera zapytań
+            cursor.execute("PRAGMA optimize")
+        
+            logger.info(f"Wersja schematu indeksów: {current_version}")
+            return True
+    except Exception as e:
+        logger.error(f"Błąd podczas migracji indeksów bazy danych: {e}")
+        return False
+
+def find_table_scans():
+    """
+    Sprawdza plany wykonania zapytań z HOT_QUERIES (EXPLAIN QUERY PLAN)
+    
+    Returns:
+        list: Zapytania, dla których SQLite wykonuje pełny skan tabeli
+    """
+    scans = []
+    try:
+        with get_connection() as conn:
+            cursor = conn.cursor()
+        
+            for query, params in HOT_QUERIES:
+                cursor.execute(f"EXPLAIN QUERY PLAN {query}", params)
+                details = [row[3] for row in cursor.fetchall()]
+                if any(detail.startswith("SCAN") for detail in details):
+                    scans.append(query)
+                    logger.warning(f"Zapytanie wykonuje pełny skan tabeli: {query} ({'; '.join(details)})")
+    except Exception as e:
+        logger.error(f"Błąd podczas sprawdzania planów zapytań: {e}")
+    
+    return scans
+
 def run_all_updates():
     """
     Uruchamia wszystkie funkcje aktualizujące bazę danych
     """
     logger.info("Rozpoczynam pełną aktualizację bazy danych")
     
+    # Podstawowe tabele (użytkownicy, konwersacje, wiadomości)
+    from database.sqlite_client import init_database
+    init_database()
+    
     # Aktualizacja tabel kredytów
     update_result = update_database_credits()
+    update_credit_categories()
+    backfill_credit_usage_daily()
     
     # Inicjalizacja tabel tematów konwersacji
     from database.sqlite_client import init_themes_table
     init_themes_table()
     
+    # Inicjalizacja tabeli podsumowań konwersacji
+    from database.sqlite_client import init_summaries_table
+    init_summaries_table()
+    
+    # Inicjalizacja tabeli pamięci podręcznej odpowiedzi
+    from database.sqlite_client import init_response_cache_table
+    init_response_cache_table()
+    
+    # Inicjalizacja tabeli przypomnień
+    from database.sqlite_client import init_reminders_table
+    init_reminders_table()
+    
+    # Migracja indeksów (po utworzeniu wszystkich tabel)
+    update_database_indexes()
+    find_table_scans()
+    
     logger.info("Zakończono pełną aktualizację bazy danych")
     return update_result
 
 if __name__ == "__main__":
-    print("Rozpoczynam aktualizację schematu bazy danych kredytów...")
-    result = update_database_credits()
+    import sys
+    
+    if "--backfill-credit-usage" in sys.argv:
+        # Przebudowa dziennych podsumowań zużycia kredytów z historii transakcji
+        print("Przebudowuję dzienne podsumowania zużycia kredytów...")
+        result = backfill_credit_usage_daily(rebuild=True)
+    else:
+        print("Rozpoczynam aktualizację schematu bazy danych kredytów...")
+        result = update_database_credits()
     if result:
         print("Aktualizacja zakończona pomyślnie!")
     else:
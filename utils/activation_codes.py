@@ -1,15 +1,14 @@
 """
 Moduł do zarządzania kodami aktywacyjnymi
 """
-import sqlite3
 import random
 import string
 import datetime
 import pytz
 import logging
 
-# Ścieżka do pliku bazy danych
-DB_PATH = "bot_database.sqlite"
+# Ścieżka do pliku bazy danych i pula połączeń
+from database.connection import DB_PATH, get_connection
 
 # Konfiguracja loggera
 logger = logging.getLogger(__name__)
@@ -29,14 +28,13 @@ def generate_activation_code(length=8):
         code = ''.join(random.choice(characters) for _ in range(length))
         
         # Sprawdź, czy kod już istnieje
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
-        cursor.execute("SELECT code FROM activation_codes WHERE code = ?", (code,))
-        exists = cursor.fetchone()
-        conn.close()
+        with get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT code FROM activation_codes WHERE code = ?", (code,))
+            exists = cursor.fetchone()
         
-        if not exists:
-            return code
+            if not exists:
+                return code
 
 def create_activation_code(credits):
     """
@@ -49,25 +47,20 @@ def create_activation_code(credits):
         str: Utworzony kod aktywacyjny
     """
     try:
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
-        
-        code = generate_activation_code()
-        now = datetime.datetime.now(pytz.UTC).isoformat()
+        with get_connection() as conn:
+            cursor = conn.cursor()
         
-        cursor.execute(
-            "INSERT INTO activation_codes (code, credits, created_at) VALUES (?, ?, ?)",
-            (code, credits, now)
-        )
+            code = generate_activation_code()
+            now = datetime.datetime.now(pytz.UTC).isoformat()
         
-        conn.commit()
-        conn.close()
+            cursor.execute(
+                "INSERT INTO activation_codes (code, credits, created_at) VALUES (?, ?, ?)",
+                (code, credits, now)
+            )
         
-        return code
+            return code
     except Exception as e:
         logger.error(f"Błąd podczas tworzenia kodu aktywacyjnego: {e}")
-        if 'conn' in locals():
-            conn.close()
         return None
 
 def create_multiple_codes(credits, count=1):
@@ -101,42 +94,36 @@ def activate_code(user_id, code):
         tuple: (Czy aktywacja się powiodła, liczba kredytów)
     """
     try:
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
-        
-        # Sprawdź, czy kod istnieje i nie został użyty
-        cursor.execute(
-            "SELECT id, credits FROM activation_codes WHERE code = ? AND is_used = 0",
-            (code,)
-        )
+        with get_connection() as conn:
+            cursor = conn.cursor()
         
-        result = cursor.fetchone()
+            # Sprawdź, czy kod istnieje i nie został użyty
+            cursor.execute(
+                "SELECT id, credits FROM activation_codes WHERE code = ? AND is_used = 0",
+                (code,)
+            )
         
-        if not result:
-            conn.close()
-            return False, 0
+            result = cursor.fetchone()
         
-        code_id, credits = result
+            if not result:
+                return False, 0
         
-        # Oznacz kod jako użyty
-        now = datetime.datetime.now(pytz.UTC).isoformat()
-        cursor.execute(
-            "UPDATE activation_codes SET is_used = 1, used_by = ?, used_at = ? WHERE id = ?",
-            (user_id, now, code_id)
-        )
+            code_id, credits = result
         
-        conn.commit()
-        conn.close()
+            # Oznacz kod jako użyty
+            now = datetime.datetime.now(pytz.UTC).isoformat()
+            cursor.execute(
+                "UPDATE activation_codes SET is_used = 1, used_by = ?, used_at = ? WHERE id = ?",
+                (user_id, now, code_id)
+            )
         
-        # Dodaj kredyty użytkownikowi
-        from database.credits_client import add_user_credits
-        add_user_credits(user_id, credits, f"Aktywacja kodu {code}")
+            # Dodaj kredyty użytkownikowi
+            from database.credits_client import add_user_credits
+            add_user_credits(user_id, credits, f"Aktywacja kodu {code}")
         
-        return True, credits
+            return True, credits
     except Exception as e:
         logger.error(f"Błąd podczas aktywacji kodu: {e}")
-        if 'conn' in locals():
-            conn.close()
         return False, 0
 
 def get_code_info(code):
@@ -150,33 +137,30 @@ def get_code_info(code):
         dict: Informacje o kodzie lub None, jeśli kod nie istnieje
     """
     try:
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
-        
-        cursor.execute(
-            "SELECT id, credits, is_used, used_by, used_at, created_at FROM activation_codes WHERE code = ?",
-            (code,)
-        )
-        
-        result = cursor.fetchone()
-        conn.close()
-        
-        if not result:
-            return None
-        
-        return {
-            'id': result[0],
-            'code': code,
-            'credits': result[1],
-            'is_used': bool(result[2]),
-            'used_by': result[3],
-            'used_at': result[4],
-            'created_at': result[5]
-        }
+        with get_connection() as conn:
+            cursor = conn.cursor()
+        
+            cursor.execute(
+                "SELECT id, credits, is_used, used_by, used_at, created_at FROM activation_codes WHERE code = ?",
+                (code,)
+            )
+        
+            result = cursor.fetchone()
+        
+            if not result:
+                return None
+        
+            return {
+                'id': result[0],
+                'code': code,
+                'credits': result[1],
+                'is_used': bool(result[2]),
+                'used_by': result[3],
+                'used_at': result[4],
+                'created_at': result[5]
+            }
     except Exception as e:
         logger.error(f"Błąd podczas pobierania informacji o kodzie: {e}")
-        if 'conn' in locals():
-            conn.close()
         return None
 
 def bulk_create_activation_codes(credits_values, count_per_value=10):
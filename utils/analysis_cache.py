@@ -0,0 +1,108 @@
+"""
+Moduł pamięci podręcznej analiz dokumentów i obrazów adresowanej treścią pliku
+"""
+import asyncio
+import hashlib
+import logging
+from utils.response_cache import lookup_response, save_response
+
+logger = logging.getLogger(__name__)
+
+# Model, którym wykonywane są analizy (zapisywany razem z wynikiem)
+ANALYSIS_MODEL = "gpt-4o"
+
+# Analizy w toku - identyczne zapytania czekają na jeden wynik
+_in_flight = {}
+_metrics = {
+    'hits': 0,
+    'misses': 0,
+    'joined': 0,
+    'failures': 0
+}
+
+def get_analysis_key(kind, content, mode, target_language):
+    """
+    Wylicza klucz analizy na podstawie treści pliku i parametrów analizy
+
+    Args:
+        kind (str): Rodzaj analizy ("document" lub "image")
+        content (bytes|str): Zawartość pliku lub jego stały identyfikator (file_unique_id)
+        mode (str): Tryb analizy ("analyze" lub "translate")
+        target_language (str): Docelowy język tłumaczenia
+
+    Returns:
+        str: Klucz analizy
+    """
+    if isinstance(content, (bytes, bytearray)):
+        content_id = "sha256:" + hashlib.sha256(content).hexdigest()
+    else:
+        content_id = "file:" + content
+
+    # Język docelowy ma znaczenie tylko przy tłumaczeniu
+    language = target_language if mode == "translate" else ""
+    return f"analysis:{kind}:{content_id}:{mode}:{language}"
+
+def _finish_in_flight(key, task):
+    _in_flight.pop(key, None)
+    # Pobierz wyjątek, nawet jeśli nikt już nie czeka na wynik
+    if not task.cancelled():
+        task.exception()
+
+async def _analyze_and_store(key, analyze):
+    try:
+        result = await analyze()
+    except Exception:
+        _metrics['failures'] += 1
+        raise
+    await save_response(key, ANALYSIS_MODEL, result)
+    return result
+
+async def get_or_create_analysis(key, analyze):
+    """
+    Zwraca zapamiętaną analizę lub wykonuje ją jednokrotnie dla wszystkich równoczesnych zapytań
+
+    Wynik jest zapamiętywany tylko wtedy, gdy funkcja analyze zakończy się bez wyjątku.
+
+    Args:
+        key (str): Klucz z get_analysis_key
+        analyze (callable): Funkcja async wykonująca analizę i zwracająca jej treść
+
+    Returns:
+        str: Wynik analizy
+    """
+    task = _in_flight.get(key)
+    if task is None:
+        cached, _ = await lookup_response(key)
+        if cached is not None:
+            _metrics['hits'] += 1
+            return cached
+
+        # W trakcie sprawdzania bazy ta sama analiza mogła zostać już rozpoczęta
+        task = _in_flight.get(key)
+        if task is None:
+            _metrics['misses'] += 1
+            task = asyncio.ensure_future(_analyze_and_store(key, analyze))
+            _in_flight[key] = task
+            task.add_done_callback(lambda done: _finish_in_flight(key, done))
+        else:
+            _metrics['joined'] += 1
+    else:
+        _metrics['joined'] += 1
+        logger.info(f"Dołączam do analizy w toku: {key}")
+
+    # Anulowanie jednego z oczekujących nie przerywa analizy pozostałym
+    return await asyncio.shield(task)
+
+def get_analysis_cache_metrics():
+    """
+    Zwraca statystyki pamięci podręcznej analiz
+
+    Returns:
+        dict: Liczba trafień, chybień (wykonanych analiz), dołączeń do analiz w toku i nieudanych analiz
+    """
+    lookups = _metrics['hits'] + _metrics['misses'] + _metrics['joined']
+    return {
+        **_metrics,
+        'in_flight': len(_in_flight),
+        'hit_rate': (_metrics['hits'] + _metrics['joined']) / lookups if lookups else 0.0
+    }
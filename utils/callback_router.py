@@ -0,0 +1,178 @@
+"""
+Moduł routera callbacków z przycisków inline
+
+Trasy są zapisane w tabeli: dokładne wartości callback_data w jednym słowniku,
+a prefiksy (zakończone znakiem "_") w drugim. Wyszukanie trasy to jedno sprawdzenie
+słownika na każdy segment callback_data - bez przeglądania długiej listy warunków.
+Dla każdej trasy zbierana jest liczba wywołań, błędów oraz czas obsługi.
+"""
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+# Separator segmentów callback_data (np. "buy_package_3")
+SEGMENT_SEPARATOR = "_"
+
+class CallbackRoute:
+    """Trasa callbacku: funkcja obsługi, typ argumentu z callback_data i statystyki czasu"""
+
+    def __init__(self, pattern, handler, payload_type=None):
+        self.pattern = pattern
+        self.handler = handler
+        self.payload_type = payload_type
+        self.calls = 0
+        self.errors = 0
+        self.total_time = 0.0
+        self.max_time = 0.0
+
+    def record(self, elapsed, failed=False):
+        """Zapisuje czas obsługi jednego callbacku"""
+        self.calls += 1
+        self.total_time += elapsed
+        if elapsed > self.max_time:
+            self.max_time = elapsed
+        if failed:
+            self.errors += 1
+
+    def metrics(self):
+        """Zwraca statystyki trasy (czasy w milisekundach)"""
+        return {
+            'calls': self.calls,
+            'errors': self.errors,
+            'avg_ms': round(self.total_time / self.calls * 1000, 1) if self.calls else 0,
+            'max_ms': round(self.max_time * 1000, 1)
+        }
+
+class CallbackRouter:
+    """
+    Router callbacków z przycisków inline
+
+    Trasy dokładne mają pierwszeństwo przed prefiksami, a spośród prefiksów
+    wybierany jest najdłuższy pasujący.
+    """
+
+    def __init__(self):
+        self._exact = {}
+        self._prefixes = {}
+        self.unhandled = 0
+
+    def add(self, callback_data, handler):
+        """
+        Rejestruje obsługę dokładnej wartości callback_data
+
+        Args:
+            callback_data (str): Wartość callback_data przycisku
+            handler: Funkcja async handler(update, context)
+        """
+        self._exact[callback_data] = CallbackRoute(callback_data, handler)
+
+    def add_prefix(self, prefix, handler, payload_type=None):
+        """
+        Rejestruje obsługę wszystkich callback_data zaczynających się od prefiksu
+
+        Args:
+            prefix (str): Prefiks zakończony znakiem "_" (np. "model_")
+            handler: Funkcja async handler(update, context) lub, gdy podano
+                payload_type, handler(update, context, argument)
+            payload_type: Typ argumentu (np. str, int) - część callback_data po prefiksie
+        """
+        if not prefix.endswith(SEGMENT_SEPARATOR):
+            raise ValueError(f"Prefiks callbacku musi kończyć się znakiem '{SEGMENT_SEPARATOR}': {prefix}")
+        self._prefixes[prefix] = CallbackRoute(prefix, handler, payload_type)
+
+    def resolve(self, callback_data):
+        """
+        Wyszukuje trasę dla callback_data
+
+        Returns:
+            tuple: (CallbackRoute, argument) lub (None, None), jeśli brak trasy
+        """
+        route = self._exact.get(callback_data)
+        if route is not None:
+            return route, None
+
+        # Najdłuższy pasujący prefiks - jedno sprawdzenie słownika na segment
+        end = callback_data.rfind(SEGMENT_SEPARATOR)
+        while end > 0:
+            route = self._prefixes.get(callback_data[:end + 1])
+            if route is not None:
+                payload = callback_data[end + 1:]
+                if route.payload_type is not None:
+                    try:
+                        payload = route.payload_type(payload)
+                    except ValueError:
+                        logger.warning(f"Nieprawidłowy argument callbacku {callback_data} dla trasy {route.pattern}")
+                        return None, None
+                return route, payload
+            end = callback_data.rfind(SEGMENT_SEPARATOR, 0, end)
+        return None, None
+
+    async def dispatch(self, update, context):
+        """
+        Wywołuje obsługę callbacku z update.callback_query
+
+        Returns:
+            bool: True jeśli znaleziono trasę, False w przeciwnym razie
+        """
+        route, payload = self.resolve(update.callback_query.data or "")
+        if route is None:
+            self.unhandled += 1
+            return False
+
+        started = time.perf_counter()
+        failed = False
+        try:
+            if route.payload_type is None:
+                await route.handler(update, context)
+            else:
+                await route.handler(update, context, payload)
+        except Exception:
+            failed = True
+            raise
+        finally:
+            route.record(time.perf_counter() - started, failed)
+        return True
+
+    def find_unrouted(self, callback_data):
+        """
+        Zwraca wartości callback_data, dla których nie zarejestrowano trasy
+
+        Args:
+            callback_data: Kolekcja wartości callback_data (np. z przycisków menu)
+
+        Returns:
+            list: Posortowana lista wartości bez trasy
+        """
+        return sorted({data for data in callback_data if self.resolve(data)[0] is None})
+
+    def metrics(self):
+        """
+        Zwraca statystyki używanych tras
+
+        Returns:
+            dict: {'routes': {wzorzec: statystyki}, 'unhandled': liczba nieobsłużonych}
+        """
+        routes = list(self._exact.values()) + list(self._prefixes.values())
+        return {
+            'routes': {route.pattern: route.metrics() for route in routes if route.calls},
+            'unhandled': self.unhandled
+        }
+
+def iter_callback_data(markups):
+    """
+    Zwraca callback_data wszystkich przycisków podanych klawiatur inline
+
+    Args:
+        markups: Kolekcja klawiatur (InlineKeyboardMarkup)
+
+    Yields:
+        str: Kolejne wartości callback_data (przyciski z adresem URL są pomijane)
+    """
+    for markup in markups:
+        for row in markup.inline_keyboard:
+            for button in row:
+                if button.callback_data:
+                    yield button.callback_data
+
+callback_router = CallbackRouter()
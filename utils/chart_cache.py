@@ -0,0 +1,267 @@
+"""
+Moduł pamięci podręcznej wykresów kredytów (PNG w pamięci procesu, opcjonalnie na dysku, oraz file_id Telegrama)
+
+Klucz wykresu zawiera ID ostatniej transakcji użytkownika, więc każda zmiana salda
+unieważnia jego wykresy. Po pierwszym wysłaniu wykresu zapamiętywany jest file_id
+zdjęcia na serwerach Telegrama - kolejne wysłania nie przesyłają już pliku.
+"""
+import asyncio
+import datetime
+import glob
+import hashlib
+import io
+import logging
+import os
+from collections import OrderedDict
+import pytz
+from telegram.error import BadRequest
+from config import CHART_CACHE_MAX_BYTES, CHART_CACHE_DIR
+from database.async_storage import run_db
+from database.credits_client import get_last_credit_transaction_id
+from utils.credit_analytics import generate_credit_usage_chart_async, generate_usage_breakdown_chart_async
+
+logger = logging.getLogger(__name__)
+
+# Liczba zapamiętanych identyfikatorów file_id (same identyfikatory zajmują mało pamięci)
+FILE_ID_CACHE_SIZE = 5000
+
+# Czas przechowywania wykresów zapisanych na dysku (w godzinach)
+CHART_DISK_TTL_HOURS = 24
+
+# Funkcje generujące wykresy według rodzaju wykresu
+CHART_GENERATORS = {
+    "usage": generate_credit_usage_chart_async,
+    "breakdown": generate_usage_breakdown_chart_async
+}
+
+_png_cache = OrderedDict()
+_png_cache_bytes = 0
+_file_ids = OrderedDict()
+
+# Wykresy w trakcie generowania - równoczesne zapytania o ten sam klucz czekają na jeden wynik
+_in_flight = {}
+
+# Ostatnia znana wersja danych (ID ostatniej transakcji) dla użytkowników
+_ledger_versions = {}
+
+_metrics = {
+    'file_id_hits': 0,
+    'memory_hits': 0,
+    'disk_hits': 0,
+    'renders': 0,
+    'shared_renders': 0
+}
+
+def get_chart_key(user_id, chart_type, days, language, last_transaction_id):
+    """
+    Tworzy klucz wykresu
+
+    Klucz zawiera bieżący dzień (UTC), ponieważ okno analizy przesuwa się codziennie.
+
+    Returns:
+        tuple: Klucz wykresu
+    """
+    today = datetime.datetime.now(pytz.UTC).date().isoformat()
+    return (user_id, chart_type, days, language, last_transaction_id, today)
+
+def _disk_path(key):
+    digest = hashlib.sha256(repr(key).encode('utf-8')).hexdigest()[:32]
+    return os.path.join(CHART_CACHE_DIR, f"{key[0]}_{digest}.png")
+
+def _write_to_disk(key, png):
+    try:
+        os.makedirs(CHART_CACHE_DIR, exist_ok=True)
+        with open(_disk_path(key), 'wb') as file:
+            file.write(png)
+    except Exception as e:
+        logger.error(f"Błąd przy zapisywaniu wykresu na dysku: {e}")
+
+def _read_from_disk(key):
+    try:
+        with open(_disk_path(key), 'rb') as file:
+            return file.read()
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        logger.error(f"Błąd przy odczycie wykresu z dysku: {e}")
+        return None
+
+def _remove_from_disk(pattern):
+    for path in glob.glob(os.path.join(CHART_CACHE_DIR, pattern)):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+def _prune_disk():
+    """Usuwa z dysku wykresy starsze niż CHART_DISK_TTL_HOURS"""
+    cutoff = datetime.datetime.now().timestamp() - CHART_DISK_TTL_HOURS * 3600
+    for path in glob.glob(os.path.join(CHART_CACHE_DIR, "*.png")):
+        try:
+            if os.path.getmtime(path) < cutoff:
+                os.remove(path)
+        except OSError:
+            pass
+
+def _remember_png(key, png):
+    """Zapisuje wykres w pamięci i zwraca wykresy usunięte z niej z powodu limitu"""
+    global _png_cache_bytes
+
+    # Nadpisywany wpis zwalnia miejsce zajmowane przez poprzednią wersję
+    old_png = _png_cache.pop(key, None)
+    if old_png is not None:
+        _png_cache_bytes -= len(old_png)
+
+    _png_cache[key] = png
+    _png_cache_bytes += len(png)
+
+    evicted = []
+    while _png_cache_bytes > CHART_CACHE_MAX_BYTES and len(_png_cache) > 1:
+        old_key, old_png = _png_cache.popitem(last=False)
+        _png_cache_bytes -= len(old_png)
+        evicted.append((old_key, old_png))
+    return evicted
+
+def _remember_file_id(key, file_id):
+    _file_ids[key] = file_id
+    _file_ids.move_to_end(key)
+    if len(_file_ids) > FILE_ID_CACHE_SIZE:
+        _file_ids.popitem(last=False)
+
+def invalidate_user_charts(user_id):
+    """
+    Usuwa wszystkie zapamiętane wykresy użytkownika
+
+    Args:
+        user_id (int): ID użytkownika
+    """
+    global _png_cache_bytes
+
+    for key in [key for key in _png_cache if key[0] == user_id]:
+        _png_cache_bytes -= len(_png_cache.pop(key))
+    for key in [key for key in _file_ids if key[0] == user_id]:
+        del _file_ids[key]
+    _ledger_versions.pop(user_id, None)
+
+    if CHART_CACHE_DIR:
+        _remove_from_disk(f"{user_id}_*.png")
+
+async def _load_chart(key):
+    """Odczytuje wykres z dysku lub generuje go i zapamiętuje w pamięci procesu"""
+    png = None
+    if CHART_CACHE_DIR:
+        png = await asyncio.to_thread(_read_from_disk, key)
+        if png is not None:
+            _metrics['disk_hits'] += 1
+
+    if png is None:
+        user_id, chart_type, days = key[0], key[1], key[2]
+        chart = await CHART_GENERATORS[chart_type](user_id, days)
+        if chart is None:
+            return None
+        png = chart.getvalue()
+        _metrics['renders'] += 1
+
+    # Nowa transakcja w trakcie generowania - nieaktualny wykres nie jest zapamiętywany
+    if _ledger_versions.get(key[0], key[4]) != key[4]:
+        return png
+
+    evicted = _remember_png(key, png)
+    if evicted and CHART_CACHE_DIR:
+        # Wykresy usunięte z pamięci trafiają na dysk
+        def spill():
+            for old_key, old_png in evicted:
+                _write_to_disk(old_key, old_png)
+            _prune_disk()
+        await asyncio.to_thread(spill)
+
+    return png
+
+def _finish_in_flight(key, task):
+    _in_flight.pop(key, None)
+    # Pobierz wyjątek, nawet jeśli nikt już nie czeka na wynik
+    if not task.cancelled():
+        task.exception()
+
+async def get_chart(key):
+    """
+    Zwraca wykres w formacie PNG - z pamięci, z dysku lub generując go od nowa
+
+    Równoczesne zapytania o ten sam wykres czekają na jedno generowanie.
+
+    Args:
+        key (tuple): Klucz z get_chart_key
+
+    Returns:
+        bytes: Wykres PNG lub None, jeśli brak danych do wykresu
+    """
+    png = _png_cache.get(key)
+    if png is not None:
+        _png_cache.move_to_end(key)
+        _metrics['memory_hits'] += 1
+        return png
+
+    task = _in_flight.get(key)
+    if task is None:
+        task = asyncio.ensure_future(_load_chart(key))
+        _in_flight[key] = task
+        task.add_done_callback(lambda done: _finish_in_flight(key, done))
+    else:
+        _metrics['shared_renders'] += 1
+
+    # Anulowanie jednego z oczekujących nie przerywa generowania pozostałym
+    return await asyncio.shield(task)
+
+async def send_credit_chart(bot, chat_id, user_id, chart_type, days, language, caption):
+    """
+    Wysyła wykres kredytów, korzystając z zapamiętanego file_id lub wykresu
+
+    Args:
+        bot: Obiekt bota
+        chat_id (int): ID czatu
+        user_id (int): ID użytkownika
+        chart_type (str): Rodzaj wykresu ("usage" lub "breakdown")
+        days (int): Liczba dni do uwzględnienia w analizie
+        language (str): Kod języka użytkownika
+        caption (str): Podpis wykresu
+
+    Returns:
+        bool: True jeśli wykres został wysłany, False jeśli brak danych do wykresu
+    """
+    last_transaction_id = await run_db(get_last_credit_transaction_id, user_id)
+
+    # Nowa transakcja unieważnia wszystkie wcześniejsze wykresy użytkownika
+    if _ledger_versions.get(user_id, last_transaction_id) != last_transaction_id:
+        invalidate_user_charts(user_id)
+    _ledger_versions[user_id] = last_transaction_id
+
+    key = get_chart_key(user_id, chart_type, days, language, last_transaction_id)
+
+    file_id = _file_ids.get(key)
+    if file_id:
+        try:
+            await bot.send_photo(chat_id=chat_id, photo=file_id, caption=caption)
+            _file_ids.move_to_end(key)
+            _metrics['file_id_hits'] += 1
+            return True
+        except BadRequest as e:
+            logger.warning(f"Nie udało się wysłać wykresu po file_id: {e}")
+            _file_ids.pop(key, None)
+
+    png = await get_chart(key)
+    if png is None:
+        return False
+
+    message = await bot.send_photo(chat_id=chat_id, photo=io.BytesIO(png), caption=caption)
+    if message and message.photo:
+        _remember_file_id(key, message.photo[-1].file_id)
+    return True
+
+def get_chart_cache_metrics():
+    """
+    Zwraca statystyki pamięci podręcznej wykresów
+
+    Returns:
+        dict: Liczniki trafień, liczba wykresów i zajęta pamięć
+    """
+    return dict(_metrics, charts=len(_png_cache), bytes=_png_cache_bytes, file_ids=len(_file_ids))
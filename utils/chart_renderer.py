@@ -0,0 +1,106 @@
+"""
+Moduł renderowania wykresów kredytów (Figure/Agg, bez globalnego stanu pyplot)
+
+Funkcje przyjmują gotowe dane i zwracają obraz PNG w postaci bajtów, dzięki czemu
+mogą być wykonywane w osobnym procesie. Moduł nie importuje warstwy bazy danych,
+a matplotlib i numpy są importowane dopiero przy renderowaniu (w procesie roboczym).
+"""
+import io
+
+# Rozdzielczość generowanych wykresów
+CHART_DPI = 100
+
+BREAKDOWN_COLORS = ['#ff9999', '#66b3ff', '#99ff99', '#ffcc99', '#c2c2f0']
+
+def _to_png(figure):
+    """Zapisuje wykres do bajtów PNG"""
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    FigureCanvasAgg(figure)
+    buf = io.BytesIO()
+    figure.savefig(buf, format='png', dpi=CHART_DPI)
+    return buf.getvalue()
+
+def render_credit_usage_chart(daily_usage):
+    """
+    Renderuje wykres salda oraz dziennego zużycia i zakupów kredytów
+
+    Args:
+        daily_usage (list): Lista krotek (dzień "RRRR-MM-DD", zużycie, zakupy, saldo na koniec dnia)
+            posortowanych chronologicznie
+
+    Returns:
+        bytes: Wykres w formacie PNG lub None, jeśli brak danych
+    """
+    if not daily_usage:
+        return None
+
+    import numpy as np
+    from matplotlib.figure import Figure
+    from matplotlib.dates import DateFormatter
+
+    days, daily_usage_amounts, daily_purchases, balances = zip(*daily_usage)
+    dates = np.array(days, dtype='datetime64[D]')
+    daily_usage_amounts = np.asarray(daily_usage_amounts, dtype=float)
+    daily_purchases = np.asarray(daily_purchases, dtype=float)
+    balances = np.asarray(balances, dtype=float)
+
+    figure = Figure(figsize=(10, 6))
+
+    # Wykres salda
+    balance_ax = figure.add_subplot(2, 1, 1)
+    balance_ax.plot(dates, balances, 'b-', label='Saldo kredytów')
+    balance_ax.set_xlabel('Data')
+    balance_ax.set_ylabel('Kredyty')
+    balance_ax.set_title('Historia salda kredytów')
+    balance_ax.grid(True, linestyle='--', alpha=0.7)
+    balance_ax.xaxis.set_major_formatter(DateFormatter('%d-%m-%Y'))
+    for label in balance_ax.get_xticklabels():
+        label.set_rotation(30)
+        label.set_horizontalalignment('right')
+    balance_ax.legend()
+
+    # Wykres transakcji - sumy dzienne
+    x = np.arange(len(dates))
+    bar_width = 0.35
+
+    bars_ax = figure.add_subplot(2, 1, 2)
+    bars_ax.bar(x - bar_width/2, daily_usage_amounts, bar_width, label='Zużycie', color='red', alpha=0.7)
+    bars_ax.bar(x + bar_width/2, daily_purchases, bar_width, label='Zakupy', color='green', alpha=0.7)
+    bars_ax.set_xlabel('Data')
+    bars_ax.set_ylabel('Kredyty')
+    bars_ax.set_title('Dzienne zużycie i zakupy kredytów')
+    bars_ax.set_xticks(x)
+    bars_ax.set_xticklabels([day.strftime('%d-%m') for day in dates.astype(object)], rotation=45)
+    bars_ax.grid(True, linestyle='--', alpha=0.3, axis='y')
+    bars_ax.legend()
+
+    figure.tight_layout()
+    return _to_png(figure)
+
+def render_usage_breakdown_chart(usage_breakdown, days):
+    """
+    Renderuje wykres kołowy rozkładu zużycia kredytów
+
+    Args:
+        usage_breakdown (dict): Słownik {kategoria: liczba kredytów}
+        days (int): Liczba dni objętych analizą (do tytułu)
+
+    Returns:
+        bytes: Wykres w formacie PNG lub None, jeśli brak danych
+    """
+    if not usage_breakdown:
+        return None
+
+    from matplotlib.figure import Figure
+
+    figure = Figure(figsize=(8, 6))
+    ax = figure.add_subplot(1, 1, 1)
+
+    labels = list(usage_breakdown.keys())
+    sizes = list(usage_breakdown.values())
+
+    ax.pie(sizes, labels=labels, colors=BREAKDOWN_COLORS, autopct='%1.1f%%', startangle=90, shadow=True)
+    ax.axis('equal')
+    ax.set_title(f'Rozkład zużycia kredytów w ostatnich {days} dniach')
+
+    return _to_png(figure)
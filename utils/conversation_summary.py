@@ -0,0 +1,128 @@
+"""
+Moduł do kroczącego podsumowywania (kompaktowania) długich konwersacji
+"""
+import logging
+from database.async_storage import (
+    get_conversation_history_async, get_conversation_summary_async,
+    save_conversation_summary_async
+)
+from utils.openai_client import chat_completion
+from utils.token_counter import count_message_tokens, truncate_to_tokens
+
+logger = logging.getLogger(__name__)
+
+# Tani model używany do tworzenia podsumowań
+SUMMARY_MODEL = "gpt-3.5-turbo"
+
+# Liczba tokenów niepodsumowanej historii, po przekroczeniu której następuje kompaktowanie
+COMPACTION_TRIGGER_TOKENS = 4000
+
+# Liczba najnowszych wiadomości, które zawsze pozostają w oryginalnej postaci
+KEEP_RECENT_MESSAGES = 10
+
+# Maksymalna liczba tokenów wiadomości przekazywanych do podsumowania w jednym przebiegu
+COMPACTION_BATCH_TOKENS = 6000
+
+# Maksymalna liczba tokenów pojedynczej wiadomości w materiale do podsumowania
+SUMMARY_MESSAGE_MAX_TOKENS = 800
+
+# Liczba wiadomości pobieranych z bazy w jednym zapytaniu
+HISTORY_PAGE_SIZE = 200
+
+SUMMARY_PROMPT = (
+    "Streszczasz rozmowę użytkownika z asystentem AI. Połącz dotychczasowe "
+    "podsumowanie (jeśli jest) z nowymi wiadomościami w jedno zwięzłe podsumowanie. "
+    "Zachowaj fakty, ustalenia, preferencje użytkownika i otwarte wątki. "
+    "Pisz w języku, w którym prowadzona jest rozmowa."
+)
+
+# Konwersacje, dla których kompaktowanie jest w toku
+_in_progress = set()
+
+async def _get_unsummarized_messages(conversation_id, last_message_id):
+    """Pobiera wszystkie wiadomości nowsze od ostatniej podsumowanej"""
+    messages = []
+    while True:
+        page = await get_conversation_history_async(conversation_id, limit=HISTORY_PAGE_SIZE, after_id=last_message_id)
+        messages.extend(page)
+        if len(page) < HISTORY_PAGE_SIZE:
+            return messages
+        last_message_id = page[-1]['id']
+
+async def _summarize(previous_summary, messages):
+    """Tworzy nowe podsumowanie na podstawie poprzedniego i kolejnych wiadomości"""
+    lines = []
+    for msg in messages:
+        sender = "Użytkownik" if msg['is_from_user'] else "Asystent"
+        content = truncate_to_tokens(msg['content'] or "", SUMMARY_MESSAGE_MAX_TOKENS, SUMMARY_MODEL)
+        lines.append(f"{sender}: {content}")
+
+    material = ""
+    if previous_summary:
+        material += f"Dotychczasowe podsumowanie:\n{previous_summary}\n\n"
+    material += "Nowe wiadomości:\n" + "\n\n".join(lines)
+
+    return await chat_completion(
+        [
+            {"role": "system", "content": SUMMARY_PROMPT},
+            {"role": "user", "content": material}
+        ],
+        model=SUMMARY_MODEL,
+        raise_on_error=True
+    )
+
+async def compact_conversation(conversation_id):
+    """
+    Podsumowuje starsze wiadomości konwersacji, jeśli przekroczyła próg tokenów
+
+    Najnowsze KEEP_RECENT_MESSAGES wiadomości pozostają nienaruszone. Funkcja
+    jest przeznaczona do uruchamiania w tle, po wysłaniu odpowiedzi użytkownikowi.
+
+    Args:
+        conversation_id (int): ID konwersacji
+
+    Returns:
+        bool: True jeśli podsumowanie zostało zaktualizowane, False w przeciwnym razie
+    """
+    if conversation_id in _in_progress:
+        return False
+
+    _in_progress.add(conversation_id)
+    try:
+        summary = await get_conversation_summary_async(conversation_id)
+        previous_summary = summary['summary'] if summary else None
+        last_message_id = summary['last_message_id'] if summary else 0
+
+        messages = await _get_unsummarized_messages(conversation_id, last_message_id)
+        candidates = messages[:-KEEP_RECENT_MESSAGES] if len(messages) > KEEP_RECENT_MESSAGES else []
+
+        total_tokens = sum(count_message_tokens(msg, SUMMARY_MODEL) for msg in messages)
+        if total_tokens < COMPACTION_TRIGGER_TOKENS or not candidates:
+            return False
+
+        updated = False
+        while candidates:
+            # Podsumowuj partiami, aby nie przekroczyć kontekstu taniego modelu
+            batch = []
+            batch_tokens = 0
+            for msg in candidates:
+                tokens = min(count_message_tokens(msg, SUMMARY_MODEL), SUMMARY_MESSAGE_MAX_TOKENS)
+                if batch and batch_tokens + tokens > COMPACTION_BATCH_TOKENS:
+                    break
+                batch.append(msg)
+                batch_tokens += tokens
+
+            previous_summary = await _summarize(previous_summary, batch)
+            last_message_id = batch[-1]['id']
+            await save_conversation_summary_async(conversation_id, previous_summary, last_message_id)
+            updated = True
+
+            candidates = candidates[len(batch):]
+
+        logger.info(f"Zaktualizowano podsumowanie konwersacji {conversation_id} (do wiadomości {last_message_id})")
+        return updated
+    except Exception as e:
+        logger.error(f"Błąd podczas kompaktowania konwersacji {conversation_id}: {e}")
+        return False
+    finally:
+        _in_progress.discard(conversation_id)
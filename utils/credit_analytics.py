@@ -1,18 +1,121 @@
 # utils/credit_analytics.py
-import sqlite3
 import datetime
 import pytz
-import matplotlib.pyplot as plt
 import io
-from matplotlib.dates import DateFormatter
-import numpy as np
+import asyncio
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 
-# Ścieżka do pliku bazy danych
-DB_PATH = "bot_database.sqlite"
+# Ścieżka do pliku bazy danych i pula połączeń
+from database.connection import DB_PATH, get_connection
+from database.async_storage import run_db
+from config import CREDIT_CATEGORIES, DEFAULT_CREDIT_CATEGORY
+from utils.chart_renderer import render_credit_usage_chart, render_usage_breakdown_chart
+
+logger = logging.getLogger(__name__)
+
+# Liczba procesów renderujących wykresy
+CHART_WORKER_PROCESSES = 2
+
+# Współczynnik wygładzania dziennego zużycia w prognozie (większy - szybsza reakcja na zmiany)
+DEPLETION_EWMA_ALPHA = 0.3
+
+_chart_pool = None
+
+def _get_chart_pool():
+    """Zwraca (i w razie potrzeby tworzy) pulę procesów renderujących wykresy"""
+    global _chart_pool
+    if _chart_pool is None:
+        # "spawn" - proces potomny nie dziedziczy wątków i połączeń z bazą danych
+        _chart_pool = ProcessPoolExecutor(
+            max_workers=CHART_WORKER_PROCESSES,
+            mp_context=multiprocessing.get_context("spawn")
+        )
+    return _chart_pool
+
+async def _render_in_pool(render, *args):
+    """Renderuje wykres w puli procesów i zwraca bufor PNG lub None"""
+    loop = asyncio.get_running_loop()
+    try:
+        png = await loop.run_in_executor(_get_chart_pool(), render, *args)
+    except BrokenProcessPool:
+        # Proces roboczy zakończył się nieoczekiwanie - utwórz nową pulę i ponów
+        logger.warning("Pula procesów wykresów przestała działać - tworzę nową")
+        shutdown_chart_pool()
+        png = await loop.run_in_executor(_get_chart_pool(), render, *args)
+    return io.BytesIO(png) if png else None
+
+def shutdown_chart_pool():
+    """Zamyka pulę procesów renderujących wykresy (przy zamykaniu bota)"""
+    global _chart_pool
+    if _chart_pool is not None:
+        _chart_pool.shutdown(wait=False, cancel_futures=True)
+        _chart_pool = None
+
+def _window_start_day(days):
+    """Zwraca pierwszy dzień (UTC, "RRRR-MM-DD") okna analizy obejmującego X ostatnich dni"""
+    return (datetime.datetime.now(pytz.UTC) - datetime.timedelta(days=days)).date().isoformat()
+
+def get_daily_credit_usage(user_id, days=30):
+    """
+    Pobiera dzienne sumy zużycia i zakupów kredytów użytkownika z ostatnich X dni
+    
+    Dane pochodzą z tabeli credit_usage_daily, więc koszt zapytania zależy od liczby
+    dni, a nie od liczby transakcji. Saldo na koniec dnia jest wyliczane wstecz od
+    bieżącego salda (kredyty zarezerwowane w trwających operacjach są już odjęte).
+    
+    Args:
+        user_id (int): ID użytkownika
+        days (int): Liczba dni do uwzględnienia w analizie
+    
+    Returns:
+        list: Lista krotek (dzień "RRRR-MM-DD", zużycie, zakupy, saldo na koniec dnia)
+    """
+    try:
+        with get_connection() as conn:
+            cursor = conn.cursor()
+        
+            cursor.execute("SELECT credits_amount FROM user_credits WHERE user_id = ?", (user_id,))
+            result = cursor.fetchone()
+            current_balance = result[0] if result else 0
+        
+            cursor.execute("""
+                SELECT day, SUM(used), SUM(purchased)
+                FROM credit_usage_daily
+                WHERE user_id = ? AND day >= ?
+                GROUP BY day
+                ORDER BY day
+            """, (user_id, _window_start_day(days)))
+        
+            rows = cursor.fetchall()
+    except Exception as e:
+        print(f"Błąd przy pobieraniu dziennego zużycia kredytów: {e}")
+        return []
+    
+    if not rows:
+        return []
+    
+    import numpy as np
+    
+    used = np.array([row[1] for row in rows])
+    purchased = np.array([row[2] for row in rows])
+    
+    # Saldo na koniec dnia = bieżące saldo minus zmiany salda z kolejnych dni
+    later_changes = np.cumsum((purchased - used)[::-1])[::-1] - (purchased - used)
+    balances = current_balance - later_changes
+    
+    return [
+        (day, int(day_used), int(day_purchased), int(balance))
+        for (day, _, _), day_used, day_purchased, balance in zip(rows, used, purchased, balances)
+    ]
 
 def generate_credit_usage_chart(user_id, days=30):
     """
-    Generuje wykres użycia kredytów w czasie
+    Generuje wykres użycia kredytów w czasie (w bieżącym wątku)
+    
+    W handlerach należy używać generate_credit_usage_chart_async.
     
     Args:
         user_id (int): ID użytkownika
@@ -22,158 +125,72 @@ def generate_credit_usage_chart(user_id, days=30):
         BytesIO: Bufor zawierający wygenerowany wykres
     """
     try:
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
-        
-        # Pobierz transakcje z ostatnich X dni
-        start_date = (datetime.datetime.now(pytz.UTC) - datetime.timedelta(days=days)).isoformat()
-        
-        cursor.execute("""
-            SELECT created_at, transaction_type, amount, credits_after
-            FROM credit_transactions
-            WHERE user_id = ? AND created_at >= ?
-            ORDER BY created_at ASC
-        """, (user_id, start_date))
-        
-        transactions = cursor.fetchall()
-        conn.close()
-        
-        if not transactions:
-            return None
-        
-        # Przygotuj dane do wykresu
-        dates = []
-        balances = []
-        usage_amounts = []
-        purchase_amounts = []
-        
-        for created_at, trans_type, amount, credits_after in transactions:
-            try:
-                # Konwersja formatu daty
-                dt = datetime.datetime.fromisoformat(created_at.replace('Z', '+00:00'))
-                dates.append(dt)
-                balances.append(credits_after)
-                
-                if trans_type == 'deduct':
-                    usage_amounts.append(amount)
-                    purchase_amounts.append(0)
-                elif trans_type in ['add', 'purchase']:
-                    usage_amounts.append(0)
-                    purchase_amounts.append(amount)
-            except Exception as e:
-                print(f"Błąd przy przetwarzaniu transakcji: {e}")
-        
-        # Wygeneruj wykres
-        plt.figure(figsize=(10, 6))
-        
-        # Wykres salda
-        plt.subplot(2, 1, 1)
-        plt.plot(dates, balances, 'b-', label='Saldo kredytów')
-        plt.xlabel('Data')
-        plt.ylabel('Kredyty')
-        plt.title('Historia salda kredytów')
-        plt.grid(True, linestyle='--', alpha=0.7)
-        plt.gca().xaxis.set_major_formatter(DateFormatter('%d-%m-%Y'))
-        plt.gcf().autofmt_xdate()
-        plt.legend()
-        
-        # Wykres transakcji
-        plt.subplot(2, 1, 2)
-        
-        # Przygotuj dane do wykresu słupkowego
-        unique_dates = sorted(list(set([d.date() for d in dates])))
-        daily_usage = [0] * len(unique_dates)
-        daily_purchases = [0] * len(unique_dates)
-        
-        for i, (dt, usage, purchase) in enumerate(zip(dates, usage_amounts, purchase_amounts)):
-            date_idx = unique_dates.index(dt.date())
-            daily_usage[date_idx] += usage
-            daily_purchases[date_idx] += purchase
-        
-        x = np.arange(len(unique_dates))
-        bar_width = 0.35
-        
-        plt.bar(x - bar_width/2, daily_usage, bar_width, label='Zużycie', color='red', alpha=0.7)
-        plt.bar(x + bar_width/2, daily_purchases, bar_width, label='Zakupy', color='green', alpha=0.7)
-        
-        plt.xlabel('Data')
-        plt.ylabel('Kredyty')
-        plt.title('Dzienne zużycie i zakupy kredytów')
-        plt.xticks(x, [d.strftime('%d-%m') for d in unique_dates], rotation=45)
-        plt.grid(True, linestyle='--', alpha=0.3, axis='y')
-        plt.legend()
-        
-        plt.tight_layout()
-        
-        # Zapisz wykres do bufora
-        buf = io.BytesIO()
-        plt.savefig(buf, format='png', dpi=100)
-        buf.seek(0)
-        plt.close()
-        
-        return buf
+        png = render_credit_usage_chart(get_daily_credit_usage(user_id, days))
+        return io.BytesIO(png) if png else None
     except Exception as e:
         print(f"Błąd przy generowaniu wykresu: {e}")
-        if 'plt' in locals():
-            plt.close()
+        return None
+
+async def generate_credit_usage_chart_async(user_id, days=30):
+    """
+    Generuje wykres użycia kredytów w czasie bez blokowania pętli zdarzeń
+    
+    Dane są pobierane w wątku bazodanowym, a wykres renderowany w puli procesów.
+    
+    Args:
+        user_id (int): ID użytkownika
+        days (int): Liczba dni do uwzględnienia w analizie
+    
+    Returns:
+        BytesIO: Bufor zawierający wygenerowany wykres
+    """
+    try:
+        daily_usage = await run_db(get_daily_credit_usage, user_id, days)
+        if not daily_usage:
+            return None
+        return await _render_in_pool(render_credit_usage_chart, daily_usage)
+    except Exception as e:
+        logger.error(f"Błąd przy generowaniu wykresu: {e}")
         return None
 
 def get_credit_usage_breakdown(user_id, days=30):
     """
-    Pobiera rozkład zużycia kredytów według rodzaju operacji
+    Pobiera rozkład zużycia kredytów według kategorii operacji
     
     Args:
         user_id (int): ID użytkownika
         days (int): Liczba dni do uwzględnienia w analizie
     
     Returns:
-        dict: Słownik z rozkładem zużycia kredytów
+        dict: Słownik {etykieta kategorii: liczba kredytów}
     """
     try:
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
-        
-        # Pobierz transakcje z ostatnich X dni
-        start_date = (datetime.datetime.now(pytz.UTC) - datetime.timedelta(days=days)).isoformat()
-        
-        cursor.execute("""
-            SELECT description, SUM(amount)
-            FROM credit_transactions
-            WHERE user_id = ? AND created_at >= ? AND transaction_type = 'deduct'
-            GROUP BY description
-            ORDER BY SUM(amount) DESC
-        """, (user_id, start_date))
-        
-        usage_breakdown = cursor.fetchall()
-        conn.close()
-        
-        result = {}
-        for description, amount in usage_breakdown:
-            category = "Inne"
-            if description:
-                if "Wiadomość" in description:
-                    category = "Wiadomości"
-                elif "obraz" in description or "DALL-E" in description:
-                    category = "Obrazy"
-                elif "dokument" in description:
-                    category = "Analiza dokumentów"
-                elif "zdjęci" in description or "zdjęc" in description:
-                    category = "Analiza zdjęć"
-            
-            if category not in result:
-                result[category] = 0
-            result[category] += amount
-        
-        return result
+        with get_connection() as conn:
+            cursor = conn.cursor()
+        
+            cursor.execute("""
+                SELECT category, SUM(used)
+                FROM credit_usage_daily
+                WHERE user_id = ? AND day >= ? AND used > 0
+                GROUP BY category
+                ORDER BY SUM(used) DESC
+            """, (user_id, _window_start_day(days)))
+        
+            result = {}
+            for category, amount in cursor.fetchall():
+                label = CREDIT_CATEGORIES.get(category, CREDIT_CATEGORIES[DEFAULT_CREDIT_CATEGORY])
+                result[label] = result.get(label, 0) + amount
+        
+            return result
     except Exception as e:
         print(f"Błąd przy pobieraniu rozkładu zużycia kredytów: {e}")
-        if 'conn' in locals():
-            conn.close()
         return {}
 
 def generate_usage_breakdown_chart(user_id, days=30):
     """
-    Generuje wykres kołowy rozkładu zużycia kredytów
+    Generuje wykres kołowy rozkładu zużycia kredytów (w bieżącym wątku)
+    
+    W handlerach należy używać generate_usage_breakdown_chart_async.
     
     Args:
         user_id (int): ID użytkownika
@@ -183,40 +200,39 @@ def generate_usage_breakdown_chart(user_id, days=30):
         BytesIO: Bufor zawierający wygenerowany wykres
     """
     try:
-        # Pobierz rozkład zużycia kredytów
-        usage_breakdown = get_credit_usage_breakdown(user_id, days)
-        
+        png = render_usage_breakdown_chart(get_credit_usage_breakdown(user_id, days), days)
+        return io.BytesIO(png) if png else None
+    except Exception as e:
+        print(f"Błąd przy generowaniu wykresu rozkładu zużycia: {e}")
+        return None
+
+async def generate_usage_breakdown_chart_async(user_id, days=30):
+    """
+    Generuje wykres kołowy rozkładu zużycia kredytów bez blokowania pętli zdarzeń
+    
+    Args:
+        user_id (int): ID użytkownika
+        days (int): Liczba dni do uwzględnienia w analizie
+    
+    Returns:
+        BytesIO: Bufor zawierający wygenerowany wykres
+    """
+    try:
+        usage_breakdown = await run_db(get_credit_usage_breakdown, user_id, days)
         if not usage_breakdown:
             return None
-        
-        # Wygeneruj wykres kołowy
-        plt.figure(figsize=(8, 6))
-        
-        labels = list(usage_breakdown.keys())
-        sizes = list(usage_breakdown.values())
-        colors = ['#ff9999', '#66b3ff', '#99ff99', '#ffcc99', '#c2c2f0']
-        
-        plt.pie(sizes, labels=labels, colors=colors, autopct='%1.1f%%', startangle=90, shadow=True)
-        plt.axis('equal')
-        plt.title(f'Rozkład zużycia kredytów w ostatnich {days} dniach')
-        
-        # Zapisz wykres do bufora
-        buf = io.BytesIO()
-        plt.savefig(buf, format='png', dpi=100)
-        buf.seek(0)
-        plt.close()
-        
-        return buf
+        return await _render_in_pool(render_usage_breakdown_chart, usage_breakdown, days)
     except Exception as e:
-        print(f"Błąd przy generowaniu wykresu rozkładu zużycia: {e}")
-        if 'plt' in locals():
-            plt.close()
+        logger.error(f"Błąd przy generowaniu wykresu rozkładu zużycia: {e}")
         return None
 
 def predict_credit_depletion(user_id, days=30):
     """
     Przewiduje, kiedy skończą się kredyty użytkownika na podstawie historii użycia
     
+    Dzienne zużycie jest średnią ważoną wykładniczo (EWMA) - ostatnie dni mają większy
+    wpływ na prognozę niż początek okna analizy. Dni bez zużycia liczą się jako zero.
+    
     Args:
         user_id (int): ID użytkownika
         days (int): Liczba dni do uwzględnienia w analizie
@@ -225,51 +241,54 @@ def predict_credit_depletion(user_id, days=30):
         dict: Słownik z informacjami o przewidywanym wyczerpaniu kredytów
     """
     try:
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
-        
-        # Pobierz aktualne saldo
-        cursor.execute("SELECT credits_amount FROM user_credits WHERE user_id = ?", (user_id,))
-        result = cursor.fetchone()
-        
-        if not result:
-            conn.close()
-            return None
+        with get_connection() as conn:
+            cursor = conn.cursor()
         
-        current_balance = result[0]
+            # Pobierz aktualne saldo
+            cursor.execute("SELECT credits_amount FROM user_credits WHERE user_id = ?", (user_id,))
+            result = cursor.fetchone()
         
-        # Pobierz transakcje z ostatnich X dni
-        start_date = (datetime.datetime.now(pytz.UTC) - datetime.timedelta(days=days)).isoformat()
+            if not result:
+                return None
         
-        cursor.execute("""
-            SELECT SUM(amount) 
-            FROM credit_transactions 
-            WHERE user_id = ? AND created_at >= ? AND transaction_type = 'deduct'
-        """, (user_id, start_date))
+            current_balance = result[0]
         
-        result = cursor.fetchone()
-        conn.close()
+            cursor.execute("""
+                SELECT day, SUM(used)
+                FROM credit_usage_daily
+                WHERE user_id = ? AND day >= ? AND used > 0
+                GROUP BY day
+            """, (user_id, _window_start_day(days)))
         
-        if not result or not result[0]:
-            return {"days_left": None, "average_daily_usage": 0, "current_balance": current_balance}
-        
-        total_usage = result[0]
-        average_daily_usage = total_usage / days
-        
-        if average_daily_usage <= 0:
-            return {"days_left": None, "average_daily_usage": 0, "current_balance": current_balance}
-        
-        days_left = int(current_balance / average_daily_usage)
-        depletion_date = datetime.datetime.now() + datetime.timedelta(days=days_left)
-        
-        return {
-            "days_left": days_left,
-            "depletion_date": depletion_date.strftime("%d.%m.%Y"),
-            "average_daily_usage": round(average_daily_usage, 2),
-            "current_balance": current_balance
-        }
+            usage_rows = cursor.fetchall()
     except Exception as e:
         print(f"Błąd przy przewidywaniu wyczerpania kredytów: {e}")
-        if 'conn' in locals():
-            conn.close()
-        return None
\ No newline at end of file
+        return None
+    
+    if not usage_rows:
+        return {"days_left": None, "average_daily_usage": 0, "current_balance": current_balance}
+    
+    import numpy as np
+    
+    # Szereg dziennego zużycia od pierwszego dnia z użyciem do dziś (brakujące dni = 0)
+    today = np.datetime64(datetime.datetime.now(pytz.UTC).date().isoformat(), 'D')
+    usage_days = np.array([row[0] for row in usage_rows], dtype='datetime64[D]')
+    offsets = (usage_days - usage_days.min()).astype(int)
+    daily_usage = np.zeros(int((today - usage_days.min()).astype(int)) + 1)
+    np.add.at(daily_usage, offsets, [row[1] for row in usage_rows])
+    
+    weights = (1 - DEPLETION_EWMA_ALPHA) ** np.arange(len(daily_usage))[::-1]
+    average_daily_usage = float(np.dot(weights, daily_usage) / weights.sum())
+    
+    if average_daily_usage <= 0:
+        return {"days_left": None, "average_daily_usage": 0, "current_balance": current_balance}
+    
+    days_left = int(current_balance / average_daily_usage)
+    depletion_date = datetime.datetime.now() + datetime.timedelta(days=days_left)
+    
+    return {
+        "days_left": days_left,
+        "depletion_date": depletion_date.strftime("%d.%m.%Y"),
+        "average_daily_usage": round(average_daily_usage, 2),
+        "current_balance": current_balance
+    }
@@ -0,0 +1,111 @@
+"""
+Moduł serwera HTTP z punktem kontroli stanu bota (GET /health)
+
+Serwer działa w pętli zdarzeń bota i nie wymaga dodatkowych zależności.
+Zwraca 200, gdy bot pobiera aktualizacje, i 503 podczas startu oraz zamykania
+(np. aby load balancer przestał kierować ruch do wygaszanej instancji).
+"""
+import asyncio
+import json
+import logging
+import time
+from utils.request_scheduler import scheduler
+from utils.callback_router import callback_router
+from utils.reminder_scheduler import reminder_scheduler
+
+logger = logging.getLogger(__name__)
+
+# Ścieżka punktu kontroli stanu
+HEALTH_PATH = "/health"
+
+# Maksymalny czas na odczytanie zapytania HTTP (w sekundach)
+REQUEST_TIMEOUT = 5
+
+_server = None
+_started_at = time.monotonic()
+
+def get_health_status(application, mode):
+    """
+    Zwraca stan bota
+
+    Args:
+        application: Aplikacja python-telegram-bot
+        mode (str): Tryb odbierania aktualizacji ("polling" lub "webhook")
+
+    Returns:
+        tuple: (kod HTTP, słownik ze stanem bota)
+    """
+    updater = application.updater
+    if application.running and updater is not None and updater.running:
+        status, code = "ok", 200
+    elif application.running:
+        # Aktualizacje nie są już przyjmowane - trwa obsługa oczekujących
+        status, code = "draining", 503
+    else:
+        status, code = "starting", 503
+
+    return code, {
+        "status": status,
+        "mode": mode,
+        "uptime": round(time.monotonic() - _started_at),
+        "pending_updates": application.update_queue.qsize(),
+        "openai_queues": scheduler.metrics(),
+        "callback_routes": callback_router.metrics(),
+        "reminders": reminder_scheduler.metrics()
+    }
+
+async def _handle_request(reader, writer, application, mode):
+    try:
+        request_line = await asyncio.wait_for(reader.readline(), REQUEST_TIMEOUT)
+        # Nagłówki nie są potrzebne - wystarczy je odczytać do pustej linii
+        while True:
+            line = await asyncio.wait_for(reader.readline(), REQUEST_TIMEOUT)
+            if line in (b"\r\n", b"\n", b""):
+                break
+
+        parts = request_line.decode("latin-1").split()
+        if len(parts) >= 2 and parts[0] == "GET" and parts[1].split("?")[0] == HEALTH_PATH:
+            code, body = get_health_status(application, mode)
+        else:
+            code, body = 404, {"status": "not_found"}
+
+        payload = json.dumps(body).encode("utf-8")
+        reason = {200: "OK", 404: "Not Found", 503: "Service Unavailable"}[code]
+        writer.write(
+            f"HTTP/1.1 {code} {reason}\r\n"
+            f"Content-Type: application/json\r\n"
+            f"Content-Length: {len(payload)}\r\n"
+            f"Connection: close\r\n\r\n".encode("latin-1") + payload
+        )
+        await writer.drain()
+    except (asyncio.TimeoutError, ConnectionError):
+        pass
+    except Exception as e:
+        logger.error(f"Błąd obsługi zapytania o stan bota: {e}")
+    finally:
+        writer.close()
+
+async def start_health_server(application, host, port, mode):
+    """
+    Uruchamia serwer HTTP z punktem kontroli stanu
+
+    Args:
+        application: Aplikacja python-telegram-bot
+        host (str): Adres nasłuchiwania
+        port (int): Port nasłuchiwania
+        mode (str): Tryb odbierania aktualizacji ("polling" lub "webhook")
+    """
+    global _server
+    _server = await asyncio.start_server(
+        lambda reader, writer: _handle_request(reader, writer, application, mode),
+        host, port
+    )
+    logger.info(f"Punkt kontroli stanu dostępny pod http://{host}:{port}{HEALTH_PATH}")
+
+async def stop_health_server():
+    """Zatrzymuje serwer HTTP z punktem kontroli stanu"""
+    global _server
+    if _server is not None:
+        _server.close()
+        await _server.wait_closed()
+        _server = None
@@ -0,0 +1,107 @@
+"""
+Moduł przygotowania zdjęć przed wysłaniem do modelu wizyjnego (zmniejszanie i ponowne kodowanie)
+"""
+import io
+import logging
+import time
+import imghdr
+from PIL import Image, ImageOps
+from config import VISION_MAX_IMAGE_EDGE
+
+logger = logging.getLogger(__name__)
+
+# Przy detail="low" model widzi obraz w rozdzielczości 512x512
+LOW_DETAIL_EDGE = 512
+
+# Przy detail="high" model skaluje krótszy bok obrazu do 768 pikseli
+HIGH_DETAIL_SHORT_EDGE = 768
+
+# Jakość kodowania JPEG/WebP dla poziomów szczegółowości
+ENCODE_QUALITY = {
+    "low": 75,
+    "high": 85
+}
+
+# Formaty, które model wizyjny przyjmuje bez ponownego kodowania
+SUPPORTED_FORMATS = {
+    "jpeg": "image/jpeg",
+    "png": "image/png",
+    "webp": "image/webp",
+    "gif": "image/gif"
+}
+
+def detect_image_format(data):
+    """
+    Rozpoznaje format obrazu na podstawie nagłówka pliku
+
+    Args:
+        data (bytes): Zawartość obrazu
+
+    Returns:
+        str: Format obrazu (jpeg, png, gif, bmp, webp) lub None
+    """
+    return imghdr.what(None, h=bytes(data[:32]))
+
+def _target_size(width, height, detail):
+    """Wylicza rozmiar obrazu, powyżej którego model i tak by go zmniejszył"""
+    if detail == "low":
+        scale = LOW_DETAIL_EDGE / max(width, height)
+    else:
+        scale = min(VISION_MAX_IMAGE_EDGE / max(width, height), HIGH_DETAIL_SHORT_EDGE / min(width, height))
+
+    if scale >= 1:
+        return width, height
+    return max(1, round(width * scale)), max(1, round(height * scale))
+
+def prepare_image(data, detail="high"):
+    """
+    Zmniejsza obraz do rozdzielczości używanej przez model i koduje go ponownie
+
+    Obrazy z przezroczystością są kodowane jako WebP, pozostałe jako JPEG.
+    Jeśli wynik nie jest mniejszy od oryginału, wysyłany jest oryginał.
+
+    Args:
+        data (bytes): Zawartość obrazu
+        detail (str, optional): Poziom szczegółowości analizy ("low" lub "high")
+
+    Returns:
+        tuple: (zawartość obrazu, typ MIME)
+    """
+    started = time.perf_counter()
+    image_format = detect_image_format(data)
+    original_mime = SUPPORTED_FORMATS.get(image_format)
+
+    try:
+        with Image.open(io.BytesIO(data)) as image:
+            # Animacje (GIF) wysyłamy bez zmian - model analizuje pierwszą klatkę
+            if getattr(image, "is_animated", False) and original_mime:
+                return bytes(data), original_mime
+
+            image = ImageOps.exif_transpose(image)
+            size = _target_size(image.width, image.height, detail)
+            resized = size != (image.width, image.height)
+            if resized:
+                image = image.resize(size, Image.LANCZOS)
+
+            output = io.BytesIO()
+            quality = ENCODE_QUALITY.get(detail, ENCODE_QUALITY["high"])
+            if image.mode in ("RGBA", "LA") or (image.mode == "P" and "transparency" in image.info):
+                image.save(output, format="WEBP", quality=quality)
+                mime_type = "image/webp"
+            else:
+                image.convert("RGB").save(output, format="JPEG", quality=quality, optimize=True)
+                mime_type = "image/jpeg"
+    except Exception as e:
+        logger.warning(f"Nie udało się przetworzyć obrazu ({image_format}): {e}")
+        return bytes(data), original_mime or "image/jpeg"
+
+    encoded = output.getvalue()
+    if not resized and original_mime and len(encoded) >= len(data):
+        encoded, mime_type = bytes(data), original_mime
+
+    elapsed = (time.perf_counter() - started) * 1000
+    logger.info(
+        f"Obraz {image_format} ({len(data) // 1024} KB) -> {mime_type} {size[0]}x{size[1]} "
+        f"({len(encoded) // 1024} KB, oszczędność {(len(data) - len(encoded)) // 1024} KB) w {elapsed:.0f} ms"
+    )
+    return encoded, mime_type
@@ -53,6 +53,70 @@ def truncate_message(message, max_length=4096):
     
     return truncated_message + "\n\n[Wiadomość została skrócona ze względu na limity Telegram...]"
 
+def _find_split_point(text, max_length):
+    """Znajduje miejsce podziału tekstu - koniec akapitu, zdania lub słowa"""
+    window = text[:max_length]
+    
+    # Preferuj koniec akapitu, potem koniec zdania, a na końcu spację
+    for separators in (('\n\n',), ('\n', '. ', '! ', '? '), (' ',)):
+        split_at = max(window.rfind(sep) + len(sep) for sep in separators)
+        if split_at > max_length // 2:
+            return split_at
+    
+    return max_length
+
+def split_message(message, max_length=4096):
+    """
+    Dzieli wiadomość na części mieszczące się w limicie Telegram
+    
+    W odróżnieniu od truncate_message nie gubi treści - dłuższy tekst zostaje
+    podzielony (w miarę możliwości na granicy akapitu lub zdania).
+    
+    Args:
+        message (str): Wiadomość do podzielenia
+        max_length (int, optional): Maksymalna długość części. Domyślnie 4096.
+    
+    Returns:
+        list: Lista części wiadomości
+    """
+    parts = []
+    while len(message) > max_length:
+        split_at = _find_split_point(message, max_length)
+        parts.append(message[:split_at])
+        message = message[split_at:]
+    parts.append(message)
+    return parts
+
+def is_valid_markdown(text):
+    """
+    Sprawdza (heurystycznie), czy tekst da się wysłać w trybie ParseMode.MARKDOWN
+    
+    Pozwala wysłać tekst od razu bez formatowania zamiast czekać na odrzucenie
+    go przez Telegram (np. w trakcie strumieniowania, gdy znacznik nie jest jeszcze zamknięty).
+    
+    Args:
+        text (str): Tekst do sprawdzenia
+    
+    Returns:
+        bool: True jeśli znaczniki Markdown są zbalansowane
+    """
+    # Bloki kodu muszą być zamknięte
+    blocks = text.split('```')
+    if len(blocks) % 2 == 0:
+        return False
+    
+    # Poza blokami kodu sprawdź znaczniki kodu, pogrubienia i kursywy
+    outside_code = blocks[::2]
+    for chunk in outside_code:
+        segments = chunk.split('`')
+        if len(segments) % 2 == 0:
+            return False
+        plain = ''.join(segments[::2])
+        if plain.count('*') % 2 or plain.count('_') % 2 or plain.count('[') != plain.count(']'):
+            return False
+    
+    return True
+
 def safe_send_message(message):
     """
     Przygotowuje wiadomość do bezpiecznego wysłania przez Telegram
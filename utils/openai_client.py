@@ -1,129 +1,336 @@
-import openai
-from openai import AsyncOpenAI
 import base64
+import logging
 import os
 import asyncio
-from config import OPENAI_API_KEY, DEFAULT_MODEL, DEFAULT_SYSTEM_PROMPT, DALL_E_MODEL
-print(f"API Key is {'set' if OPENAI_API_KEY else 'NOT SET'}")
-print(f"API Key length: {len(OPENAI_API_KEY) if OPENAI_API_KEY else 0}")
+from config import (
+    OPENAI_API_KEY, DEFAULT_MODEL, DEFAULT_SYSTEM_PROMPT, DALL_E_MODEL,
+    OPENAI_FALLBACK_MODELS, VISION_DETAIL_BY_MODE
+)
+from utils.token_counter import build_context, estimate_request_tokens
+from utils.request_scheduler import scheduler
+from utils.analysis_cache import get_analysis_key, get_or_create_analysis
+from utils.openai_resilience import (
+    MAX_RETRIES, OpenAIServiceError, OpenAIUnavailableError, OpenAIRequestError,
+    get_circuit_breaker, is_retryable, retry_delay, to_service_error
+)
 
-# Inicjalizacja klienta OpenAI
-client = AsyncOpenAI(api_key=OPENAI_API_KEY)
+logger = logging.getLogger(__name__)
 
-async def chat_completion_stream(messages, model=DEFAULT_MODEL):
+# Maksymalna liczba tokenów tekstu dokumentu PDF dołączanego do analizy
+# (mieści się także w kontekście modelu zastępczego)
+DOCUMENT_TEXT_TOKENS = 8000
+
+_client = None
+
+def get_client():
     """
-    Wygeneruj odpowiedź strumieniową z OpenAI API
+    Zwraca klienta OpenAI, tworząc go przy pierwszym zapytaniu
+    
+    Biblioteka openai jest importowana dopiero tutaj, aby nie wydłużać startu bota.
+    Ponawianiem zapytań zajmuje się call_openai, a nie biblioteka.
+    
+    Returns:
+        AsyncOpenAI: Klient OpenAI
+    """
+    global _client
+    if _client is None:
+        from openai import AsyncOpenAI
+        if not OPENAI_API_KEY:
+            logger.warning("Nie ustawiono OPENAI_API_KEY")
+        _client = AsyncOpenAI(api_key=OPENAI_API_KEY, max_retries=0)
+    return _client
+
+def get_queue_metrics():
+    """
+    Zwraca statystyki kolejek zapytań do OpenAI (zajęte miejsca, długość kolejki)
+    
+    Returns:
+        dict: Słownik {model: statystyki kolejki}
+    """
+    return scheduler.metrics()
+
+def _model_chain(model, fallback=True):
+    """Zwraca listę modeli do wypróbowania: wybrany model i jego modele zastępcze"""
+    if not fallback:
+        return [model]
+    return [model] + OPENAI_FALLBACK_MODELS.get(model, [])
+
+def _retry_or_raise(error, model, breaker, attempt):
+    """
+    Zwraca opóźnienie przed kolejną próbą lub rzuca typowany błąd, jeśli ponawianie nie ma sensu
+    """
+    if not is_retryable(error):
+        raise to_service_error(error, model) from error
+    
+    breaker.record_failure()
+    if attempt >= MAX_RETRIES:
+        raise to_service_error(error, model) from error
+    
+    delay = retry_delay(error, attempt)
+    print(f"Błąd przejściowy OpenAI ({model}), ponowienie {attempt + 1}/{MAX_RETRIES} za {delay:.1f}s: {error}")
+    return delay
+
+async def call_openai(model, request, user_id=None, tokens=0, fallback=True):
+    """
+    Wykonaj zapytanie do OpenAI API z ponawianiem i przełączaniem na modele zastępcze
+    
+    Błędy przejściowe (429, 5xx, połączenie) są ponawiane z wykładniczym opóźnieniem,
+    a po wyczerpaniu prób zapytanie trafia do kolejnego modelu z OPENAI_FALLBACK_MODELS.
     
     Args:
-        messages (list): Lista wiadomości w formacie OpenAI
-        model (str, optional): Model do użycia. Domyślnie DEFAULT_MODEL.
+        model (str): Wybrany model
+        request (callable): Funkcja async przyjmująca nazwę modelu i wykonująca zapytanie
+        user_id (int, optional): ID użytkownika (do sprawiedliwego kolejkowania)
+        tokens (int, optional): Szacowana liczba tokenów zapytania
+        fallback (bool, optional): Czy używać modeli zastępczych
     
     Returns:
-        async generator: Generator zwracający fragmenty odpowiedzi
+        tuple: (wynik funkcji request, model, który odpowiedział)
+    
+    Raises:
+        OpenAIServiceError: Gdy żaden model nie zwrócił odpowiedzi
     """
-    try:
-        print(f"Wywołuję OpenAI API z modelem {model}")
-        # Dodaj opóźnienie w przypadku gdy używamy GPT-4 (aby uniknąć rate limitów)
-        if "gpt-4" in model:
-            import asyncio
-            await asyncio.sleep(0.5)
+    last_error = None
+    for candidate in _model_chain(model, fallback):
+        breaker = get_circuit_breaker(candidate)
+        attempt = 0
+        while True:
+            if not breaker.allow_request():
+                last_error = OpenAIUnavailableError(f"Model {candidate} jest tymczasowo wyłączony", candidate)
+                break
             
-        stream = await client.chat.completions.create(
-            model=model,
-            messages=messages,
-            stream=True
-        )
+            try:
+                async with scheduler.slot(candidate, user_id, tokens):
+                    result = await request(candidate)
+                breaker.record_success()
+                return result, candidate
+            except Exception as e:
+                try:
+                    delay = _retry_or_raise(e, candidate, breaker, attempt)
+                except OpenAIRequestError:
+                    raise
+                except OpenAIServiceError as service_error:
+                    last_error = service_error
+                    break
+            
+            await asyncio.sleep(delay)
+            attempt += 1
         
-        async for chunk in stream:
-            if chunk.choices and chunk.choices[0].delta.content:
-                yield chunk.choices[0].delta.content
-    except Exception as e:
-        error_msg = f"Błąd API OpenAI (stream): {str(e)}"
-        print(error_msg)
-        yield error_msg
+        print(f"Model {candidate} niedostępny: {last_error}")
+    
+    raise last_error
+
+class ChatStream:
+    """
+    Strumień odpowiedzi z OpenAI API (iterowany przez `async for`)
+    
+    Atrybut model wskazuje model, który wygenerował odpowiedź - po przełączeniu
+    na model zastępczy różni się od modelu wybranego przez użytkownika.
+    """
+    
+    def __init__(self, messages, model, user_id=None):
+        self.messages = messages
+        self.requested_model = model
+        self.model = model
+        self.user_id = user_id
+    
+    @property
+    def used_fallback(self):
+        """Czy odpowiedź wygenerował model zastępczy"""
+        return self.model != self.requested_model
+    
+    def __aiter__(self):
+        return self._generate()
+    
+    async def _generate(self):
+        tokens = estimate_request_tokens(self.messages, self.requested_model)
+        last_error = None
+        
+        for candidate in _model_chain(self.requested_model):
+            breaker = get_circuit_breaker(candidate)
+            attempt = 0
+            while True:
+                if not breaker.allow_request():
+                    last_error = OpenAIUnavailableError(f"Model {candidate} jest tymczasowo wyłączony", candidate)
+                    break
+                
+                print(f"Wywołuję OpenAI API z modelem {candidate}")
+                started = False
+                try:
+                    # Miejsce w kolejce modelu jest zajęte przez cały czas strumieniowania
+                    async with scheduler.slot(candidate, self.user_id, tokens):
+                        stream = await get_client().chat.completions.create(
+                            model=candidate,
+                            messages=self.messages,
+                            stream=True
+                        )
+                        
+                        async for chunk in stream:
+                            if chunk.choices and chunk.choices[0].delta.content:
+                                if not started:
+                                    started = True
+                                    self.model = candidate
+                                yield chunk.choices[0].delta.content
+                    breaker.record_success()
+                    self.model = candidate
+                    return
+                except Exception as e:
+                    if started:
+                        # Wysłanej części odpowiedzi nie da się cofnąć - nie ponawiamy
+                        if is_retryable(e):
+                            breaker.record_failure()
+                        raise to_service_error(e, candidate) from e
+                    
+                    try:
+                        delay = _retry_or_raise(e, candidate, breaker, attempt)
+                    except OpenAIRequestError:
+                        raise
+                    except OpenAIServiceError as service_error:
+                        last_error = service_error
+                        break
+                
+                await asyncio.sleep(delay)
+                attempt += 1
+            
+            print(f"Model {candidate} niedostępny: {last_error}")
+        
+        raise last_error
 
+def chat_completion_stream(messages, model=DEFAULT_MODEL, user_id=None):
+    """
+    Wygeneruj odpowiedź strumieniową z OpenAI API
+    
+    Zapytanie jest ponawiane (lub przełączane na model zastępczy) tylko do momentu
+    otrzymania pierwszego fragmentu odpowiedzi.
+    
+    Args:
+        messages (list): Lista wiadomości w formacie OpenAI
+        model (str, optional): Model do użycia. Domyślnie DEFAULT_MODEL.
+        user_id (int, optional): ID użytkownika (do sprawiedliwego kolejkowania)
+    
+    Returns:
+        ChatStream: Strumień fragmentów odpowiedzi; po jego zakończeniu atrybut model
+            wskazuje model, który odpowiedział
+    
+    Raises:
+        OpenAIServiceError: W trakcie iteracji, gdy nie udało się wygenerować odpowiedzi
+    """
+    return ChatStream(messages, model, user_id)
 
-async def chat_completion(messages, model=DEFAULT_MODEL):
+async def chat_completion(messages, model=DEFAULT_MODEL, raise_on_error=False, user_id=None):
     """
     Wygeneruj całą odpowiedź z OpenAI API (niestrumieniowa)
     
     Args:
         messages (list): Lista wiadomości w formacie OpenAI
         model (str, optional): Model do użycia. Domyślnie DEFAULT_MODEL.
+        raise_on_error (bool, optional): Czy rzucić OpenAIServiceError zamiast zwracać komunikat o błędzie
+        user_id (int, optional): ID użytkownika (do sprawiedliwego kolejkowania)
     
     Returns:
         str: Wygenerowana odpowiedź
     """
-    try:
-        response = await client.chat.completions.create(
-            model=model,
+    async def request(candidate):
+        return await get_client().chat.completions.create(
+            model=candidate,
             messages=messages
         )
+    
+    try:
+        response, _ = await call_openai(model, request, user_id, estimate_request_tokens(messages, model))
         return response.choices[0].message.content
     except Exception as e:
         print(f"Błąd API OpenAI: {e}")
+        if raise_on_error:
+            raise
         return f"Przepraszam, wystąpił błąd podczas generowania odpowiedzi: {str(e)}"
 
-def prepare_messages_from_history(history, user_message, system_prompt=None):
+def prepare_context_from_history(history, user_message, system_prompt=None, model=DEFAULT_MODEL, summary=None):
     """
-    Przygotuj listę wiadomości dla API OpenAI na podstawie historii konwersacji
+    Przygotuj listę wiadomości dla API OpenAI mieszczącą się w budżecie tokenów modelu
     
     Args:
         history (list): Lista wiadomości z historii konwersacji
         user_message (str): Aktualna wiadomość użytkownika
         system_prompt (str, optional): Prompt systemowy. Jeśli None, użyty zostanie DEFAULT_SYSTEM_PROMPT.
+        model (str, optional): Model, dla którego liczone są tokeny. Domyślnie DEFAULT_MODEL.
+        summary (dict, optional): Podsumowanie wcześniejszej części konwersacji
     
     Returns:
-        list: Lista wiadomości w formacie OpenAI
+        tuple: (lista wiadomości w formacie OpenAI, liczba tokenów kontekstu)
     """
     # Zabezpieczenie przed None - używamy domyślnego prompta, jeśli system_prompt jest None
     if system_prompt is None:
         system_prompt = DEFAULT_SYSTEM_PROMPT
     
-    messages = [
-        {"role": "system", "content": system_prompt}
-    ]
+    # Wiadomości objęte podsumowaniem nie są wysyłane ponownie
+    summary_text = None
+    if summary:
+        summary_text = summary['summary']
+        history = [msg for msg in history if msg.get('id') is None or msg['id'] > summary['last_message_id']]
     
-    # Dodaj wiadomości z historii
-    for msg in history:
-        role = "user" if msg["is_from_user"] else "assistant"
-        # Upewniamy się, że content nie jest None
-        content = msg["content"] if msg["content"] is not None else ""
-        messages.append({
-            "role": role,
-            "content": content
-        })
+    return build_context(history, user_message if user_message is not None else "", system_prompt, model, summary_text)
+
+def prepare_messages_from_history(history, user_message, system_prompt=None, model=DEFAULT_MODEL, summary=None):
+    """
+    Przygotuj listę wiadomości dla API OpenAI na podstawie historii konwersacji
     
-    # Dodaj aktualną wiadomość użytkownika
-    messages.append({"role": "user", "content": user_message if user_message is not None else ""})
+    Args:
+        history (list): Lista wiadomości z historii konwersacji
+        user_message (str): Aktualna wiadomość użytkownika
+        system_prompt (str, optional): Prompt systemowy. Jeśli None, użyty zostanie DEFAULT_SYSTEM_PROMPT.
+        model (str, optional): Model, dla którego liczone są tokeny. Domyślnie DEFAULT_MODEL.
+        summary (dict, optional): Podsumowanie wcześniejszej części konwersacji
     
+    Returns:
+        list: Lista wiadomości w formacie OpenAI
+    """
+    messages, _ = prepare_context_from_history(history, user_message, system_prompt, model, summary)
     return messages
 
-async def generate_image_dall_e(prompt):
+async def generate_image_dall_e(prompt, user_id=None):
     """
     Wygeneruj obraz za pomocą DALL-E 3
     
     Args:
         prompt (str): Opis obrazu do wygenerowania
+        user_id (int, optional): ID użytkownika (do sprawiedliwego kolejkowania)
     
     Returns:
         str: URL wygenerowanego obrazu lub błąd
     """
-    try:
-        response = await client.images.generate(
-            model=DALL_E_MODEL,
+    async def request(candidate):
+        return await get_client().images.generate(
+            model=candidate,
             prompt=prompt,
             n=1,
             size="1024x1024"
         )
-        
+    
+    try:
+        response, _ = await call_openai(DALL_E_MODEL, request, user_id, fallback=False)
         return response.data[0].url
     except Exception as e:
         print(f"Błąd generowania obrazu: {e}")
         return None
 
 
-async def analyze_document(file_content, file_name, mode="analyze", target_language="en"):
+async def _read_pdf_content(file_content):
+    """Zwraca tekst PDF do dołączenia do zapytania (odczytywany w osobnym wątku, w limicie tokenów)"""
+    from utils.pdf_translator import extract_pdf_text
+    try:
+        pdf_text, truncated = await asyncio.to_thread(extract_pdf_text, file_content, DOCUMENT_TEXT_TOKENS)
+    except Exception as e:
+        logger.error(f"Błąd podczas odczytywania tekstu z pliku PDF: {e}")
+        pdf_text, truncated = "", False
+    
+    if not pdf_text:
+        return "\n\nNo text could be extracted from this PDF file."
+    if truncated:
+        return f"\n\nFile content (beginning of a longer document):\n\n{pdf_text}"
+    return f"\n\nFile content:\n\n{pdf_text}"
+
+async def analyze_document(file_content, file_name, mode="analyze", target_language="en", user_id=None, raise_on_error=False, content_id=None):
     """
     Analizuj lub tłumacz dokument za pomocą OpenAI API
     
@@ -132,6 +339,9 @@ async def analyze_document(file_content, file_name, mode="analyze", target_langu
         file_name (str): Nazwa pliku
         mode (str): Tryb analizy: "analyze" (domyślnie) lub "translate"
         target_language (str): Docelowy język tłumaczenia (dwuliterowy kod)
+        user_id (int, optional): ID użytkownika (do sprawiedliwego kolejkowania)
+        raise_on_error (bool, optional): Czy rzucić OpenAIServiceError zamiast zwracać komunikat o błędzie
+        content_id (str, optional): Stały identyfikator pliku (file_unique_id) - klucz pamięci podręcznej analiz
         
     Returns:
         str: Analiza dokumentu, tłumaczenie lub informacja o błędzie
@@ -182,18 +392,32 @@ async def analyze_document(file_content, file_name, mode="analyze", target_langu
                 # Jeśli nie możemy odkodować, traktuj jako plik binarny
                 messages[1]["content"] += "\n\nThe file contains binary data that cannot be displayed as text."
         
-        response = await client.chat.completions.create(
-            model="gpt-4o",  # Używamy GPT-4o dla lepszej jakości
-            messages=messages,
-            max_tokens=1500  # Zwiększamy limit tokenów dla dłuższych tekstów
-        )
+        async def request(candidate):
+            return await get_client().chat.completions.create(
+                model=candidate,
+                messages=messages,
+                max_tokens=1500  # Zwiększamy limit tokenów dla dłuższych tekstów
+            )
         
-        return response.choices[0].message.content
+        async def analyze():
+            # Tekst PDF jest odczytywany dopiero wtedy, gdy analizy nie ma w pamięci podręcznej
+            if file_extension == '.pdf':
+                messages[1]["content"] += await _read_pdf_content(file_content)
+            
+            # Używamy GPT-4o dla lepszej jakości
+            response, _ = await call_openai("gpt-4o", request, user_id, estimate_request_tokens(messages, "gpt-4o", 1500))
+            return response.choices[0].message.content
+        
+        # Ten sam plik (np. przekazany dalej) jest analizowany tylko raz
+        key = get_analysis_key("document", content_id or file_content, mode, target_language)
+        return await get_or_create_analysis(key, analyze)
     except Exception as e:
         print(f"Błąd analizy dokumentu: {e}")
+        if raise_on_error and isinstance(e, OpenAIServiceError):
+            raise
         return f"Sorry, an error occurred while analyzing the document: {str(e)}"
 
-async def analyze_image(image_content, image_name, mode="analyze", target_language="en"):
+async def analyze_image(image_content, image_name, mode="analyze", target_language="en", user_id=None, raise_on_error=False, content_id=None, detail=None):
     """
     Analizuj obraz za pomocą OpenAI API
     
@@ -202,14 +426,21 @@ async def analyze_image(image_content, image_name, mode="analyze", target_langua
         image_name (str): Nazwa obrazu
         mode (str): Tryb analizy: "analyze" (domyślnie) lub "translate"
         target_language (str): Docelowy język tłumaczenia (dwuliterowy kod)
+        user_id (int, optional): ID użytkownika (do sprawiedliwego kolejkowania)
+        raise_on_error (bool, optional): Czy rzucić OpenAIServiceError zamiast zwracać komunikat o błędzie
+        content_id (str, optional): Stały identyfikator pliku (file_unique_id) - klucz pamięci podręcznej analiz
+        detail (str, optional): Poziom szczegółowości ("low" lub "high"). Domyślnie według VISION_DETAIL_BY_MODE.
         
     Returns:
         str: Analiza obrazu lub tłumaczenie tekstu
     """
+    # Pillow jest importowany dopiero przy pierwszej analizie obrazu
+    from utils.image_preprocessor import prepare_image
+    
+    if detail is None:
+        detail = VISION_DETAIL_BY_MODE.get(mode, "high")
+    
     try:
-        # Kodowanie obrazu do Base64
-        base64_image = base64.b64encode(image_content).decode('utf-8')
-        
         # Przygotuj odpowiednie instrukcje bazując na trybie
         if mode == "translate":
             language_names = {
@@ -231,35 +462,52 @@ async def analyze_image(image_content, image_name, mode="analyze", target_langua
             system_instruction = "You are a helpful assistant who analyzes images. Your answers should be detailed but concise."
             user_instruction = "Describe this image. What do you see? Provide a detailed but concise analysis of the image content."
         
-        messages = [
-            {
-                "role": "system", 
-                "content": system_instruction
-            },
-            {
-                "role": "user",
-                "content": [
-                    {
-                        "type": "text",
-                        "text": user_instruction
-                    },
-                    {
-                        "type": "image_url",
-                        "image_url": {
-                            "url": f"data:image/jpeg;base64,{base64_image}"
+        async def analyze():
+            # Zmniejsz i zakoduj obraz ponownie (w osobnym wątku - operacja obciąża procesor)
+            image_data, mime_type = await asyncio.to_thread(prepare_image, image_content, detail)
+            
+            # Kodowanie obrazu do Base64
+            base64_image = base64.b64encode(image_data).decode('utf-8')
+            
+            messages = [
+                {
+                    "role": "system", 
+                    "content": system_instruction
+                },
+                {
+                    "role": "user",
+                    "content": [
+                        {
+                            "type": "text",
+                            "text": user_instruction
+                        },
+                        {
+                            "type": "image_url",
+                            "image_url": {
+                                "url": f"data:{mime_type};base64,{base64_image}",
+                                "detail": detail
+                            }
                         }
-                    }
-                ]
-            }
-        ]
-        
-        response = await client.chat.completions.create(
-            model="gpt-4o",  # Używamy GPT-4o zamiast zdeprecjonowanego gpt-4-vision-preview
-            messages=messages,
-            max_tokens=800  # Zwiększona liczba tokenów dla dłuższych tekstów
-        )
+                    ]
+                }
+            ]
+            
+            async def request(candidate):
+                return await get_client().chat.completions.create(
+                    model=candidate,
+                    messages=messages,
+                    max_tokens=800  # Zwiększona liczba tokenów dla dłuższych tekstów
+                )
+            
+            # Używamy GPT-4o zamiast zdeprecjonowanego gpt-4-vision-preview (bez modeli zastępczych - muszą obsługiwać obrazy)
+            response, _ = await call_openai("gpt-4o", request, user_id, estimate_request_tokens(messages, "gpt-4o", 800), fallback=False)
+            return response.choices[0].message.content
         
-        return response.choices[0].message.content
+        # To samo zdjęcie (np. przekazane dalej) jest analizowane tylko raz
+        key = get_analysis_key(f"image-{detail}", content_id or image_content, mode, target_language)
+        return await get_or_create_analysis(key, analyze)
     except Exception as e:
         print(f"Błąd analizy obrazu: {e}")
+        if raise_on_error and isinstance(e, OpenAIServiceError):
+            raise
         return f"Sorry, an error occurred while analyzing the image: {str(e)}"
\ No newline at end of file
@@ -0,0 +1,137 @@
+"""
+Moduł obsługi błędów OpenAI API - ponawianie z wykładniczym opóźnieniem, circuit breaker i typowane wyjątki
+"""
+import logging
+import random
+import time
+
+logger = logging.getLogger(__name__)
+
+# Maksymalna liczba ponowień zapytania do jednego modelu
+MAX_RETRIES = 3
+
+# Parametry wykładniczego opóźnienia (w sekundach)
+BACKOFF_BASE = 0.5
+BACKOFF_MAX = 20.0
+
+# Liczba kolejnych błędów, po której model jest tymczasowo wyłączany
+CIRCUIT_FAILURE_THRESHOLD = 5
+
+# Czas (w sekundach), po którym wyłączony model dostaje zapytanie próbne
+CIRCUIT_RESET_TIMEOUT = 30.0
+
+class OpenAIServiceError(Exception):
+    """Bazowy błąd wywołania OpenAI API - odpowiedź nie została wygenerowana"""
+
+    def __init__(self, message, model=None):
+        super().__init__(message)
+        self.model = model
+
+class OpenAIRateLimitError(OpenAIServiceError):
+    """Przekroczono limity zapytań (429) mimo ponowień"""
+
+class OpenAIUnavailableError(OpenAIServiceError):
+    """Model jest niedostępny (błędy 5xx, problemy z połączeniem lub otwarty circuit breaker)"""
+
+class OpenAIRequestError(OpenAIServiceError):
+    """Zapytanie zostało odrzucone (błąd 4xx) - ponawianie nie ma sensu"""
+
+class CircuitBreaker:
+    """
+    Circuit breaker dla jednego modelu
+
+    Po CIRCUIT_FAILURE_THRESHOLD kolejnych błędach model jest wyłączany na
+    CIRCUIT_RESET_TIMEOUT sekund, po czym co CIRCUIT_RESET_TIMEOUT sekund
+    przepuszczane jest jedno zapytanie próbne.
+    """
+
+    def __init__(self, model):
+        self.model = model
+        self.failures = 0
+        self.opened_at = None
+        self.probe_started_at = None
+
+    def allow_request(self):
+        if self.opened_at is None:
+            return True
+
+        now = time.monotonic()
+        if now - self.opened_at < CIRCUIT_RESET_TIMEOUT:
+            return False
+
+        # Zapytanie próbne, które nie zakończyło się w wyznaczonym czasie (np. zostało anulowane), jest ponawiane
+        if self.probe_started_at is None or now - self.probe_started_at >= CIRCUIT_RESET_TIMEOUT:
+            self.probe_started_at = now
+            return True
+
+        return False
+
+    def record_success(self):
+        if self.opened_at is not None:
+            logger.info(f"Model {self.model} ponownie dostępny - zamykam circuit breaker")
+        self.failures = 0
+        self.opened_at = None
+        self.probe_started_at = None
+
+    def record_failure(self):
+        self.failures += 1
+        self.probe_started_at = None
+        if self.failures >= CIRCUIT_FAILURE_THRESHOLD:
+            if self.opened_at is None:
+                logger.warning(f"Model {self.model} wyłączony po {self.failures} błędach z rzędu")
+            self.opened_at = time.monotonic()
+
+_breakers = {}
+
+def get_circuit_breaker(model):
+    """Zwraca circuit breaker dla modelu"""
+    breaker = _breakers.get(model)
+    if breaker is None:
+        breaker = _breakers[model] = CircuitBreaker(model)
+    return breaker
+
+def is_retryable(error):
+    """Sprawdza, czy błąd OpenAI API jest przejściowy (429, 5xx, połączenie)"""
+    # Błąd mógł wystąpić tylko po zaimportowaniu biblioteki przez klienta
+    import openai
+    if isinstance(error, (openai.RateLimitError, openai.APIConnectionError)):
+        return True
+    if isinstance(error, openai.APIStatusError):
+        return error.status_code >= 500
+    return False
+
+def retry_delay(error, attempt):
+    """
+    Wylicza opóźnienie przed kolejną próbą
+
+    Jeśli serwer podał nagłówek Retry-After, jest on respektowany. W przeciwnym razie
+    stosowane jest opóźnienie wykładnicze z pełnym losowym rozrzutem (full jitter).
+
+    Args:
+        error (Exception): Błąd zwrócony przez API
+        attempt (int): Numer próby (od 0)
+
+    Returns:
+        float: Opóźnienie w sekundach
+    """
+    response = getattr(error, 'response', None)
+    if response is not None:
+        retry_after = response.headers.get('retry-after')
+        if retry_after:
+            try:
+                return min(BACKOFF_MAX, float(retry_after))
+            except ValueError:
+                pass
+
+    return random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * (2 ** attempt)))
+
+def to_service_error(error, model):
+    """Zamienia wyjątek biblioteki openai na typowany OpenAIServiceError"""
+    if isinstance(error, OpenAIServiceError):
+        return error
+    import openai
+    if isinstance(error, openai.RateLimitError):
+        return OpenAIRateLimitError(f"Przekroczono limit zapytań do modelu {model}", model)
+    if is_retryable(error):
+        return OpenAIUnavailableError(f"Model {model} jest chwilowo niedostępny: {error}", model)
+    return OpenAIRequestError(f"Zapytanie do modelu {model} zostało odrzucone: {error}", model)
@@ -1,14 +1,32 @@
 """
-Moduł do tłumaczenia fragmentów dokumentów PDF
+Moduł do tłumaczenia dokumentów PDF (pierwszego akapitu lub całego dokumentu)
 """
 import io
 import PyPDF2
 import re
+import asyncio
 import logging
-from utils.openai_client import client
+from collections import OrderedDict
+from utils.openai_client import get_client, call_openai
+from utils.token_counter import estimate_request_tokens, count_tokens
 
 logger = logging.getLogger(__name__)
 
+# Model używany do tłumaczenia
+TRANSLATION_MODEL = "gpt-4o"
+
+# Maksymalna liczba tokenów tekstu źródłowego w jednym fragmencie
+PDF_CHUNK_TOKENS = 1000
+
+# Maksymalna liczba równocześnie tłumaczonych fragmentów jednego dokumentu
+TRANSLATION_CONCURRENCY = 4
+
+# Liczba dokumentów, dla których przechowywane są częściowe tłumaczenia (do wznowienia)
+PARTIAL_RESULTS_LIMIT = 50
+
+# Przetłumaczone fragmenty dokumentów, których tłumaczenie nie zostało ukończone
+_partial_results = OrderedDict()
+
 async def extract_first_paragraph(pdf_content):
     """
     Ekstrahuje pierwszy akapit z pliku PDF
@@ -54,7 +72,7 @@ async def extract_first_paragraph(pdf_content):
         logger.error(f"Błąd podczas ekstrahowania akapitu z PDF: {e}")
         return f"Wystąpił błąd podczas odczytywania pliku PDF: {str(e)}"
 
-async def translate_paragraph(text, source_lang="pl", target_lang="en"):
+async def translate_paragraph(text, source_lang="pl", target_lang="en", user_id=None, raise_on_error=False):
     """
     Tłumaczy tekst z jednego języka na drugi za pomocą OpenAI API
     
@@ -62,6 +80,8 @@ async def translate_paragraph(text, source_lang="pl", target_lang="en"):
         text (str): Tekst do przetłumaczenia
         source_lang (str): Język źródłowy (domyślnie "pl")
         target_lang (str): Język docelowy (domyślnie "en")
+        user_id (int, optional): ID użytkownika (do sprawiedliwego kolejkowania)
+        raise_on_error (bool, optional): Czy przekazać wyjątek zamiast zwracać komunikat o błędzie
     
     Returns:
         str: Przetłumaczony tekst lub informacja o błędzie
@@ -79,21 +99,26 @@ async def translate_paragraph(text, source_lang="pl", target_lang="en"):
             }
         ]
         
-        # Wyślij zapytanie do API
-        response = await client.chat.completions.create(
-            model="gpt-4o",  # Używamy GPT-4o dla lepszej jakości tłumaczenia
-            messages=messages,
-            max_tokens=1500  # Zwiększamy limit tokenów dla dłuższych tekstów
-        )
+        async def request(model):
+            return await get_client().chat.completions.create(
+                model=model,
+                messages=messages,
+                max_tokens=1500  # Zwiększamy limit tokenów dla dłuższych tekstów
+            )
+        
+        # Wyślij zapytanie do API (GPT-4o dla lepszej jakości tłumaczenia)
+        response, _ = await call_openai(TRANSLATION_MODEL, request, user_id, estimate_request_tokens(messages, TRANSLATION_MODEL, 1500))
         
         # Zwróć tłumaczenie
         return response.choices[0].message.content
     
     except Exception as e:
         logger.error(f"Błąd podczas tłumaczenia tekstu: {e}")
+        if raise_on_error:
+            raise
         return f"Wystąpił błąd podczas tłumaczenia: {str(e)}"
 
-async def translate_pdf_first_paragraph(pdf_content, source_lang="pl", target_lang="en"):
+async def translate_pdf_first_paragraph(pdf_content, source_lang="pl", target_lang="en", user_id=None):
     """
     Ekstrahuje i tłumaczy pierwszy akapit z pliku PDF
     
@@ -101,6 +126,7 @@ async def translate_pdf_first_paragraph(pdf_content, source_lang="pl", target_la
         pdf_content (bytes): Zawartość pliku PDF w formie bajtowej
         source_lang (str): Język źródłowy (domyślnie "pl")
         target_lang (str): Język docelowy (domyślnie "en")
+        user_id (int, optional): ID użytkownika (do sprawiedliwego kolejkowania)
     
     Returns:
         dict: Słownik zawierający oryginalny tekst i tłumaczenie
@@ -118,7 +144,7 @@ async def translate_pdf_first_paragraph(pdf_content, source_lang="pl", target_la
         }
     
     # Tłumacz akapit
-    translated_text = await translate_paragraph(original_text, source_lang, target_lang)
+    translated_text = await translate_paragraph(original_text, source_lang, target_lang, user_id=user_id)
     
     # Sprawdź, czy tłumaczenie się powiodło
     if translated_text.startswith("Wystąpił błąd"):
@@ -135,4 +161,215 @@ async def translate_pdf_first_paragraph(pdf_content, source_lang="pl", target_la
         "original_text": original_text,
         "translated_text": translated_text,
         "error": None
+    }
+
+def count_pdf_pages(pdf_content):
+    """
+    Zwraca liczbę stron pliku PDF
+    
+    Args:
+        pdf_content (bytes): Zawartość pliku PDF w formie bajtowej
+    
+    Returns:
+        int: Liczba stron
+    """
+    return len(PyPDF2.PdfReader(io.BytesIO(pdf_content)).pages)
+
+def _split_long_paragraph(paragraph, max_tokens):
+    """Dzieli zbyt długi akapit na części (po zdaniach, a w ostateczności po znakach)"""
+    tokens = count_tokens(paragraph, TRANSLATION_MODEL)
+    if tokens <= max_tokens:
+        return [paragraph]
+    
+    pieces = []
+    for sentence in re.split(r'(?<=[.!?])\s+', paragraph):
+        sentence_tokens = count_tokens(sentence, TRANSLATION_MODEL)
+        if sentence_tokens <= max_tokens:
+            pieces.append(sentence)
+            continue
+        
+        # Zdanie dłuższe niż limit - dzielimy proporcjonalnie do liczby znaków
+        step = max(1, len(sentence) * max_tokens // sentence_tokens)
+        pieces.extend(sentence[start:start + step] for start in range(0, len(sentence), step))
+    return pieces
+
+def iter_pdf_chunks(pdf_content, max_tokens=PDF_CHUNK_TOKENS):
+    """
+    Odczytuje tekst PDF strona po stronie i dzieli go na fragmenty w ramach limitu tokenów
+    
+    Tekst kolejnej strony jest odczytywany dopiero wtedy, gdy potrzebny jest następny fragment.
+    
+    Args:
+        pdf_content (bytes): Zawartość pliku PDF w formie bajtowej
+        max_tokens (int, optional): Maksymalna liczba tokenów fragmentu
+    
+    Yields:
+        str: Kolejne fragmenty tekstu (całe akapity, o ile mieszczą się w limicie)
+    """
+    pdf_reader = PyPDF2.PdfReader(io.BytesIO(pdf_content))
+    # Akapity we fragmencie są rozdzielone pustą linią, która też zajmuje tokeny
+    separator_tokens = count_tokens("\n\n", TRANSLATION_MODEL)
+    
+    chunk = []
+    chunk_tokens = 0
+    for page in pdf_reader.pages:
+        text = page.extract_text() or ""
+        
+        for paragraph in re.split(r'\n\s*\n', text):
+            paragraph = paragraph.strip()
+            if not paragraph:
+                continue
+            
+            for piece in _split_long_paragraph(paragraph, max_tokens):
+                tokens = count_tokens(piece, TRANSLATION_MODEL)
+                if chunk and chunk_tokens + separator_tokens + tokens > max_tokens:
+                    yield "\n\n".join(chunk)
+                    chunk = []
+                    chunk_tokens = 0
+                if chunk:
+                    chunk_tokens += separator_tokens
+                chunk.append(piece)
+                chunk_tokens += tokens
+    
+    if chunk:
+        yield "\n\n".join(chunk)
+
+def extract_pdf_text(pdf_content, max_tokens):
+    """
+    Odczytuje tekst PDF strona po stronie, dopóki mieści się w limicie tokenów
+    
+    Strony za limitem nie są w ogóle odczytywane.
+    
+    Args:
+        pdf_content (bytes): Zawartość pliku PDF w formie bajtowej
+        max_tokens (int): Maksymalna liczba tokenów zwracanego tekstu
+    
+    Returns:
+        tuple: (tekst dokumentu, czy tekst został obcięty)
+    """
+    chunks = []
+    used = 0
+    for chunk in iter_pdf_chunks(pdf_content, min(max_tokens, PDF_CHUNK_TOKENS)):
+        tokens = count_tokens(chunk, TRANSLATION_MODEL)
+        if used + tokens > max_tokens:
+            return "\n\n".join(chunks), True
+        chunks.append(chunk)
+        used += tokens
+    return "\n\n".join(chunks), False
+
+async def translate_pdf_document(pdf_content, source_lang="pl", target_lang="en", user_id=None,
+                                 progress_callback=None, resume_key=None):
+    """
+    Tłumaczy cały dokument PDF - fragmenty są tłumaczone równolegle i składane w kolejności
+    
+    Odczyt kolejnych stron postępuje w miarę zwalniania się miejsc na tłumaczenie
+    (najwyżej TRANSLATION_CONCURRENCY fragmentów naraz). Jeśli część fragmentów się
+    nie powiedzie, przetłumaczone fragmenty są zachowywane i kolejne wywołanie z tym
+    samym resume_key tłumaczy tylko brakujące.
+    
+    Args:
+        pdf_content (bytes): Zawartość pliku PDF w formie bajtowej
+        source_lang (str): Język źródłowy (domyślnie "pl")
+        target_lang (str): Język docelowy (domyślnie "en")
+        user_id (int, optional): ID użytkownika (do sprawiedliwego kolejkowania)
+        progress_callback (callable, optional): Funkcja async (przetłumaczone, wszystkie lub None)
+        resume_key (str, optional): Stały identyfikator pliku (file_unique_id) do wznawiania
+    
+    Returns:
+        dict: Słownik zawierający tłumaczenie, liczbę fragmentów i nieudanych fragmentów
+    """
+    partial_key = (resume_key, source_lang, target_lang) if resume_key else None
+    translations = dict(_partial_results.get(partial_key, {}))
+    if translations:
+        logger.info(f"Wznawiam tłumaczenie PDF ({len(translations)} fragmentów już przetłumaczonych)")
+    
+    semaphore = asyncio.Semaphore(TRANSLATION_CONCURRENCY)
+    failed = []
+    progress = {"done": len(translations), "total": None}
+    
+    async def translate_chunk(index, text):
+        try:
+            translations[index] = await translate_paragraph(
+                text, source_lang, target_lang, user_id=user_id, raise_on_error=True
+            )
+        except Exception as e:
+            logger.error(f"Błąd podczas tłumaczenia fragmentu {index} pliku PDF: {e}")
+            failed.append(index)
+        finally:
+            semaphore.release()
+        
+        progress["done"] += 1
+        if progress_callback:
+            try:
+                await progress_callback(progress["done"], progress["total"])
+            except Exception as e:
+                logger.warning(f"Błąd przy raportowaniu postępu tłumaczenia: {e}")
+    
+    tasks = []
+    total = 0
+    try:
+        chunks = iter_pdf_chunks(pdf_content)
+        while True:
+            # Odczyt kolejnych stron odbywa się w osobnym wątku, gdy zwolni się miejsce na tłumaczenie
+            await semaphore.acquire()
+            text = await asyncio.to_thread(next, chunks, None)
+            if text is None:
+                semaphore.release()
+                break
+            
+            if total in translations:
+                semaphore.release()
+            else:
+                tasks.append(asyncio.create_task(translate_chunk(total, text)))
+            total += 1
+    except Exception as e:
+        logger.error(f"Błąd podczas odczytywania pliku PDF: {e}")
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        return {
+            "success": False,
+            "translated_text": None,
+            "chunks": total,
+            "failed_chunks": total,
+            "error": f"Wystąpił błąd podczas odczytywania pliku PDF: {str(e)}"
+        }
+    
+    progress["total"] = total
+    await asyncio.gather(*tasks)
+    
+    if total == 0:
+        return {
+            "success": False,
+            "translated_text": None,
+            "chunks": 0,
+            "failed_chunks": 0,
+            "error": "Nie można odczytać tekstu z pliku PDF."
+        }
+    
+    if failed:
+        # Zachowaj przetłumaczone fragmenty, aby można było wznowić tłumaczenie
+        if partial_key:
+            _partial_results[partial_key] = translations
+            _partial_results.move_to_end(partial_key)
+            if len(_partial_results) > PARTIAL_RESULTS_LIMIT:
+                _partial_results.popitem(last=False)
+        
+        return {
+            "success": False,
+            "translated_text": None,
+            "chunks": total,
+            "failed_chunks": len(failed),
+            "error": f"Nie udało się przetłumaczyć {len(failed)} z {total} fragmentów."
+        }
+    
+    if partial_key:
+        _partial_results.pop(partial_key, None)
+    
+    return {
+        "success": True,
+        "translated_text": "\n\n".join(translations[index] for index in range(total)),
+        "chunks": total,
+        "failed_chunks": 0,
+        "error": None
     }
\ No newline at end of file
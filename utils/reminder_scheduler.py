@@ -0,0 +1,221 @@
+"""
+Moduł harmonogramu przypomnień
+
+Przypomnienia są przechowywane w tabeli reminders. W pamięci trzymany jest tylko
+kopiec (min-heap) terminów najbliższych przypomnień - jeden timer śpi do najwcześniejszego
+z nich, a po przebudzeniu pobiera z bazy wszystkie zaległe przypomnienia partiami
+(jedna transakcja na partię) i wysyła je. Nie ma osobnego zadania dla każdego
+przypomnienia ani okresowego przeszukiwania tabeli. Po restarcie bota kopiec
+jest odtwarzany z bazy danych.
+
+Gdy oczekujących przypomnień jest więcej niż REMINDER_HEAP_SIZE, ostatni załadowany
+termin jest punktem doładowania - po jego obsłużeniu kolejne terminy są pobierane
+z bazy, począwszy od tego punktu.
+"""
+import asyncio
+import datetime
+import heapq
+import logging
+import math
+import time
+import pytz
+from telegram.constants import ParseMode
+from telegram.error import BadRequest, RetryAfter
+from database.async_storage import run_db
+from database.sqlite_client import (
+    claim_due_reminders, finish_reminders, reset_claimed_reminders, get_pending_reminder_times
+)
+
+logger = logging.getLogger(__name__)
+
+# Liczba przypomnień pobieranych z bazy w jednej transakcji
+REMINDER_CLAIM_BATCH = 500
+
+# Maksymalna liczba równocześnie wysyłanych przypomnień
+REMINDER_SEND_CONCURRENCY = 25
+
+# Liczba najbliższych terminów ładowanych z bazy do pamięci
+REMINDER_HEAP_SIZE = 10000
+
+# Maksymalny czas uśpienia timera (w sekundach) - zabezpieczenie przed zmianą zegara systemowego
+MAX_SLEEP_SECONDS = 300
+
+# Przerwa po nieoczekiwanym błędzie timera (w sekundach)
+ERROR_RETRY_SECONDS = 5
+
+# Maksymalna liczba ponowień wysyłki po przekroczeniu limitu Telegram (RetryAfter)
+MAX_SEND_RETRIES = 3
+
+class ReminderScheduler:
+    """
+    Harmonogram przypomnień - jeden timer dla wszystkich przypomnień
+
+    Kopiec zawiera jedynie terminy (znaczniki czasu), które wyznaczają moment
+    przebudzenia. Źródłem prawdy o tym, co należy wysłać, pozostaje baza danych.
+    """
+
+    def __init__(self):
+        self._heap = []
+        # Ostatni załadowany termin (ISO UTC), jeśli w bazie są późniejsze terminy spoza kopca
+        self._load_boundary = None
+        self._wakeup = asyncio.Event()
+        self._semaphore = asyncio.Semaphore(REMINDER_SEND_CONCURRENCY)
+        self._task = None
+        self._bot = None
+        self.delivered = 0
+        self.failed = 0
+
+    async def start(self, bot):
+        """
+        Odtwarza kolejkę przypomnień z bazy danych i uruchamia timer
+
+        Args:
+            bot: Obiekt bota używany do wysyłania przypomnień
+        """
+        self._bot = bot
+
+        # Przypomnienia pobrane do wysłania przed restartem wracają do kolejki
+        restored = await run_db(reset_claimed_reminders)
+        if restored:
+            logger.info(f"Przywrócono do kolejki {restored} przypomnień niewysłanych przed restartem")
+
+        await self._load()
+        self._task = asyncio.create_task(self._run())
+        logger.info(f"Harmonogram przypomnień uruchomiony ({len(self._heap)} oczekujących terminów w pamięci)")
+
+    async def stop(self):
+        """Zatrzymuje timer (niewysłane przypomnienia pozostają w bazie)"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def schedule(self, remind_at):
+        """
+        Dodaje termin nowego przypomnienia zapisanego w bazie
+
+        Args:
+            remind_at (datetime): Czas przypomnienia (ze strefą czasową)
+        """
+        # Baza przechowuje czas zaokrąglony w górę do pełnej sekundy
+        timestamp = math.ceil(remind_at.timestamp())
+        heapq.heappush(self._heap, timestamp)
+
+        # Obudź timer tylko wtedy, gdy nowy termin jest najwcześniejszy
+        if self._heap[0] == timestamp:
+            self._wakeup.set()
+
+    async def _load(self, after=None):
+        """
+        Ładuje do kopca terminy najbliższych oczekujących przypomnień
+
+        Args:
+            after (str, optional): Punkt doładowania - ładowane są tylko późniejsze terminy.
+                Terminy późniejsze niż ten punkt, dodane w międzyczasie przez schedule(),
+                są zapisane w bazie, więc zostają zastąpione terminami z bazy (bez duplikatów).
+        """
+        times = await run_db(get_pending_reminder_times, REMINDER_HEAP_SIZE, after)
+        if after is not None:
+            boundary = datetime.datetime.fromisoformat(after).timestamp()
+            self._heap = [timestamp for timestamp in self._heap if timestamp <= boundary]
+            heapq.heapify(self._heap)
+        for value in times:
+            heapq.heappush(self._heap, datetime.datetime.fromisoformat(value).timestamp())
+        self._load_boundary = times[-1] if len(times) == REMINDER_HEAP_SIZE else None
+
+    def _needs_reload(self):
+        """Czy obsłużono wszystkie terminy do punktu doładowania"""
+        if self._load_boundary is None:
+            return False
+        boundary = datetime.datetime.fromisoformat(self._load_boundary).timestamp()
+        return not self._heap or self._heap[0] > boundary
+
+    async def _run(self):
+        while True:
+            try:
+                self._wakeup.clear()
+
+                # Terminy spoza pamięci są doładowywane po obsłużeniu punktu doładowania
+                if self._needs_reload():
+                    await self._load(self._load_boundary)
+
+                now = time.time()
+                if self._heap and self._heap[0] <= now:
+                    while self._heap and self._heap[0] <= now:
+                        heapq.heappop(self._heap)
+                    await self._deliver_due()
+                    continue
+
+                timeout = min(self._heap[0] - now, MAX_SLEEP_SECONDS) if self._heap else None
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Błąd harmonogramu przypomnień: {e}")
+                await asyncio.sleep(ERROR_RETRY_SECONDS)
+
+    async def _deliver_due(self):
+        """Wysyła wszystkie zaległe przypomnienia partiami"""
+        while True:
+            # Bieżący czas z tego samego zegara, który wyznacza przebudzenia timera
+            now = datetime.datetime.fromtimestamp(time.time(), pytz.UTC)
+            reminders = await run_db(claim_due_reminders, now, REMINDER_CLAIM_BATCH)
+            if not reminders:
+                return
+
+            results = await asyncio.gather(*(self._send(reminder) for reminder in reminders))
+            sent_ids = [reminder['id'] for reminder, sent in zip(reminders, results) if sent]
+            failed_ids = [reminder['id'] for reminder, sent in zip(reminders, results) if not sent]
+            await run_db(finish_reminders, sent_ids, failed_ids)
+
+            self.delivered += len(sent_ids)
+            self.failed += len(failed_ids)
+
+            if len(reminders) < REMINDER_CLAIM_BATCH:
+                return
+
+    async def _send(self, reminder):
+        """Wysyła jedno przypomnienie - zwraca True, jeśli się powiodło"""
+        text = f"⏰ *PRZYPOMNIENIE*\n\n{reminder['content']}"
+        parse_mode = ParseMode.MARKDOWN
+        async with self._semaphore:
+            for _ in range(MAX_SEND_RETRIES):
+                try:
+                    await self._bot.send_message(
+                        chat_id=reminder['user_id'],
+                        text=text,
+                        parse_mode=parse_mode
+                    )
+                    return True
+                except BadRequest as e:
+                    if parse_mode is None or "parse" not in str(e).lower():
+                        logger.error(f"Błąd wysyłania przypomnienia {reminder['id']}: {e}")
+                        return False
+                    # Treść przypomnienia psuje formatowanie Markdown - wyślij ją jako zwykły tekst
+                    text = f"⏰ PRZYPOMNIENIE\n\n{reminder['content']}"
+                    parse_mode = None
+                except RetryAfter as e:
+                    # Limit wiadomości Telegram - odczekaj wskazany czas i spróbuj ponownie
+                    retry_after = e.retry_after.total_seconds() if isinstance(e.retry_after, datetime.timedelta) else e.retry_after
+                    await asyncio.sleep(retry_after)
+                except Exception as e:
+                    logger.error(f"Błąd wysyłania przypomnienia {reminder['id']}: {e}")
+                    return False
+            return False
+
+    def metrics(self):
+        """Zwraca statystyki harmonogramu przypomnień"""
+        return {
+            'scheduled_in_memory': len(self._heap),
+            'next_due_in': round(max(self._heap[0] - time.time(), 0)) if self._heap else None,
+            'delivered': self.delivered,
+            'failed': self.failed
+        }
+
+reminder_scheduler = ReminderScheduler()
@@ -0,0 +1,199 @@
+"""
+Moduł kolejkujący zapytania do OpenAI API z limitami dla poszczególnych modeli
+"""
+import asyncio
+import logging
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from config import OPENAI_MODEL_LIMITS
+
+logger = logging.getLogger(__name__)
+
+# Okno czasowe limitów RPM/TPM (w sekundach)
+RATE_WINDOW = 60.0
+
+# Klucz kolejki dla zapytań bez przypisanego użytkownika
+ANONYMOUS_USER = "anonymous"
+
+class ModelQueue:
+    """
+    Kolejka zapytań do jednego modelu
+
+    Pilnuje liczby równoczesnych zapytań oraz budżetów zapytań i tokenów na minutę.
+    Oczekujące zapytania są obsługiwane na zmianę dla kolejnych użytkowników
+    (round-robin), więc jeden użytkownik z wieloma zapytaniami nie blokuje innych.
+    """
+
+    def __init__(self, model, concurrency, rpm=None, tpm=None):
+        self.model = model
+        self.concurrency = concurrency
+        self.rpm = rpm
+        self.tpm = tpm
+        self.active = 0
+        self._waiters = {}
+        self._users = deque()
+        self._history = deque()
+        self._window_tokens = 0
+        self._timer = None
+
+    @property
+    def queue_depth(self):
+        return sum(len(waiters) for waiters in self._waiters.values())
+
+    async def acquire(self, user_id=None, tokens=0):
+        """Czeka na swoją kolej i zajmuje miejsce w limicie modelu"""
+        user_key = user_id if user_id is not None else ANONYMOUS_USER
+        future = asyncio.get_running_loop().create_future()
+
+        if user_key not in self._waiters:
+            self._waiters[user_key] = deque()
+            self._users.append(user_key)
+        self._waiters[user_key].append((future, tokens))
+
+        self._dispatch()
+        try:
+            await future
+        except asyncio.CancelledError:
+            # Miejsce mogło zostać przydzielone tuż przed anulowaniem
+            if future.done() and not future.cancelled():
+                self.release()
+            raise
+
+    def release(self):
+        """Zwalnia miejsce i przekazuje je kolejnemu oczekującemu"""
+        self.active -= 1
+        self._dispatch()
+
+    def _prune_history(self, now):
+        while self._history and now - self._history[0][0] >= RATE_WINDOW:
+            _, tokens = self._history.popleft()
+            self._window_tokens -= tokens
+
+    def _rate_delay(self, tokens, now):
+        """Zwraca czas (w sekundach) do zwolnienia budżetu RPM/TPM lub 0"""
+        self._prune_history(now)
+        if not self._history:
+            return 0
+
+        over_rpm = self.rpm is not None and len(self._history) >= self.rpm
+        over_tpm = self.tpm is not None and self._window_tokens + tokens > self.tpm
+        if over_rpm or over_tpm:
+            return self._history[0][0] + RATE_WINDOW - now
+        return 0
+
+    def _next_waiter(self):
+        """Wybiera pierwsze oczekujące zapytanie kolejnego użytkownika (round-robin)"""
+        while self._users:
+            user_key = self._users[0]
+            waiters = self._waiters[user_key]
+
+            # Pomiń zapytania anulowane w trakcie oczekiwania
+            while waiters and waiters[0][0].done():
+                waiters.popleft()
+
+            if not waiters:
+                self._users.popleft()
+                del self._waiters[user_key]
+                continue
+
+            return user_key, waiters
+        return None, None
+
+    def _dispatch(self):
+        while self.active < self.concurrency:
+            user_key, waiters = self._next_waiter()
+            if waiters is None:
+                return
+
+            future, tokens = waiters[0]
+            now = time.monotonic()
+            delay = self._rate_delay(tokens, now)
+            if delay > 0:
+                self._schedule_dispatch(delay)
+                return
+
+            waiters.popleft()
+            self._users.rotate(-1)
+
+            self.active += 1
+            self._history.append((now, tokens))
+            self._window_tokens += tokens
+            future.set_result(None)
+
+    def _schedule_dispatch(self, delay):
+        if self._timer is not None and not self._timer.cancelled():
+            return
+
+        def run():
+            self._timer = None
+            self._dispatch()
+
+        self._timer = asyncio.get_running_loop().call_later(delay, run)
+
+    def metrics(self):
+        """Zwraca bieżące statystyki kolejki"""
+        self._prune_history(time.monotonic())
+        return {
+            'active': self.active,
+            'concurrency': self.concurrency,
+            'queue_depth': self.queue_depth,
+            'waiting_users': len(self._waiters),
+            'requests_last_minute': len(self._history),
+            'tokens_last_minute': self._window_tokens
+        }
+
+class RequestScheduler:
+    """
+    Harmonogram zapytań do OpenAI API - osobna kolejka dla każdego modelu
+    """
+
+    def __init__(self, limits):
+        self.limits = limits
+        self._queues = {}
+
+    def _get_queue(self, model):
+        queue = self._queues.get(model)
+        if queue is None:
+            limits = self.limits.get(model, self.limits["default"])
+            queue = self._queues[model] = ModelQueue(
+                model,
+                limits["concurrency"],
+                limits.get("rpm"),
+                limits.get("tpm")
+            )
+        return queue
+
+    @asynccontextmanager
+    async def slot(self, model, user_id=None, tokens=0):
+        """
+        Zajmuje miejsce w kolejce modelu na czas wykonania zapytania
+
+        Args:
+            model (str): Nazwa modelu
+            user_id (int, optional): ID użytkownika (do sprawiedliwego kolejkowania)
+            tokens (int, optional): Szacowana liczba tokenów zapytania (limit TPM)
+        """
+        queue = self._get_queue(model)
+        started = time.monotonic()
+        await queue.acquire(user_id, tokens)
+
+        waited = time.monotonic() - started
+        if waited > 1:
+            logger.info(f"Zapytanie do {model} czekało w kolejce {waited:.1f}s")
+
+        try:
+            yield
+        finally:
+            queue.release()
+
+    def metrics(self):
+        """
+        Zwraca statystyki kolejek wszystkich używanych modeli
+
+        Returns:
+            dict: Słownik {model: statystyki kolejki}
+        """
+        return {model: queue.metrics() for model, queue in self._queues.items()}
+
+scheduler = RequestScheduler(OPENAI_MODEL_LIMITS)
@@ -0,0 +1,198 @@
+"""
+Moduł pamięci podręcznej odpowiedzi na powtarzalne pytania (pamięć procesu + SQLite)
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import time
+from collections import OrderedDict
+from config import CHAT_MODES
+from database.async_storage import (
+    get_cached_response_async, save_cached_response_async, evict_response_cache_async
+)
+
+logger = logging.getLogger(__name__)
+
+# Liczba odpowiedzi przechowywanych w pamięci procesu
+MEMORY_CACHE_SIZE = 500
+
+# Czas ważności zapisanej odpowiedzi (w godzinach)
+CACHE_TTL_HOURS = 24
+
+# Maksymalna liczba odpowiedzi przechowywanych w bazie danych
+MAX_CACHED_RESPONSES = 5000
+
+# Co ile zapisów usuwać z bazy wpisy przeterminowane i nadmiarowe
+EVICT_EVERY_SAVES = 100
+
+# Wielkość fragmentu, w jakim zapamiętana odpowiedź jest przekazywana do edytora wiadomości
+CACHED_CHUNK_SIZE = 200
+
+_memory_cache = OrderedDict()
+_saves_since_eviction = 0
+_metrics = {
+    'memory_hits': 0,
+    'db_hits': 0,
+    'misses': 0,
+    'stores': 0
+}
+
+def _normalize(text):
+    """Ujednolica treść wiadomości (wielkość liter i białe znaki)"""
+    return " ".join((text or "").split()).lower()
+
+def is_cacheable(mode, messages):
+    """
+    Sprawdza, czy odpowiedź na zapytanie może pochodzić z pamięci podręcznej
+
+    Zapamiętywane są tylko odpowiedzi w trybach oznaczonych jako "cacheable"
+    w CHAT_MODES, na początku rozmowy (bez wcześniejszych odpowiedzi asystenta).
+
+    Args:
+        mode (str): Klucz trybu czatu
+        messages (list): Lista wiadomości w formacie OpenAI
+
+    Returns:
+        bool: True jeśli zapytanie może korzystać z pamięci podręcznej
+    """
+    if not CHAT_MODES.get(mode, {}).get("cacheable", False):
+        return False
+    return all(message["role"] != "assistant" for message in messages)
+
+def get_cache_key(model, messages):
+    """
+    Wylicza klucz zapytania na podstawie modelu i ujednoliconych wiadomości
+
+    Args:
+        model (str): Nazwa modelu
+        messages (list): Lista wiadomości w formacie OpenAI (z promptem systemowym)
+
+    Returns:
+        str: Skrót SHA-256 zapytania
+    """
+    normalized = [[message["role"], _normalize(message["content"])] for message in messages]
+    payload = json.dumps([model, normalized], ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+def _remember(cache_key, response):
+    # Wpis w pamięci procesu przechowuje odpowiedź razem z czasem wygaśnięcia
+    _memory_cache[cache_key] = (response, time.monotonic() + CACHE_TTL_HOURS * 3600)
+    _memory_cache.move_to_end(cache_key)
+    if len(_memory_cache) > MEMORY_CACHE_SIZE:
+        _memory_cache.popitem(last=False)
+
+async def lookup_response(cache_key):
+    """
+    Wyszukuje zapamiętaną treść bez liczenia trafień w statystykach odpowiedzi
+
+    Args:
+        cache_key (str): Klucz wpisu
+
+    Returns:
+        tuple: (treść lub None, źródło: "memory", "db" lub None)
+    """
+    entry = _memory_cache.get(cache_key)
+    if entry is not None:
+        response, expires_at = entry
+        if time.monotonic() < expires_at:
+            _memory_cache.move_to_end(cache_key)
+            return response, "memory"
+        # Przeterminowany wpis - odpowiedź trzeba pobrać z bazy lub wygenerować ponownie
+        del _memory_cache[cache_key]
+
+    response = await get_cached_response_async(cache_key, CACHE_TTL_HOURS)
+    if response is not None:
+        _remember(cache_key, response)
+        return response, "db"
+
+    return None, None
+
+async def get_cached_response(cache_key):
+    """
+    Pobiera zapamiętaną odpowiedź - najpierw z pamięci procesu, potem z bazy danych
+
+    Args:
+        cache_key (str): Klucz zapytania z get_cache_key
+
+    Returns:
+        str: Zapamiętana odpowiedź lub None
+    """
+    response, source = await lookup_response(cache_key)
+    if source is None:
+        _metrics['misses'] += 1
+    else:
+        _metrics[f'{source}_hits'] += 1
+    return response
+
+async def save_response(cache_key, model, response):
+    """
+    Zapisuje treść w pamięci procesu i w bazie danych bez liczenia zapisów w statystykach odpowiedzi
+
+    Args:
+        cache_key (str): Klucz wpisu
+        model (str): Model, który wygenerował treść
+        response (str): Treść do zapamiętania
+    """
+    global _saves_since_eviction
+
+    if not response:
+        return
+
+    _remember(cache_key, response)
+
+    try:
+        await save_cached_response_async(cache_key, model, response)
+
+        _saves_since_eviction += 1
+        if _saves_since_eviction >= EVICT_EVERY_SAVES:
+            _saves_since_eviction = 0
+            removed = await evict_response_cache_async(CACHE_TTL_HOURS, MAX_CACHED_RESPONSES)
+            if removed:
+                logger.info(f"Usunięto {removed} wpisów z pamięci podręcznej odpowiedzi")
+    except Exception as e:
+        logger.error(f"Błąd przy zapisywaniu odpowiedzi w pamięci podręcznej: {e}")
+
+async def store_response(cache_key, model, response):
+    """
+    Zapamiętuje odpowiedź w pamięci procesu i w bazie danych
+
+    Args:
+        cache_key (str): Klucz zapytania z get_cache_key
+        model (str): Model, który wygenerował odpowiedź
+        response (str): Treść odpowiedzi
+    """
+    if not response:
+        return
+
+    _metrics['stores'] += 1
+    await save_response(cache_key, model, response)
+
+async def stream_cached_response(response):
+    """
+    Przekazuje zapamiętaną odpowiedź fragmentami, tak jak odpowiedź strumieniowa z API
+
+    Args:
+        response (str): Zapamiętana odpowiedź
+
+    Returns:
+        async generator: Generator zwracający fragmenty odpowiedzi
+    """
+    for start in range(0, len(response), CACHED_CHUNK_SIZE):
+        yield response[start:start + CACHED_CHUNK_SIZE]
+        await asyncio.sleep(0)
+
+def get_cache_metrics():
+    """
+    Zwraca statystyki pamięci podręcznej odpowiedzi
+
+    Returns:
+        dict: Liczba trafień (z pamięci procesu i z bazy), chybień, zapisów i wielkość pamięci procesu
+    """
+    lookups = _metrics['memory_hits'] + _metrics['db_hits'] + _metrics['misses']
+    hits = _metrics['memory_hits'] + _metrics['db_hits']
+    return {
+        **_metrics,
+        'memory_entries': len(_memory_cache),
+        'hit_rate': hits / lookups if lookups else 0.0
+    }
@@ -0,0 +1,225 @@
+"""
+Moduł do strumieniowego aktualizowania wiadomości Telegram z ograniczaniem liczby edycji
+"""
+import asyncio
+import logging
+import time
+from telegram.constants import ParseMode
+from telegram.error import BadRequest, RetryAfter
+from utils.message_formatter import split_message, is_valid_markdown
+
+logger = logging.getLogger(__name__)
+
+# Limity Telegram: ok. 30 wiadomości na sekundę dla całego bota i ok. 1 na sekundę w jednym czacie
+GLOBAL_RATE = 25.0
+GLOBAL_BURST = 30
+CHAT_RATE = 1.0
+CHAT_BURST = 2
+
+# Najmniejsza częstotliwość edycji w czacie po serii odpowiedzi RetryAfter
+MIN_CHAT_RATE = 0.1
+
+# Maksymalna długość jednej wiadomości Telegram
+MAX_MESSAGE_LENGTH = 4096
+
+# Liczba prób wysłania końcowej wersji wiadomości
+FINAL_ATTEMPTS = 3
+
+STREAM_CURSOR = "▌"
+
+class TokenBucket:
+    """
+    Ogranicznik typu token bucket z adaptacyjnym spowalnianiem po RetryAfter
+    """
+
+    def __init__(self, rate, capacity):
+        self.base_rate = rate
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated_at = time.monotonic()
+        self.blocked_until = 0.0
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    async def acquire(self):
+        """Czeka na dostępny token i go pobiera"""
+        while True:
+            now = time.monotonic()
+            self._refill(now)
+
+            if now < self.blocked_until:
+                await asyncio.sleep(self.blocked_until - now)
+                continue
+
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return
+
+            await asyncio.sleep((1 - self.tokens) / self.rate)
+
+    def slow_down(self, retry_after):
+        """Wstrzymuje wysyłanie na czas wskazany przez Telegram i zmniejsza częstotliwość"""
+        self.blocked_until = max(self.blocked_until, time.monotonic() + retry_after)
+        self.rate = max(MIN_CHAT_RATE, self.rate / 2)
+        self.tokens = 0
+
+    def recover(self):
+        """Stopniowo przywraca bazową częstotliwość po udanym wysłaniu"""
+        if self.rate < self.base_rate:
+            self.rate = min(self.base_rate, self.rate * 1.25)
+
+_global_bucket = TokenBucket(GLOBAL_RATE, GLOBAL_BURST)
+_chat_buckets = {}
+
+def _get_chat_bucket(chat_id):
+    bucket = _chat_buckets.get(chat_id)
+    if bucket is None:
+        # Usuń ograniczniki czatów, które od dawna nie były używane
+        if len(_chat_buckets) > 10000:
+            cutoff = time.monotonic() - 60
+            for key in [key for key, value in _chat_buckets.items() if value.updated_at < cutoff]:
+                del _chat_buckets[key]
+        bucket = _chat_buckets[chat_id] = TokenBucket(CHAT_RATE, CHAT_BURST)
+    return bucket
+
+def _retry_after_seconds(error):
+    retry_after = error.retry_after
+    if hasattr(retry_after, 'total_seconds'):
+        return retry_after.total_seconds()
+    return float(retry_after)
+
+class StreamingEditor:
+    """
+    Aktualizuje wiadomość bota w trakcie strumieniowania odpowiedzi
+
+    Kolejne wersje tekstu są scalane - wysyłana jest tylko najnowsza, z zachowaniem
+    limitów Telegram dla czatu i całego bota. Tekst dłuższy niż 4096 znaków jest
+    kontynuowany w kolejnych wiadomościach, a niepoprawny Markdown wysyłany jako zwykły tekst.
+
+    Użycie:
+        editor = StreamingEditor(response_message)
+        async for chunk in stream:
+            full_response += chunk
+            editor.update(full_response)
+        await editor.finish(full_response)
+    """
+
+    def __init__(self, message, parse_mode=ParseMode.MARKDOWN):
+        self.chat_id = message.chat_id
+        self.parse_mode = parse_mode
+        self._bot = message.get_bot()
+        self._messages = [message]
+        self._sent = [message.text]
+        self._chat_bucket = _get_chat_bucket(self.chat_id)
+        self._pending = None
+        self._task = None
+        self._markdown_ok = parse_mode is not None
+
+    def update(self, text):
+        """
+        Zleca aktualizację wiadomości (nie czeka na jej wysłanie)
+
+        Args:
+            text (str): Aktualna, pełna treść odpowiedzi
+        """
+        self._pending = text
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._flush_loop())
+
+    async def finish(self, text):
+        """
+        Wysyła końcową wersję odpowiedzi (bez kursora)
+
+        Args:
+            text (str): Pełna treść odpowiedzi
+
+        Returns:
+            list: Wiadomości Telegram, w których znajduje się odpowiedź
+        """
+        self._pending = None
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+
+        for attempt in range(FINAL_ATTEMPTS):
+            try:
+                await self._render(text, final=True)
+                break
+            except RetryAfter as e:
+                self._handle_retry_after(e)
+            except Exception as e:
+                logger.error(f"Błąd przy wysyłaniu końcowej wersji wiadomości: {e}")
+                break
+
+        return self._messages
+
+    async def _flush_loop(self):
+        while self._pending is not None:
+            text = self._pending
+            self._pending = None
+            try:
+                await self._render(text + STREAM_CURSOR, final=False)
+            except RetryAfter as e:
+                self._handle_retry_after(e)
+                # Ponów najnowszą wersję po upływie blokady
+                if self._pending is None:
+                    self._pending = text
+            except Exception as e:
+                logger.warning(f"Błąd przy aktualizacji wiadomości strumieniowej: {e}")
+
+    def _handle_retry_after(self, error):
+        retry_after = _retry_after_seconds(error)
+        logger.warning(f"Telegram RetryAfter {retry_after}s dla czatu {self.chat_id}")
+        self._chat_bucket.slow_down(retry_after)
+
+    async def _render(self, text, final):
+        parts = split_message(text, MAX_MESSAGE_LENGTH)
+
+        for index, part in enumerate(parts):
+            if index < len(self._sent) and self._sent[index] == part:
+                continue
+            await self._send(index, part)
+
+        # Usuń nadmiarowe wiadomości (np. zawierające tylko kursor)
+        if final:
+            while len(self._messages) > len(parts):
+                extra = self._messages.pop()
+                self._sent.pop()
+                try:
+                    await extra.delete()
+                except Exception as e:
+                    logger.warning(f"Nie udało się usunąć nadmiarowej wiadomości: {e}")
+
+    async def _send(self, index, text):
+        await self._chat_bucket.acquire()
+        await _global_bucket.acquire()
+
+        parse_mode = self.parse_mode if self._markdown_ok and is_valid_markdown(text) else None
+        try:
+            await self._deliver(index, text, parse_mode)
+        except BadRequest as e:
+            error = str(e).lower()
+            if "not modified" in error:
+                pass
+            elif parse_mode is not None and "parse" in error:
+                # Telegram odrzucił formatowanie - dalsze wersje wysyłaj jako zwykły tekst
+                self._markdown_ok = False
+                await self._deliver(index, text, None)
+            else:
+                raise
+
+        if index < len(self._sent):
+            self._sent[index] = text
+        else:
+            self._sent.append(text)
+        self._chat_bucket.recover()
+
+    async def _deliver(self, index, text, parse_mode):
+        if index < len(self._messages):
+            await self._messages[index].edit_text(text, parse_mode=parse_mode)
+        else:
+            message = await self._bot.send_message(chat_id=self.chat_id, text=text, parse_mode=parse_mode)
+            self._messages.append(message)
@@ -0,0 +1,200 @@
+"""
+Moduł do liczenia tokenów i budowania kontekstu rozmowy w ramach budżetu tokenów
+"""
+import logging
+from collections import OrderedDict
+from config import MODEL_CONTEXT_BUDGETS, MAX_HISTORY_MESSAGE_TOKENS
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+logger = logging.getLogger(__name__)
+
+# Narzut tokenów na każdą wiadomość (rola, separatory) i na początek odpowiedzi
+TOKENS_PER_MESSAGE = 4
+TOKENS_PER_REPLY = 3
+
+# Przybliżona liczba znaków na token, gdy tiktoken nie jest dostępny
+CHARS_PER_TOKEN = 4
+
+# Minimalna liczba tokenów, dla której opłaca się dołączyć skróconą wiadomość
+MIN_TRUNCATED_TOKENS = 64
+
+# Nagłówek wiadomości systemowej z podsumowaniem wcześniejszej części rozmowy
+SUMMARY_PREFIX = "Podsumowanie wcześniejszej części rozmowy:\n"
+
+# Liczba zapamiętanych wyników liczenia tokenów dla zapisanych wiadomości
+TOKEN_CACHE_SIZE = 10000
+
+_encodings = {}
+_token_cache = OrderedDict()
+
+def _get_encoding(model):
+    """Zwraca koder tiktoken dla modelu lub None, jeśli tiktoken nie jest dostępny"""
+    if tiktoken is None:
+        return None
+
+    if model not in _encodings:
+        try:
+            _encodings[model] = tiktoken.encoding_for_model(model)
+        except KeyError:
+            _encodings[model] = tiktoken.get_encoding("cl100k_base")
+    return _encodings[model]
+
+def count_tokens(text, model):
+    """
+    Liczy tokeny w tekście dla danego modelu
+
+    Args:
+        text (str): Tekst do policzenia
+        model (str): Nazwa modelu OpenAI
+
+    Returns:
+        int: Liczba tokenów
+    """
+    if not text:
+        return 0
+
+    encoding = _get_encoding(model)
+    if encoding is None:
+        return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+    return len(encoding.encode(text))
+
+def truncate_to_tokens(text, max_tokens, model):
+    """
+    Skraca tekst do podanej liczby tokenów (zachowując jego początek)
+
+    Args:
+        text (str): Tekst do skrócenia
+        max_tokens (int): Maksymalna liczba tokenów
+        model (str): Nazwa modelu OpenAI
+
+    Returns:
+        str: Skrócony tekst
+    """
+    encoding = _get_encoding(model)
+    if encoding is None:
+        max_chars = max_tokens * CHARS_PER_TOKEN
+        return text if len(text) <= max_chars else text[:max_chars] + "…"
+
+    tokens = encoding.encode(text)
+    if len(tokens) <= max_tokens:
+        return text
+    return encoding.decode(tokens[:max_tokens]) + "…"
+
+def count_message_tokens(message, model):
+    """
+    Liczy tokeny zapisanej wiadomości, zapamiętując wynik dla jej ID
+
+    Args:
+        message (dict): Wiadomość z historii konwersacji
+        model (str): Nazwa modelu OpenAI
+
+    Returns:
+        int: Liczba tokenów treści wiadomości
+    """
+    message_id = message.get("id")
+    encoding = _get_encoding(model)
+    key = (message_id, encoding.name if encoding is not None else None)
+
+    if message_id is not None and key in _token_cache:
+        _token_cache.move_to_end(key)
+        return _token_cache[key]
+
+    tokens = count_tokens(message.get("content") or "", model)
+
+    if message_id is not None:
+        _token_cache[key] = tokens
+        if len(_token_cache) > TOKEN_CACHE_SIZE:
+            _token_cache.popitem(last=False)
+
+    return tokens
+
+def estimate_request_tokens(messages, model, max_tokens=0):
+    """
+    Szacuje liczbę tokenów zapytania (wiadomości + limit odpowiedzi) na potrzeby limitu TPM
+
+    Args:
+        messages (list): Lista wiadomości w formacie OpenAI
+        model (str): Nazwa modelu OpenAI
+        max_tokens (int, optional): Limit tokenów odpowiedzi
+
+    Returns:
+        int: Szacowana liczba tokenów
+    """
+    tokens = TOKENS_PER_REPLY + (max_tokens or 0)
+    for message in messages:
+        content = message["content"]
+        if isinstance(content, list):
+            # Wiadomość wieloczęściowa - liczymy tylko części tekstowe
+            content = " ".join(part.get("text", "") for part in content if part.get("type") == "text")
+        tokens += TOKENS_PER_MESSAGE + count_tokens(content, model)
+    return tokens
+
+def get_context_budget(model):
+    """Zwraca budżet tokenów kontekstu dla modelu"""
+    return MODEL_CONTEXT_BUDGETS.get(model, MODEL_CONTEXT_BUDGETS["default"])
+
+def build_context(history, user_message, system_prompt, model, summary=None):
+    """
+    Buduje listę wiadomości dla API OpenAI mieszczącą się w budżecie tokenów modelu
+
+    Prompt systemowy i aktualna wiadomość są zawsze dołączane. Z historii
+    dobierane są najnowsze wiadomości, dopóki mieszczą się w budżecie - zbyt
+    długie wiadomości są skracane, a starsze, które się nie mieszczą, pomijane.
+    Podsumowanie wcześniejszej części rozmowy (jeśli jest) trafia zaraz po
+    prompcie systemowym.
+
+    Args:
+        history (list): Lista wiadomości z historii konwersacji (chronologicznie)
+        user_message (str): Aktualna wiadomość użytkownika
+        system_prompt (str): Prompt systemowy
+        model (str): Nazwa modelu OpenAI
+        summary (str, optional): Podsumowanie wcześniejszej części rozmowy
+
+    Returns:
+        tuple: (lista wiadomości w formacie OpenAI, liczba tokenów kontekstu)
+    """
+    budget = get_context_budget(model)
+
+    used = TOKENS_PER_REPLY
+    used += TOKENS_PER_MESSAGE + count_tokens(system_prompt, model)
+    used += TOKENS_PER_MESSAGE + count_tokens(user_message, model)
+
+    summary_message = None
+    if summary:
+        summary_message = {"role": "system", "content": SUMMARY_PREFIX + summary}
+        used += TOKENS_PER_MESSAGE + count_tokens(summary_message["content"], model)
+
+    selected = []
+    for msg in reversed(history):
+        content = msg["content"] if msg["content"] is not None else ""
+        tokens = count_message_tokens(msg, model)
+        remaining = budget - used - TOKENS_PER_MESSAGE
+
+        # Zbyt długie pojedyncze wiadomości (np. wklejone dokumenty) są skracane
+        limit = min(MAX_HISTORY_MESSAGE_TOKENS, remaining)
+        if tokens > limit:
+            if limit < MIN_TRUNCATED_TOKENS:
+                break
+            content = truncate_to_tokens(content, limit - 1, model)
+            tokens = count_tokens(content, model)
+
+        used += TOKENS_PER_MESSAGE + tokens
+        selected.append({
+            "role": "user" if msg["is_from_user"] else "assistant",
+            "content": content
+        })
+
+    messages = [{"role": "system", "content": system_prompt}]
+    if summary_message:
+        messages.append(summary_message)
+    messages.extend(reversed(selected))
+    messages.append({"role": "user", "content": user_message})
+
+    if len(selected) < len(history):
+        logger.debug(f"Kontekst ({model}): pominięto {len(history) - len(selected)} najstarszych wiadomości z historii")
+
+    return messages, used
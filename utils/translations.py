@@ -1,5 +1,13 @@
 # translations.py
 # Moduł obsługujący tłumaczenia dla bota Telegram
+import logging
+import string
+import sys
+
+logger = logging.getLogger(__name__)
+
+# Język, z którego pobierane są teksty brakujące w innych językach
+FALLBACK_LANGUAGE = "pl"
 
 # Słownik z tłumaczeniami dla każdego obsługiwanego języka
 translations = {
@@ -143,6 +151,7 @@ translations = {
         "history_delete_button": "🗑️ Usuń historię",
         "history_deleted": "*Historia została wyczyszczona*\n\nRozpocznęto nową konwersację.",
         "generating_response": "⏳ Generowanie odpowiedzi...",
+        "openai_unavailable": "⚠️ Usługa AI jest chwilowo przeciążona lub niedostępna. Nie pobrano kredytów - spróbuj ponownie za chwilę.",
         
         # Do modeli i trybów
         "model_not_available": "Wybrany model nie jest dostępny.",
@@ -204,7 +213,12 @@ translations = {
         "original_text": "Oryginalny tekst",
         "translated_text": "Przetłumaczony tekst",
         "pdf_translation_error": "Błąd podczas tłumaczenia pliku PDF",
-        "translate_pdf_command": "Aby przetłumaczyć pierwszy akapit z pliku PDF, prześlij plik PDF z komentarzem /translate",
+        "translate_pdf_command": "Aby przetłumaczyć cały plik PDF, prześlij go z komentarzem /translate",
+        "translating_pdf_document": "Tłumaczę dokument PDF, proszę czekać...",
+        "pdf_translation_progress": "⏳ Tłumaczę dokument PDF: przetłumaczono {done}/{total} fragmentów...",
+        "pdf_translation_done": "✅ Przetłumaczono dokument {file_name} ({chunks} fragmentów).",
+        "pdf_translation_partial": "⚠️ Nie udało się przetłumaczyć {failed} z {total} fragmentów. Kredyty nie zostały pobrane - wyślij plik ponownie, aby dokończyć tłumaczenie.",
+        "pdf_too_many_pages": "Dokument ma zbyt wiele stron ({pages}). Można przetłumaczyć maksymalnie {max_pages} stron.",
         "pdf_translate_button": "🔄 Przetłumacz pierwszy akapit",
         "translating_document": "Tłumaczę dokument, proszę czekać...",
         "subscription_expired_short": "Niewystarczająca liczba kredytów",
@@ -414,6 +428,7 @@ translations = {
         "history_delete_button": "🗑️ Delete History",
         "history_deleted": "*History has been cleared*\n\nA new conversation has been started.",
         "generating_response": "⏳ Generating response...",
+        "openai_unavailable": "⚠️ The AI service is temporarily overloaded or unavailable. No credits were charged - please try again in a moment.",
         
         # Do modeli i trybów
         "model_not_available": "The selected model is not available.",
@@ -475,7 +490,12 @@ translations = {
         "original_text": "Original text",
         "translated_text": "Translated text",
         "pdf_translation_error": "Error while translating the PDF file",
-        "translate_pdf_command": "To translate the first paragraph from a PDF file, upload a PDF file with the /translate comment",
+        "translate_pdf_command": "To translate a whole PDF file, upload it with the /translate comment",
+        "translating_pdf_document": "Translating the PDF document, please wait...",
+        "pdf_translation_progress": "⏳ Translating the PDF document: {done}/{total} chunks translated...",
+        "pdf_translation_done": "✅ Document {file_name} translated ({chunks} chunks).",
+        "pdf_translation_partial": "⚠️ {failed} of {total} chunks could not be translated. No credits were charged - send the file again to finish the translation.",
+        "pdf_too_many_pages": "The document has too many pages ({pages}). At most {max_pages} pages can be translated.",
         "pdf_translate_button": "🔄 Translate first paragraph",
         "translating_document": "Translating document, please wait...",
         "subscription_expired_short": "Insufficient credits",
@@ -686,6 +706,7 @@ translations = {
         "history_delete_button": "🗑️ Удалить историю",
         "history_deleted": "*История была очищена*\n\nНачат новый разговор.",
         "generating_response": "⏳ Генерация ответа...",
+        "openai_unavailable": "⚠️ Сервис ИИ временно перегружен или недоступен. Кредиты не списаны - попробуйте ещё раз через минуту.",
         
         # Do modeli i trybów
         "model_not_available": "Выбранная модель недоступна.",
@@ -747,7 +768,12 @@ translations = {
         "original_text": "Оригинальный текст",
         "translated_text": "Переведенный текст",
         "pdf_translation_error": "Ошибка при переводе файла PDF",
-        "translate_pdf_command": "Чтобы перевести первый абзац из файла PDF, загрузите файл PDF с комментарием /translate",
+        "translate_pdf_command": "Чтобы перевести весь файл PDF, загрузите его с комментарием /translate",
+        "translating_pdf_document": "Перевожу документ PDF, пожалуйста, подождите...",
+        "pdf_translation_progress": "⏳ Перевожу документ PDF: переведено {done}/{total} фрагментов...",
+        "pdf_translation_done": "✅ Документ {file_name} переведён ({chunks} фрагментов).",
+        "pdf_translation_partial": "⚠️ Не удалось перевести {failed} из {total} фрагментов. Кредиты не списаны - отправьте файл ещё раз, чтобы завершить перевод.",
+        "pdf_too_many_pages": "В документе слишком много страниц ({pages}). Можно перевести не более {max_pages} страниц.",
         "pdf_translate_button": "🔄 Перевести первый абзац",
         "translating_document": "Перевожу документ, пожалуйста, подождите...",
         "subscription_expired_short": "Недостаточно кредитов",
@@ -817,6 +843,99 @@ translations = {
     }
 }
 
+# Skompilowany katalog: {język: {klucz: (tekst, zbiór nazw argumentów lub None, szablon printf lub None)}}
+_catalog = None
+
+# Pary (język, klucz), o których brakach już poinformowano
+_reported_missing = set()
+
+# Wyrenderowane etykiety klawiatur: {(układ, język): krotka wierszy (tekst, callback_data)}
+_keyboard_cache = {}
+
+# Funkcje wywoływane po kompilacji katalogu (np. czyszczenie zapamiętanych klawiatur menu)
+_catalog_listeners = []
+
+def on_catalog_compiled(listener):
+    """
+    Rejestruje funkcję wywoływaną po każdej kompilacji katalogu tłumaczeń
+
+    Moduły zapamiętujące teksty z katalogu rejestrują się same, dzięki czemu
+    moduł tłumaczeń nie importuje handlerów.
+    """
+    if listener not in _catalog_listeners:
+        _catalog_listeners.append(listener)
+    return listener
+
+def _parse_fields(text):
+    """Zwraca zbiór nazw argumentów tekstu lub None, jeśli tekst nie wymaga formatowania"""
+    try:
+        fields = {
+            field_name.split(".")[0].split("[")[0]
+            for _, field_name, _, _ in string.Formatter().parse(text)
+            if field_name is not None
+        }
+    except ValueError:
+        # Nawiasy klamrowe niebędące argumentami - tekst wyświetlany bez formatowania
+        return None
+    if not fields and "{" not in text and "}" not in text:
+        return None
+    return frozenset(fields)
+
+def _compile_template(text):
+    """
+    Zamienia tekst z prostymi argumentami ({nazwa}) na szablon printf (%(nazwa)s),
+    który jest formatowany szybciej niż str.format. Zwraca None, gdy tekst używa
+    konwersji, specyfikacji formatu lub odwołań do atrybutów i indeksów.
+    """
+    parts = []
+    for literal, field_name, format_spec, conversion in string.Formatter().parse(text):
+        parts.append(literal.replace("%", "%%"))
+        if field_name is None:
+            continue
+        if not field_name.isidentifier() or format_spec or conversion:
+            return None
+        parts.append(f"%({field_name})s")
+    return "".join(parts)
+
+def compile_catalog():
+    """
+    Kompiluje katalog tłumaczeń: każdy tekst otrzymuje zbiór swoich argumentów,
+    a teksty bez argumentów są internowane. Klucze brakujące w danym języku
+    są zgłaszane jednorazowo i uzupełniane tekstem z języka domyślnego.
+    """
+    global _catalog
+    reference = translations[FALLBACK_LANGUAGE]
+    catalog = {}
+    for language, messages in translations.items():
+        missing = [key for key in reference if key not in messages]
+        if missing:
+            logger.warning(f"Brak tłumaczeń ({language}) dla kluczy: {', '.join(sorted(missing))}")
+            _reported_missing.update((language, key) for key in missing)
+
+        compiled = {}
+        for key in reference.keys() | messages.keys():
+            text = messages.get(key, reference.get(key))
+            fields = _parse_fields(text)
+            if fields:
+                compiled[key] = (text, fields, _compile_template(text))
+            else:
+                compiled[key] = (sys.intern(text), fields, None)
+        catalog[language] = compiled
+
+    _keyboard_cache.clear()
+    _catalog = catalog
+    for listener in _catalog_listeners:
+        listener()
+
+def _report_missing(key, language, has_default):
+    if (language, key) in _reported_missing:
+        return
+    _reported_missing.add((language, key))
+    if has_default:
+        logger.debug(f"Brak tłumaczenia ({language}) dla klucza {key} - użyto tekstu domyślnego")
+    else:
+        logger.warning(f"Brak tłumaczenia ({language}) dla klucza {key}")
+
 def get_text(key, language="pl", **kwargs):
     """
     Pobiera przetłumaczony tekst dla określonego klucza i języka.
@@ -824,24 +943,54 @@ def get_text(key, language="pl", **kwargs):
     Args:
         key (str): Klucz tekstu do przetłumaczenia
         language (str): Kod języka (pl, en, ru)
-        **kwargs: Argumenty do formatowania tekstu
+        **kwargs: Argumenty do formatowania tekstu (default - tekst, gdy brak klucza)
         
     Returns:
         str: Przetłumaczony tekst
     """
+    if _catalog is None:
+        compile_catalog()
+    
     # Domyślny język, jeśli podany język nie jest obsługiwany
-    if language not in translations:
-        language = "pl"
+    messages = _catalog.get(language)
+    if messages is None:
+        language = FALLBACK_LANGUAGE
+        messages = _catalog[language]
+    
+    entry = messages.get(key)
+    if entry is None:
+        # Brak klucza jest zgłaszany tylko raz - zwróć tekst domyślny lub klucz
+        _report_missing(key, language, 'default' in kwargs)
+        return kwargs.get('default', key)
     
-    # Pobierz tekst lub zwróć klucz jako fallback
-    text = translations[language].get(key, kwargs.get('default', key))
+    text, fields, template = entry
+    if fields is None or not kwargs:
+        return text
     
-    # Formatuj tekst z podanymi argumentami
-    if kwargs:
-        try:
-            return text.format(**kwargs)
-        except KeyError:
-            # Jeśli formatowanie nie powiedzie się, zwróć nieformatowany tekst
-            return text
+    # Formatuj tylko, gdy podano wszystkie argumenty tekstu
+    if not fields.issubset(kwargs):
+        return text
+    if template is not None:
+        return template % kwargs
+    return text.format(**kwargs)
+
+def get_keyboard_labels(layout, language="pl"):
+    """
+    Zwraca przetłumaczony układ klawiatury (wynik jest zapamiętywany)
     
-    return text
\ No newline at end of file
+    Args:
+        layout (tuple): Krotka wierszy, każdy wiersz to krotka par (klucz tekstu, callback_data)
+        language (str): Kod języka (pl, en, ru)
+        
+    Returns:
+        tuple: Krotka wierszy par (tekst przycisku, callback_data)
+    """
+    cache_key = (layout, language)
+    rows = _keyboard_cache.get(cache_key)
+    if rows is None:
+        rows = tuple(
+            tuple((get_text(key, language), callback_data) for key, callback_data in row)
+            for row in layout
+        )
+        _keyboard_cache[cache_key] = rows
+    return rows